@@ -4,7 +4,6 @@ Plugin tasks related to the scenario history
 
 """
 import concurrent.futures
-import copy
 import datetime
 from enum import IntEnum
 import json
@@ -13,8 +12,10 @@ import os
 from qgis.PyQt import QtCore
 from qgis.core import QgsTask
 
-from .request import CplusApiRequest
+from .request import CplusApiRequest, DEFAULT_DOWNLOAD_CONCURRENCY
+from ..conf import settings_manager, Settings
 from ..models.base import Scenario, ScenarioResult, NcsPathway, Activity
+from ..utils import log
 
 
 class BaseScenarioTask(QgsTask):
@@ -35,6 +36,9 @@ class BaseFetchScenarioOutput:
         self.downloaded_output = 0
         self.total_file_output = 0
         self.created_datetime = datetime.datetime.now()
+        # Download priority of the output files keyed by their path, 0 for
+        # the final output, 1 for the activity layers and 2 for the rest
+        self.output_priorities = {}
 
     def is_download_cancelled(self):
         """Check if download is cancelled.
@@ -45,6 +49,37 @@ class BaseFetchScenarioOutput:
         """
         return False
 
+    def get_download_concurrency(self) -> int:
+        """Returns the number of output files that can be downloaded
+        at the same time.
+
+        :return: Number of concurrent downloads, at least one.
+        :rtype: int
+        """
+        concurrency = settings_manager.get_value(
+            Settings.DOWNLOAD_CONCURRENCY,
+            default=DEFAULT_DOWNLOAD_CONCURRENCY,
+            setting_type=int,
+        )
+        try:
+            concurrency = int(concurrency)
+        except (TypeError, ValueError):
+            concurrency = DEFAULT_DOWNLOAD_CONCURRENCY
+
+        return max(1, concurrency)
+
+    def on_output_downloaded(self, download_path: str):
+        """Called when an output file has been downloaded and verified,
+        before the remaining outputs have finished downloading.
+
+        This method can be overriden by child class, e.g. to load the
+        output while the rest of the outputs are being downloaded.
+
+        :param download_path: Path of the downloaded output file
+        :type download_path: str
+        """
+        pass
+
     def __create_activity(self, activity: dict, download_dict: list):
         """
         Create activity object from activity and downloaded file dictionary.
@@ -159,9 +194,15 @@ class BaseFetchScenarioOutput:
             return None, None
         self.total_file_output = len(output_list["results"])
         self.downloaded_output = 0
+        self.output_priorities = {}
+
+        activity_filenames = [
+            os.path.basename(activity.get("path") or "")
+            for activity in scenario_detail.get("activities", [])
+        ]
 
-        urls_to_download = []
         download_paths = []
+        pending_downloads = []
         final_output = None
         for output in output_list["results"]:
             if output["is_final_output"]:
@@ -169,36 +210,53 @@ class BaseFetchScenarioOutput:
                 final_output_path = download_path
                 final_output = output["output_meta"]
                 final_output["OUTPUT"] = final_output_path
+                priority = 0
             else:
                 download_path = os.path.join(
                     scenario_directory, output["group"], output["filename"]
                 )
-            urls_to_download.append(output["url"])
+                priority = 1 if output["filename"] in activity_filenames else 2
             download_paths.append(download_path)
+            pending_downloads.append((priority, output["url"], download_path))
+            self.output_priorities[download_path] = priority
 
-        download_paths_copy = copy.deepcopy(download_paths)
+        # The final output and the activity layers are downloaded first
+        pending_downloads.sort(key=lambda item: item[0])
 
         # configure max number of iteration
-        max_iteration = len(download_paths_copy * 2)
+        max_iteration = len(download_paths * 2)
         iteration = 0
-        while len(urls_to_download) > 0:
+        while len(pending_downloads) > 0:
             with concurrent.futures.ThreadPoolExecutor(
-                max_workers=3 if os.cpu_count() > 3 else 1
+                max_workers=self.get_download_concurrency()
             ) as executor:
-                executor.map(self.download_file, urls_to_download, download_paths_copy)
+                futures = {
+                    executor.submit(self.download_file, url, download_path): (
+                        download_path
+                    )
+                    for _, url, download_path in pending_downloads
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    download_path = futures[future]
+                    try:
+                        future.result()
+                    except Exception as ex:
+                        # Partially downloaded files are resumed on retry
+                        log(f"Problem downloading {download_path}: {ex}")
+                        continue
+                    if os.path.exists(download_path):
+                        self.on_output_downloaded(download_path)
             if self.is_download_cancelled():
                 return None, None
-            is_valid, invalid_indexes = self.__validate_output_paths(download_paths)
-            if len(invalid_indexes) <= len(urls_to_download):
-                urls_to_download = [urls_to_download[idx] for idx in invalid_indexes]
-                download_paths_copy = [
-                    download_paths_copy[idx] for idx in invalid_indexes
-                ]
+            pending_downloads = [
+                item for item in pending_downloads if not os.path.exists(item[2])
+            ]
             if iteration == max_iteration:
                 break
             iteration += 1
 
-        if not self.__validate_output_paths(download_paths):
+        is_valid, _ = self.__validate_output_paths(download_paths)
+        if not is_valid:
             return None, None
         scenario = self.__create_scenario(
             original_scenario, scenario_detail, output_list, download_paths
@@ -19,6 +19,7 @@ from qgis.PyQt import QtCore
 
 from .base import ApiRequestStatus
 from ..conf import settings_manager, Settings
+from ..lib.remote_cache import remote_raster_cache
 from ..models.helpers import extent_to_url_param
 from ..utils import log, tr, transform_extent
 
@@ -342,6 +343,16 @@ class BaseCarbonDownloadTask(QgsTask):
         # Use to block downloader until it completes or encounters an error
         self._event_loop = QtCore.QEventLoop(self)
 
+        # Reuse a previous download of the same dataset and extent
+        cache_key = remote_raster_cache.key(
+            full_download_url.toString(), crs="EPSG:4326"
+        )
+        if remote_raster_cache.copy_to(cache_key, save_path):
+            log(f"Using the cached {self.dataset_name} dataset for {save_path}")
+            self.started.emit()
+            self._on_download_completed(full_download_url)
+            return True
+
         self._downloader = QgsFileDownloader(
             full_download_url, save_path, delayStart=True
         )
@@ -370,6 +381,12 @@ class BaseCarbonDownloadTask(QgsTask):
 
         self._event_loop.exec()
 
+        if self._successfully_completed:
+            try:
+                remote_raster_cache.put(cache_key, save_path)
+            except OSError as ex:
+                log(f"Unable to cache the {self.dataset_name} dataset: {ex}")
+
         return True
 
     def _get_file_path(self) -> str:
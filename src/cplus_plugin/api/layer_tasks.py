@@ -27,6 +27,7 @@ from ..definitions.constants import (
     NO_DATA_VALUE,
 )
 from .base import ApiRequestStatus
+from ..lib.remote_cache import remote_raster_cache
 from ..models.base import ResultInfo
 from ..models.helpers import extent_to_url_param
 from ..utils import (
@@ -508,6 +509,7 @@ class DefaultPriorityLayerDownloadTask(QgsTask):
 
         self.priority_layer = priority_layer
         self.save_file_path = save_file_path
+        self._successfully_completed = False
 
         self.cplus_api_url = CplusApiUrl()
 
@@ -729,6 +731,21 @@ class DefaultPriorityLayerDownloadTask(QgsTask):
         # Use to block downloader until it completes or encounters an error
         self._event_loop = QtCore.QEventLoop(self)
 
+        # Reuse a previous download of the same layer version and extent
+        cache_key = remote_raster_cache.key(
+            full_download_url.toString(),
+            version=self.priority_layer.get("version"),
+            crs="EPSG:4326",
+        )
+        if remote_raster_cache.copy_to(cache_key, self.save_file_path):
+            log(
+                f"Using the cached priority layer {self.priority_layer.get('name')} "
+                f"for {self.save_file_path}"
+            )
+            self.started.emit()
+            self._on_download_completed(full_download_url)
+            return True
+
         self._downloader = QgsFileDownloader(
             full_download_url, self.save_file_path, delayStart=True
         )
@@ -757,6 +774,12 @@ class DefaultPriorityLayerDownloadTask(QgsTask):
 
         self._event_loop.exec()
 
+        if self._successfully_completed:
+            try:
+                remote_raster_cache.put(cache_key, self.save_file_path)
+            except OSError as ex:
+                log(f"Unable to cache the priority layer download: {ex}")
+
         return True
 
 
@@ -1,4 +1,5 @@
 import datetime
+import hashlib
 import io
 import json
 import math
@@ -7,13 +8,11 @@ import time
 import typing
 import uuid
 
-from qgis import processing
 from qgis.PyQt import QtCore
 from qgis.PyQt.QtNetwork import QNetworkRequest, QNetworkReply
 from qgis.core import (
     QgsNetworkAccessManager,
     QgsNetworkReplyContent,
-    QgsProcessingFeedback,
 )
 
 from ..models.base import Scenario, SpatialExtent, Activity, LayerSource
@@ -28,6 +27,16 @@ JOB_CANCELLED_STATUS = "Cancelled"
 JOB_RUNNING_STATUS = "Running"
 JOB_STOPPED_STATUS = "Stopped"
 CHUNK_SIZE = 100 * 1024 * 1024
+# Suffix of files that are being downloaded
+PARTIAL_DOWNLOAD_SUFFIX = ".part"
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+# Number of output files that are downloaded at the same time
+DEFAULT_DOWNLOAD_CONCURRENCY = 3
+# Number of parts of a single file that are uploaded at the same time
+DEFAULT_UPLOAD_PART_CONCURRENCY = 3
+# Age in seconds after which an unfinished upload is no longer resumed
+# as its presigned part URLs are likely to have expired
+UPLOAD_RESUME_MAX_AGE = 24 * 60 * 60
 
 
 def debug_log(message: str, data: dict = {}):
@@ -689,9 +698,22 @@ class CplusApiRequest:
         """
         log(f"Finished downloading file to {filename}")
 
-    def download_file(self, url: str, file_path: str, on_download_progress):
+    def download_file(
+        self,
+        url: str,
+        file_path: str,
+        on_download_progress,
+        is_cancelled: typing.Callable[[], bool] = None,
+    ):
         """Download a file from url and save into output file in file_path.
 
+        The content is first written to a partial file next to the output
+        file. If a partial file is left from a previous attempt, only the
+        remaining bytes are requested using an HTTP Range request. The md5
+        checksum is computed while writing and compared with the ETag of
+        the file when it is a plain md5 checksum, the partial file is only
+        moved to file_path once the download has been verified.
+
         :param url: Download URL
         :type url: str
 
@@ -700,13 +722,87 @@ class CplusApiRequest:
 
         :param on_download_progress: callback for download progress signal
         :type on_download_progress: any
-        """
 
-        feedback = QgsProcessingFeedback()
-        params = {"URL": url, "OUTPUT": file_path}
-        feedback.progressChanged.connect(on_download_progress)
+        :param is_cancelled: Callable that returns True when the download
+            should be stopped, the partial file is then kept to resume later
+        :type is_cancelled: typing.Callable[[], bool]
+
+        :raises CplusApiRequestError: If the download failed or the
+            downloaded file does not match its checksum
+        """
+        partial_path = f"{file_path}{PARTIAL_DOWNLOAD_SUFFIX}"
+        offset = 0
+        hash_md5 = hashlib.md5()
+        if os.path.exists(partial_path):
+            # resume the checksum from the content already downloaded
+            with open(partial_path, "rb") as f:
+                for chunk in iter(lambda: f.read(DOWNLOAD_BUFFER_SIZE), b""):
+                    hash_md5.update(chunk)
+                    offset += len(chunk)
 
-        processing.run("qgis:filedownloader", params, feedback=feedback)
+        nam = QgsNetworkAccessManager.instance()
+        request = QNetworkRequest(QtCore.QUrl(url))
+        if offset > 0:
+            request.setRawHeader(b"Range", f"bytes={offset}-".encode("utf-8"))
+        reply = nam.get(request)
+
+        state = {"started": False, "offset": offset, "hash": hash_md5}
+        with open(partial_path, "ab") as f:
+
+            def write_data():
+                if not state["started"]:
+                    state["started"] = True
+                    http_status = reply.attribute(
+                        QNetworkRequest.Attribute.HttpStatusCodeAttribute
+                    )
+                    if http_status == 200 and state["offset"] > 0:
+                        # Range is not supported, download the whole file
+                        f.seek(0)
+                        f.truncate()
+                        state["offset"] = 0
+                        state["hash"] = hashlib.md5()
+                data = reply.readAll().data()
+                if data:
+                    f.write(data)
+                    state["hash"].update(data)
+                if is_cancelled is not None and is_cancelled():
+                    reply.abort()
+
+            def update_progress(received: int, total: int):
+                if total > 0:
+                    downloaded = state["offset"] + received
+                    on_download_progress(
+                        int(downloaded * 100 / (state["offset"] + total))
+                    )
+
+            reply.readyRead.connect(write_data)
+            reply.downloadProgress.connect(update_progress)
+            self._make_request(reply)
+            if reply.error() == QNetworkReply.NetworkError.NoError:
+                write_data()
+
+        http_status = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        etag = reply.rawHeader(b"ETag").data().decode("utf-8").strip('"')
+        error = reply.error()
+        error_string = reply.errorString()
+        reply.deleteLater()
+
+        if error != QNetworkReply.NetworkError.NoError:
+            if http_status == 416:
+                # The partial file cannot be resumed
+                os.remove(partial_path)
+            self._on_download_error(file_path, error_string)
+        if http_status is None or not 200 <= http_status < 300:
+            self._on_download_error(file_path, f"HTTP Error: {http_status}")
+
+        # multipart ETags are not the md5 checksum of the content
+        checksum = state["hash"].hexdigest()
+        if len(etag) == 32 and "-" not in etag and etag != checksum:
+            os.remove(partial_path)
+            self._on_download_error(file_path, "checksum mismatch")
+
+        os.replace(partial_path, file_path)
+        self._on_download_finished(file_path)
 
     def _do_upload_file_part(
         self, url: str, chunk: typing.Union[bytes, bytearray], file_part_number: int
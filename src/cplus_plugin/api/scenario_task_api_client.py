@@ -1,25 +1,51 @@
 import concurrent.futures
 import json
+import math
 import os
+import threading
+import time
 import traceback
 import typing
 from zipfile import ZipFile
 
+from osgeo import gdal
+
 from qgis.core import Qgis
+from qgis.PyQt import QtCore
 
 from .request import (
     CplusApiRequest,
     JOB_COMPLETED_STATUS,
     JOB_STOPPED_STATUS,
     CHUNK_SIZE,
+    DEFAULT_UPLOAD_PART_CONCURRENCY,
+    UPLOAD_RESUME_MAX_AGE,
 )
 from ..api.base import BaseFetchScenarioOutput
 from ..conf import settings_manager, Settings
 from ..models.base import Activity, NcsPathway, Scenario
 from ..tasks import ScenarioAnalysisTask
-from ..utils import FileUtils, CustomJsonEncoder, todict
+from ..utils import (
+    FilePartReader,
+    FileUtils,
+    CustomJsonEncoder,
+    compress_raster,
+    get_layer_type,
+    md5,
+    sampled_file_fingerprint,
+    todict,
+)
 from ..definitions.constants import NO_DATA_VALUE
-from ..lib.constant_raster import constant_raster_registry
+from ..definitions.defaults import (
+    DEFAULT_UPLOAD_CACHE_SIZE_MB,
+    DEFAULT_UPLOAD_COMPRESSION,
+    UPLOAD_CACHE_DIR_NAME,
+)
+from ..lib.constant_raster import (
+    constant_raster_registry,
+    virtual_constant_raster_value,
+)
+from ..lib.remote_cache import RemoteRasterCache
 
 
 def clean_filename(filename):
@@ -41,6 +67,24 @@ def clean_filename(filename):
     return filename
 
 
+def set_priority_layer_payload_path(priority_layer: dict):
+    """Sets the path of a priority layer in the online scenario payload.
+
+    The local path is not sent since the layer is referenced by its
+    uploaded layer UUID. A virtual constant raster is never uploaded, its
+    path and value are sent instead so that the value is used as a scalar.
+
+    :param priority_layer: Priority layer in the scenario payload.
+    :type priority_layer: dict
+    """
+    path = priority_layer.get("path", "")
+    constant_value = virtual_constant_raster_value(path)
+    if constant_value is None:
+        priority_layer["path"] = ""
+    else:
+        priority_layer["constant_value"] = constant_value
+
+
 class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutput):
     """Prepares and runs the scenario analysis in Cplus API
 
@@ -63,6 +107,10 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
     :type scenario: Scenario
     """
 
+    # Path of the final output or an activity layer that has been
+    # downloaded while the other outputs are still downloading
+    output_downloaded = QtCore.pyqtSignal(str)
+
     def __init__(
         self,
         analysis_scenario_name: str,
@@ -88,6 +136,7 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
         self.total_file_upload_size = 0
         self.total_file_upload_chunks = 0
         self.uploaded_chunks = 0
+        self._upload_lock = threading.Lock()
         self.path_to_layer_mapping = {}
         self.scenario_api_uuid = None
         self.status_pooling = None
@@ -121,17 +170,15 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
 
         hide_task = getattr(self, "hide_task", False)
         if not hide_task:
-            # check if there is ongoing upload
+            # ongoing uploads are kept so that they can be resumed
             layer_mapping = settings_manager.get_all_layer_mapping()
             for identifier, layer in layer_mapping.items():
                 if "upload_id" not in layer:
                     continue
-                self.log_message(f"Cancelling upload file: {layer['path']} ")
-                try:
-                    self.request.abort_upload_layer(layer["uuid"], layer["upload_id"])
-                    settings_manager.remove_layer_mapping(identifier)
-                except Exception as ex:
-                    self.log_message(f"Problem aborting upload layer: {ex}")
+                self.log_message(
+                    f"Upload of {layer['path']} is unfinished, "
+                    "it will be resumed on the next run"
+                )
             self.log_message(f"Cancel scenario {self.scenario_api_uuid}")
             if self.scenario_api_uuid and self.scenario_status not in [
                 JOB_COMPLETED_STATUS,
@@ -151,6 +198,24 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
         self.scenario_directory = self.get_scenario_directory()
         FileUtils.create_new_dir(self.scenario_directory)
 
+        # The server only supports vector masks, the decision tree masks
+        # are uploaded as polygons of the areas where no action is allowed
+        self.run_ncs_decision_tree(self.analysis_activities)
+        if self.processing_cancelled:
+            return False
+        for activity in self.analysis_activities:
+            # Drop the decision tree masks of a previous run
+            activity.mask_paths = [
+                mask_path
+                for mask_path in activity.mask_paths or []
+                if os.path.basename(os.path.dirname(mask_path)) != "decision_tree"
+            ]
+            mask_path = self.polygonize_decision_masks(activity)
+            if mask_path:
+                activity.mask_paths.append(mask_path)
+        if self.processing_cancelled:
+            return False
+
         try:
             self.upload_layers()
         except Exception as e:
@@ -198,60 +263,271 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
         :rtype: typing.Dict
         """
 
+        temp_layer = self.get_resumable_upload(file_path)
+        if temp_layer:
+            self.log_message(
+                f"Resuming upload of {file_path} as {component_type}, "
+                f"{len(temp_layer['parts'])} part(s) already uploaded"
+            )
+            try:
+                return self._complete_upload(temp_layer, component_type)
+            except Exception as ex:
+                if self.processing_cancelled:
+                    raise
+                # The server might have discarded the parts or the presigned
+                # URLs might have expired, start the upload from scratch.
+                self.log_message(
+                    f"Unable to resume upload of {file_path}, "
+                    f"restarting the upload: {ex}"
+                )
+                self._abort_upload(temp_layer)
+                with self._upload_lock:
+                    self.uploaded_chunks -= len(temp_layer["parts"])
+        else:
+            # An unfinished upload that cannot be resumed is aborted so
+            # that its parts are not left on the server
+            self._abort_unfinished_upload(file_path)
+
         self.log_message(f"Uploading {file_path} as {component_type}")
         upload_params = self.request.start_upload_layer(file_path, component_type)
-        upload_id = upload_params["multipart_upload_id"]
-        layer_uuid = upload_params["uuid"]
-        upload_urls = upload_params["upload_urls"]
         if self.processing_cancelled:
             return False
-        # store temporary layer
+        file_stat = os.stat(file_path)
+        # store temporary layer, it is updated as parts of the file are
+        # uploaded so that the upload can be resumed if it is interrupted.
         temp_layer = {
-            "uuid": layer_uuid,
-            "size": os.stat(file_path).st_size,
+            "uuid": upload_params["uuid"],
+            "size": file_stat.st_size,
+            "mtime": file_stat.st_mtime,
             "name": os.path.basename(file_path),
-            "upload_id": upload_id,
+            "upload_id": upload_params["multipart_upload_id"],
+            "upload_urls": upload_params["upload_urls"],
+            "parts": {},
             "path": file_path,
+            "started": time.time(),
         }
         settings_manager.save_layer_mapping(temp_layer)
 
-        # do upload by chunks
-        items = []
-        idx = 0
-        with open(file_path, "rb") as f:
-            while True:
+        return self._complete_upload(temp_layer, component_type)
+
+    def _complete_upload(self, temp_layer: dict, component_type: str) -> typing.Dict:
+        """Uploads the remaining parts of an unfinished upload and
+        finishes it.
+
+        :param temp_layer: Layer mapping of the unfinished upload
+        :type temp_layer: dict
+
+        :param component_type: Input layer type of the upload file
+        :type component_type: str
+
+        :return: result, containing UUID of the uploaded file, size, and final filename
+        :rtype: typing.Dict
+        """
+        # do upload by chunks, several parts of the file at a time
+        items = self._upload_file_parts(
+            temp_layer["path"], temp_layer["upload_urls"], component_type, temp_layer
+        )
+
+        # finish upload
+        result = {"uuid": None}
+        if self.processing_cancelled:
+            return result
+        result = self.request.finish_upload_layer(
+            temp_layer["uuid"], temp_layer["upload_id"], items
+        )
+        return result
+
+    def get_resumable_upload(self, file_path: str) -> typing.Union[dict, None]:
+        """Returns the layer mapping of an unfinished upload of the file
+        that can be resumed.
+
+        An upload can be resumed if it has been started with the same
+        file content, i.e. the file size and modification time have
+        not changed since the upload started, and it is not older than
+        UPLOAD_RESUME_MAX_AGE.
+
+        :param file_path: Path of the file to be uploaded
+        :type file_path: str
+
+        :return: Layer mapping of the unfinished upload or None if
+            there is no upload to resume
+        :rtype: typing.Union[dict, None]
+        """
+        identifier = file_path.replace(os.sep, "--")
+        temp_layer = settings_manager.get_layer_mapping(identifier)
+        if not temp_layer.get("upload_id") or not temp_layer.get("uuid"):
+            return None
+        if not temp_layer.get("upload_urls") or "parts" not in temp_layer:
+            return None
+        if temp_layer.get("path") != file_path or not os.path.exists(file_path):
+            return None
+
+        file_stat = os.stat(file_path)
+        if (
+            temp_layer.get("size") != file_stat.st_size
+            or temp_layer.get("mtime") != file_stat.st_mtime
+        ):
+            return None
+
+        # The presigned URLs of older uploads might have expired
+        if time.time() - temp_layer.get("started", 0) > UPLOAD_RESUME_MAX_AGE:
+            return None
+
+        return temp_layer
+
+    def _abort_unfinished_upload(self, file_path: str):
+        """Aborts the unfinished upload of the file, if any.
+
+        :param file_path: Path of the file to be uploaded
+        :type file_path: str
+        """
+        identifier = file_path.replace(os.sep, "--")
+        temp_layer = settings_manager.get_layer_mapping(identifier)
+        if not temp_layer.get("upload_id") or not temp_layer.get("uuid"):
+            return
+
+        self.log_message(f"Aborting the unfinished upload of {file_path}")
+        temp_layer["path"] = file_path
+        self._abort_upload(temp_layer)
+
+    def _abort_upload(self, temp_layer: dict):
+        """Aborts an unfinished upload and removes its layer mapping.
+
+        :param temp_layer: Layer mapping of the unfinished upload
+        :type temp_layer: dict
+        """
+        try:
+            self.request.abort_upload_layer(temp_layer["uuid"], temp_layer["upload_id"])
+        except Exception as ex:
+            self.log_message(f"Problem aborting upload layer: {ex}")
+        settings_manager.remove_layer_mapping(temp_layer["path"].replace(os.sep, "--"))
+
+    def get_upload_part_concurrency(self) -> int:
+        """Returns the number of parts of a single file that can be
+        uploaded at the same time.
+
+        :return: Number of concurrent part uploads, at least one.
+        :rtype: int
+        """
+        concurrency = self.get_settings_value(
+            Settings.UPLOAD_PART_CONCURRENCY,
+            default=DEFAULT_UPLOAD_PART_CONCURRENCY,
+            setting_type=int,
+        )
+        try:
+            concurrency = int(concurrency)
+        except (TypeError, ValueError):
+            concurrency = DEFAULT_UPLOAD_PART_CONCURRENCY
+
+        return max(1, concurrency)
+
+    def _upload_file_parts(
+        self,
+        file_path: str,
+        upload_urls: typing.List[dict],
+        component_type: str,
+        temp_layer: dict,
+    ) -> typing.List[dict]:
+        """Uploads the parts of a file concurrently.
+
+        Each part is read from its own offset in the file just before it
+        is uploaded so at most the configured number of parts is held
+        in memory at any time. Parts already recorded in the layer
+        mapping are skipped and each part that finishes is recorded
+        there so that an interrupted upload can be resumed.
+
+        :param file_path: Path of the file to be uploaded
+        :type file_path: str
+
+        :param upload_urls: Presigned URLs with the corresponding part number
+        :type upload_urls: typing.List[dict]
+
+        :param component_type: Input layer type of the upload file
+        :type component_type: str
+
+        :param temp_layer: Layer mapping of the unfinished upload
+        :type temp_layer: dict
+
+        :return: List of part_number and etag in part order
+        :rtype: typing.List[dict]
+        """
+        file_size = os.stat(file_path).st_size
+        number_of_parts = min(math.ceil(file_size / CHUNK_SIZE), len(upload_urls))
+        # JSON keys of the recorded parts are strings
+        items = {
+            int(part_number): {"part_number": int(part_number), "etag": etag}
+            for part_number, etag in temp_layer["parts"].items()
+        }
+        pending_parts = [
+            idx
+            for idx in range(number_of_parts)
+            if int(upload_urls[idx]["part_number"]) not in items
+        ]
+        if items:
+            with self._upload_lock:
+                self.uploaded_chunks += len(items)
+
+        with FilePartReader(file_path) as reader:
+
+            def upload_part(idx: int) -> typing.Union[dict, None]:
                 if self.processing_cancelled:
-                    break
-                chunk = f.read(CHUNK_SIZE)
+                    return None
+                chunk = reader.read(idx * CHUNK_SIZE, CHUNK_SIZE)
                 if not chunk:
-                    break
+                    return None
                 url_item = upload_urls[idx]
                 part_item = self.request.upload_file_part(
                     url_item["url"], chunk, url_item["part_number"]
                 )
-                if part_item:
-                    items.append(part_item)
-                else:
+                if not part_item:
                     raise Exception(
                         f"Error while uploading {file_path} as " f"{component_type}"
                     )
-                self.uploaded_chunks += 1
-                self._update_scenario_status(
-                    {
-                        "progress_text": "Uploading layers with concurrent request",
-                        "progress": int(
-                            (self.uploaded_chunks / self.total_file_upload_chunks) * 100
-                        ),
-                    }
-                )
-                idx += 1
+                self._on_file_part_uploaded(temp_layer, part_item)
+                return part_item
 
-        # finish upload
-        result = {"uuid": None}
-        if self.processing_cancelled:
-            return result
-        result = self.request.finish_upload_layer(layer_uuid, upload_id, items)
-        return result
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.get_upload_part_concurrency()
+            ) as executor:
+                futures = [executor.submit(upload_part, idx) for idx in pending_parts]
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        part_item = future.result()
+                        if part_item:
+                            items[part_item["part_number"]] = part_item
+                except Exception:
+                    # Do not start the remaining parts if one has failed
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        # Parts can finish in any order, the API expects them sorted
+        return [items[part_number] for part_number in sorted(items)]
+
+    def _on_file_part_uploaded(self, temp_layer: dict, part_item: dict):
+        """Records the uploaded file part in the layer mapping and
+        updates the upload progress.
+
+        :param temp_layer: Layer mapping of the unfinished upload
+        :type temp_layer: dict
+
+        :param part_item: Dictionary of part_number and etag
+        :type part_item: dict
+        """
+        with self._upload_lock:
+            temp_layer["parts"][str(part_item["part_number"])] = part_item["etag"]
+            settings_manager.save_layer_mapping(temp_layer)
+            self.uploaded_chunks += 1
+            uploaded_chunks = self.uploaded_chunks
+
+        self._update_scenario_status(
+            {
+                "progress_text": "Uploading layers with concurrent request",
+                "progress": int(
+                    (uploaded_chunks / self.total_file_upload_chunks) * 100
+                ),
+            }
+        )
 
     def run_parallel_upload(self, upload_dict) -> typing.List[typing.Dict]:
         """Upload file concurrently using ThreadPoolExecutor
@@ -438,15 +714,34 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
                 }
             )
 
+        # Rasters are uploaded as compressed copies of the inputs
+        upload_paths = self.prepare_layers_for_upload(list(items_to_check))
+        if self.processing_cancelled:
+            return False
+        items_to_check = {
+            upload_paths.get(path, path): component_type
+            for path, component_type in items_to_check.items()
+        }
+
         files_to_upload.update(self.check_layer_uploaded(items_to_check))
         if self.processing_cancelled:
             return False
 
         self.total_file_upload_size = sum(os.stat(fp).st_size for fp in files_to_upload)
         self.total_file_upload_chunks = self.total_file_upload_size / CHUNK_SIZE
-        final_results = self.run_parallel_upload(files_to_upload)
+
+        # Full checksums used to index the uploaded layers by content are
+        # computed in the background while the files are being uploaded.
+        hash_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        checksums = {fp: hash_executor.submit(md5, fp) for fp in files_to_upload}
+        try:
+            final_results = self.run_parallel_upload(files_to_upload)
+        except Exception:
+            hash_executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
         if self.processing_cancelled:
+            hash_executor.shutdown(wait=False, cancel_futures=True)
             return False
 
         new_uploaded_layer = {}
@@ -476,6 +771,167 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
             self.path_to_layer_mapping[uploaded_layer["path"]] = uploaded_layer
             settings_manager.save_layer_mapping(uploaded_layer, identifier)
 
+        for file_path, uploaded_layer in new_uploaded_layer.items():
+            try:
+                settings_manager.save_layer_fingerprint(
+                    sampled_file_fingerprint(file_path),
+                    {"md5": checksums[file_path].result(), "layer": uploaded_layer},
+                )
+            except Exception as ex:
+                self.log_message(f"Problem indexing uploaded layer {file_path}: {ex}")
+        hash_executor.shutdown(wait=False, cancel_futures=True)
+
+        if upload_paths:
+            self.get_upload_cache().trim()
+
+        # The scenario refers to the inputs by their original path
+        for path, upload_path in upload_paths.items():
+            if upload_path in self.path_to_layer_mapping:
+                self.path_to_layer_mapping[path] = self.path_to_layer_mapping[
+                    upload_path
+                ]
+
+    def prepare_layers_for_upload(self, file_paths: typing.List[str]) -> dict:
+        """Compresses the raster inputs before they are uploaded.
+
+        The rasters are converted to tiled, compressed GeoTIFFs in a worker
+        pool. The compressed copies are cached in the base directory, keyed
+        by the path, size and modification time of the source file so that
+        later submissions of unchanged inputs reuse them. The least recently
+        used copies are evicted once the layers have been uploaded.
+
+        :param file_paths: Paths of the files to be uploaded
+        :type file_paths: typing.List[str]
+
+        :return: Dictionary with the original raster path as key and the
+            path of the file to upload as value
+        :rtype: dict
+        """
+        compression = self.get_upload_compression()
+        raster_paths = [
+            path
+            for path in file_paths
+            if get_layer_type(path) == 0 and os.path.isfile(path)
+        ]
+        if compression == "NONE" or not raster_paths:
+            return {}
+
+        upload_cache = self.get_upload_cache()
+        cache_dir = upload_cache.cache_dir
+
+        self._update_scenario_status(
+            {"progress_text": "Compressing layers to be uploaded", "progress": 0}
+        )
+
+        def compress(path: str) -> str:
+            if self.processing_cancelled:
+                return path
+            file_stat = os.stat(path)
+            cache_key = RemoteRasterCache.key(
+                os.path.realpath(path),
+                version=f"{file_stat.st_size}|{file_stat.st_mtime}|{compression}",
+            )
+            cache_path = upload_cache.get(cache_key)
+            if cache_path is not None:
+                return cache_path
+
+            # Write to a temporary file so that an interrupted compression
+            # is not picked up from the cache.
+            file_name = os.path.splitext(os.path.basename(path))[0]
+            temp_path = os.path.join(cache_dir, f"{file_name}_{cache_key}.tmp.tif")
+            compressed_path = compress_raster(
+                path, temp_path, compression_type=compression
+            )
+            if compressed_path != temp_path:
+                # Failed or the source is already compressed
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                return path
+
+            # Only use the compressed copy if it is actually smaller
+            if os.stat(temp_path).st_size >= file_stat.st_size:
+                os.remove(temp_path)
+                return path
+            # The copies are only evicted once they have been uploaded
+            cache_path = upload_cache.put(
+                cache_key,
+                temp_path,
+                move=True,
+                file_name=f"{file_name}_{cache_key}.tif",
+                evict=False,
+            )
+            self.log_message(
+                f"Compressed {path} from {file_stat.st_size} "
+                f"to {os.stat(cache_path).st_size} bytes"
+            )
+            return cache_path
+
+        upload_paths = {}
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(raster_paths), os.cpu_count() or 1, 4)
+        ) as executor:
+            for idx, (path, upload_path) in enumerate(
+                zip(raster_paths, executor.map(compress, raster_paths))
+            ):
+                if upload_path != path:
+                    upload_paths[path] = upload_path
+                self._update_scenario_status(
+                    {
+                        "progress_text": "Compressing layers to be uploaded",
+                        "progress": int((idx + 1) / len(raster_paths) * 100),
+                    }
+                )
+
+        return upload_paths
+
+    def get_upload_cache(self) -> RemoteRasterCache:
+        """Returns the cache of the compressed copies of the uploaded
+        rasters, limited to the size in the plugin settings.
+
+        :return: Upload cache
+        :rtype: RemoteRasterCache
+        """
+        max_size_mb = self.get_settings_value(
+            Settings.UPLOAD_CACHE_SIZE,
+            default=DEFAULT_UPLOAD_CACHE_SIZE_MB,
+            setting_type=int,
+        )
+        try:
+            max_size_mb = int(max_size_mb)
+        except (TypeError, ValueError):
+            max_size_mb = DEFAULT_UPLOAD_CACHE_SIZE_MB
+
+        base_dir = self.get_settings_value(Settings.BASE_DIR)
+        return RemoteRasterCache(
+            os.path.join(base_dir, UPLOAD_CACHE_DIR_NAME),
+            max(0, max_size_mb) * 1024 * 1024,
+        )
+
+    def get_upload_compression(self) -> str:
+        """Returns the compression of the raster inputs before they
+        are uploaded.
+
+        ZSTD falls back to DEFLATE when the GDAL build does not support it.
+
+        :return: DEFLATE, ZSTD or NONE
+        :rtype: str
+        """
+        compression = str(
+            self.get_settings_value(
+                Settings.UPLOAD_COMPRESSION, default=DEFAULT_UPLOAD_COMPRESSION
+            )
+        ).upper()
+        if compression not in ("DEFLATE", "ZSTD", "NONE"):
+            compression = DEFAULT_UPLOAD_COMPRESSION
+        if compression == "ZSTD":
+            creation_options = gdal.GetDriverByName("GTiff").GetMetadataItem(
+                "DMD_CREATIONOPTIONLIST"
+            )
+            if "ZSTD" not in (creation_options or ""):
+                compression = "DEFLATE"
+
+        return compression
+
     def check_layer_uploaded(self, items_to_check: typing.List[dict]) -> dict:
         """Check whether a layer has been uploaded to CPLUS API
 
@@ -487,6 +943,7 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
         """
         output = {}
         uuid_to_path = {}
+        not_uploaded = []
 
         for layer_path, group in items_to_check.items():
             identifier = layer_path.replace(os.sep, "--")
@@ -495,27 +952,96 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
                 existing_upload_id = uploaded_layer_dict.get("upload_id", None)
                 existing_uuid = uploaded_layer_dict.get("uuid", None)
                 if existing_upload_id and existing_uuid:
-                    # if upload_id exists, then upload is not finished
-                    try:
-                        self.request.abort_upload_layer(
-                            existing_uuid, existing_upload_id
-                        )
-                    except Exception as ex:
-                        pass
+                    # if upload_id exists, then upload is not finished,
+                    # resume it if the file has not changed since.
+                    if not self.get_resumable_upload(layer_path):
+                        self._abort_unfinished_upload(layer_path)
                     output[layer_path] = items_to_check[layer_path]
+                    continue
                 if layer_path == uploaded_layer_dict["path"]:
-                    uuid_to_path[uploaded_layer_dict["uuid"]] = layer_path
+                    uuid_to_path.setdefault(uploaded_layer_dict["uuid"], []).append(
+                        layer_path
+                    )
                     self.path_to_layer_mapping[layer_path] = uploaded_layer_dict
+            else:
+                not_uploaded.append(layer_path)
+
+        # Files that have not been uploaded from their path might have
+        # been uploaded from another location with the same content.
+        duplicates = self.find_uploaded_duplicates(not_uploaded)
+        for layer_path in not_uploaded:
+            if layer_path in duplicates:
+                uploaded_layer_dict = duplicates[layer_path][1]
+                uuid_to_path.setdefault(uploaded_layer_dict["uuid"], []).append(
+                    layer_path
+                )
+                self.path_to_layer_mapping[layer_path] = uploaded_layer_dict
             else:
                 output[layer_path] = items_to_check[layer_path]
+
         layer_check_result = self.request.check_layer(list(uuid_to_path))
         for layer_uuid in (
             layer_check_result["unavailable"] + layer_check_result["invalid"]
         ):
-            layer_path = uuid_to_path[layer_uuid]
-            output[layer_path] = items_to_check[layer_path]
+            for layer_path in uuid_to_path[layer_uuid]:
+                output[layer_path] = items_to_check[layer_path]
+                if layer_path in duplicates:
+                    settings_manager.remove_layer_fingerprint(duplicates[layer_path][0])
+
+        for layer_path, (_, uploaded_layer_dict) in duplicates.items():
+            if layer_path in output:
+                continue
+            self.log_message(
+                f"Reusing layer {uploaded_layer_dict['uuid']} with the same "
+                f"content as {layer_path}"
+            )
+            settings_manager.save_layer_mapping(uploaded_layer_dict)
         return output
 
+    def find_uploaded_duplicates(
+        self, file_paths: typing.List[str]
+    ) -> typing.Dict[str, typing.Tuple[str, dict]]:
+        """Finds the files whose content has already been uploaded,
+        regardless of the path they were uploaded from.
+
+        Candidates are looked up by their sampled fingerprint and then
+        confirmed by comparing the full md5 checksum, which is computed
+        in background threads.
+
+        :param file_paths: Paths of the files to look up
+        :type file_paths: typing.List[str]
+
+        :return: Dictionary with file path as key and a tuple of the
+            fingerprint and the uploaded layer mapping for the file as value
+        :rtype: typing.Dict[str, typing.Tuple[str, dict]]
+        """
+        candidates = {}
+        for file_path in file_paths:
+            if not os.path.isfile(file_path):
+                continue
+            fingerprint = sampled_file_fingerprint(file_path)
+            indexed_layer = settings_manager.get_layer_fingerprint(fingerprint)
+            if indexed_layer.get("md5") and indexed_layer.get("layer", {}).get("uuid"):
+                candidates[file_path] = (fingerprint, indexed_layer)
+
+        if not candidates:
+            return {}
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(candidates), 3)
+        ) as executor:
+            checksums = dict(zip(candidates, executor.map(md5, candidates)))
+
+        duplicates = {}
+        for file_path, (fingerprint, indexed_layer) in candidates.items():
+            if checksums[file_path] != indexed_layer["md5"]:
+                continue
+            uploaded_layer = dict(indexed_layer["layer"])
+            uploaded_layer["path"] = file_path
+            duplicates[file_path] = (fingerprint, uploaded_layer)
+
+        return duplicates
+
     def build_scenario_detail_json(self) -> None:
         """Build scenario detail JSON to be sent to CPLUS API"""
 
@@ -599,7 +1125,7 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
                 priority_layer["layer_uuid"] = self.path_to_layer_mapping[path]["uuid"]
             else:
                 priority_layer["layer_uuid"] = ""
-            priority_layer["path"] = ""
+            set_priority_layer_payload_path(priority_layer)
 
         activity_constant_rasters = {}
         for activity in old_scenario_dict["activities"]:
@@ -623,7 +1149,7 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
             for priority_layer in activity.get("priority_layers", []):
                 if priority_layer is None:
                     continue
-                priority_layer["path"] = ""
+                set_priority_layer_payload_path(priority_layer)
                 new_priority_layers.append(priority_layer)
 
             mask_uuids = []
@@ -646,12 +1172,17 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
                 activity_identifier=activity["uuid"]
             )
             for component in constant_raster_components:
+                # The value of a virtual constant raster is sent as the
+                # normalized value, it is never uploaded
+                normalized_value = virtual_constant_raster_value(component.path)
+                if normalized_value is None:
+                    normalized_value = component.value_info.normalized
                 constant_raster = {
                     "name": component.component.name,
                     "base_name": component.base_name,
                     "uuid": component.component_id,
                     "absolute": component.value_info.absolute,
-                    "normalized": component.value_info.normalized,
+                    "normalized": normalized_value,
                     "path": "",
                     "skip_raster": (
                         component.skip_raster
@@ -878,7 +1409,12 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
         parent_dir = os.path.dirname(local_filename)
         if not os.path.exists(parent_dir):
             os.makedirs(parent_dir)
-        self.request.download_file(url, local_filename, self._download_progress)
+        self.request.download_file(
+            url,
+            local_filename,
+            self._download_progress,
+            is_cancelled=self.is_download_cancelled,
+        )
         self.downloaded_output += 1
         self._update_scenario_status(
             {
@@ -888,6 +1424,27 @@ class ScenarioAnalysisTaskApiClient(ScenarioAnalysisTask, BaseFetchScenarioOutpu
             }
         )
 
+    def is_download_cancelled(self) -> bool:
+        """Check if download is cancelled.
+
+        :return: True if task has been cancelled
+        :rtype: bool
+        """
+        return self.processing_cancelled
+
+    def on_output_downloaded(self, download_path: str):
+        """Emits the path of the final output and of the activity layers
+        as soon as they are downloaded so that they can be loaded before
+        the remaining outputs have finished downloading.
+
+        :param download_path: Path of the downloaded output file
+        :type download_path: str
+        """
+        if self.output_priorities.get(download_path, 2) > 1:
+            return
+
+        self.output_downloaded.emit(download_path)
+
     def delete_online_task(self):
         running_online_scenario_uuid = settings_manager.get_running_online_scenario()
         online_task = settings_manager.get_scenario(running_online_scenario_uuid)
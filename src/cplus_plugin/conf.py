@@ -230,6 +230,7 @@ class Settings(enum.Enum):
 
     # Processing option
     PROCESSING_TYPE = "processing_type"
+    PREVIEW_FACTOR = "preview_factor"
 
     # REPORT OPTIONS
     USE_CUSTOM_METRICS = "use_custom_metrics"
@@ -240,6 +241,24 @@ class Settings(enum.Enum):
 
     ACTIVE_ONLINE_TASK = "active_online_task"
 
+    # Online upload options
+    UPLOAD_PART_CONCURRENCY = "upload/part_concurrency"
+    UPLOAD_COMPRESSION = "upload/compression"
+    # Cache of the compressed copies of the uploaded rasters, size in MB
+    UPLOAD_CACHE_SIZE = "upload/cache_max_size"
+
+    # Online download options
+    DOWNLOAD_CONCURRENCY = "download/concurrency"
+
+    # Cache of the rasters fetched from remote sources, size in MB
+    REMOTE_CACHE_SIZE = "remote_cache/max_size"
+
+    # Maximum number of scenario analysis stages running at the same time
+    MAX_CONCURRENT_STAGES = "scenario/max_concurrent_stages"
+
+    # Reuse the unchanged stage outputs of the previous scenario analyses
+    INCREMENTAL_ANALYSIS = "scenario/incremental_analysis"
+
     # Irrecoverable carbon
     IRRECOVERABLE_CARBON_SOURCE_TYPE = "carbon/irrecoverable_carbon_source_type"
     # Path for local data source
@@ -293,6 +312,7 @@ class SettingsManager(QtCore.QObject):
     PRIORITY_LAYERS_GROUP_NAME: str = "priority_layers"
     NCS_PATHWAY_BASE: str = "ncs_pathways"
     LAYER_MAPPING_BASE: str = "layer_mapping"
+    LAYER_FINGERPRINT_BASE: str = "layer_fingerprints"
     SERVER_DEFAULT_LAYERS: str = "default_layers"
     ONLINE_TASK_BASE: str = "online_task"
 
@@ -564,6 +584,7 @@ class SettingsManager(QtCore.QObject):
             settings.setValue("analysis_output", analysis_output)
             settings.setValue("output_layer_name", scenario_result.output_layer_name)
             settings.setValue("scenario_directory", scenario_result.scenario_directory)
+            settings.setValue("preview", scenario_result.preview)
 
     def get_scenario_result(self, scenario_id):
         """Retrieves the scenario result that matched the passed scenario id.
@@ -581,6 +602,7 @@ class SettingsManager(QtCore.QObject):
             analysis_output = scenario_settings.value("analysis_output")
             output_layer_name = scenario_settings.value("output_layer_name")
             scenario_directory = scenario_settings.value("scenario_directory")
+            preview = scenario_settings.value("preview", False, type=bool)
             if analysis_output is None:
                 return None
             try:
@@ -598,6 +620,7 @@ class SettingsManager(QtCore.QObject):
                 analysis_output=analysis_output,
                 output_layer_name=output_layer_name,
                 scenario_directory=scenario_directory,
+                preview=preview,
             )
         return None
 
@@ -618,6 +641,7 @@ class SettingsManager(QtCore.QObject):
                     analysis_output = scenario_settings.value("analysis_output")
                     output_layer_name = scenario_settings.value("output_layer_name")
                     scenario_directory = scenario_settings.value("scenario_directory")
+                    preview = scenario_settings.value("preview", False, type=bool)
 
                     try:
                         created_date = datetime.datetime.strptime(
@@ -635,6 +659,7 @@ class SettingsManager(QtCore.QObject):
                             analysis_output=analysis_output,
                             output_layer_name=output_layer_name,
                             scenario_directory=scenario_directory,
+                            preview=preview,
                         )
                     )
         return result
@@ -1080,6 +1105,56 @@ class SettingsManager(QtCore.QObject):
         """Remove layer mapping from settings."""
         self.remove(f"{self.LAYER_MAPPING_BASE}/{identifier}")
 
+    def _get_layer_fingerprints_settings_base(self) -> str:
+        """Returns the path for Layer Fingerprint settings.
+
+        :returns: Base path to Layer Fingerprint group.
+        :rtype: str
+        """
+        return f"{self.BASE_GROUP_NAME}/{self.LAYER_FINGERPRINT_BASE}"
+
+    def get_layer_fingerprint(self, fingerprint: str) -> typing.Dict:
+        """Retrieves the uploaded layer that matches the passed content
+        fingerprint.
+
+        :param fingerprint: Sampled fingerprint of the layer file
+        :type fingerprint: str
+
+        :returns: Uploaded layer with its full md5 checksum or an
+            empty dictionary if there is no match.
+        :rtype: typing.Dict
+        """
+        layer = {}
+
+        fingerprint_root = self._get_layer_fingerprints_settings_base()
+        with qgis_settings(fingerprint_root) as settings:
+            layer_raw = settings.value(fingerprint, dict())
+            if len(layer_raw) > 0:
+                try:
+                    layer = json.loads(layer_raw)
+                except json.JSONDecodeError:
+                    log("Layer fingerprint JSON is invalid")
+        return layer
+
+    def save_layer_fingerprint(self, fingerprint: str, layer: dict):
+        """Save the uploaded layer of a content fingerprint into the
+        plugin settings.
+
+        :param fingerprint: Sampled fingerprint of the layer file
+        :type fingerprint: str
+
+        :param layer: Uploaded layer, should contain the uuid and the
+            md5 checksum of the file
+        :type layer: dict
+        """
+        fingerprint_root = self._get_layer_fingerprints_settings_base()
+        with qgis_settings(fingerprint_root) as settings:
+            settings.setValue(fingerprint, json.dumps(layer))
+
+    def remove_layer_fingerprint(self, fingerprint: str):
+        """Remove layer fingerprint from settings."""
+        self.remove(f"{self.LAYER_FINGERPRINT_BASE}/{fingerprint}")
+
     def _get_default_layers_settings_base(self) -> str:
         """Returns the path for Default Layers settings.
 
@@ -104,6 +104,9 @@ COMPONENT_UUID_ATTRIBUTE = "component_uuid"
 COMPONENT_ID_ATTRIBUTE = "component_id"
 COMPONENT_TYPE_ATTRIBUTE = "component_type"
 SKIP_RASTER_ATTRIBUTE = "skip_raster"
+# Prefix of the path of a virtual constant raster, which is never written
+# to disk and is used as a scalar value in the analysis expressions.
+VIRTUAL_CONSTANT_RASTER_PREFIX = "cplus-constant://"
 ALLOWABLE_MIN_ATTRIBUTE = "allowable_min"
 ALLOWABLE_MAX_ATTRIBUTE = "allowable_max"
 LAST_UPDATED_ATTRIBUTE = "last_updated"
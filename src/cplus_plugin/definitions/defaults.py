@@ -17,6 +17,9 @@ PILOT_AREA_EXTENT = {
 
 PLUGIN_MESSAGE_LOG_TAB = "qgis_cplus"
 SCENARIO_LOG_FILE_NAME = "processing.log"
+SCENARIO_SUMMARY_FILE_NAME = "scenario_summary.json"
+SCENARIO_PROFILE_FILE_NAME = "profile.json"
+BATCH_COMPARISON_FILE_NAME = "scenario_comparison.csv"
 
 QGIS_MESSAGE_LEVEL_DICT = {
     0: "INFO",
@@ -299,3 +302,18 @@ IMPACT_MATRIX_COLORS = {
 # Online stored carbon config values
 STORED_CARBON_ID = "e7c3f70f-91a1-4cde-8c77-f09e93acf811"
 STORED_CARBON_NAME = "Biomass AGB BGB"
+
+# Compression of the raster inputs before they are uploaded
+DEFAULT_UPLOAD_COMPRESSION = "DEFLATE"
+UPLOAD_CACHE_DIR_NAME = "upload_cache"
+DEFAULT_UPLOAD_CACHE_SIZE_MB = 2048
+
+# Cache of the rasters fetched from remote sources
+DEFAULT_REMOTE_CACHE_SIZE_MB = 2048
+REMOTE_CACHE_DIR_NAME = "remote_cache"
+
+# Persistent cache of the layer metadata read during validation
+VALIDATION_CACHE_DIR_NAME = "validation_cache"
+
+# Scenario analysis stages that can run at the same time
+DEFAULT_MAX_CONCURRENT_STAGES = 2
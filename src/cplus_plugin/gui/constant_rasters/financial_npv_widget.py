@@ -28,7 +28,7 @@ from ...definitions.constants import (
     MAX_YEARS,
 )
 from ...definitions.defaults import FINANCIAL_NPV_NAME, NPV_METADATA_ID
-from ...lib.financials import compute_discount_value
+from ...lib.financials import compute_discount_value, compute_discount_values
 from ...models.base import LayerModelComponent, ModelComponentType
 from ...models.financial import ActivityNpv, ActivityNpvCollection, NpvParameters
 from ...models.helpers import (
@@ -495,14 +495,42 @@ class ActivityNpvWidget(QtWidgets.QWidget, ConstantRasterWidgetInterface):
     def _recompute_discounted_column(self):
         """Updates all discounted values that had already been
         computed using the revised discount rate.
+
+        The discounted values of all the years are computed in a
+        single array operation and the NPV is updated once.
         """
-        for row in range(self.fin_model.rowCount()):
-            discount_value = self.fin_model.data(
-                self.fin_model.index(row, 3), QtCore.Qt.ItemDataRole.EditRole
+        row_count = self.fin_model.rowCount()
+        revenues, costs, discounted_values = [
+            [
+                self.fin_model.data(
+                    self.fin_model.index(row, column),
+                    QtCore.Qt.ItemDataRole.EditRole,
+                )
+                for row in range(row_count)
+            ]
+            for column in (1, 2, 3)
+        ]
+        updated_rows = [
+            row
+            for row in range(row_count)
+            if discounted_values[row] is not None
+            and (revenues[row] is not None or costs[row] is not None)
+        ]
+        if len(updated_rows) == 0:
+            return
+
+        computed_values = compute_discount_values(
+            revenues, costs, self.sb_discount.value()
+        )
+        for row in updated_rows:
+            self.fin_model.setData(
+                self.fin_model.index(row, 3),
+                round(float(computed_values[row]), DEFAULT_DECIMAL_PLACES),
+                QtCore.Qt.ItemDataRole.EditRole,
             )
-            if discount_value is None:
-                continue
-            self.update_discounted_value(row)
+
+        if not self.cb_manual_npv.isChecked():
+            self.compute_npv()
 
     def update_discounted_value(self, row: int):
         """Updated the discounted value for the given row number.
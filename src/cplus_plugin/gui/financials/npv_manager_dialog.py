@@ -24,7 +24,7 @@ from ...definitions.defaults import ICON_PATH, USER_DOCUMENTATION_SITE
 from ...models.base import Activity
 from ...models.financial import ActivityNpv, ActivityNpvCollection, NpvParameters
 from .npv_financial_model import NpvFinancialModel
-from ...lib.financials import compute_discount_value
+from ...lib.financials import compute_discount_value, compute_discount_values
 from ...utils import FileUtils, open_documentation, tr
 
 
@@ -398,14 +398,42 @@ class NpvPwlManagerDialog(QtWidgets.QDialog, WidgetUi):
     def update_all_discounted_values(self):
         """Updates all discounted values that had already been
         computed using the revised discount rate.
+
+        The discounted values of all the years are computed in a
+        single array operation and the NPV is updated once.
         """
-        for row in range(self._npv_model.rowCount()):
-            discount_value = self._npv_model.data(
-                self._npv_model.index(row, 3), QtCore.Qt.ItemDataRole.EditRole
+        row_count = self._npv_model.rowCount()
+        revenues, costs, discounted_values = [
+            [
+                self._npv_model.data(
+                    self._npv_model.index(row, column),
+                    QtCore.Qt.ItemDataRole.EditRole,
+                )
+                for row in range(row_count)
+            ]
+            for column in (1, 2, 3)
+        ]
+        updated_rows = [
+            row
+            for row in range(row_count)
+            if discounted_values[row] is not None
+            and (revenues[row] is not None or costs[row] is not None)
+        ]
+        if len(updated_rows) == 0:
+            return
+
+        computed_values = compute_discount_values(
+            revenues, costs, self.sb_discount.value()
+        )
+        for row in updated_rows:
+            self._npv_model.setData(
+                self._npv_model.index(row, 3),
+                round(float(computed_values[row]), self.NUM_DECIMAL_PLACES),
+                QtCore.Qt.ItemDataRole.EditRole,
             )
-            if discount_value is None:
-                continue
-            self.update_discounted_value(row)
+
+        if not self.cb_manual_npv.isChecked():
+            self.compute_npv()
 
     def on_discount_rate_changed(self, discount_rate: float):
         """Slot raised when discount rate has changed.
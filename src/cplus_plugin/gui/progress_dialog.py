@@ -19,6 +19,7 @@ from ..definitions.defaults import (
     ICON_HELP,
     REPORT_DOCUMENTATION,
 )
+from ..lib.progress import format_duration
 from ..lib.reports.manager import report_manager, ReportManager
 from ..models.report import ReportResult
 
@@ -154,6 +155,23 @@ class ProgressDialog(QtWidgets.QDialog, Ui_DlgProgress):
             except RuntimeError:
                 log(tr("Error setting value to a progress bar"), notify=False)
 
+    def update_remaining_time(self, seconds: float) -> None:
+        """Shows the estimated remaining time of the analysis on the
+        progress bar.
+
+        :param seconds: Remaining time in seconds
+        :type seconds: float
+        """
+        if not self.progress_bar or not self.analysis_running:
+            return
+
+        try:
+            self.progress_bar.setFormat(
+                tr("%p% - about {} remaining").format(format_duration(seconds))
+            )
+        except RuntimeError:
+            log(tr("Error setting the format of a progress bar"), notify=False)
+
     def change_status_message(self, message=None) -> None:
         """Updates the status message
 
@@ -283,6 +301,7 @@ class ProgressDialog(QtWidgets.QDialog, Ui_DlgProgress):
 
         self.analysis_running = False
         self.change_status_message(self.analysis_finished_message)
+        self.progress_bar.setFormat("%p%")
 
         # Change cancel button to the close button status
         self.btn_cancel.setText(tr("Close"))
@@ -119,6 +119,7 @@ from ..definitions.defaults import (
     SCENARIO_LOG_FILE_NAME,
     USER_DOCUMENTATION_SITE,
 )
+from ..lib.pipeline import StageManifest
 from ..lib.reports.manager import report_manager
 from ..models.base import Scenario, ScenarioResult, ScenarioState, SpatialExtent
 from ..tasks import ScenarioAnalysisTask
@@ -129,7 +130,6 @@ from ..utils import (
     FileUtils,
     write_to_file,
 )
-from ..lib.validation.ncs_decision_tree import ApplyNcsDecisionTreeAlgorithm
 
 WidgetUi, _ = loadUiType(
     os.path.join(os.path.dirname(__file__), "../ui/qgis_cplus_main_dockwidget.ui")
@@ -192,6 +192,7 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
         self.landuse_project.toggled.connect(self.outputs_options_changed)
         self.highest_position.toggled.connect(self.outputs_options_changed)
         self.processing_type.toggled.connect(self.processing_options_changed)
+        self.preview_factor_box.valueChanged.connect(self.preview_factor_changed)
         self.chb_metric_builder.toggled.connect(self.on_use_custom_metrics)
         self.btn_metric_builder.clicked.connect(self.on_show_metrics_wizard)
         edit_table_icon = FileUtils.get_icon("mActionEditTable.svg")
@@ -289,6 +290,16 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
         settings_manager.set_value(
             Settings.PROCESSING_TYPE, self.processing_type.isChecked()
         )
+        # Previews are only run by the local processing
+        self.preview_factor_box.setEnabled(not self.processing_type.isChecked())
+
+    def preview_factor_changed(self, value: int):
+        """Saves the downsampling factor of the preview analysis.
+
+        :param value: Downsampling factor, 1 for a full resolution analysis.
+        :type value: int
+        """
+        settings_manager.set_value(Settings.PREVIEW_FACTOR, value)
 
     def load_layer_options(self):
         """
@@ -320,6 +331,13 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
             )
         )
 
+        self.preview_factor_box.setValue(
+            settings_manager.get_value(
+                Settings.PREVIEW_FACTOR, default=1, setting_type=int
+            )
+        )
+        self.preview_factor_box.setEnabled(not self.processing_type.isChecked())
+
         self.view_status_btn.clicked.connect(self.on_view_status_button_clicked)
         running_online_scenario_uuid = settings_manager.get_running_online_scenario()
         online_task = settings_manager.get_scenario(running_online_scenario_uuid)
@@ -1211,10 +1229,11 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
         :param pathway_npv: NPV mapping for an NCS pathway.
         :type pathway_npv: ActivityNpv
 
-        :param npv_pwl_path: Absolute file path of the created NPV PWL.
+        :param npv_pwl_path: Virtual constant raster path of the NPV PWL.
         :type npv_pwl_path: str
 
-        :param algorithm: Processing algorithm that created the NPV PWL.
+        :param algorithm: Processing algorithm that created the NPV PWL,
+        None for a virtual constant raster.
         :type algorithm: QgsProcessingAlgorithm
 
         :param context: Contextual information that was used to create
@@ -1877,6 +1896,9 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
     def run_cplus_main_task(self, progress_dialog, scenario, analysis_task):
         progress_changed = partial(self.update_progress_bar, progress_dialog)
         analysis_task.custom_progress_changed.connect(progress_changed)
+        analysis_task.remaining_time_changed.connect(
+            progress_dialog.update_remaining_time
+        )
 
         status_message_changed = partial(self.update_progress_dialog, progress_dialog)
 
@@ -1914,6 +1936,19 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
         analysis_terminated = partial(self.task_terminated, analysis_task)
         analysis_task.taskTerminated.connect(analysis_terminated)
 
+        # Load the online outputs as they are downloaded, the temporary
+        # group is replaced by the scenario group when the task completes
+        if isinstance(analysis_task, ScenarioAnalysisTaskApiClient):
+            downloads_group_name = tr("{} (downloading)").format(scenario.name)
+            analysis_task.output_downloaded.connect(
+                partial(self.load_downloaded_output, downloads_group_name)
+            )
+            remove_downloaded_outputs = partial(
+                self.remove_downloaded_outputs, downloads_group_name
+            )
+            analysis_task.taskCompleted.connect(remove_downloaded_outputs)
+            analysis_task.taskTerminated.connect(remove_downloaded_outputs)
+
         QgsApplication.taskManager().addTask(analysis_task)
 
     def prepare_message_bar(self):
@@ -2129,11 +2164,23 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
             ],
             crs=analysis_crs.authid(),
         )
+
+        # An incomplete analysis of the scenario can continue from its
+        # first incomplete stage, it needs the same scenario identifier.
+        resumable_analysis = None
+        if not self.processing_type.isChecked():
+            resumable_analysis = self.resumable_analysis(self.analysis_scenario_name)
+        scenario_uuid = (
+            uuid.UUID(resumable_analysis.parameters.get("scenario"))
+            if resumable_analysis is not None
+            else uuid.uuid4()
+        )
+
         try:
             self.enable_analysis_controls(False)
 
             scenario = Scenario(
-                uuid=uuid.uuid4(),
+                uuid=scenario_uuid,
                 name=self.analysis_scenario_name,
                 description=self.analysis_scenario_description,
                 extent=self.analysis_extent,
@@ -2201,56 +2248,6 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
 
                 return
 
-            dt_alg = ApplyNcsDecisionTreeAlgorithm()
-            pixel_size = 30.0
-            nodata_val = -9999
-            dt_extent = QgsRectangle(
-                float(self.analysis_extent.bbox[0]),
-                float(self.analysis_extent.bbox[2]),
-                float(self.analysis_extent.bbox[1]),
-                float(self.analysis_extent.bbox[3]),
-            )
-
-            scenario_dir = settings_manager.get_value(Settings.BASE_DIR)
-            os.makedirs(scenario_dir, exist_ok=True)
-
-            for activity in self.analysis_activities:
-                out_name = f"{self.analysis_scenario_name}__{activity.name}__decision_protect.tif"
-                out_path = os.path.join(scenario_dir, out_name)
-
-                # Pass pathway UUIDs directly as JSON array
-                pathway_uuids = [str(p.uuid) for p in (activity.pathways or [])]
-
-                dt_params = {
-                    "PATHWAY_UUIDS": json.dumps(pathway_uuids),
-                    dt_alg.P_TARGET_CRS: self.analysis_extent.crs,
-                    dt_alg.P_EXTENT: dt_extent,
-                    dt_alg.P_PIXEL: pixel_size,
-                    dt_alg.P_NODATA: nodata_val,
-                    dt_alg.P_SELECTED_ACTION: 0,  # 0=Protect; see CHOICES_ACTION
-                    dt_alg.O_SELECTED: out_path,
-                }
-                try:
-                    dt_result = dt_alg.processAlgorithm(
-                        dt_params,
-                        self.processing_context,
-                        self.position_feedback,
-                    )
-                    mask_path = dt_result[dt_alg.O_SELECTED]
-
-                    # Ensure mask_paths exists
-                    if (
-                        not hasattr(activity, "mask_paths")
-                        or activity.mask_paths is None
-                    ):
-                        activity.mask_paths = []
-
-                    activity.mask_paths.append(mask_path)
-                except Exception as e:
-                    log(
-                        tr(f"Decision Tree failed for {activity.name}: {e}"), info=False
-                    )
-
             if self.processing_type.isChecked():
                 analysis_task = ScenarioAnalysisTaskApiClient(
                     self.analysis_scenario_name,
@@ -2282,6 +2279,9 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
                     clip_to_studyarea,
                     self.get_studyarea_path(),
                 )
+                analysis_task.preview_factor = self.preview_factor_box.value()
+                if resumable_analysis is not None:
+                    analysis_task.resume(resumable_analysis.scenario_directory)
 
             self.run_cplus_main_task(progress_dialog, scenario, analysis_task)
 
@@ -2297,6 +2297,44 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
                 )
             )
 
+    def resumable_analysis(self, scenario_name: str) -> typing.Optional[StageManifest]:
+        """Checks for an incomplete analysis of the scenario and asks
+        whether to resume it.
+
+        :param scenario_name: Name of the scenario to be analyzed.
+        :type scenario_name: str
+
+        :returns: Stage manifest of the analysis to resume or None if
+            there is none or a new analysis should be started.
+        :rtype: StageManifest
+        """
+        try:
+            manifest = ScenarioAnalysisTask.find_resumable_analysis(scenario_name)
+        except Exception as e:
+            log(f"Unable to check for an incomplete scenario analysis, {e}")
+            return None
+
+        if manifest is None:
+            return None
+
+        reply = QtWidgets.QMessageBox.question(
+            self,
+            tr("Resume Scenario Analysis"),
+            tr(
+                f"A previous analysis of {scenario_name} did not complete.\n"
+                f"Click Yes to resume it from the first incomplete step "
+                f"or No to start a new analysis."
+            ),
+            QtWidgets.QMessageBox.StandardButton.Yes,
+            QtWidgets.QMessageBox.StandardButton.No,
+        )
+        if reply != QtWidgets.QMessageBox.StandardButton.Yes:
+            return None
+
+        log(f"Resuming the scenario analysis in {manifest.scenario_directory}")
+
+        return manifest
+
     def selected_activities(self) -> typing.List[Activity]:
         """Gets the collection of selected activities.
 
@@ -2413,6 +2451,43 @@ class QgisCplusMain(QtWidgets.QDockWidget, WidgetUi):
             )  # Add to top of group
             parent.removeChildNode(layer)
 
+    def load_downloaded_output(self, group_name: str, output_path: str):
+        """Adds an output of an online scenario analysis to the map as soon
+        as it has been downloaded.
+
+        :param group_name: Name of the temporary group of the outputs
+        :type group_name: str
+
+        :param output_path: Path of the downloaded output
+        :type output_path: str
+        """
+        if self.processing_cancelled:
+            return
+
+        layer_name = os.path.splitext(os.path.basename(output_path))[0]
+        layer = QgsRasterLayer(output_path, layer_name, QGIS_GDAL_PROVIDER)
+        if not layer.isValid():
+            return
+
+        instance_root = QgsProject.instance().layerTreeRoot()
+        group = instance_root.findGroup(group_name)
+        if group is None:
+            group = instance_root.insertGroup(0, group_name)
+
+        self.move_layer_to_group(QgsProject.instance().addMapLayer(layer), group)
+
+    def remove_downloaded_outputs(self, group_name: str):
+        """Removes the temporary group of the online outputs loaded while
+        they were being downloaded.
+
+        :param group_name: Name of the temporary group of the outputs
+        :type group_name: str
+        """
+        instance_root = QgsProject.instance().layerTreeRoot()
+        group = instance_root.findGroup(group_name)
+        if group is not None:
+            instance_root.removeChildNode(group)
+
     def post_analysis(self, scenario_result, task, report_manager, progress_dialog):
         """Handles analysis outputs from the final analysis results.
         Adds the resulting scenario raster to the canvas with styling.
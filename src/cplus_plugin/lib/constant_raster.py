@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 """Processing utilities for constant rasters."""
 
+import concurrent.futures
+import dataclasses
+import hashlib
 import json
+import math
 import os
+from pathlib import Path
 import typing
 from datetime import datetime
 
+from osgeo import gdal
+
 from qgis import processing
 from qgis.core import (
     QgsProcessingContext,
@@ -41,9 +48,118 @@ from ..models.helpers import (
 from ..definitions.constants import (
     ID_ATTRIBUTE,
     PATH_ATTRIBUTE,
+    VIRTUAL_CONSTANT_RASTER_PREFIX,
 )
 
 
+def virtual_constant_raster_path(value: float) -> str:
+    """Creates the path of a virtual constant raster i.e. a constant
+    raster that is not written to disk but whose value is used directly
+    in the analysis expressions.
+
+    :param value: Value of all the pixels of the constant raster.
+    :type value: float
+
+    :returns: Path of the virtual constant raster.
+    :rtype: str
+    """
+    return f"{VIRTUAL_CONSTANT_RASTER_PREFIX}{float(value)!r}"
+
+
+def virtual_constant_raster_value(path: str) -> typing.Optional[float]:
+    """Returns the value of a virtual constant raster.
+
+    :param path: Path of the layer.
+    :type path: str
+
+    :returns: Value of the virtual constant raster or None if the path
+    does not refer to a virtual constant raster.
+    :rtype: float
+    """
+    if not path or not path.startswith(VIRTUAL_CONSTANT_RASTER_PREFIX):
+        return None
+
+    try:
+        return float(path[len(VIRTUAL_CONSTANT_RASTER_PREFIX) :])
+    except ValueError:
+        return None
+
+
+# GDAL metadata items used to identify up-to-date constant rasters
+CONSTANT_VALUE_METADATA_ITEM = "CPLUS_CONSTANT_VALUE"
+CONSTANT_GRID_METADATA_ITEM = "CPLUS_CONSTANT_GRID"
+
+
+@dataclasses.dataclass(frozen=True)
+class ConstantRasterGrid:
+    """Grid definition shared by a batch of constant rasters."""
+
+    crs_wkt: str
+    geotransform: typing.Tuple[float, float, float, float, float, float]
+    width: int
+    height: int
+
+    @classmethod
+    def from_extent(
+        cls,
+        extent: QgsRectangle,
+        crs: QgsCoordinateReferenceSystem,
+        pixel_size: float,
+    ) -> "ConstantRasterGrid":
+        """Creates a grid definition covering the given extent, matching
+        the grid of native:createconstantrasterlayer.
+
+        :param extent: Extent of the grid.
+        :type extent: QgsRectangle
+
+        :param crs: CRS of the grid.
+        :type crs: QgsCoordinateReferenceSystem
+
+        :param pixel_size: Pixel size in map units.
+        :type pixel_size: float
+
+        :returns: Grid definition.
+        :rtype: ConstantRasterGrid
+        """
+        pixel_size = float(pixel_size)
+        return cls(
+            crs_wkt=crs.toWkt(),
+            geotransform=(
+                extent.xMinimum(),
+                pixel_size,
+                0.0,
+                extent.yMaximum(),
+                0.0,
+                -pixel_size,
+            ),
+            width=max(1, math.ceil(extent.width() / pixel_size)),
+            height=max(1, math.ceil(extent.height() / pixel_size)),
+        )
+
+    @classmethod
+    def from_context(cls, context: ConstantRasterContext) -> "ConstantRasterGrid":
+        """Creates a grid definition from a constant raster context.
+
+        :param context: Context with the extent, CRS and pixel size.
+        :type context: ConstantRasterContext
+
+        :returns: Grid definition.
+        :rtype: ConstantRasterGrid
+        """
+        return cls.from_extent(context.extent, context.crs, context.pixel_size)
+
+    @property
+    def key(self) -> str:
+        """Returns a key identifying the grid.
+
+        :returns: Grid key.
+        :rtype: str
+        """
+        identity = [self.crs_wkt, [round(v, 9) for v in self.geotransform]]
+        identity.extend([self.width, self.height])
+        return hashlib.md5(json.dumps(identity).encode("utf-8")).hexdigest()
+
+
 class ConstantRasterProcessingUtils:
     """Utilities for constant raster processing.
 
@@ -136,6 +252,166 @@ class ConstantRasterProcessingUtils:
             log(f"{err_msg}: {str(ex)}", info=False)
             raise QgsProcessingException(f"{err_msg}: {str(ex)}")
 
+    @staticmethod
+    def write_constant_raster(
+        value: float, grid: ConstantRasterGrid, output_path: str
+    ) -> str:
+        """Writes a constant raster directly using GDAL.
+
+        The value and grid are saved in the raster metadata so that the
+        raster can be reused while both are unchanged.
+
+        :param value: Constant value for all pixels in the raster.
+        :type value: float
+
+        :param grid: Grid definition of the raster.
+        :type grid: ConstantRasterGrid
+
+        :param output_path: Path of the output raster.
+        :type output_path: str
+
+        :returns: Path of the created raster.
+        :rtype: str
+        """
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        temp_path = f"{os.path.splitext(output_path)[0]}.tmp.tif"
+        ds = gdal.GetDriverByName("GTiff").Create(
+            temp_path,
+            grid.width,
+            grid.height,
+            1,
+            gdal.GDT_Float32,
+            ["COMPRESS=DEFLATE", "TILED=YES", "BIGTIFF=IF_SAFER"],
+        )
+        if ds is None:
+            raise QgsProcessingException(
+                f"Unable to create constant raster {output_path}"
+            )
+        ds.SetGeoTransform(grid.geotransform)
+        ds.SetProjection(grid.crs_wkt)
+        ds.GetRasterBand(1).Fill(value)
+        ds.SetMetadata(
+            {
+                CONSTANT_VALUE_METADATA_ITEM: repr(float(value)),
+                CONSTANT_GRID_METADATA_ITEM: grid.key,
+            }
+        )
+        ds = None
+        os.replace(temp_path, output_path)
+
+        return output_path
+
+    @staticmethod
+    def write_constant_rasters(
+        rasters: typing.List[typing.Tuple[float, str]],
+        grid: ConstantRasterGrid,
+        feedback: typing.Optional[QgsProcessingFeedback] = None,
+    ) -> typing.List[str]:
+        """Writes a batch of constant rasters sharing the same grid
+        concurrently.
+
+        :param rasters: Value and output path of each constant raster.
+        :type rasters: list
+
+        :param grid: Grid definition of the rasters.
+        :type grid: ConstantRasterGrid
+
+        :param feedback: Optional feedback for progress reporting
+        :type feedback: QgsProcessingFeedback
+
+        :returns: Paths of the rasters that were successfully created.
+        :rtype: list
+        """
+        created_paths = []
+        if len(rasters) == 0:
+            return created_paths
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(rasters), os.cpu_count() or 1, 4)
+        ) as executor:
+            futures = {
+                executor.submit(
+                    ConstantRasterProcessingUtils.write_constant_raster,
+                    value,
+                    grid,
+                    output_path,
+                ): output_path
+                for value, output_path in rasters
+            }
+            for future in concurrent.futures.as_completed(futures):
+                output_path = futures[future]
+                try:
+                    created_paths.append(future.result())
+                except Exception as ex:
+                    error_msg = f"Error creating constant raster {output_path}: {ex}"
+                    if feedback:
+                        feedback.reportError(error_msg)
+                    log(error_msg, info=False)
+
+                if feedback:
+                    feedback.setProgress(100 * len(created_paths) / len(rasters))
+
+        return created_paths
+
+    @staticmethod
+    def existing_constant_rasters(
+        directory: str, grid: ConstantRasterGrid
+    ) -> typing.Dict[float, str]:
+        """Scans a directory, including its subdirectories, for constant
+        rasters created with the given grid.
+
+        :param directory: Directory to scan.
+        :type directory: str
+
+        :param grid: Grid definition of the rasters.
+        :type grid: ConstantRasterGrid
+
+        :returns: Paths of the existing constant rasters indexed by
+            their value.
+        :rtype: dict
+        """
+        rasters = {}
+        if not directory or not os.path.isdir(directory):
+            return rasters
+
+        grid_key = grid.key
+        for raster_path in Path(directory).rglob("*.tif"):
+            if raster_path.name.endswith(".tmp.tif"):
+                continue
+            identity = ConstantRasterProcessingUtils.constant_raster_identity(
+                str(raster_path)
+            )
+            if identity is not None and identity[1] == grid_key:
+                rasters[identity[0]] = str(raster_path)
+
+        return rasters
+
+    @staticmethod
+    def constant_raster_identity(
+        raster_path: str,
+    ) -> typing.Optional[typing.Tuple[float, str]]:
+        """Returns the value and grid key saved in the metadata of a
+        constant raster created by write_constant_raster.
+
+        :param raster_path: Path of the raster.
+        :type raster_path: str
+
+        :returns: Tuple of the value and grid key or None if the raster
+            does not have them.
+        :rtype: tuple
+        """
+        ds = gdal.Open(raster_path, gdal.GA_ReadOnly)
+        if ds is None:
+            return None
+
+        value = ds.GetMetadataItem(CONSTANT_VALUE_METADATA_ITEM)
+        grid_key = ds.GetMetadataItem(CONSTANT_GRID_METADATA_ITEM)
+        if value is None or grid_key is None:
+            return None
+
+        return float(value), grid_key
+
     @staticmethod
     def validate_raster(
         raster_path: str, feedback: typing.Optional[QgsProcessingFeedback] = None
@@ -224,7 +500,9 @@ class ConstantRasterProcessingUtils:
         :param input_range: DEPRECATED - min/max are now calculated from actual component values
         :param feedback: Optional feedback for progress reporting
         :param metadata_id: Metadata ID for determining file naming (e.g., "years_experience_activity")
-        :returns: List of paths to created raster files
+        :returns: List of the virtual constant raster paths of the
+            components, the raster files are only written if the
+            collection's skip_raster is False
         :raises QgsProcessingException: If raster creation fails
         """
         if feedback:
@@ -285,31 +563,27 @@ class ConstantRasterProcessingUtils:
             if feedback:
                 feedback.pushInfo(f"Created output directory: {actual_output_dir}")
 
-        # Create timestamped session folder for this raster creation session
+        # Timestamped session folder for the rasters written in this
+        # session, it is only created if there are rasters to write
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         session_dir = os.path.join(actual_output_dir, timestamp)
-        os.makedirs(session_dir, exist_ok=True)
-        if feedback:
-            feedback.pushInfo(f"Created session directory: {session_dir}")
 
         created_rasters = []
-        processing_context = QgsProcessingContext()
 
-        # Process each component
+        # Determine the values and output paths of all the components
+        # before writing the rasters as a batch.
+        raster_plans = []
         total_components = len(enabled_components)
         for idx, component in enumerate(enabled_components):
             if feedback and feedback.isCanceled():
                 raise QgsProcessingException("Processing canceled by user")
 
-            # Update progress
+            component_name = (
+                component.component.name
+                if component.component and hasattr(component.component, "name")
+                else component.component_id
+            )
             if feedback:
-                progress = int((idx / total_components) * 100)
-                feedback.setProgress(progress)
-                component_name = (
-                    component.component.name
-                    if component.component and hasattr(component.component, "name")
-                    else component.component_id
-                )
                 feedback.pushInfo(
                     f"Processing {idx + 1}/{total_components}: {component_name}"
                 )
@@ -351,11 +625,6 @@ class ConstantRasterProcessingUtils:
                 feedback.pushInfo(f"Normalized value (0-1): {normalized_value}")
 
             # Generate output filename using helper
-            component_name = (
-                component.component.name
-                if component.component and hasattr(component.component, "name")
-                else component.component_id
-            )
             if metadata_id and component_name:
                 # Use descriptive filename with value and unit
                 output_filename = generate_constant_raster_filename(
@@ -366,98 +635,122 @@ class ConstantRasterProcessingUtils:
                 safe_name = component_name.replace(" ", "_").replace("/", "_")
                 output_filename = f"constant_raster_{safe_name}.tif"
 
-            output_path = os.path.join(session_dir, output_filename)
+            raster_plans.append(
+                (
+                    component,
+                    component_name,
+                    absolute_value,
+                    normalized_value,
+                    os.path.join(session_dir, output_filename),
+                )
+            )
 
-            try:
-                # Create the constant raster only if skip_raster is False
-                if not collection.skip_raster:
+        # Create the constant rasters only if skip_raster is False,
+        # reusing the up-to-date rasters from previous sessions.
+        raster_paths = {}
+        if not collection.skip_raster:
+            grid = ConstantRasterGrid.from_context(context)
+            existing_rasters = ConstantRasterProcessingUtils.existing_constant_rasters(
+                actual_output_dir, grid
+            )
+
+            pending_rasters = []
+            for _, component_name, _, normalized_value, output_path in raster_plans:
+                existing_path = existing_rasters.get(normalized_value)
+                if existing_path is not None:
+                    raster_paths[output_path] = existing_path
                     if feedback:
-                        component_name = (
-                            component.component.name
-                            if component.component
-                            and hasattr(component.component, "name")
-                            else component.component_id
-                        )
-                        feedback.pushInfo(f"Component: {component_name}")
-                        feedback.pushInfo(f"Absolute value: {absolute_value}")
-                        feedback.pushInfo(f"Normalized value: {normalized_value}")
                         feedback.pushInfo(
-                            f"Creating raster with value {normalized_value} at {output_path}"
+                            f"Using up-to-date raster for {component_name}: {existing_path}"
                         )
-
-                    created_path = ConstantRasterProcessingUtils.create_constant_raster(
-                        value=normalized_value,
-                        raster_context=context,
-                        output_path=output_path,
-                        processing_context=processing_context,
-                        feedback=feedback,
-                    )
-
-                    if feedback:
-                        feedback.pushInfo(f"Successfully created: {created_path}")
                 else:
-                    # Skip raster creation, just use the output path
-                    created_path = output_path
-                    log(
-                        f"Skipped raster creation for {output_filename} (skip_raster=True)",
-                        info=True,
-                    )
+                    pending_rasters.append((normalized_value, output_path))
 
-                # Always save metadata file (even when skip_raster=True)
-                if metadata_id:
-                    try:
-                        component_name = (
-                            component.component.name
-                            if component.component
-                            and hasattr(component.component, "name")
-                            else component.component_id
-                        )
+            if feedback:
+                feedback.pushInfo(f"Creating {len(pending_rasters)} constant rasters")
 
-                        # Create metadata object
-                        file_metadata = ConstantRasterFileMetadata(
-                            raster_path="" if collection.skip_raster else created_path,
-                            component_id=component.component_id,
-                            component_name=component_name,
-                            component_type=(
-                                collection.component_type.value
-                                if collection.component_type
-                                else "unknown"
-                            ),
-                            input_value=absolute_value,
-                            normalized_value=normalized_value,
-                            output_min=collection.min_value,
-                            output_max=collection.max_value,
-                            metadata_id=metadata_id,
-                        )
+            if pending_rasters:
+                os.makedirs(session_dir, exist_ok=True)
+                if feedback:
+                    feedback.pushInfo(f"Created session directory: {session_dir}")
 
-                        meta_path = save_constant_raster_metadata(
-                            file_metadata, session_dir
-                        )
-                        if feedback:
-                            feedback.pushInfo(f"Saved metadata: {meta_path}")
-                        log(f"Saved metadata: {meta_path}", info=True)
-                    except Exception as meta_error:
-                        if feedback:
-                            feedback.pushWarning(
-                                f"Failed to save metadata: {str(meta_error)}"
-                            )
-                        log(f"Failed to save metadata: {str(meta_error)}", info=False)
-
-                # Update component with raster path
-                # Note: value_info only stores normalized/absolute values
-                # File path stored at component level
-                component.path = created_path
-
-                created_rasters.append(created_path)
-
-            except Exception as e:
-                error_msg = (
-                    f"Failed to create raster for {component.component_id}: {str(e)}"
+            for output_path in ConstantRasterProcessingUtils.write_constant_rasters(
+                pending_rasters, grid, feedback
+            ):
+                raster_paths[output_path] = output_path
+
+        for (
+            component,
+            component_name,
+            absolute_value,
+            normalized_value,
+            output_path,
+        ) in raster_plans:
+            if collection.skip_raster:
+                raster_path = ""
+                log(
+                    f"Skipped raster creation for {os.path.basename(output_path)} (skip_raster=True)",
+                    info=True,
                 )
+            elif output_path in raster_paths:
+                raster_path = raster_paths[output_path]
+            else:
+                error_msg = f"Failed to create raster for {component.component_id}"
                 if feedback:
                     feedback.reportError(error_msg)
                 log(error_msg, info=False)
                 # Continue with other components even if one fails
+                continue
+
+            # Always save metadata file (even when skip_raster=True),
+            # beside the written or reused raster otherwise in the
+            # output directory
+            if metadata_id:
+                try:
+                    # Create metadata object
+                    file_metadata = ConstantRasterFileMetadata(
+                        raster_path=raster_path,
+                        component_id=component.component_id,
+                        component_name=component_name,
+                        component_type=(
+                            collection.component_type.value
+                            if collection.component_type
+                            else "unknown"
+                        ),
+                        input_value=absolute_value,
+                        normalized_value=normalized_value,
+                        output_min=collection.min_value,
+                        output_max=collection.max_value,
+                        metadata_id=metadata_id,
+                    )
+
+                    meta_path = save_constant_raster_metadata(
+                        file_metadata,
+                        (
+                            os.path.dirname(raster_path)
+                            if raster_path
+                            else actual_output_dir
+                        ),
+                    )
+                    if feedback:
+                        feedback.pushInfo(f"Saved metadata: {meta_path}")
+                    log(f"Saved metadata: {meta_path}", info=True)
+                except Exception as meta_error:
+                    if feedback:
+                        feedback.pushWarning(
+                            f"Failed to save metadata: {str(meta_error)}"
+                        )
+                    log(f"Failed to save metadata: {str(meta_error)}", info=False)
+
+            # The analysis uses the value directly through a virtual
+            # constant raster, the written raster is only recorded in the
+            # metadata file so that it is never uploaded or resampled.
+            # Note: value_info only stores normalized/absolute values
+            # File path stored at component level
+            created_path = virtual_constant_raster_path(normalized_value)
+            component.path = created_path
+
+            created_rasters.append(created_path)
 
         if feedback:
             feedback.setProgress(100)
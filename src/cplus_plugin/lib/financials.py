@@ -3,25 +3,23 @@
 Contains functions for financial computations.
 """
 
-import datetime
-from functools import partial
+import dataclasses
 import pathlib
 import typing
 
+import numpy as np
+
 from qgis.core import (
     QgsProcessingContext,
-    QgsProcessingException,
     QgsProcessingFeedback,
     QgsProcessingMultiStepFeedback,
 )
 
-from qgis import processing
-
 from ..definitions.constants import NPV_PRIORITY_LAYERS_SEGMENT, PRIORITY_LAYERS_SEGMENT
 from ..definitions.defaults import NPV_METADATA_ID
 from ..conf import settings_manager, Settings
-from .constant_raster import constant_raster_registry
-from ..models.financial import ActivityNpvCollection
+from .constant_raster import constant_raster_registry, virtual_constant_raster_path
+from ..models.financial import ActivityNpv, ActivityNpvCollection
 from ..utils import clean_filename, FileUtils, log, tr
 
 
@@ -48,6 +46,253 @@ def compute_discount_value(
     return (revenue - cost) / ((1 + discount / 100.0) ** (year - 1))
 
 
+def compute_discount_values(
+    revenues: typing.Sequence[typing.Optional[float]],
+    costs: typing.Sequence[typing.Optional[float]],
+    discount: float,
+) -> np.ndarray:
+    """Calculates the discounted values for consecutive years, starting
+    from year 1, in a single array operation.
+
+    Undefined (None) revenues or costs are treated as zero.
+
+    :param revenues: Projected total revenue for each year.
+    :type revenues: list
+
+    :param costs: Projected total costs for each year.
+    :type costs: list
+
+    :param discount: Discount value as a percent i.e. between 0 and 100.
+    :type discount: float
+
+    :returns: The discounted value for each year.
+    :rtype: np.ndarray
+    """
+    net_values = np.nan_to_num(np.asarray(revenues, dtype=float)) - np.nan_to_num(
+        np.asarray(costs, dtype=float)
+    )
+    exponents = np.arange(net_values.size, dtype=float)
+
+    return net_values / np.power(1 + discount / 100.0, exponents)
+
+
+@dataclasses.dataclass
+class NpvSensitivityCube:
+    """Absolute and normalized NPVs of activities for each combination
+    of discount rate and time horizon.
+
+    The arrays are indexed as activity, discount rate and horizon.
+    Normalized values that cannot be determined i.e. when all the
+    activities have the same NPV are set to NaN.
+    """
+
+    component_ids: typing.List[str]
+    discount_rates: np.ndarray
+    horizons: np.ndarray
+    absolute: np.ndarray
+    normalized: np.ndarray
+
+    def _position(self, discount: float, horizon: int) -> typing.Tuple[int, int]:
+        """Returns the indices of the discount rate and horizon."""
+        discount_index = np.flatnonzero(np.isclose(self.discount_rates, discount))
+        horizon_index = np.flatnonzero(self.horizons == horizon)
+        if discount_index.size == 0 or horizon_index.size == 0:
+            raise KeyError(
+                f"Discount rate {discount} and horizon {horizon} are not "
+                f"in the sensitivity cube"
+            )
+
+        return int(discount_index[0]), int(horizon_index[0])
+
+    def npvs(
+        self, discount: float, horizon: int, normalized: bool = True
+    ) -> typing.Dict[str, float]:
+        """Returns the NPV of each activity for the given discount rate
+        and horizon.
+
+        :param discount: Discount rate, as a percent, in the cube.
+        :type discount: float
+
+        :param horizon: Time horizon, in years, in the cube.
+        :type horizon: int
+
+        :param normalized: True to return the normalized NPVs else the
+        absolute NPVs.
+        :type normalized: bool
+
+        :returns: NPV values keyed by the identifier of the activity
+        model component, undetermined normalized values are excluded.
+        :rtype: dict
+        """
+        discount_index, horizon_index = self._position(discount, horizon)
+        values = self.normalized if normalized else self.absolute
+        npvs = values[:, discount_index, horizon_index]
+
+        return {
+            component_id: float(npv)
+            for component_id, npv in zip(self.component_ids, npvs)
+            if not np.isnan(npv)
+        }
+
+    def apply(
+        self, npv_collection: ActivityNpvCollection, discount: float, horizon: int
+    ) -> bool:
+        """Sets the absolute and normalized NPVs for the given discount
+        rate and horizon in the collection so that it can be used to
+        create the NPV PWLs.
+
+        :param npv_collection: Collection whose mappings will be updated.
+        :type npv_collection: ActivityNpvCollection
+
+        :param discount: Discount rate, as a percent, in the cube.
+        :type discount: float
+
+        :param horizon: Time horizon, in years, in the cube.
+        :type horizon: int
+
+        :returns: True if the normalized NPVs could be determined else
+        False.
+        :rtype: bool
+        """
+        absolute_npvs = self.npvs(discount, horizon, False)
+        normalized_npvs = self.npvs(discount, horizon)
+        if len(normalized_npvs) == 0:
+            return False
+
+        for activity_npv in npv_collection.mappings:
+            component_id = activity_npv.component_id
+            if component_id not in normalized_npvs:
+                continue
+            activity_npv.params.absolute = absolute_npvs[component_id]
+            activity_npv.params.normalized = normalized_npvs[component_id]
+
+        npv_collection.min_value = min(absolute_npvs.values())
+        npv_collection.max_value = max(absolute_npvs.values())
+
+        return True
+
+
+def _cube_npv_mappings(
+    npv_collection: ActivityNpvCollection,
+) -> typing.List[ActivityNpv]:
+    """Returns the enabled NPV mappings that can be included in the
+    sensitivity cube.
+    """
+    return [
+        activity_npv
+        for activity_npv in npv_collection.mappings
+        if activity_npv.enabled
+        and activity_npv.params is not None
+        and (
+            not activity_npv.params.manual_npv
+            or activity_npv.params.absolute is not None
+        )
+    ]
+
+
+def normalize_npv_cube(absolute_npvs: np.ndarray) -> np.ndarray:
+    """Normalizes the NPVs across activities for each discount rate and
+    horizon using the minimum and maximum NPV of the activities.
+
+    A single activity is assigned a normalized value of 1.0, consistent
+    with `ActivityNpvCollection.normalize_npvs`.
+
+    :param absolute_npvs: Absolute NPVs indexed as activity, discount
+    rate and horizon.
+    :type absolute_npvs: np.ndarray
+
+    :returns: Normalized NPVs with the same shape, NaN where all the
+    activities have the same NPV.
+    :rtype: np.ndarray
+    """
+    if absolute_npvs.shape[0] == 1:
+        return np.ones_like(absolute_npvs)
+
+    min_npvs = absolute_npvs.min(axis=0)
+    norm_range = absolute_npvs.max(axis=0) - min_npvs
+    normalized_npvs = np.full_like(absolute_npvs, np.nan)
+    np.divide(
+        absolute_npvs - min_npvs,
+        norm_range,
+        out=normalized_npvs,
+        where=np.broadcast_to(norm_range > 0, absolute_npvs.shape),
+    )
+
+    return normalized_npvs
+
+
+def compute_npv_cube(
+    npv_collection: ActivityNpvCollection,
+    discount_rates: typing.Sequence[float],
+    horizons: typing.Sequence[int],
+) -> NpvSensitivityCube:
+    """Computes the NPV of each enabled activity in the collection for
+    all combinations of discount rates and time horizons.
+
+    The yearly revenues and costs are discounted with broadcast discount
+    factors and accumulated over the years, so the NPVs for every horizon
+    are read from the cumulative sums rather than recomputed. Activities
+    with a manual NPV keep the same NPV across the cube.
+
+    :param npv_collection: Collection containing the activity NPV
+    parameters.
+    :type npv_collection: ActivityNpvCollection
+
+    :param discount_rates: Discount rates as a percent.
+    :type discount_rates: list
+
+    :param horizons: Time horizons in years i.e. between 1 and 99.
+    :type horizons: list
+
+    :returns: The sensitivity cube of the absolute and normalized NPVs.
+    :rtype: NpvSensitivityCube
+    """
+    npv_mappings = _cube_npv_mappings(npv_collection)
+    rates = np.asarray(discount_rates, dtype=float)
+    horizon_years = np.asarray(horizons, dtype=int)
+    num_years = max(
+        [len(activity_npv.params.yearly_rates) for activity_npv in npv_mappings]
+        + [int(horizon_years.max()) if horizon_years.size else 0, 1]
+    )
+
+    # Net yearly values padded with zeros beyond each activity's years
+    net_values = np.zeros((len(npv_mappings), num_years))
+    for i, activity_npv in enumerate(npv_mappings):
+        yearly_rates = activity_npv.params.yearly_rates
+        if activity_npv.params.manual_npv or len(yearly_rates) == 0:
+            continue
+        revenues = [rate[0] for rate in yearly_rates]
+        costs = [rate[1] for rate in yearly_rates]
+        net_values[i, : len(yearly_rates)] = np.nan_to_num(
+            np.asarray(revenues, dtype=float)
+        ) - np.nan_to_num(np.asarray(costs, dtype=float))
+
+    exponents = np.arange(num_years, dtype=float)
+    discount_factors = np.power(1 + rates[:, np.newaxis] / 100.0, -exponents)
+    cumulative_npvs = np.cumsum(
+        net_values[:, np.newaxis, :] * discount_factors[np.newaxis, :, :], axis=2
+    )
+    horizon_indices = np.clip(horizon_years, 1, num_years) - 1
+    absolute_npvs = cumulative_npvs[:, :, horizon_indices]
+
+    for i, activity_npv in enumerate(npv_mappings):
+        if activity_npv.params.manual_npv:
+            absolute_npvs[i] = activity_npv.params.absolute
+
+    if len(npv_mappings) == 0:
+        normalized_npvs = absolute_npvs.copy()
+    else:
+        normalized_npvs = normalize_npv_cube(absolute_npvs)
+
+    return NpvSensitivityCube(
+        [activity_npv.component_id for activity_npv in npv_mappings],
+        rates,
+        horizon_years,
+        absolute_npvs,
+        normalized_npvs,
+    )
+
+
 def create_npv_pwls(
     npv_collection: ActivityNpvCollection,
     context: QgsProcessingContext,
@@ -62,6 +307,10 @@ def create_npv_pwls(
     """Creates constant raster layers based on the normalized NPV values for
     the specified NCS pathways.
 
+    The NPV PWLs are virtual constant rasters i.e. they are not written to
+    disk, their normalized NPV is used directly in the pathway weighting.
+    The target CRS, pixel size and extent are therefore not used.
+
     :param npv_collection: The NCS pathway NPV collection containing the NPV
     parameters for NCS pathway.
     :type npv_collection: ActivityNpvCollection
@@ -85,15 +334,15 @@ def create_npv_pwls(
     :type target_extent: str
 
     :param on_finish_func: Function to be executed when a constant raster
-    has been created.
+    has been created, it is called without a processing algorithm.
     :type on_finish_func: Callable
 
     :param on_removed_func: Function to be executed when a disabled NPV PWL has
     been removed.
     :type on_finish_func: Callable
 
-    :returns: A list containing the processing results (as a dictionary) for
-    each successful run.
+    :returns: A list containing the results (as a dictionary) with the
+    virtual constant raster path of each NPV PWL as the output.
     :rtype: list
     """
     base_dir = settings_manager.get_value(Settings.BASE_DIR)
@@ -116,11 +365,11 @@ def create_npv_pwls(
         if feedback.isCanceled():
             break
 
-        if pathway_npv.pathway is None or pathway_npv.params is None:
+        if pathway_npv.activity is None or pathway_npv.params is None:
             log(
                 tr(
-                    "Could not create or update NCS pathway NPV as NCS "
-                    "pathway and NPV parameter information is missing."
+                    "Could not create or update activity NPV as activity "
+                    "and NPV parameter information is missing."
                 ),
                 info=False,
             )
@@ -134,8 +383,8 @@ def create_npv_pwls(
             pathway_npv.base_name.replace(" ", "_").lower()
         )
 
-        # Delete existing NPV PWLs. Relevant layers will be re-created
-        # where applicable.
+        # Delete the NPV PWL rasters written by previous versions, the
+        # NPV PWLs are now virtual constant rasters.
         for del_npv_path in pathlib.Path(npv_base_dir).glob(f"*{base_layer_name}*"):
             try:
                 log(f"{tr('Deleting')} - NPV PWL {del_npv_path}")
@@ -165,34 +414,12 @@ def create_npv_pwls(
                 multi_step_feedback.setCurrentStep(current_step)
                 continue
 
-        # Output layer name
-        npv_pwl_path = f"{npv_base_dir}/{base_layer_name}_{datetime.datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.tif"
-
-        output_post_processing_func = None
+        # The NPV PWL is a virtual constant raster, its value is used
+        # directly in the pathway weighting expression
+        npv_pwl_path = virtual_constant_raster_path(pathway_npv.params.normalized)
         if on_finish_func is not None:
-            output_post_processing_func = partial(
-                on_finish_func, pathway_npv, npv_pwl_path
-            )
-
-        try:
-            alg_params = {
-                "EXTENT": target_extent,
-                "TARGET_CRS": target_crs_id,
-                "PIXEL_SIZE": target_pixel_size,
-                "NUMBER": pathway_npv.params.normalized_npv,
-                "OUTPUT": npv_pwl_path,
-            }
-            res = processing.run(
-                "native:createconstantrasterlayer",
-                alg_params,
-                context=context,
-                feedback=multi_step_feedback,
-                onFinish=output_post_processing_func,
-            )
-            results.append(res)
-        except QgsProcessingException as ex:
-            err_tr = tr("Error creating NPV PWL")
-            log(f"{err_tr} {npv_pwl_path}")
+            on_finish_func(pathway_npv, npv_pwl_path, None, context, feedback)
+        results.append({"OUTPUT": npv_pwl_path})
 
         current_step += 1
         multi_step_feedback.setCurrentStep(current_step)
@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+"""
+Scheduling of the stages of the scenario analysis pipeline.
+"""
+
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+import typing
+
+from ..utils import CustomJsonEncoder, log
+
+
+@dataclasses.dataclass
+class PipelineStage:
+    """A stage of the analysis pipeline with the resources it reads
+    and writes.
+
+    Resources are names of the pieces of analysis state shared between
+    the stages e.g. the pathway layer paths or the activity layer paths.
+    """
+
+    name: str
+    func: typing.Callable[[], typing.Any]
+    inputs: typing.Tuple[str, ...] = ()
+    outputs: typing.Tuple[str, ...] = ()
+    # Share of the scheduler budget used while the stage runs
+    cost: int = 1
+    # Values, other than the input resources, that the stage output
+    # depends on e.g. the settings used by the stage
+    parameters: dict = dataclasses.field(default_factory=dict)
+    # Estimated number of pixels processed by the stage, for reporting
+    # the overall progress of the analysis
+    work: float = 0
+
+    def conflicts_with(self, stage: "PipelineStage") -> bool:
+        """Checks whether the stage and the given stage access the same
+        resources in a way that requires them to run in order i.e. one
+        of them writes a resource that the other reads or writes.
+
+        :param stage: Stage to compare with.
+        :type stage: PipelineStage
+
+        :returns: True if the stages cannot run concurrently else False.
+        :rtype: bool
+        """
+        outputs = set(self.outputs)
+        other_outputs = set(stage.outputs)
+
+        return bool(
+            outputs & (set(stage.inputs) | other_outputs)
+            or other_outputs & set(self.inputs)
+        )
+
+
+class StageScheduler:
+    """Runs the pipeline stages as a directed acyclic graph.
+
+    Each stage depends on every earlier stage whose resources conflict
+    with its own, so the results are the same as running the stages in
+    the order they were added. Stages whose dependencies have completed
+    run concurrently as long as the sum of their costs fits in the
+    budget. A stage whose cost exceeds the budget runs on its own.
+    """
+
+    def __init__(
+        self,
+        stages: typing.List[PipelineStage] = None,
+        budget: int = 1,
+        completed: typing.Iterable[str] = None,
+        on_stage_finished: typing.Callable[[PipelineStage, typing.Any], None] = None,
+        reuse_stage: typing.Callable[[PipelineStage], bool] = None,
+    ):
+        """Initialize the scheduler.
+
+        :param stages: Stages in their sequential order.
+        :type stages: list
+
+        :param budget: Maximum total cost of the stages running at the
+            same time, 1 runs the stages sequentially in the calling thread.
+        :type budget: int
+
+        :param completed: Names of the stages completed in a previous run
+            that will be skipped, only those whose dependencies have also
+            completed are skipped.
+        :type completed: list
+
+        :param on_stage_finished: Called with the stage and its return
+            value after each stage finishes without an exception. It is
+            always called from the thread that runs the scheduler.
+        :type on_stage_finished: typing.Callable
+
+        :param reuse_stage: Called with each stage when its dependencies
+            have completed, before the stage runs. If it returns True, the
+            stage is not run and is finished with True as its return value
+            e.g. when its outputs from a previous analysis were restored.
+            It is always called from the thread that runs the scheduler.
+        :type reuse_stage: typing.Callable
+        """
+        self.stages: typing.List[PipelineStage] = []
+        self.budget = max(1, int(budget))
+        self.results: typing.Dict[str, typing.Any] = {}
+        self.completed = set(completed or [])
+        self.on_stage_finished = on_stage_finished
+        self.reuse_stage = reuse_stage
+        self._dependencies: typing.Dict[str, typing.Set[str]] = {}
+        for stage in stages or []:
+            self.add_stage(stage)
+
+    def add_stage(self, stage: PipelineStage):
+        """Appends a stage to the pipeline.
+
+        :param stage: Stage to be added, its name must be unique.
+        :type stage: PipelineStage
+        """
+        if stage.name in self._dependencies:
+            raise ValueError(f"Duplicate pipeline stage {stage.name}")
+
+        self._dependencies[stage.name] = {
+            previous.name for previous in self.stages if stage.conflicts_with(previous)
+        }
+        self.stages.append(stage)
+
+    def dependencies(self, name: str) -> typing.Set[str]:
+        """Returns the names of the stages that the given stage depends on.
+
+        :param name: Stage name.
+        :type name: str
+
+        :returns: Names of the stages that must complete first.
+        :rtype: set
+        """
+        return set(self._dependencies.get(name, set()))
+
+    def skipped_stages(self) -> typing.List[str]:
+        """Returns the names of the completed stages that will be skipped
+        i.e. the completed stages whose dependencies are all skipped too.
+
+        :returns: Names of the skipped stages in their sequential order.
+        :rtype: list
+        """
+        skipped = []
+        for stage in self.stages:
+            dependencies = self._dependencies[stage.name]
+            if stage.name in self.completed and dependencies <= set(skipped):
+                skipped.append(stage.name)
+
+        return skipped
+
+    def _stage_finished(self, stage: PipelineStage, result: typing.Any):
+        self.results[stage.name] = result
+        if self.on_stage_finished is not None:
+            self.on_stage_finished(stage, result)
+
+    def _reused(self, stage: PipelineStage) -> bool:
+        if self.reuse_stage is None or not self.reuse_stage(stage):
+            return False
+
+        self._stage_finished(stage, True)
+
+        return True
+
+    def run(self) -> typing.Dict[str, typing.Any]:
+        """Runs all the stages.
+
+        If a stage raises an exception, no further stages are started,
+        the running stages are allowed to complete and the exception is
+        raised again.
+
+        :returns: Return values of the stages keyed by the stage name.
+        :rtype: dict
+        """
+        self.results = {}
+        skipped = self.skipped_stages()
+        pending = [stage for stage in self.stages if stage.name not in skipped]
+        if self.budget == 1:
+            for stage in pending:
+                if not self._reused(stage):
+                    self._stage_finished(stage, stage.func())
+            return self.results
+
+        running: typing.Dict[concurrent.futures.Future, PipelineStage] = {}
+        completed: typing.Set[str] = set(skipped)
+        error = None
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(pending), self.budget) or 1
+        ) as executor:
+            while pending or running:
+                if error is None:
+                    running_cost = sum(stage.cost for stage in running.values())
+                    for stage in list(pending):
+                        if not self._dependencies[stage.name] <= completed:
+                            continue
+                        if running and running_cost + stage.cost > self.budget:
+                            continue
+                        pending.remove(stage)
+                        if self._reused(stage):
+                            completed.add(stage.name)
+                            continue
+                        running[executor.submit(stage.func)] = stage
+                        running_cost += stage.cost
+                    if not running:
+                        continue
+                elif not running:
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        self._stage_finished(stage, future.result())
+                    except Exception as e:
+                        log(f"Pipeline stage {stage.name} failed, {e}", info=False)
+                        if error is None:
+                            error = e
+                    completed.add(stage.name)
+
+        if error is not None:
+            raise error
+
+        return self.results
+
+
+class StageManifest:
+    """Records the completed stages of a scenario analysis together with
+    the analysis state they produced, in the scenario directory, so that
+    a failed or cancelled analysis can be resumed from the first
+    incomplete stage.
+    """
+
+    FILE_NAME = "stage_manifest.json"
+    VERSION = 2
+
+    def __init__(self, scenario_directory: str, parameters: dict = None):
+        """Initialize the manifest.
+
+        :param scenario_directory: Directory of the scenario analysis.
+        :type scenario_directory: str
+
+        :param parameters: Parameters of the analysis, a resumed analysis
+            must have the same parameters.
+        :type parameters: dict
+        """
+        self.scenario_directory = scenario_directory
+        self.parameters = parameters or {}
+        self.completed: typing.List[str] = []
+        self.state: typing.Dict[str, typing.Any] = {}
+        # Outputs of the completed stages keyed by the fingerprint of
+        # the stage inputs, and outputs of the items within the stages
+        # e.g. the weighted pathways, keyed by their fingerprint
+        self.stage_outputs: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        self.items: typing.Dict[str, typing.Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        """Returns the path of the manifest file.
+
+        :returns: Manifest file path.
+        :rtype: str
+        """
+        return os.path.join(self.scenario_directory, self.FILE_NAME)
+
+    @classmethod
+    def load(cls, scenario_directory: str) -> typing.Optional["StageManifest"]:
+        """Loads the manifest in the scenario directory.
+
+        :param scenario_directory: Directory of the scenario analysis.
+        :type scenario_directory: str
+
+        :returns: The manifest or None if it does not exist or is invalid.
+        :rtype: StageManifest
+        """
+        manifest = cls(scenario_directory)
+        if not os.path.exists(manifest.path):
+            return None
+
+        try:
+            with open(manifest.path, "r") as f:
+                content = json.load(f)
+        except (OSError, ValueError) as e:
+            log(f"Invalid stage manifest {manifest.path}, {e}", info=False)
+            return None
+
+        if content.get("version") != cls.VERSION:
+            return None
+
+        manifest.parameters = content.get("parameters", {})
+        manifest.completed = content.get("completed", [])
+        manifest.state = content.get("state", {})
+        manifest.stage_outputs = content.get("stage_outputs", {})
+        manifest.items = content.get("items", {})
+
+        return manifest
+
+    @classmethod
+    def find_manifests(
+        cls, base_dir: str, limit: int = 10
+    ) -> typing.List["StageManifest"]:
+        """Loads the manifests of the latest scenario analyses.
+
+        :param base_dir: Directory containing the scenario directories.
+        :type base_dir: str
+
+        :param limit: Maximum number of scenario directories to check.
+        :type limit: int
+
+        :returns: Manifests from the latest to the oldest analysis.
+        :rtype: list
+        """
+        if not base_dir or not os.path.isdir(base_dir):
+            return []
+
+        scenario_directories = sorted(
+            (
+                entry.path
+                for entry in os.scandir(base_dir)
+                if entry.is_dir() and entry.name.startswith("scenario_")
+            ),
+            reverse=True,
+        )
+        manifests = []
+        for scenario_directory in scenario_directories[:limit]:
+            manifest = cls.load(scenario_directory)
+            if manifest is not None:
+                manifests.append(manifest)
+
+        return manifests
+
+    def save(self):
+        """Writes the manifest into the scenario directory."""
+        content = {
+            "version": self.VERSION,
+            "parameters": self.parameters,
+            "completed": self.completed,
+            "state": self.state,
+            "stage_outputs": self.stage_outputs,
+            "items": self.items,
+        }
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(content, f, cls=CustomJsonEncoder)
+        os.replace(temp_path, self.path)
+
+    def record_stage(
+        self,
+        name: str,
+        state: typing.Dict[str, typing.Any],
+        fingerprint: str = None,
+    ):
+        """Records a completed stage and the state of the resources it
+        wrote, then saves the manifest.
+
+        :param name: Stage name.
+        :type name: str
+
+        :param state: State of the stage outputs keyed by resource name.
+        :type state: dict
+
+        :param fingerprint: Fingerprint of the stage inputs, used to
+            reuse the outputs in later analyses.
+        :type fingerprint: str
+        """
+        with self._lock:
+            if name not in self.completed:
+                self.completed.append(name)
+            self.state.update(state)
+            if fingerprint:
+                self.stage_outputs[fingerprint] = state
+            self._save()
+
+    def record_item(self, fingerprint: str, value: typing.Any):
+        """Records the output of an item within a stage, then saves
+        the manifest.
+
+        :param fingerprint: Fingerprint of the item inputs.
+        :type fingerprint: str
+
+        :param value: Output of the item e.g. a file path.
+        :type value: Any
+        """
+        with self._lock:
+            self.items[fingerprint] = value
+            self._save()
+
+    def _save(self):
+        try:
+            self.save()
+        except (OSError, TypeError, ValueError) as e:
+            log(f"Unable to save the stage manifest, {e}", info=False)
+
+    def is_compatible(self, parameters: dict) -> bool:
+        """Checks whether an analysis with the given parameters can be
+        resumed from the manifest, including that the output files
+        recorded in the state still exist.
+
+        :param parameters: Parameters of the analysis to be resumed.
+        :type parameters: dict
+
+        :returns: True if the analysis can be resumed else False.
+        :rtype: bool
+        """
+        normalized_parameters = json.loads(
+            json.dumps(parameters, cls=CustomJsonEncoder)
+        )
+        if normalized_parameters != self.parameters:
+            log("Stage manifest parameters differ from the analysis parameters")
+            return False
+
+        missing_files = [
+            path for path in _state_file_paths(self.state) if not os.path.exists(path)
+        ]
+        if missing_files:
+            log(f"Stage manifest output files are missing, {missing_files}")
+            return False
+
+        return True
+
+
+def outputs_exist(value: typing.Any) -> bool:
+    """Checks whether all the files in recorded stage outputs exist.
+
+    :param value: Recorded outputs.
+    :type value: Any
+
+    :returns: True if all the output files exist else False.
+    :rtype: bool
+    """
+    return all(os.path.exists(path) for path in _state_file_paths(value))
+
+
+def fingerprint(value: typing.Any) -> str:
+    """Creates a fingerprint of stage or item inputs. The size and
+    modification time of the files in the inputs are included so that
+    changed files produce a different fingerprint.
+
+    :param value: JSON serializable inputs.
+    :type value: Any
+
+    :returns: Fingerprint of the inputs.
+    :rtype: str
+    """
+    file_identities = {}
+    for path in sorted(set(_state_file_paths(value))):
+        try:
+            stat = os.stat(path)
+            file_identities[path] = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            file_identities[path] = None
+
+    content = json.dumps(
+        {"inputs": value, "files": file_identities}, sort_keys=True, default=str
+    )
+
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+def _state_file_paths(value: typing.Any) -> typing.List[str]:
+    """Returns the absolute file paths in the recorded stage state."""
+    if isinstance(value, str):
+        return [value] if os.path.isabs(value) else []
+    if isinstance(value, dict):
+        values = value.values()
+    elif isinstance(value, (list, tuple)):
+        values = value
+    else:
+        return []
+
+    paths = []
+    for item in values:
+        paths.extend(_state_file_paths(item))
+
+    return paths
@@ -0,0 +1,538 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of the scenario analysis stages and processing algorithms.
+"""
+
+import contextlib
+import dataclasses
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import typing
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from qgis import processing
+from qgis.core import QgsMapLayer, QgsRasterLayer
+
+from ..definitions.defaults import QGIS_GDAL_PROVIDER
+from ..utils import CustomJsonEncoder, log
+
+
+def peak_rss() -> typing.Optional[int]:
+    """Returns the peak resident set size of the QGIS process over its
+    lifetime, which is not reset between the analysis stages.
+
+    :returns: Peak memory in bytes or None if it cannot be determined.
+    :rtype: int
+    """
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux and bytes on macOS
+    if sys.platform == "darwin":
+        return max_rss
+
+    return max_rss * 1024
+
+
+def current_rss() -> typing.Optional[int]:
+    """Returns the current resident set size of the QGIS process.
+
+    :returns: Memory in bytes or None if it cannot be determined, it is
+    only available on Linux.
+    :rtype: int
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, IndexError, OSError, ValueError):
+        return None
+
+
+class RssMonitor:
+    """Samples the resident set size of the process in a background thread
+    while there are active measurements, so that the peak memory of each
+    measured period is known rather than the lifetime peak of the process.
+
+    Short allocations between two samples are not observed.
+    """
+
+    SAMPLE_INTERVAL = 0.05
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self._peaks: typing.Dict[int, int] = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+        self._stopped = None
+
+    def start(self) -> typing.Optional[int]:
+        """Starts measuring the peak memory of a period.
+
+        :returns: Token of the measurement for :meth:`stop` or None if
+        the memory of the process cannot be measured.
+        :rtype: int
+        """
+        rss = current_rss()
+        if rss is None:
+            return None
+
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._peaks[token] = rss
+            if self._stopped is None:
+                self._stopped = threading.Event()
+                threading.Thread(
+                    target=self._sample, args=(self._stopped,), daemon=True
+                ).start()
+
+        return token
+
+    def stop(self, token: typing.Optional[int]) -> typing.Optional[int]:
+        """Stops a measurement and returns its peak memory.
+
+        :param token: Token returned by :meth:`start`.
+        :type token: int
+
+        :returns: Peak resident set size in bytes during the measurement
+        or None if it was not measured.
+        :rtype: int
+        """
+        if token is None:
+            return None
+
+        rss = current_rss()
+        with self._lock:
+            peak = self._peaks.pop(token, None)
+            if not self._peaks and self._stopped is not None:
+                self._stopped.set()
+                self._stopped = None
+
+        if peak is None or rss is None:
+            return peak
+
+        return max(peak, rss)
+
+    def _sample(self, stopped: threading.Event):
+        while not stopped.wait(self.interval):
+            rss = current_rss()
+            if rss is None:
+                continue
+            with self._lock:
+                for token, peak in self._peaks.items():
+                    if rss > peak:
+                        self._peaks[token] = rss
+
+
+def io_counters() -> typing.Tuple[typing.Optional[int], typing.Optional[int]]:
+    """Returns the number of bytes read from and written to the storage
+    by the QGIS process so far.
+
+    :returns: Bytes read and written, None values if the counters are not
+    available on the platform.
+    :rtype: tuple
+    """
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(counters["read_bytes"]), int(counters["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def cpu_time() -> float:
+    """Returns the CPU time used by the QGIS process and its finished
+    child processes e.g. the GDAL command line tools, in seconds.
+
+    :returns: CPU time in seconds.
+    :rtype: float
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+@dataclasses.dataclass
+class ResourceUsage:
+    """Resources used by the process at a point in time or, for the
+    difference of two snapshots, over a period of time.
+
+    The peak memory is the peak resident set size of the process during
+    the period, sampled by :class:`RssMonitor`.
+    """
+
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    read_bytes: typing.Optional[int] = None
+    write_bytes: typing.Optional[int] = None
+    peak_rss: typing.Optional[int] = None
+
+    @classmethod
+    def snapshot(cls) -> "ResourceUsage":
+        """Takes a snapshot of the resources used by the process.
+
+        :returns: Current resource usage.
+        :rtype: ResourceUsage
+        """
+        read_bytes, write_bytes = io_counters()
+        return cls(time.perf_counter(), cpu_time(), read_bytes, write_bytes)
+
+    def since(self, start: "ResourceUsage") -> "ResourceUsage":
+        """Returns the resources used since an earlier snapshot, with the
+        peak memory recorded in this snapshot.
+
+        :param start: Earlier snapshot.
+        :type start: ResourceUsage
+
+        :returns: Resources used between the snapshots.
+        :rtype: ResourceUsage
+        """
+
+        def difference(end_value, start_value):
+            if end_value is None or start_value is None:
+                return None
+            return end_value - start_value
+
+        return ResourceUsage(
+            self.wall_time - start.wall_time,
+            self.cpu_time - start.cpu_time,
+            difference(self.read_bytes, start.read_bytes),
+            difference(self.write_bytes, start.write_bytes),
+            self.peak_rss,
+        )
+
+
+def layer_info(value: typing.Any) -> typing.List[dict]:
+    """Returns the file size and, for rasters, the dimensions of the layers
+    referenced by an algorithm parameter or result value.
+
+    :param value: Layer path, layer object or a list of them.
+    :type value: Any
+
+    :returns: Information about each layer file.
+    :rtype: list
+    """
+    if isinstance(value, (list, tuple)):
+        return [info for item in value for info in layer_info(item)]
+
+    if isinstance(value, QgsMapLayer):
+        value = value.source()
+    if not isinstance(value, str) or not os.path.isfile(value):
+        return []
+
+    info = {"path": value, "bytes": os.path.getsize(value)}
+    layer = QgsRasterLayer(value, "profile", QGIS_GDAL_PROVIDER)
+    if layer.isValid():
+        info["width"] = layer.width()
+        info["height"] = layer.height()
+        info["pixels"] = layer.width() * layer.height()
+
+    return [info]
+
+
+@dataclasses.dataclass
+class AlgorithmProfile:
+    """Resources used by a processing algorithm run."""
+
+    algorithm_id: str
+    stage: typing.Optional[str]
+    usage: ResourceUsage
+    inputs: typing.List[dict] = dataclasses.field(default_factory=list)
+    outputs: typing.List[dict] = dataclasses.field(default_factory=list)
+    failed: bool = False
+
+
+@dataclasses.dataclass
+class StageProfile:
+    """Resources used by an analysis stage."""
+
+    name: str
+    usage: ResourceUsage
+    failed: bool = False
+    # Pixels of the input layers processed by the stage
+    pixels: int = 0
+
+    @property
+    def throughput(self) -> typing.Optional[float]:
+        """Returns the pixels processed by the stage per second.
+
+        :returns: Throughput in megapixels per second or None if the
+        stage did not process any pixels.
+        :rtype: float
+        """
+        if not self.pixels or self.usage.wall_time <= 0:
+            return None
+
+        return self.pixels / 1e6 / self.usage.wall_time
+
+
+class AnalysisProfiler:
+    """Records the resources used by the analysis stages and the processing
+    algorithms they run.
+
+    The CPU time, I/O and peak memory are measured for the whole process,
+    so the values of stages running concurrently include each other's
+    usage.
+    """
+
+    # Meaning of the profile fields, written in the profile file
+    FIELD_DESCRIPTIONS = {
+        "peak_rss": (
+            "Peak resident set size of the process in bytes over its "
+            "lifetime, including earlier analyses in the same QGIS session."
+        ),
+        "usage.peak_rss": (
+            "Peak resident set size of the process in bytes while the stage "
+            "or algorithm ran, sampled every "
+            f"{int(RssMonitor.SAMPLE_INTERVAL * 1000)} ms. It includes the "
+            "memory of concurrent stages and is null where the memory of the "
+            "process cannot be read i.e. outside Linux."
+        ),
+        "usage.cpu_time": (
+            "CPU time in seconds of the process and its finished child " "processes."
+        ),
+        "usage.read_bytes": "Bytes read from the storage by the process.",
+        "usage.write_bytes": "Bytes written to the storage by the process.",
+        "stages.throughput": (
+            "Megapixels of the input layers processed per second of wall time."
+        ),
+    }
+
+    def __init__(self):
+        self.started = datetime.datetime.now()
+        self.stages: typing.List[StageProfile] = []
+        self.algorithms: typing.List[AlgorithmProfile] = []
+        self._stage_pixels: typing.Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._rss_monitor = RssMonitor()
+
+    @property
+    def current_stage(self) -> typing.Optional[str]:
+        """Returns the name of the stage running in the current thread.
+
+        :returns: Stage name or None if no stage is running.
+        :rtype: str
+        """
+        return getattr(self._local, "stage", None)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Context manager that records the resources used by a stage
+        running in the current thread.
+
+        :param name: Stage name.
+        :type name: str
+        """
+        previous_stage = self.current_stage
+        self._local.stage = name
+        rss_token = self._rss_monitor.start()
+        start = ResourceUsage.snapshot()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._local.stage = previous_stage
+            usage = ResourceUsage.snapshot().since(start)
+            usage.peak_rss = self._rss_monitor.stop(rss_token)
+            with self._lock:
+                pixels = self._stage_pixels.pop(name, 0)
+                self.stages.append(StageProfile(name, usage, failed, pixels))
+
+    def profile_stage(self, name: str, func: typing.Callable) -> typing.Callable:
+        """Wraps a stage function to record its resource usage.
+
+        :param name: Stage name.
+        :type name: str
+
+        :param func: Stage function.
+        :type func: Callable
+
+        :returns: The wrapped stage function.
+        :rtype: Callable
+        """
+
+        def run_stage():
+            with self.stage(name):
+                result = func()
+            if result is False:
+                self.stage_profile(name).failed = True
+            return result
+
+        return run_stage
+
+    def stage_profile(self, name: str) -> typing.Optional[StageProfile]:
+        """Returns the latest profile of a stage.
+
+        :param name: Stage name.
+        :type name: str
+
+        :returns: Stage profile or None if the stage was not recorded.
+        :rtype: StageProfile
+        """
+        with self._lock:
+            for stage_profile in reversed(self.stages):
+                if stage_profile.name == name:
+                    return stage_profile
+
+        return None
+
+    def record_pixels(self, pixels: int):
+        """Adds pixels processed by the stage running in the current
+        thread e.g. by a block computation that does not run through
+        :meth:`run_algorithm`.
+
+        :param pixels: Number of pixels.
+        :type pixels: int
+        """
+        stage = self.current_stage
+        if stage is None or not pixels:
+            return
+
+        with self._lock:
+            self._stage_pixels[stage] = self._stage_pixels.get(stage, 0) + pixels
+
+    def run_algorithm(
+        self,
+        algorithm_id: str,
+        parameters: dict,
+        inputs: typing.List[dict] = None,
+        **kwargs,
+    ) -> typing.Dict[str, typing.Any]:
+        """Runs a processing algorithm and records its resource usage
+        and the sizes of its input and output layers.
+
+        :param algorithm_id: Processing algorithm identifier.
+        :type algorithm_id: str
+
+        :param parameters: Algorithm parameters.
+        :type parameters: dict
+
+        :param inputs: Information about the input layers from
+        :func:`layer_info`, read from the parameters if not set.
+        :type inputs: list
+
+        :param kwargs: Other arguments of `processing.run`.
+        :type kwargs: dict
+
+        :returns: Algorithm results.
+        :rtype: dict
+        """
+        if inputs is None:
+            inputs = layer_info(list(parameters.values()))
+        self.record_pixels(sum(info.get("pixels", 0) for info in inputs))
+        rss_token = self._rss_monitor.start()
+        start = ResourceUsage.snapshot()
+        results = {}
+        failed = True
+        try:
+            results = processing.run(algorithm_id, parameters, **kwargs)
+            failed = False
+            return results
+        finally:
+            usage = ResourceUsage.snapshot().since(start)
+            usage.peak_rss = self._rss_monitor.stop(rss_token)
+            outputs = layer_info(list((results or {}).values()))
+            with self._lock:
+                self.algorithms.append(
+                    AlgorithmProfile(
+                        algorithm_id,
+                        self.current_stage,
+                        usage,
+                        inputs,
+                        outputs,
+                        failed,
+                    )
+                )
+
+    def to_dict(self) -> dict:
+        """Returns the recorded profiles.
+
+        :returns: Stage and algorithm profiles.
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "started": self.started,
+                "fields": self.FIELD_DESCRIPTIONS,
+                "peak_rss": peak_rss(),
+                "stages": [
+                    dict(dataclasses.asdict(stage), throughput=stage.throughput)
+                    for stage in self.stages
+                ],
+                "algorithms": [
+                    dataclasses.asdict(algorithm) for algorithm in self.algorithms
+                ],
+            }
+
+    def save(self, path: str):
+        """Writes the recorded profiles as a JSON file.
+
+        :param path: Path of the profile file.
+        :type path: str
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(), f, cls=CustomJsonEncoder, indent=4)
+        os.replace(temp_path, path)
+
+    def summary(self) -> str:
+        """Returns a summary of the stages sorted by their wall time.
+
+        :returns: Summary text.
+        :rtype: str
+        """
+        with self._lock:
+            stages = sorted(
+                self.stages, key=lambda stage: stage.usage.wall_time, reverse=True
+            )
+            algorithm_counts = {}
+            for algorithm in self.algorithms:
+                algorithm_counts[algorithm.stage] = (
+                    algorithm_counts.get(algorithm.stage, 0) + 1
+                )
+
+        total_time = sum(stage.usage.wall_time for stage in stages)
+        lines = [f"Scenario analysis profile, {total_time:.1f}s in the stages"]
+        for stage in stages:
+            usage = stage.usage
+            line = (
+                f"{stage.name}: {usage.wall_time:.1f}s wall, "
+                f"{usage.cpu_time:.1f}s CPU, "
+                f"{algorithm_counts.get(stage.name, 0)} algorithms"
+            )
+            if usage.read_bytes is not None:
+                line += (
+                    f", {usage.read_bytes / 1e6:.1f}MB read, "
+                    f"{usage.write_bytes / 1e6:.1f}MB written"
+                )
+            if usage.peak_rss is not None:
+                line += f", {usage.peak_rss / 1e6:.1f}MB peak memory"
+            if stage.throughput is not None:
+                line += f", {stage.throughput:.1f} Mpixel/s"
+            if stage.failed:
+                line += ", failed"
+            lines.append(line)
+
+        rss = peak_rss()
+        if rss is not None:
+            lines.append(f"Peak process memory {rss / 1e6:.1f}MB")
+
+        return "\n".join(lines)
+
+    def log_summary(self):
+        """Writes the summary of the stages to the plugin log."""
+        log(self.summary(), notify=False)
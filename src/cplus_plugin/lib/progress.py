@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Overall progress of the scenario analysis weighted by the raster work
+of the stages.
+"""
+
+import dataclasses
+import itertools
+import threading
+import time
+import typing
+
+
+# Share of its estimated work that a stage reports before it completes,
+# the estimates are approximate and a stage may process more pixels
+STAGE_PROGRESS_LIMIT = 0.99
+
+
+def format_duration(seconds: float) -> str:
+    """Formats a duration for the progress messages e.g. 1h 05m, 3m 20s.
+
+    :param seconds: Duration in seconds.
+    :type seconds: float
+
+    :returns: Duration text.
+    :rtype: str
+    """
+    seconds = max(0, int(round(seconds)))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+
+    return f"{seconds}s"
+
+
+@dataclasses.dataclass
+class StageProgress:
+    """Estimated and processed pixels of an analysis stage."""
+
+    name: str
+    pixels: float = 0.0
+    processed: float = 0.0
+    # Pixels and completed fraction of the running algorithms
+    running: typing.Dict[int, typing.List[float]] = dataclasses.field(
+        default_factory=dict
+    )
+    completed: bool = False
+
+    @property
+    def done(self) -> float:
+        """Returns the pixels processed so far, limited to the estimate.
+
+        :returns: Processed pixels.
+        :rtype: float
+        """
+        if self.completed:
+            return self.pixels
+
+        processed = self.processed + sum(
+            pixels * fraction for pixels, fraction in self.running.values()
+        )
+
+        return min(processed, self.pixels * STAGE_PROGRESS_LIMIT)
+
+
+class ProgressModel:
+    """Estimates the work of the analysis stages in pixels before the
+    analysis runs and reports the overall progress and the remaining
+    time from the pixels processed by the algorithms of each stage.
+
+    The progress of each algorithm is weighted by the pixels of its
+    input layers, so a stage reports a steady progress across its
+    algorithms instead of each algorithm going from 0 to 100%.
+    """
+
+    def __init__(self, clock: typing.Callable[[], float] = time.monotonic):
+        self.stages: typing.Dict[str, StageProgress] = {}
+        self.started = None
+        self._clock = clock
+        self._items = itertools.count()
+        self._item_stages: typing.Dict[int, str] = {}
+        # Pixels of the algorithms that ran, excluding the stages that
+        # were reused or skipped, for the processing rate
+        self._worked = 0.0
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, pixels: float):
+        """Adds a stage with its estimated work.
+
+        :param name: Stage name.
+        :type name: str
+
+        :param pixels: Estimated number of pixels processed by the stage.
+        :type pixels: float
+        """
+        with self._lock:
+            self.stages[name] = StageProgress(name, max(0.0, float(pixels)))
+
+    def start(self):
+        """Starts measuring the elapsed time of the analysis."""
+        self.started = self._clock()
+
+    @property
+    def active(self) -> bool:
+        """Returns whether the model has an estimated work to report on.
+
+        :returns: True if the stages have an estimated work else False.
+        :rtype: bool
+        """
+        return self.total_pixels > 0
+
+    @property
+    def total_pixels(self) -> float:
+        """Returns the estimated pixels of all the stages.
+
+        :returns: Estimated pixels.
+        :rtype: float
+        """
+        with self._lock:
+            return sum(stage.pixels for stage in self.stages.values())
+
+    @property
+    def progress(self) -> float:
+        """Returns the overall progress of the analysis.
+
+        :returns: Progress between 0 and 1.
+        :rtype: float
+        """
+        with self._lock:
+            total = sum(stage.pixels for stage in self.stages.values())
+            done = sum(stage.done for stage in self.stages.values())
+
+        if total <= 0:
+            return 0.0
+
+        return min(1.0, done / total)
+
+    def start_item(self, stage: str, pixels: float) -> typing.Optional[int]:
+        """Starts tracking an algorithm or block computation of a stage.
+
+        :param stage: Stage name.
+        :type stage: str
+
+        :param pixels: Pixels processed by the algorithm.
+        :type pixels: float
+
+        :returns: Identifier of the tracked item or None if the stage
+        is not part of the model.
+        :rtype: int
+        """
+        with self._lock:
+            stage_progress = self.stages.get(stage)
+            if stage_progress is None:
+                return None
+            item = next(self._items)
+            self._item_stages[item] = stage
+            stage_progress.running[item] = [max(0.0, float(pixels)), 0.0]
+
+        return item
+
+    def update_item(self, item: typing.Optional[int], fraction: float):
+        """Sets the completed fraction of a tracked item.
+
+        :param item: Item identifier from :meth:`start_item`.
+        :type item: int
+
+        :param fraction: Completed fraction between 0 and 1.
+        :type fraction: float
+        """
+        with self._lock:
+            stage = self.stages.get(self._item_stages.get(item))
+            if stage is None or item not in stage.running:
+                return
+            stage.running[item][1] = min(1.0, max(0.0, fraction))
+
+    def finish_item(self, item: typing.Optional[int]):
+        """Stops tracking an item and counts all its pixels as processed.
+
+        :param item: Item identifier from :meth:`start_item`.
+        :type item: int
+        """
+        with self._lock:
+            stage = self.stages.get(self._item_stages.pop(item, None))
+            if stage is None:
+                return
+            pixels, _ = stage.running.pop(item, (0.0, 0.0))
+            stage.processed += pixels
+            self._worked += pixels
+
+    def complete_stage(self, name: str):
+        """Marks a stage as completed, including the stages that were
+        skipped or reused.
+
+        :param name: Stage name.
+        :type name: str
+        """
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is not None:
+                stage.completed = True
+
+    def remaining_time(self) -> typing.Optional[float]:
+        """Estimates the time until the analysis completes from the rate
+        of the pixels processed so far.
+
+        :returns: Remaining time in seconds or None if no algorithm has
+        processed any pixels yet.
+        :rtype: float
+        """
+        if self.started is None:
+            return None
+
+        with self._lock:
+            total = sum(stage.pixels for stage in self.stages.values())
+            done = sum(stage.done for stage in self.stages.values())
+            worked = self._worked + sum(
+                pixels * fraction
+                for stage in self.stages.values()
+                for pixels, fraction in stage.running.values()
+            )
+
+        elapsed = self._clock() - self.started
+        if worked <= 0 or elapsed <= 0:
+            return None
+
+        return max(0.0, total - done) * elapsed / worked
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""Persistent on-disk cache of rasters fetched from remote sources."""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import typing
+
+from qgis.core import QgsApplication
+
+from ..conf import settings_manager, Settings
+from ..definitions.defaults import (
+    DEFAULT_REMOTE_CACHE_SIZE_MB,
+    REMOTE_CACHE_DIR_NAME,
+)
+from ..utils import FileUtils, log
+
+
+class RemoteRasterCache:
+    """Stores the rasters fetched from remote sources, e.g. the windows of
+    default pathways read through /vsicurl or the clipped carbon and
+    default priority layer downloads, so that they can be reused by later
+    analyses and plugin sessions, including when offline.
+
+    Entries are keyed by the URL, layer version, CRS, pixel size, extent
+    and NoData value of the fetched window. The least recently used entries are
+    evicted once the total size of the cache exceeds its limit, except the
+    entries that are pinned because they are still in use.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(self, cache_dir: str = None, max_size: int = None):
+        """Initialize the cache.
+
+        :param cache_dir: Directory of the cache, defaults to the
+            remote_cache directory in the plugin base directory.
+        :type cache_dir: str
+
+        :param max_size: Maximum size of the cache in bytes, defaults
+            to the size in the plugin settings.
+        :type max_size: int
+        """
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        self._lock = threading.RLock()
+        # Number of users of each pinned entry
+        self._pinned: typing.Dict[str, int] = {}
+
+    @property
+    def cache_dir(self) -> str:
+        """Returns the directory of the cache, creating it if required.
+
+        :returns: Cache directory path.
+        :rtype: str
+        """
+        cache_dir = self._cache_dir
+        if not cache_dir:
+            base_dir = settings_manager.get_value(Settings.BASE_DIR, default="")
+            if not base_dir:
+                base_dir = os.path.join(
+                    QgsApplication.qgisSettingsDirPath(), "cplus_plugin"
+                )
+            cache_dir = os.path.join(base_dir, REMOTE_CACHE_DIR_NAME)
+        FileUtils.create_new_dir(cache_dir)
+
+        return cache_dir
+
+    @property
+    def max_size(self) -> int:
+        """Returns the maximum size of the cache in bytes.
+
+        :returns: Maximum cache size.
+        :rtype: int
+        """
+        if self._max_size is not None:
+            return self._max_size
+
+        max_size_mb = settings_manager.get_value(
+            Settings.REMOTE_CACHE_SIZE,
+            default=DEFAULT_REMOTE_CACHE_SIZE_MB,
+            setting_type=int,
+        )
+        try:
+            max_size_mb = int(max_size_mb)
+        except (TypeError, ValueError):
+            max_size_mb = DEFAULT_REMOTE_CACHE_SIZE_MB
+
+        return max(0, max_size_mb) * 1024 * 1024
+
+    @staticmethod
+    def key(
+        url: str,
+        version: str = None,
+        crs: str = None,
+        pixel_size: float = None,
+        extent: typing.Iterable[float] = None,
+        nodata: float = None,
+    ) -> str:
+        """Creates the cache key of a remote raster window.
+
+        :param url: URL of the remote raster.
+        :type url: str
+
+        :param version: Version of the remote layer, if known.
+        :type version: str
+
+        :param crs: Authority identifier of the CRS of the window.
+        :type crs: str
+
+        :param pixel_size: Pixel size of the window.
+        :type pixel_size: float
+
+        :param extent: Extent of the window as xmin, ymin, xmax, ymax.
+        :type extent: list
+
+        :param nodata: NoData value written in the cached raster, if any.
+        :type nodata: float
+
+        :returns: Cache key.
+        :rtype: str
+        """
+        identity = {
+            "url": url,
+            "version": version,
+            "crs": crs,
+            "pixel_size": round(float(pixel_size), 9) if pixel_size else None,
+            "extent": [round(float(v), 9) for v in extent] if extent else None,
+        }
+        if nodata is not None:
+            identity["nodata"] = float(nodata)
+        return hashlib.md5(
+            json.dumps(identity, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, self.INDEX_FILE_NAME)
+
+    def _read_index(self) -> dict:
+        index_path = self._index_path()
+        if not os.path.exists(index_path):
+            return {}
+        try:
+            with open(index_path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as ex:
+            log(f"Remote raster cache index is invalid, resetting it: {ex}")
+            return {}
+
+    def _write_index(self, index: dict):
+        index_path = self._index_path()
+        temp_path = f"{index_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(temp_path, index_path)
+
+    def get(self, key: str) -> typing.Optional[str]:
+        """Returns the path of a cached raster and marks it as recently used.
+
+        :param key: Cache key.
+        :type key: str
+
+        :returns: Path of the cached raster or None if it is not cached.
+        :rtype: str
+        """
+        with self._lock:
+            index = self._read_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            path = os.path.join(self.cache_dir, entry["file"])
+            if not os.path.exists(path):
+                index.pop(key)
+                self._write_index(index)
+                return None
+            entry["last_access"] = time.time()
+            self._write_index(index)
+
+            return path
+
+    def put(
+        self,
+        key: str,
+        file_path: str,
+        move: bool = False,
+        file_name: str = None,
+        evict: bool = True,
+    ) -> str:
+        """Adds a raster to the cache, evicting the least recently used
+        rasters if the cache exceeds its size limit.
+
+        :param key: Cache key.
+        :type key: str
+
+        :param file_path: Path of the raster to cache.
+        :type file_path: str
+
+        :param move: True to move the file into the cache instead of
+            copying it.
+        :type move: bool
+
+        :param file_name: Name of the cached file, defaults to the key
+            with the extension of the raster.
+        :type file_name: str
+
+        :param evict: False to defer the eviction to a later call of
+            :meth:`trim` e.g. while the cached rasters are still in use.
+        :type evict: bool
+
+        :returns: Path of the cached raster.
+        :rtype: str
+        """
+        file_name = file_name or f"{key}{os.path.splitext(file_path)[1]}"
+        cached_path = os.path.join(self.cache_dir, file_name)
+        temp_path = f"{cached_path}.tmp"
+        if move:
+            shutil.move(file_path, temp_path)
+        else:
+            shutil.copyfile(file_path, temp_path)
+        os.replace(temp_path, cached_path)
+
+        with self._lock:
+            index = self._read_index()
+            index[key] = {
+                "file": file_name,
+                "size": os.path.getsize(cached_path),
+                "last_access": time.time(),
+            }
+            if evict:
+                self._evict(index, keep=key)
+            self._write_index(index)
+
+        return cached_path
+
+    def pin(self, key: str):
+        """Pins an entry so that it is not evicted while it is in use,
+        even if it has not been added yet. Each call needs a matching
+        call of :meth:`unpin`.
+
+        :param key: Cache key.
+        :type key: str
+        """
+        with self._lock:
+            self._pinned[key] = self._pinned.get(key, 0) + 1
+
+    def unpin(self, key: str):
+        """Releases an entry pinned with :meth:`pin`, it can be evicted
+        once it is no longer pinned.
+
+        :param key: Cache key.
+        :type key: str
+        """
+        with self._lock:
+            count = self._pinned.get(key, 0) - 1
+            if count > 0:
+                self._pinned[key] = count
+            else:
+                self._pinned.pop(key, None)
+
+    def trim(self):
+        """Evicts the least recently used rasters until the cache fits
+        in its size limit.
+        """
+        with self._lock:
+            index = self._read_index()
+            self._evict(index)
+            self._write_index(index)
+
+    def copy_to(self, key: str, destination: str) -> bool:
+        """Copies a cached raster to the destination path.
+
+        :param key: Cache key.
+        :type key: str
+
+        :param destination: Path of the copy.
+        :type destination: str
+
+        :returns: True if the raster was cached and has been copied,
+            else False.
+        :rtype: bool
+        """
+        cached_path = self.get(key)
+        if cached_path is None:
+            return False
+        try:
+            FileUtils.create_new_dir(os.path.dirname(destination))
+            shutil.copyfile(cached_path, destination)
+        except OSError as ex:
+            log(f"Unable to copy cached raster to {destination}: {ex}", info=False)
+            return False
+
+        return True
+
+    def _evict(self, index: dict, keep: str = None):
+        """Removes the least recently used entries until the cache fits
+        in its size limit, the pinned entries are not removed.
+
+        :param index: Cache index, updated in place.
+        :type index: dict
+
+        :param keep: Key of an entry that should not be evicted.
+        :type keep: str
+        """
+        max_size = self.max_size
+        total_size = sum(entry["size"] for entry in index.values())
+        lru_keys = sorted(
+            (k for k in index if k != keep and k not in self._pinned),
+            key=lambda k: index[k]["last_access"],
+        )
+        for lru_key in lru_keys:
+            if total_size <= max_size:
+                break
+            entry = index.pop(lru_key)
+            total_size -= entry["size"]
+            try:
+                os.remove(os.path.join(self.cache_dir, entry["file"]))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Removes all the cached rasters."""
+        with self._lock:
+            index = self._read_index()
+            for entry in index.values():
+                try:
+                    os.remove(os.path.join(self.cache_dir, entry["file"]))
+                except OSError:
+                    pass
+            self._write_index({})
+
+
+# Shared cache instance
+remote_raster_cache = RemoteRasterCache()
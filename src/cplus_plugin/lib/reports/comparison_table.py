@@ -157,7 +157,10 @@ class ScenarioComparisonTableInfo(QtCore.QObject):
                 msg = "No activity areas from the calculation"
                 log(msg)
 
-            row_data = [QgsTableCell(result.scenario.name)]
+            scenario_name = result.scenario.name
+            if result.preview:
+                scenario_name = tr("{} (preview)").format(scenario_name)
+            row_data = [QgsTableCell(scenario_name)]
             for header_info in self._activity_header_info:
                 activity_name = header_info[1]
                 if activity_name in activity_name_area_info:
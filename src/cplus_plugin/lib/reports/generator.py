@@ -227,7 +227,10 @@ class BaseScenarioReportGeneratorTask(QgsTask):
         metadata = project.metadata()
         metadata.setAuthor("CPLUS plugin")
         if hasattr(self._context, "scenario"):
-            metadata.setTitle(self._context.scenario.name)
+            title = self._context.scenario.name
+            if getattr(self._context, "preview", False):
+                title = tr("{} (preview)").format(title)
+            metadata.setTitle(title)
             metadata.setAbstract(self._context.scenario.description)
         metadata.setCreationDateTime(QtCore.QDateTime.currentDateTime())
         project.setMetadata(metadata)
@@ -471,6 +471,7 @@ class ReportManager(QtCore.QObject):
             feedback=feedback,
             output_layer_name=scenario_result.output_layer_name,
             custom_metrics=use_custom_metrics,
+            preview=scenario_result.preview,
         )
 
     @classmethod
@@ -112,9 +112,13 @@ class ScenarioNameVariableInfo(CplusVariableInfo):
         self.final_value = ""
 
     def update_final_value(self, context: BaseReportContext):
-        """Set the scenario name."""
+        """Set the scenario name, marked for preview analyses so that the
+        report is not mistaken for a final output.
+        """
         if hasattr(context, "scenario"):
             self.final_value = context.scenario.name
+            if getattr(context, "preview", False):
+                self.final_value = tr("{} (preview)").format(context.scenario.name)
 
 
 @dataclass
@@ -0,0 +1,1178 @@
+# -*- coding: utf-8 -*-
+"""
+Headless scenario runner that runs the scenario analysis without the
+plugin dock widget e.g. on a batch node using a standalone QGIS application.
+
+Usage::
+
+    python -m cplus_plugin.lib.runner scenario.json --summary summary.json
+
+Several scenario definitions are run as a batch, which preprocesses the
+shared pathway and priority layers once and writes a comparison table::
+
+    python -m cplus_plugin.lib.runner variant_*.json --parallel 4
+
+The scenario definition is a JSON file with the following structure, where
+the priority layers, groups, NCS pathways and activities use the same
+attributes as the ones stored in the plugin settings::
+
+    {
+        "name": "Scenario",
+        "description": "Scenario description",
+        "extent": {"bbox": [xmin, xmax, ymin, ymax], "crs": "EPSG:32735"},
+        "studyarea_path": "",
+        "base_dir": "/data/cplus",
+        "settings": {"snapping_enabled": false},
+        "preview_factor": 1,
+        "priority_groups": [...],
+        "priority_layers": [...],
+        "pathways": [...],
+        "activities": [{"uuid": "...", "pathways": ["<pathway uuid>"], ...}]
+    }
+
+The definition settings are written in the plugin settings only for the
+duration of the run, the previous plugin settings are then restored. The
+priority layers, groups, pathways and activities of the definition are not
+saved in the plugin settings.
+
+A priority layer can set a "constant_value" instead of a "path", it is then
+used as a virtual constant raster whose value is inlined in the pathway
+weighting, without writing a raster.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import csv
+import dataclasses
+import datetime
+import enum
+import json
+import os
+import sys
+import time
+import typing
+import uuid
+
+from qgis.core import QgsApplication, QgsRasterLayer, QgsVectorLayer
+
+from ..conf import settings_manager, Settings
+from ..definitions.constants import (
+    PATH_ATTRIBUTE,
+    PATHWAYS_ATTRIBUTE,
+    PRIORITY_LAYERS_SEGMENT,
+    UUID_ATTRIBUTE,
+)
+from ..definitions.defaults import (
+    BATCH_COMPARISON_FILE_NAME,
+    SCENARIO_SUMMARY_FILE_NAME,
+)
+from ..models.base import (
+    Activity,
+    NcsPathway,
+    Scenario,
+    ScenarioResult,
+    ScenarioState,
+    SpatialExtent,
+)
+from ..models.helpers import create_activity, create_ncs_pathway
+from ..tasks import ScenarioAnalysisTask
+from ..utils import clean_filename, CustomJsonEncoder, FileUtils, log
+from .constant_raster import virtual_constant_raster_path
+from .pipeline import fingerprint
+from .reports.comparison_table import ScenarioComparisonTableInfo
+
+
+class ExitCode(enum.IntEnum):
+    """Exit codes of the headless scenario runner."""
+
+    SUCCESS = 0
+    FAILED = 1
+    INVALID_DEFINITION = 2
+    CANCELLED = 3
+
+
+class ScenarioDefinitionError(Exception):
+    """Raised when a scenario definition is invalid."""
+
+
+@dataclasses.dataclass
+class ScenarioDefinition:
+    """Scenario definition used to run the scenario analysis without
+    the plugin user interface.
+    """
+
+    name: str
+    description: str
+    extent: SpatialExtent
+    activities: typing.List[dict]
+    pathways: typing.List[dict] = dataclasses.field(default_factory=list)
+    priority_layers: typing.List[dict] = dataclasses.field(default_factory=list)
+    priority_groups: typing.List[dict] = dataclasses.field(default_factory=list)
+    settings: dict = dataclasses.field(default_factory=dict)
+    studyarea_path: str = ""
+    base_dir: str = ""
+    # Downsampling factor of a preview analysis, 1 for full resolution
+    preview_factor: int = 1
+
+    @classmethod
+    def from_dict(cls, source_dict: dict) -> "ScenarioDefinition":
+        """Creates a scenario definition from its attribute values.
+
+        :param source_dict: Scenario definition attribute values.
+        :type source_dict: dict
+
+        :returns: Scenario definition.
+        :rtype: ScenarioDefinition
+
+        :raises ScenarioDefinitionError: If required attributes are
+        missing or invalid.
+        """
+        if not isinstance(source_dict, dict):
+            raise ScenarioDefinitionError("Scenario definition must be an object")
+
+        for attribute in ("name", "description", "extent", "activities"):
+            if not source_dict.get(attribute):
+                raise ScenarioDefinitionError(
+                    f"Scenario definition is missing the {attribute!r} attribute"
+                )
+
+        extent = source_dict["extent"]
+        bbox = extent.get("bbox") if isinstance(extent, dict) else extent
+        try:
+            bbox = [float(value) for value in bbox]
+        except (TypeError, ValueError):
+            bbox = []
+        if len(bbox) != 4:
+            raise ScenarioDefinitionError(
+                "Scenario extent must have a bbox with four values in the "
+                "order xmin, xmax, ymin, ymax"
+            )
+        crs = extent.get("crs") if isinstance(extent, dict) else None
+
+        definition = cls(
+            name=source_dict["name"],
+            description=source_dict["description"],
+            extent=SpatialExtent(bbox=bbox, crs=crs),
+            activities=list(source_dict["activities"]),
+            pathways=list(source_dict.get("pathways", [])),
+            priority_layers=list(source_dict.get(PRIORITY_LAYERS_SEGMENT, [])),
+            priority_groups=list(source_dict.get("priority_groups", [])),
+            settings=dict(source_dict.get("settings", {})),
+            studyarea_path=source_dict.get("studyarea_path") or "",
+            base_dir=source_dict.get("base_dir") or "",
+            preview_factor=source_dict.get("preview_factor", 1),
+        )
+        definition.validate()
+
+        for idx, priority_layer in enumerate(definition.priority_layers):
+            if "constant_value" not in priority_layer:
+                continue
+            priority_layer = dict(priority_layer)
+            try:
+                constant_value = float(priority_layer.pop("constant_value"))
+            except (TypeError, ValueError):
+                raise ScenarioDefinitionError(
+                    f"Priority layer {priority_layer.get('name')} constant "
+                    f"value must be a number"
+                )
+            priority_layer[PATH_ATTRIBUTE] = virtual_constant_raster_path(
+                constant_value
+            )
+            definition.priority_layers[idx] = priority_layer
+
+        return definition
+
+    @classmethod
+    def load(cls, path: str) -> "ScenarioDefinition":
+        """Loads a scenario definition from a JSON file.
+
+        :param path: Path to the scenario definition file.
+        :type path: str
+
+        :returns: Scenario definition.
+        :rtype: ScenarioDefinition
+
+        :raises ScenarioDefinitionError: If the file cannot be read or
+        the definition is invalid.
+        """
+        try:
+            with open(path, "r") as f:
+                source_dict = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ScenarioDefinitionError(
+                f"Unable to read the scenario definition {path}, {e}"
+            ) from e
+
+        return cls.from_dict(source_dict)
+
+    def validate(self):
+        """Checks that the components of the definition are complete and
+        reference each other.
+
+        :raises ScenarioDefinitionError: If the definition is invalid.
+        """
+        components = {
+            "priority group": self.priority_groups,
+            "priority layer": self.priority_layers,
+            "pathway": self.pathways,
+            "activity": self.activities,
+        }
+        for component_name, items in components.items():
+            for item in items:
+                if not isinstance(item, dict) or not item.get(UUID_ATTRIBUTE):
+                    raise ScenarioDefinitionError(
+                        f"Each {component_name} must have a uuid"
+                    )
+
+        pathway_ids = {str(pathway[UUID_ATTRIBUTE]) for pathway in self.pathways}
+        for activity in self.activities:
+            missing_pathways = [
+                pathway_id
+                for pathway_id in activity.get(PATHWAYS_ATTRIBUTE, [])
+                if str(pathway_id) not in pathway_ids
+            ]
+            if missing_pathways:
+                raise ScenarioDefinitionError(
+                    f"Activity {activity.get('name')} references undefined "
+                    f"pathways {missing_pathways}"
+                )
+
+        for key in self.settings:
+            setting_from_key(key)
+
+        if not isinstance(self.preview_factor, int) or self.preview_factor < 1:
+            raise ScenarioDefinitionError(
+                "Scenario preview factor must be an integer of at least 1"
+            )
+
+    def analysis_settings(self) -> typing.Dict[Settings, typing.Any]:
+        """Returns the settings of the scenario keyed by the plugin setting,
+        with the values of the object settings e.g. the relative impact
+        matrix serialized to JSON as in the plugin settings.
+
+        :returns: Scenario settings.
+        :rtype: dict
+        """
+        settings = {}
+        for key, value in self.settings.items():
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            settings[setting_from_key(key)] = value
+
+        return settings
+
+    def priority_layer_groups(self) -> typing.List[dict]:
+        """Returns the priority groups with the names of their priority
+        layers, in the format used by the scenario analysis.
+
+        :returns: Priority groups and their layer names.
+        :rtype: list
+        """
+        groups = []
+        for group in self.priority_groups:
+            layers = []
+            for layer in self.priority_layers:
+                group_names = [
+                    layer_group.get("name") for layer_group in layer.get("groups", [])
+                ]
+                if group.get("name") in group_names:
+                    layers.append(layer.get("name"))
+            groups.append(
+                {
+                    "name": group.get("name"),
+                    "value": group.get("value"),
+                    "layers": layers,
+                }
+            )
+
+        return groups
+
+
+@dataclasses.dataclass
+class ScenarioRunSummary:
+    """Machine-readable summary of a headless scenario run."""
+
+    scenario_name: str
+    exit_code: ExitCode
+    scenario_id: str = ""
+    scenario_directory: str = ""
+    output_path: str = ""
+    activity_outputs: dict = dataclasses.field(default_factory=dict)
+    started: typing.Optional[datetime.datetime] = None
+    duration: float = 0.0
+    error: str = ""
+    preview: bool = False
+    scenario_result: typing.Optional[ScenarioResult] = None
+
+    def to_dict(self) -> dict:
+        """Returns the summary attribute values without the scenario result
+        object.
+
+        :returns: Summary attribute values.
+        :rtype: dict
+        """
+        return {
+            "scenario_name": self.scenario_name,
+            "scenario_id": self.scenario_id,
+            "status": self.exit_code.name.lower(),
+            "exit_code": int(self.exit_code),
+            "scenario_directory": self.scenario_directory,
+            "output_path": self.output_path,
+            "activity_outputs": self.activity_outputs,
+            "started": self.started,
+            "duration": round(self.duration, 3),
+            "error": self.error,
+            "preview": self.preview,
+        }
+
+    def save(self, path: str):
+        """Writes the summary as a JSON file.
+
+        :param path: Path of the summary file.
+        :type path: str
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            FileUtils.create_new_dir(directory)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(), f, cls=CustomJsonEncoder, indent=4)
+        os.replace(temp_path, path)
+
+
+def setting_from_key(key: str) -> Settings:
+    """Returns the plugin setting matching a scenario definition setting
+    key, which can either be the setting name or its value.
+
+    :param key: Setting name e.g. SNAPPING_ENABLED or value
+    e.g. snapping_enabled.
+    :type key: str
+
+    :returns: Plugin setting.
+    :rtype: Settings
+
+    :raises ScenarioDefinitionError: If there is no matching setting.
+    """
+    if key in Settings.__members__:
+        return Settings[key]
+    try:
+        return Settings(key)
+    except ValueError:
+        raise ScenarioDefinitionError(f"Unknown setting {key!r}") from None
+
+
+@contextlib.contextmanager
+def preserved_settings(definitions: typing.List[ScenarioDefinition]):
+    """Context manager that restores the plugin settings written by
+    :func:`apply_definition` for the definitions, so that the settings
+    of a scenario do not leak into later runs.
+
+    :param definitions: Scenario definitions to be applied.
+    :type definitions: list
+
+    :yields: Plugin values of the settings set by any of the
+        definitions, before the definitions were applied. The settings
+        that are not set in the plugin have a None value.
+    :ytype: dict
+    """
+    settings = {Settings.BASE_DIR, Settings.STUDYAREA_PATH}
+    for definition in definitions:
+        try:
+            settings.update(definition.analysis_settings())
+        except ScenarioDefinitionError:
+            # The definition is reported as invalid when it is applied
+            continue
+
+    snapshot = {
+        setting: (
+            settings_manager.settings.contains(
+                f"{settings_manager.BASE_GROUP_NAME}/{setting}"
+            ),
+            settings_manager.get_value(setting),
+        )
+        for setting in settings
+    }
+    try:
+        yield {
+            setting: value if is_set else None
+            for setting, (is_set, value) in snapshot.items()
+        }
+    finally:
+        for setting, (is_set, value) in snapshot.items():
+            if is_set:
+                settings_manager.set_value(setting, value)
+            else:
+                settings_manager.remove(setting)
+
+
+def apply_definition(definition: ScenarioDefinition) -> typing.List[Activity]:
+    """Saves the settings of the definition in the plugin settings and
+    creates its NCS pathways and activities. Use :func:`preserved_settings`
+    to restore the previous settings after the run.
+
+    The priority layers, groups, pathways and activities are passed to
+    the analysis task instead of being saved, so that they do not
+    replace or add to the items of the plugin.
+
+    :param definition: Scenario definition.
+    :type definition: ScenarioDefinition
+
+    :returns: Activities of the scenario with their NCS pathways.
+    :rtype: list
+
+    :raises ScenarioDefinitionError: If a pathway or an activity
+    cannot be created.
+    """
+    for setting, value in definition.analysis_settings().items():
+        settings_manager.set_value(setting, value)
+
+    if definition.base_dir:
+        settings_manager.set_value(Settings.BASE_DIR, definition.base_dir)
+    if not settings_manager.get_value(Settings.BASE_DIR):
+        raise ScenarioDefinitionError("Base data directory is not set")
+
+    settings_manager.set_value(Settings.STUDYAREA_PATH, definition.studyarea_path)
+
+    pathways: typing.Dict[str, NcsPathway] = {}
+    for pathway_dict in definition.pathways:
+        pathway = create_ncs_pathway(pathway_dict)
+        if pathway is None or not pathway.is_valid():
+            raise ScenarioDefinitionError(
+                f"Pathway {pathway_dict.get('name')} is invalid, check "
+                f"that its layer exists"
+            )
+        pathways[str(pathway.uuid)] = pathway
+
+    activities = []
+    for activity_dict in definition.activities:
+        activity = create_activity(activity_dict)
+        if activity is None:
+            raise ScenarioDefinitionError(
+                f"Activity {activity_dict.get('name')} is invalid"
+            )
+        for pathway_id in activity_dict.get(PATHWAYS_ATTRIBUTE, []):
+            activity.add_ncs_pathway(pathways[str(pathway_id)])
+        if not activity.pathways:
+            raise ScenarioDefinitionError(
+                f"Activity {activity.name} does not have any pathways"
+            )
+        activities.append(activity)
+
+    return activities
+
+
+def create_analysis_task(
+    definition: ScenarioDefinition,
+    activities: typing.List[Activity],
+    plugin_settings: typing.Dict[Settings, typing.Any] = None,
+):
+    """Creates the scenario analysis task for a scenario definition.
+
+    :param definition: Scenario definition.
+    :type definition: ScenarioDefinition
+
+    :param activities: Activities of the scenario.
+    :type activities: list
+
+    :param plugin_settings: Plugin values of the settings that the
+        definition does not set, so that the task does not read the
+        values written by other definitions of a batch.
+    :type plugin_settings: dict
+
+    :returns: Scenario analysis task.
+    :rtype: ScenarioAnalysisTask
+    """
+    clip_to_studyarea = bool(definition.studyarea_path) and (
+        QgsVectorLayer(definition.studyarea_path, "studyarea_path").isValid()
+    )
+    priority_layer_groups = definition.priority_layer_groups()
+    scenario = Scenario(
+        uuid=uuid.uuid4(),
+        name=definition.name,
+        description=definition.description,
+        extent=definition.extent,
+        activities=activities,
+        priority_layer_groups=priority_layer_groups,
+        clip_to_studyarea=clip_to_studyarea,
+        studyarea_path=definition.studyarea_path,
+        crs=definition.extent.crs,
+    )
+
+    task = ScenarioAnalysisTask(
+        definition.name,
+        definition.description,
+        activities,
+        priority_layer_groups,
+        definition.extent,
+        scenario,
+        clip_to_studyarea,
+        definition.studyarea_path,
+    )
+    # Scenarios of a batch run share the plugin settings
+    task.scenario_settings = dict(plugin_settings or {})
+    task.scenario_settings.pop(Settings.BASE_DIR, None)
+    task.scenario_settings.pop(Settings.STUDYAREA_PATH, None)
+    task.scenario_settings.update(definition.analysis_settings())
+    task.scenario_priority_layers = list(definition.priority_layers)
+    task.preview_factor = definition.preview_factor
+
+    return task
+
+
+def run_scenario(
+    definition: ScenarioDefinition,
+    resume_directory: str = None,
+    save_result: bool = True,
+) -> ScenarioRunSummary:
+    """Runs the scenario analysis of a definition synchronously in the
+    calling thread.
+
+    A QGIS application with the processing framework initialized is
+    required, see :func:`init_qgis`.
+
+    :param definition: Scenario definition.
+    :type definition: ScenarioDefinition
+
+    :param resume_directory: Directory of an incomplete analysis of the
+    scenario to resume.
+    :type resume_directory: str
+
+    :param save_result: Whether to save the scenario and its result in
+    the plugin scenario history.
+    :type save_result: bool
+
+    :returns: Run summary, which is also saved in the scenario directory.
+    :rtype: ScenarioRunSummary
+    """
+    summary = ScenarioRunSummary(
+        definition.name, ExitCode.FAILED, started=datetime.datetime.now()
+    )
+
+    with preserved_settings([definition]):
+        try:
+            activities = apply_definition(definition)
+            task = create_analysis_task(definition, activities)
+        except ScenarioDefinitionError as e:
+            summary.exit_code = ExitCode.INVALID_DEFINITION
+            summary.error = str(e)
+            log(f"Invalid scenario definition, {e}", info=False)
+            return summary
+
+        if resume_directory:
+            task.resume(resume_directory)
+
+        run_analysis_task(task, summary)
+
+    if save_result:
+        save_scenario_history(summary)
+
+    return summary
+
+
+def run_analysis_task(
+    task: ScenarioAnalysisTask, summary: ScenarioRunSummary
+) -> ScenarioRunSummary:
+    """Runs a scenario analysis task synchronously and updates the run
+    summary with its outcome. The summary is saved in the scenario
+    directory.
+
+    :param task: Scenario analysis task.
+    :type task: ScenarioAnalysisTask
+
+    :param summary: Summary of the run.
+    :type summary: ScenarioRunSummary
+
+    :returns: The updated run summary.
+    :rtype: ScenarioRunSummary
+    """
+    start_time = time.perf_counter()
+    summary.scenario_id = str(task.scenario.uuid)
+    summary.preview = task.preview
+
+    result = task.run()
+    summary.duration = time.perf_counter() - start_time
+    summary.scenario_directory = task.scenario_directory or ""
+
+    # The stages cancel the task when they fail, a cancelled task
+    # without an error was cancelled by the user
+    if task.error is not None:
+        summary.exit_code = ExitCode.FAILED
+        summary.error = str(task.error)
+    elif task.processing_cancelled or task.isCanceled():
+        summary.exit_code = ExitCode.CANCELLED
+        summary.error = "Scenario analysis was cancelled"
+    elif not result or task.scenario_result is None:
+        summary.exit_code = ExitCode.FAILED
+        summary.error = str(task.error or "No valid output from the analysis")
+    else:
+        scenario_result = task.scenario_result
+        scenario_result.analysis_output = task.output
+        scenario_result.scenario.state = ScenarioState.FINISHED
+        summary.exit_code = ExitCode.SUCCESS
+        summary.scenario_result = scenario_result
+        summary.output_path = (task.output or {}).get("OUTPUT", "")
+        summary.activity_outputs = {
+            str(activity.uuid): activity.path for activity in task.analysis_activities
+        }
+
+    if summary.scenario_directory and os.path.isdir(summary.scenario_directory):
+        summary.save(
+            os.path.join(summary.scenario_directory, SCENARIO_SUMMARY_FILE_NAME)
+        )
+
+    return summary
+
+
+def save_scenario_history(summary: ScenarioRunSummary):
+    """Saves the scenario and the result of a successful run in the
+    plugin scenario history.
+
+    :param summary: Summary of the run.
+    :type summary: ScenarioRunSummary
+    """
+    scenario_result = summary.scenario_result
+    if scenario_result is None:
+        return
+
+    settings_manager.save_scenario(scenario_result.scenario)
+    settings_manager.save_scenario_result(
+        scenario_result, str(scenario_result.scenario.uuid)
+    )
+
+
+def preprocessing_key(definition: ScenarioDefinition) -> str:
+    """Returns a key of the values that the preprocessed pathway and
+    priority layers of a scenario depend on i.e. the extent, the study
+    area and the settings other than the relative impact matrix.
+
+    :param definition: Scenario definition.
+    :type definition: ScenarioDefinition
+
+    :returns: Preprocessing key.
+    :rtype: str
+    """
+    settings = {
+        setting.name: value
+        for setting, value in definition.analysis_settings().items()
+        if setting != Settings.SCENARIO_IMPACT_MATRIX
+    }
+    return fingerprint(
+        {
+            "extent": dataclasses.asdict(definition.extent),
+            "studyarea": definition.studyarea_path,
+            "settings": settings,
+            "preview_factor": definition.preview_factor,
+        }
+    )
+
+
+def _preprocessing_inputs(definition: ScenarioDefinition) -> dict:
+    """Returns the layers of the pathways and priority layers of a
+    definition that are preprocessed, keyed by their UUID.
+    """
+    inputs = {}
+    for pathway in definition.pathways:
+        inputs[str(pathway[UUID_ATTRIBUTE])] = [
+            pathway.get(PATH_ATTRIBUTE),
+            pathway.get(PRIORITY_LAYERS_SEGMENT),
+        ]
+    for priority_layer in definition.priority_layers:
+        inputs[str(priority_layer[UUID_ATTRIBUTE])] = priority_layer.get(PATH_ATTRIBUTE)
+
+    return inputs
+
+
+def preprocessing_groups(
+    definitions: typing.List[ScenarioDefinition],
+) -> typing.List[typing.List[int]]:
+    """Groups the definitions that can share the preprocessing of their
+    pathway and priority layers. The definitions in a group have the same
+    preprocessing key and do not define the same pathway or priority
+    layer differently.
+
+    :param definitions: Scenario definitions.
+    :type definitions: list
+
+    :returns: Indexes of the definitions in each group.
+    :rtype: list
+    """
+    groups = []
+    for index, definition in enumerate(definitions):
+        key = preprocessing_key(definition)
+        inputs = _preprocessing_inputs(definition)
+        for group in groups:
+            if group["key"] != key:
+                continue
+            if any(
+                group["inputs"].get(input_id, value) != value
+                for input_id, value in inputs.items()
+            ):
+                continue
+            group["indexes"].append(index)
+            group["inputs"].update(inputs)
+            break
+        else:
+            groups.append({"key": key, "inputs": inputs, "indexes": [index]})
+
+    return [group["indexes"] for group in groups]
+
+
+def union_definition(
+    definitions: typing.List[ScenarioDefinition], name: str
+) -> ScenarioDefinition:
+    """Creates a definition with all the activities, pathways and priority
+    layers of the given definitions, for preprocessing their layers once.
+
+    :param definitions: Scenario definitions with the same preprocessing
+    key.
+    :type definitions: list
+
+    :param name: Name of the definition.
+    :type name: str
+
+    :returns: Union of the scenario definitions.
+    :rtype: ScenarioDefinition
+    """
+
+    def union(items: typing.Iterable[dict]) -> typing.List[dict]:
+        unique_items = {}
+        for item in items:
+            unique_items.setdefault(str(item[UUID_ATTRIBUTE]), item)
+        return list(unique_items.values())
+
+    first = definitions[0]
+
+    return ScenarioDefinition(
+        name=name,
+        description=name,
+        extent=first.extent,
+        activities=union(a for d in definitions for a in d.activities),
+        pathways=union(p for d in definitions for p in d.pathways),
+        priority_layers=union(p for d in definitions for p in d.priority_layers),
+        priority_groups=union(g for d in definitions for g in d.priority_groups),
+        settings=dict(first.settings),
+        studyarea_path=first.studyarea_path,
+        base_dir=first.base_dir,
+        preview_factor=first.preview_factor,
+    )
+
+
+def estimated_scenario_memory(definition: ScenarioDefinition) -> int:
+    """Estimates the memory used by the analysis of a scenario as the
+    size of its pathway rasters and its activity rasters, in bytes.
+
+    :param definition: Scenario definition.
+    :type definition: ScenarioDefinition
+
+    :returns: Estimated memory in bytes.
+    :rtype: int
+    """
+    pixel_counts = []
+    for pathway in definition.pathways:
+        layer = QgsRasterLayer(pathway.get(PATH_ATTRIBUTE, ""), "pathway")
+        if layer.isValid():
+            pixel_counts.append(layer.width() * layer.height())
+
+    if not pixel_counts:
+        return 0
+
+    # Float64 pixels of the pathways and of an activity layer per activity
+    return (sum(pixel_counts) + max(pixel_counts) * len(definition.activities)) * 8
+
+
+def available_memory() -> typing.Optional[int]:
+    """Returns the available physical memory in bytes.
+
+    :returns: Available memory or None if it cannot be determined.
+    :rtype: int
+    """
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def batch_workers(
+    definitions: typing.List[ScenarioDefinition], max_parallel: int
+) -> int:
+    """Returns the number of scenarios of a batch to run in parallel,
+    limited by the available memory.
+
+    :param definitions: Scenario definitions.
+    :type definitions: list
+
+    :param max_parallel: Maximum number of scenarios to run in parallel.
+    :type max_parallel: int
+
+    :returns: Number of parallel scenario runs, at least 1.
+    :rtype: int
+    """
+    workers = max(1, min(max_parallel, len(definitions)))
+    memory = available_memory()
+    scenario_memory = max(
+        [estimated_scenario_memory(definition) for definition in definitions] + [0]
+    )
+    if memory and scenario_memory:
+        workers = min(workers, max(1, memory // scenario_memory))
+
+    return workers
+
+
+@dataclasses.dataclass
+class BatchRunSummary:
+    """Summary of the scenarios run by the batch runner."""
+
+    batch_directory: str
+    summaries: typing.List[ScenarioRunSummary] = dataclasses.field(default_factory=list)
+    comparison_path: str = ""
+
+    @property
+    def exit_code(self) -> ExitCode:
+        """Returns the exit code of the batch, which is the exit code of
+        the failed, cancelled or invalid scenarios in that order of
+        precedence.
+
+        :returns: Batch exit code.
+        :rtype: ExitCode
+        """
+        exit_codes = {summary.exit_code for summary in self.summaries}
+        for exit_code in (
+            ExitCode.FAILED,
+            ExitCode.CANCELLED,
+            ExitCode.INVALID_DEFINITION,
+        ):
+            if exit_code in exit_codes:
+                return exit_code
+
+        return ExitCode.SUCCESS
+
+    def to_dict(self) -> dict:
+        """Returns the batch summary attribute values.
+
+        :returns: Batch summary attribute values.
+        :rtype: dict
+        """
+        return {
+            "batch_directory": self.batch_directory,
+            "status": self.exit_code.name.lower(),
+            "exit_code": int(self.exit_code),
+            "comparison_path": self.comparison_path,
+            "scenarios": [summary.to_dict() for summary in self.summaries],
+        }
+
+    def save(self, path: str):
+        """Writes the batch summary as a JSON file.
+
+        :param path: Path of the summary file.
+        :type path: str
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            FileUtils.create_new_dir(directory)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(), f, cls=CustomJsonEncoder, indent=4)
+        os.replace(temp_path, path)
+
+
+def write_comparison_table(summaries: typing.List[ScenarioRunSummary], path: str):
+    """Writes a CSV table comparing the scenarios of a batch i.e. their
+    status, duration and the area of each activity in hectares.
+
+    :param summaries: Summaries of the scenario runs.
+    :type summaries: list
+
+    :param path: Path of the CSV file.
+    :type path: str
+    """
+    results = [
+        summary.scenario_result
+        for summary in summaries
+        if summary.scenario_result is not None
+    ]
+    table_info = ScenarioComparisonTableInfo(results)
+    activity_columns = [column.heading() for column in table_info.columns[1:]]
+
+    # Results whose layer could not be loaded have no row in the table
+    # contents, the signal is emitted once for each row that is added.
+    calculated_uuids = []
+    table_info.area_calculated.connect(
+        lambda area_info: calculated_uuids.append(area_info.identifier)
+    )
+    contents = table_info.contents()
+    area_rows = {
+        scenario_uuid: [cell.content() for cell in row[1:]]
+        for scenario_uuid, row in zip(calculated_uuids, contents)
+    }
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Scenario", "Status", "Duration (s)"] + activity_columns)
+        for summary in summaries:
+            scenario_result = summary.scenario_result
+            areas = []
+            if scenario_result is not None:
+                areas = area_rows.get(scenario_result.scenario.uuid, [])
+            status = summary.exit_code.name.lower()
+            if summary.preview:
+                status = f"{status} (preview)"
+            writer.writerow(
+                [summary.scenario_name, status, round(summary.duration, 3)] + areas
+            )
+
+
+def run_scenarios(
+    definitions: typing.List[ScenarioDefinition],
+    batch_directory: str = None,
+    max_parallel: int = 1,
+    save_result: bool = True,
+) -> BatchRunSummary:
+    """Runs the scenario analyses of several definitions, typically
+    variants of a scenario over the same area of interest.
+
+    The pathway and priority layers of the scenarios that share the
+    extent, study area and settings are preprocessed once and the
+    remaining stages of each scenario run in parallel where the
+    available memory allows it.
+
+    :param definitions: Scenario definitions.
+    :type definitions: list
+
+    :param batch_directory: Directory of the batch outputs, defaults to
+    a new directory in the plugin base directory.
+    :type batch_directory: str
+
+    :param max_parallel: Maximum number of scenarios to run in parallel.
+    :type max_parallel: int
+
+    :param save_result: Whether to save the scenarios and their results
+    in the plugin scenario history.
+    :type save_result: bool
+
+    :returns: Summary of the batch with a summary per scenario, which is
+    saved in the batch directory together with the comparison table.
+    :rtype: BatchRunSummary
+    """
+    summaries = [
+        ScenarioRunSummary(
+            definition.name, ExitCode.FAILED, started=datetime.datetime.now()
+        )
+        for definition in definitions
+    ]
+    # The plugin settings are restored once the batch completes
+    with preserved_settings(definitions) as plugin_settings:
+        tasks = {}
+        for index, definition in enumerate(definitions):
+            try:
+                activities = apply_definition(definition)
+                tasks[index] = create_analysis_task(
+                    definition, activities, plugin_settings
+                )
+            except ScenarioDefinitionError as e:
+                summaries[index].exit_code = ExitCode.INVALID_DEFINITION
+                summaries[index].error = str(e)
+                log(f"Invalid scenario definition {definition.name}, {e}", info=False)
+
+        if not batch_directory:
+            batch_directory = os.path.join(
+                settings_manager.get_value(Settings.BASE_DIR, default=""),
+                f'batch_{datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}',
+            )
+        FileUtils.create_new_dir(batch_directory)
+        batch_summary = BatchRunSummary(batch_directory, summaries)
+
+        for index, task in tasks.items():
+            task.scenario_directory = os.path.join(
+                batch_directory, f"{index + 1:02d}_{clean_filename(task.scenario.name)}"
+            )
+
+        valid_indexes = list(tasks)
+        for group_number, group in enumerate(
+            preprocessing_groups([definitions[index] for index in valid_indexes]), 1
+        ):
+            group_indexes = [valid_indexes[position] for position in group]
+            if len(group_indexes) < 2:
+                continue
+
+            group_definition = union_definition(
+                [definitions[index] for index in group_indexes],
+                f"preprocessing_{group_number}",
+            )
+            try:
+                preprocessing_task = create_analysis_task(
+                    group_definition,
+                    apply_definition(group_definition),
+                    plugin_settings,
+                )
+            except ScenarioDefinitionError as e:
+                log(f"Unable to preprocess the batch scenarios, {e}", info=False)
+                continue
+
+            preprocessing_task.scenario_directory = os.path.join(
+                batch_directory, group_definition.name
+            )
+            log(
+                f"Preprocessing the layers of {len(group_indexes)} scenarios "
+                f"in {preprocessing_task.scenario_directory}"
+            )
+            state = preprocessing_task.run_preprocessing()
+            if state is None:
+                log(
+                    "Preprocessing of the batch scenarios failed, the scenarios "
+                    "will preprocess their own layers.",
+                    info=False,
+                )
+                continue
+
+            for index in group_indexes:
+                tasks[index].use_preprocessed_state(state)
+
+        workers = batch_workers([definitions[index] for index in tasks], max_parallel)
+        log(f"Running {len(tasks)} scenarios with {workers} parallel runs")
+        if workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(run_analysis_task, task, summaries[index])
+                    for index, task in tasks.items()
+                ]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+        else:
+            for index, task in tasks.items():
+                run_analysis_task(task, summaries[index])
+
+    if save_result:
+        for summary in summaries:
+            save_scenario_history(summary)
+
+    batch_summary.comparison_path = os.path.join(
+        batch_directory, BATCH_COMPARISON_FILE_NAME
+    )
+    write_comparison_table(summaries, batch_summary.comparison_path)
+    batch_summary.save(os.path.join(batch_directory, SCENARIO_SUMMARY_FILE_NAME))
+
+    return batch_summary
+
+
+def init_qgis():
+    """Initializes a QGIS application without the user interface and
+    the processing framework, if there is no running QGIS application.
+
+    :returns: The QGIS application created or None if there was an
+    existing application.
+    :rtype: QgsApplication
+    """
+    if QgsApplication.instance() is not None:
+        return None
+
+    app = QgsApplication([], False)
+    app.initQgis()
+
+    plugins_path = os.path.join(QgsApplication.pkgDataPath(), "python", "plugins")
+    if plugins_path not in sys.path:
+        sys.path.append(plugins_path)
+    from processing.core.Processing import Processing
+
+    Processing.initialize()
+
+    return app
+
+
+def main(argv: typing.List[str] = None) -> int:
+    """Entry point of the headless scenario runner.
+
+    :param argv: Command line arguments, defaults to the arguments of
+    the current process.
+    :type argv: list
+
+    :returns: Exit code of the run.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description="Runs CPLUS scenario analyses without the QGIS interface."
+    )
+    parser.add_argument(
+        "definitions",
+        nargs="+",
+        help="Paths to the scenario definition files, several definitions "
+        "are run as a batch.",
+    )
+    parser.add_argument(
+        "--summary", help="Path to also write the run summary JSON file to."
+    )
+    parser.add_argument(
+        "--resume", help="Directory of an incomplete scenario analysis to resume."
+    )
+    parser.add_argument("--batch-directory", help="Directory of the batch outputs.")
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        help="Maximum number of batch scenarios to run in parallel.",
+    )
+    parser.add_argument(
+        "--preview",
+        type=int,
+        metavar="FACTOR",
+        help="Runs a coarse resolution preview with the layers downsampled "
+        "by the given factor.",
+    )
+    parser.add_argument(
+        "--no-history",
+        action="store_true",
+        help="Do not save the scenario results in the plugin scenario history.",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Print the plugin log messages."
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        definitions = [
+            ScenarioDefinition.load(definition) for definition in args.definitions
+        ]
+    except ScenarioDefinitionError as e:
+        print(e, file=sys.stderr)
+        return int(ExitCode.INVALID_DEFINITION)
+
+    if args.preview is not None:
+        if args.preview < 1:
+            print("Preview factor must be at least 1", file=sys.stderr)
+            return int(ExitCode.INVALID_DEFINITION)
+        for definition in definitions:
+            definition.preview_factor = args.preview
+
+    app = init_qgis()
+    if args.verbose:
+        QgsApplication.messageLog().messageReceived.connect(
+            lambda message, tag, level: print(f"[{tag}] {message}", file=sys.stderr)
+        )
+
+    try:
+        if len(definitions) > 1 or args.batch_directory:
+            summary = run_scenarios(
+                definitions,
+                batch_directory=args.batch_directory,
+                max_parallel=args.parallel,
+                save_result=not args.no_history,
+            )
+        else:
+            summary = run_scenario(
+                definitions[0],
+                resume_directory=args.resume,
+                save_result=not args.no_history,
+            )
+    finally:
+        if app is not None:
+            app.exitQgis()
+
+    if args.summary:
+        summary.save(args.summary)
+    print(json.dumps(summary.to_dict(), cls=CustomJsonEncoder, indent=4))
+
+    return int(summary.exit_code)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,597 @@
+# -*- coding: utf-8 -*-
+"""
+Per-run cache of the layer metadata used by the rule validators.
+"""
+
+import concurrent.futures
+import dataclasses
+import json
+import os
+from pathlib import Path
+import threading
+import typing
+
+import numpy as np
+from osgeo import gdal
+
+from qgis.core import (
+    QgsApplication,
+    QgsFeedback,
+    QgsRasterBandStats,
+    QgsRasterLayer,
+    QgsUnitTypes,
+)
+
+from ...conf import settings_manager, Settings
+from ...definitions.defaults import VALIDATION_CACHE_DIR_NAME
+from ...models.base import LayerModelComponent
+from ...utils import FileUtils, log
+
+
+@dataclasses.dataclass
+class LayerMetadata:
+    """Metadata of a layer required by the rule validators."""
+
+    name: str = ""
+    is_valid: bool = False
+    is_raster: bool = False
+    crs: typing.Optional[str] = None
+    is_geographic: bool = False
+    map_units: str = ""
+    resolution: typing.Optional[typing.Tuple[float, float]] = None
+    has_nodata: bool = False
+    nodata_value: typing.Optional[float] = None
+    extent: typing.Optional[typing.Tuple[float, float, float, float]] = None
+    data_type: typing.Optional[int] = None
+    minimum: typing.Optional[float] = None
+    maximum: typing.Optional[float] = None
+    has_statistics: bool = False
+    # False if the minimum and maximum only bound the values read
+    # before an out-of-range value was found, see read_value_range
+    statistics_exact: bool = False
+    # Metadata of default layers as provided by the CPLUS API
+    source_metadata: dict = dataclasses.field(default_factory=dict)
+
+
+# Number of pixels read at a time when scanning the band values
+VALUE_SCAN_PIXELS = 4 * 1024 * 1024
+
+
+def read_value_range(
+    path: str,
+    lower: float = 0.0,
+    upper: float = 1.0,
+    scan_pixels: int = VALUE_SCAN_PIXELS,
+) -> typing.Optional[typing.Tuple[float, float, bool]]:
+    """Determines the range of the values of the first band of a raster
+    relative to an expected range, avoiding a full scan where possible.
+
+    The checks are tiered:
+
+    1. Statistics stored with the raster are used if they fall outside
+       the expected range or, if exact, inside it.
+    2. Otherwise, the smallest overview is scanned and used if it has
+       values outside the expected range.
+    3. Otherwise, the full resolution band is scanned block by block,
+       stopping at the first block with a value outside the expected
+       range.
+
+    :param path: Path of the raster.
+    :type path: str
+
+    :param lower: Lower bound of the expected range.
+    :type lower: float
+
+    :param upper: Upper bound of the expected range.
+    :type upper: float
+
+    :param scan_pixels: Approximate number of pixels read at a time
+        when scanning the band.
+    :type scan_pixels: int
+
+    :returns: Tuple containing the minimum and maximum values and whether
+        they are the exact values of the band. The values are None if
+        the band only contains NoData. Returns None if the raster cannot
+        be read using GDAL.
+    :rtype: tuple
+    """
+    ds = gdal.Open(path, gdal.GA_ReadOnly)
+    if ds is None:
+        return None
+
+    band = ds.GetRasterBand(1)
+
+    # Stored statistics
+    stored_minimum = band.GetMetadataItem("STATISTICS_MINIMUM")
+    stored_maximum = band.GetMetadataItem("STATISTICS_MAXIMUM")
+    if stored_minimum is not None and stored_maximum is not None:
+        minimum, maximum = float(stored_minimum), float(stored_maximum)
+        exact = band.GetMetadataItem("STATISTICS_APPROXIMATE") != "YES"
+        if minimum < lower or maximum > upper or exact:
+            return minimum, maximum, exact
+
+    # Overview values
+    overview_count = band.GetOverviewCount()
+    if overview_count > 0:
+        overview = band.GetOverview(overview_count - 1)
+        try:
+            minimum, maximum = overview.ComputeRasterMinMax(False)
+            if minimum < lower or maximum > upper:
+                return minimum, maximum, False
+        except RuntimeError:
+            # Overview only contains NoData
+            pass
+
+    # Block-wise exact scan
+    nodata = band.GetNoDataValue()
+    x_size, y_size = band.XSize, band.YSize
+    block_rows = band.GetBlockSize()[1]
+    rows = block_rows * max(1, scan_pixels // max(1, x_size * block_rows))
+
+    minimum = maximum = None
+    for y_offset in range(0, y_size, rows):
+        values = band.ReadAsArray(0, y_offset, x_size, min(rows, y_size - y_offset))
+        valid = ~np.isnan(values) if values.dtype.kind == "f" else None
+        if nodata is not None:
+            nodata_mask = values != nodata
+            valid = nodata_mask if valid is None else valid & nodata_mask
+        if valid is not None:
+            values = values[valid]
+        if values.size == 0:
+            continue
+
+        block_minimum, block_maximum = float(values.min()), float(values.max())
+        minimum = block_minimum if minimum is None else min(minimum, block_minimum)
+        maximum = block_maximum if maximum is None else max(maximum, block_maximum)
+        if minimum < lower or maximum > upper:
+            return minimum, maximum, y_offset + rows >= y_size
+
+    return minimum, maximum, True
+
+
+class LayerMetadataStore:
+    """Persists the metadata of local layers across validation runs.
+
+    Entries are keyed by the normalized layer path and are only returned
+    if the size and modification time of the file are unchanged, so that
+    only new or modified files need to be examined again.
+    """
+
+    FILE_NAME = "layer_metadata.json"
+
+    # Incremented when the stored metadata fields change
+    VERSION = 2
+
+    def __init__(self, cache_dir: str = None):
+        """Initialize the store.
+
+        :param cache_dir: Directory of the store, defaults to the
+            validation_cache directory in the plugin base directory.
+        :type cache_dir: str
+        """
+        self._cache_dir = cache_dir
+        self._entries: typing.Optional[dict] = None
+        self._modified = False
+        self._lock = threading.RLock()
+
+    @property
+    def cache_dir(self) -> str:
+        """Returns the directory of the store, creating it if required.
+
+        :returns: Store directory path.
+        :rtype: str
+        """
+        cache_dir = self._cache_dir
+        if not cache_dir:
+            base_dir = settings_manager.get_value(Settings.BASE_DIR, default="")
+            if not base_dir:
+                base_dir = os.path.join(
+                    QgsApplication.qgisSettingsDirPath(), "cplus_plugin"
+                )
+            cache_dir = os.path.join(base_dir, VALIDATION_CACHE_DIR_NAME)
+        FileUtils.create_new_dir(cache_dir)
+
+        return cache_dir
+
+    @staticmethod
+    def file_identity(path: str) -> typing.Optional[typing.Tuple[int, float]]:
+        """Returns the size and modification time of a file.
+
+        :param path: File path.
+        :type path: str
+
+        :returns: Tuple of the size and modification time or None if the
+            file does not exist.
+        :rtype: tuple
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        return stat.st_size, stat.st_mtime
+
+    def _load(self) -> dict:
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        store_path = os.path.join(self.cache_dir, self.FILE_NAME)
+        if os.path.exists(store_path):
+            try:
+                with open(store_path, "r") as f:
+                    content = json.load(f)
+                if content.get("version") == self.VERSION:
+                    self._entries = content.get("layers", {})
+            except (OSError, ValueError, AttributeError) as ex:
+                log(f"Layer metadata cache is invalid, resetting it: {ex}")
+
+        return self._entries
+
+    def get(self, path: str) -> typing.Optional[LayerMetadata]:
+        """Returns the stored metadata of the layer at the given path if
+        the file has not changed since it was stored.
+
+        :param path: Layer path.
+        :type path: str
+
+        :returns: Stored layer metadata or None if there is no entry or
+            the file has changed.
+        :rtype: LayerMetadata
+        """
+        identity = self.file_identity(path)
+        if identity is None:
+            return None
+
+        with self._lock:
+            entry = self._load().get(os.path.normpath(path))
+
+        if entry is None or tuple(entry.get("identity", ())) != identity:
+            return None
+
+        metadata = LayerMetadata(**entry["metadata"])
+        for field in ("resolution", "extent"):
+            value = getattr(metadata, field)
+            if value is not None:
+                setattr(metadata, field, tuple(value))
+
+        return metadata
+
+    def put(self, path: str, metadata: LayerMetadata):
+        """Stores the metadata of a valid local layer.
+
+        :param path: Layer path.
+        :type path: str
+
+        :param metadata: Metadata of the layer.
+        :type metadata: LayerMetadata
+        """
+        identity = self.file_identity(path)
+        if identity is None or not metadata.is_valid:
+            return
+
+        with self._lock:
+            self._load()[os.path.normpath(path)] = {
+                "identity": list(identity),
+                "metadata": dataclasses.asdict(metadata),
+            }
+            self._modified = True
+
+    def save(self):
+        """Writes the entries to disk if they have been modified, dropping
+        those whose files no longer exist.
+        """
+        with self._lock:
+            if not self._modified:
+                return
+
+            entries = {
+                path: entry
+                for path, entry in self._load().items()
+                if os.path.exists(path)
+            }
+            store_path = os.path.join(self.cache_dir, self.FILE_NAME)
+            temp_path = f"{store_path}.tmp"
+            try:
+                with open(temp_path, "w") as f:
+                    json.dump({"version": self.VERSION, "layers": entries}, f)
+                os.replace(temp_path, store_path)
+            except OSError as ex:
+                log(f"Unable to save the layer metadata cache: {ex}", info=False)
+                return
+
+            self._entries = entries
+            self._modified = False
+
+
+class LayerMetadataCache:
+    """Reads the metadata of each layer once per validation run so that
+    all the rule validators can share it instead of reopening the layers.
+
+    Entries are indexed by the layer path and, for default layers, the
+    layer type of the default layer. If a persistent store is specified,
+    the metadata of local layers that have not changed since a previous
+    run is read from the store.
+    """
+
+    MAX_WORKERS = 4
+
+    def __init__(self, store: LayerMetadataStore = None):
+        self._metadata: typing.Dict[tuple, LayerMetadata] = {}
+        self._default_layers: typing.Dict[str, dict] = {}
+        self._store = store
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str, layer_type: str = "ncs_pathway") -> tuple:
+        if path.startswith("cplus://"):
+            return path, layer_type
+        return os.path.normpath(path), ""
+
+    def populate(
+        self,
+        model_components: typing.List[LayerModelComponent],
+        include_statistics: bool = False,
+        feedback: QgsFeedback = None,
+    ):
+        """Reads the metadata of the given model components in parallel.
+
+        :param model_components: Model components whose metadata will
+        be read.
+        :type model_components: list
+
+        :param include_statistics: True to also compute the minimum and
+        maximum band values of the raster layers.
+        :type include_statistics: bool
+
+        :param feedback: Feedback for checking whether the validation
+        has been cancelled.
+        :type feedback: QgsFeedback
+        """
+        pending = []
+        for model_component in model_components:
+            if model_component.is_default_layer():
+                # Already available in the settings
+                self.metadata(model_component)
+            elif self._stored_metadata(model_component.path, include_statistics):
+                continue
+            else:
+                pending.append(model_component)
+
+        if len(pending) == 0:
+            return
+
+        def _read(model_component: LayerModelComponent):
+            if feedback is not None and feedback.isCanceled():
+                return
+            self.metadata(model_component, include_statistics)
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(pending), os.cpu_count() or 1, self.MAX_WORKERS)
+        ) as executor:
+            futures = [executor.submit(_read, component) for component in pending]
+            for future in concurrent.futures.as_completed(futures):
+                exception = future.exception()
+                if exception is not None:
+                    log(f"Unable to read layer metadata: {exception}", info=False)
+
+        if self._store is not None:
+            self._store.save()
+
+    def _stored_metadata(
+        self, path: str, include_statistics: bool = False
+    ) -> typing.Optional[LayerMetadata]:
+        """Loads the metadata of a local layer from the persistent store
+        into the cache.
+
+        :param path: Layer path.
+        :type path: str
+
+        :param include_statistics: True if the stored metadata should
+        include the band statistics.
+        :type include_statistics: bool
+
+        :returns: Stored metadata or None if there is no store, no entry
+        or the entry is out of date.
+        :rtype: LayerMetadata
+        """
+        if self._store is None:
+            return None
+
+        metadata = self._store.get(path)
+        if metadata is None or (include_statistics and not metadata.has_statistics):
+            return None
+
+        with self._lock:
+            self._metadata[self._key(path)] = metadata
+
+        return metadata
+
+    def metadata(
+        self,
+        model_component: LayerModelComponent,
+        include_statistics: bool = False,
+    ) -> LayerMetadata:
+        """Returns the metadata of a model component's layer, reading it
+        if it has not been cached.
+
+        :param model_component: Model component whose metadata will
+        be returned.
+        :type model_component: LayerModelComponent
+
+        :param include_statistics: True to ensure the minimum and maximum
+        band values are included.
+        :type include_statistics: bool
+
+        :returns: Metadata of the model component's layer.
+        :rtype: LayerMetadata
+        """
+        if model_component.is_default_layer():
+            return self.default_layer_metadata(model_component.layer_uuid)
+
+        key = self._key(model_component.path)
+        with self._lock:
+            metadata = self._metadata.get(key)
+
+        if metadata is None or (include_statistics and not metadata.has_statistics):
+            metadata = self._stored_metadata(model_component.path, include_statistics)
+
+        if metadata is None:
+            layer = model_component.to_map_layer()
+            metadata = self._read_layer_metadata(layer, include_statistics)
+            metadata.name = Path(model_component.path).stem
+            with self._lock:
+                self._metadata[key] = metadata
+            if self._store is not None:
+                self._store.put(model_component.path, metadata)
+
+        return metadata
+
+    def path_metadata(
+        self, path: str, layer_type: str = "ncs_pathway"
+    ) -> LayerMetadata:
+        """Returns the metadata of the raster layer at the given path,
+        which can also refer to a default layer.
+
+        :param path: Path of the raster layer or 'cplus://' URI of a
+        default layer.
+        :type path: str
+
+        :param layer_type: Type of the default layer e.g. ncs_carbon.
+        :type layer_type: str
+
+        :returns: Metadata of the raster layer.
+        :rtype: LayerMetadata
+        """
+        if path.startswith("cplus://"):
+            return self.default_layer_metadata(path.replace("cplus://", ""), layer_type)
+
+        key = self._key(path)
+        with self._lock:
+            metadata = self._metadata.get(key)
+
+        if metadata is None:
+            metadata = self._stored_metadata(path)
+
+        if metadata is None:
+            metadata = self._read_layer_metadata(QgsRasterLayer(path))
+            metadata.name = Path(path).stem
+            with self._lock:
+                self._metadata[key] = metadata
+            if self._store is not None:
+                self._store.put(path, metadata)
+
+        return metadata
+
+    def default_layer_metadata(
+        self, layer_uuid: str, layer_type: str = "ncs_pathway"
+    ) -> LayerMetadata:
+        """Returns the metadata of a default layer provided by the
+        CPLUS API.
+
+        :param layer_uuid: UUID of the default layer.
+        :type layer_uuid: str
+
+        :param layer_type: Type of the default layer e.g. ncs_pathway.
+        :type layer_type: str
+
+        :returns: Metadata of the default layer.
+        :rtype: LayerMetadata
+        """
+        key = self._key(f"cplus://{layer_uuid}", layer_type)
+        with self._lock:
+            metadata = self._metadata.get(key)
+            if metadata is not None:
+                return metadata
+
+            if layer_type not in self._default_layers:
+                self._default_layers[layer_type] = settings_manager.get_default_layers(
+                    layer_type, as_dict=True
+                )
+            layer = self._default_layers[layer_type].get(layer_uuid) or {}
+            source_metadata = layer.get("metadata", {})
+
+            resolution = source_metadata.get("resolution")
+            metadata = LayerMetadata(
+                name=source_metadata.get("name", ""),
+                is_valid=True,
+                is_raster=source_metadata.get("is_raster", False),
+                crs=source_metadata.get("crs", None),
+                is_geographic=source_metadata.get("is_geographic", False),
+                map_units=source_metadata.get("unit", ""),
+                resolution=tuple(resolution[:2]) if resolution else None,
+                has_nodata="nodata_value" in source_metadata,
+                nodata_value=source_metadata.get("nodata_value"),
+                source_metadata=source_metadata,
+            )
+            self._metadata[key] = metadata
+
+        return metadata
+
+    @staticmethod
+    def _read_layer_metadata(
+        layer: typing.Optional[QgsRasterLayer], include_statistics: bool = False
+    ) -> LayerMetadata:
+        """Reads the metadata of a layer.
+
+        :param layer: Layer whose metadata will be read.
+        :type layer: QgsMapLayer
+
+        :param include_statistics: True to compute the minimum and maximum
+        values of the first band relative to the normalized range of
+        0 - 1, see read_value_range.
+        :type include_statistics: bool
+
+        :returns: Metadata of the layer.
+        :rtype: LayerMetadata
+        """
+        metadata = LayerMetadata()
+        if layer is None or not layer.isValid():
+            return metadata
+
+        metadata.is_valid = True
+        crs = layer.crs()
+        metadata.crs = crs.authid()
+        metadata.is_geographic = crs.isGeographic()
+        metadata.map_units = QgsUnitTypes.toAbbreviatedString(crs.mapUnits())
+        extent = layer.extent()
+        metadata.extent = (
+            extent.xMinimum(),
+            extent.yMinimum(),
+            extent.xMaximum(),
+            extent.yMaximum(),
+        )
+
+        if not isinstance(layer, QgsRasterLayer):
+            return metadata
+
+        metadata.is_raster = True
+        metadata.resolution = (
+            layer.rasterUnitsPerPixelX(),
+            layer.rasterUnitsPerPixelY(),
+        )
+        provider = layer.dataProvider()
+        metadata.data_type = int(provider.dataType(1))
+        metadata.has_nodata = provider.sourceHasNoDataValue(1)
+        if metadata.has_nodata:
+            metadata.nodata_value = provider.sourceNoDataValue(1)
+
+        if include_statistics:
+            value_range = None
+            if provider.name() == "gdal":
+                value_range = read_value_range(layer.source())
+
+            if value_range is None:
+                stats = provider.bandStatistics(
+                    1, QgsRasterBandStats.Stats.Min | QgsRasterBandStats.Stats.Max
+                )
+                value_range = stats.minimumValue, stats.maximumValue, True
+
+            (
+                metadata.minimum,
+                metadata.maximum,
+                metadata.statistics_exact,
+            ) = value_range
+            metadata.has_statistics = True
+
+        return metadata
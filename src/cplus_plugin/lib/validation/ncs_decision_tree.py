@@ -5,6 +5,9 @@ import os
 import tempfile
 import typing
 
+import numpy as np
+from osgeo import gdal
+
 from qgis.core import (
     QgsProcessingAlgorithm,
     QgsProcessingParameterString,
@@ -14,6 +17,7 @@ from qgis.core import (
     QgsProcessingParameterRasterDestination,
     QgsProcessingParameterEnum,
     QgsProcessingException,
+    QgsProcessingFeedback,
     QgsCoordinateReferenceSystem,
     QgsRectangle,
     QgsRasterLayer,
@@ -21,6 +25,7 @@ from qgis.core import (
 from qgis import processing
 
 from ...conf import settings_manager
+from ..remote_cache import remote_raster_cache
 from ...utils import tr, log
 from ...models.base import NcsPathway, NcsPathwayType
 
@@ -35,52 +40,43 @@ def _tmp_tif() -> str:
     return f.name
 
 
-def _calc(
-    expr: str,
-    a: QgsRasterLayer,
-    out_path: str,
-    b: typing.Optional[QgsRasterLayer] = None,
-    extent: typing.Optional[QgsRectangle] = None,
-) -> str:
-    """Thin wrapper around gdal:rastercalculator using refs a@1 and optional b@1."""
-    params = {
-        "EXPRESSION": expr,
-        "LAYERS": [a] if b is None else [a, b],
-        "CRS": a.crs().authid(),
-        "EXTENT": extent.toString() if extent else a.extent().toString(),
-        "OUTPUT": out_path,
-        "CELLSIZE": a.rasterUnitsPerPixelX(),  # assume square pixels post-warp
-    }
-    processing.run("gdal:rastercalculator", params)
-    return out_path
-
-
 def _warp_clip(
     src: str,
     crs: QgsCoordinateReferenceSystem,
     extent: QgsRectangle,
     pixel_size: float,
     nodata: int,
+    feedback: QgsProcessingFeedback = None,
 ) -> str:
     """
     Warp/clip a raster (file or URL) to the target CRS, extent, and pixel size.
+    The warp stops when the feedback is cancelled and its partial output
+    is deleted.
     """
     out = _tmp_tif()
-    processing.run(
-        "gdal:warpreproject",
-        {
-            "INPUT": src,
-            "SOURCE_CRS": None,
-            "TARGET_CRS": crs,
-            "RESAMPLING": 0,  # nearest
-            "NODATA": nodata,
-            "TARGET_RESOLUTION": pixel_size,
-            "TARGET_EXTENT": extent.toString(),
-            "DATA_TYPE": 6,  # Float32
-            "OUTPUT": out,
-            "MULTITHREADING": True,
-        },
-    )
+    try:
+        processing.run(
+            "gdal:warpreproject",
+            {
+                "INPUT": src,
+                "SOURCE_CRS": None,
+                "TARGET_CRS": crs,
+                "RESAMPLING": 0,  # nearest
+                "NODATA": nodata,
+                "TARGET_RESOLUTION": pixel_size,
+                "TARGET_EXTENT": extent.toString(),
+                "DATA_TYPE": 6,  # Float32
+                "OUTPUT": out,
+                "MULTITHREADING": True,
+            },
+            feedback=feedback,
+        )
+    except Exception:
+        _remove_files([out])
+        raise
+    if feedback and feedback.isCanceled():
+        _remove_files([out])
+        raise QgsProcessingException("NCS decision tree was cancelled.")
     return out
 
 
@@ -90,17 +86,21 @@ def _materialize(
     crs: QgsCoordinateReferenceSystem,
     pixel_size: float,
     nodata: int,
-) -> typing.Optional[QgsRasterLayer]:
+    feedback: QgsProcessingFeedback = None,
+    pinned_keys: typing.List[str] = None,
+) -> typing.Tuple[typing.Optional[str], bool]:
     """
     Turn a default/online pathway into a local clipped/warped GTiff.
-    Cache once per run to avoid repeated downloads.
-    """
-    cache_attr = "_tmp_local_raster"
-    cached = getattr(mc, cache_attr, None)
-    if cached and os.path.exists(cached):
-        lyr = QgsRasterLayer(cached, f"tmp_{getattr(mc, 'name', 'layer')}")
-        return lyr if lyr.isValid() else None
+    Windows of remote rasters are kept in the persistent remote raster
+    cache, local rasters are warped to a temporary file that the caller
+    should delete.
+
+    The cache entry of a remote raster is pinned and its key is appended
+    to pinned_keys, the caller should unpin it once the raster is closed.
 
+    :returns: Path of the warped raster, or None if it failed, and
+        whether the raster is a temporary file.
+    """
     # Try to resolve a file/URL
     src = getattr(mc, "source", None) or getattr(mc, "path", None)
     if not src and hasattr(mc, "to_map_layer"):
@@ -109,18 +109,39 @@ def _materialize(
             src = lyr0.source()
     if not src:
         log(f"DecisionTree: no source for '{getattr(mc,'name','?')}'")
-        return None
+        return None, False
+
+    cache_key = None
     if src.startswith("http"):
+        cache_key = remote_raster_cache.key(
+            src,
+            version=getattr(mc, "version", None),
+            crs=crs.authid(),
+            pixel_size=pixel_size,
+            extent=[
+                extent.xMinimum(),
+                extent.yMinimum(),
+                extent.xMaximum(),
+                extent.yMaximum(),
+            ],
+            nodata=nodata,
+        )
+        if pinned_keys is not None:
+            remote_raster_cache.pin(cache_key)
+            pinned_keys.append(cache_key)
+        cached = remote_raster_cache.get(cache_key)
+        if cached:
+            return cached, False
         src = f"/vsicurl/{src}"
 
     try:
-        out = _warp_clip(src, crs, extent, pixel_size, nodata)
+        out = _warp_clip(src, crs, extent, pixel_size, nodata, feedback)
     except Exception as ex:
         log(
             f"DecisionTree: warp failed for '{getattr(mc,'name','?')}': {ex}",
             info=False,
         )
-        return None
+        return None, False
 
     lyr = QgsRasterLayer(out, f"tmp_{getattr(mc, 'name', 'layer')}")
     if not lyr.isValid():
@@ -128,81 +149,268 @@ def _materialize(
             f"DecisionTree: invalid warped raster for '{getattr(mc,'name','?')}'",
             info=False,
         )
+        _remove_files([out])
+        return None, False
+
+    if cache_key:
         try:
-            os.remove(out)
-        except Exception:
-            pass
-        return None
+            return remote_raster_cache.put(cache_key, out, move=True), False
+        except OSError as ex:
+            log(f"DecisionTree: unable to cache '{out}': {ex}", info=False)
 
-    setattr(mc, cache_attr, out)
-    return lyr
+    return out, True
 
 
-def _calcN(
-    expr: str,
-    layers: typing.List[QgsRasterLayer],
-    out_path: str,
-    extent: QgsRectangle,
-    crs: QgsCoordinateReferenceSystem,
-    pixel_size: float,
-) -> str:
+def _remove_files(paths: typing.Iterable[str]):
+    """Delete temporary files, ignoring the ones that cannot be removed."""
+    for path in paths:
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+        except Exception as ex:
+            log(f"DecisionTree: unable to remove '{path}': {ex}", info=False)
+
+
+def _pathway_groups(pathway: NcsPathway) -> typing.List[str]:
     """
-    N-ary raster calculator using a@1, b@1, c@1... variable refs.
-    Layers must already be aligned (our _materialize does that).
+    Names of the sums that the pathway raster contributes to, i.e. its
+    biome presence group (C/W/G), its action x biome group (e.g. P_c)
+    and R_for for forest restore (used by the biodiversity rule).
     """
-    if not layers:
-        raise QgsProcessingException("No layers provided to raster calculator.")
-    params = {
-        "EXPRESSION": expr,
-        "LAYERS": layers,
-        "CRS": crs.authid(),
-        "EXTENT": extent.toString(),
-        "CELLSIZE": pixel_size,
-        "OUTPUT": out_path,
-    }
-    processing.run("gdal:rastercalculator", params)
-    return out_path
-
-
-def _mosaic_sum(
-    layers: typing.List[QgsRasterLayer],
-    crs: QgsCoordinateReferenceSystem,
-    extent: QgsRectangle,
-    pixel: float,
-) -> typing.Optional[QgsRasterLayer]:
+    # Biome grouping (prefer metadata; fallback on names)
+    biome = (getattr(pathway, "biome", None) or getattr(pathway, "name", "")).lower()
+    is_crop = "crop" in biome
+    is_wet = "wetland" in biome
+    is_grass_sav_shrub = any(k in biome for k in ("grass", "savanna", "shrub"))
+    is_forest = "forest" in biome
+
+    groups = []
+    if is_crop:
+        groups.append("C")
+    elif is_wet:
+        groups.append("W")
+    elif is_grass_sav_shrub:
+        groups.append("G")
+
+    biome_suffix = "c" if is_crop else "w" if is_wet else "o"
+    ptype = getattr(pathway, "pathway_type", None)
+    if ptype == NcsPathwayType.PROTECT:
+        groups.append(f"P_{biome_suffix}")
+    elif ptype == NcsPathwayType.MANAGE:
+        groups.append(f"M_{biome_suffix}")
+    elif ptype == NcsPathwayType.RESTORE:
+        groups.append(f"R_{biome_suffix}")
+        if is_forest:
+            groups.append("R_for")
+
+    return groups
+
+
+def _read_block(band, nodata: float, y_offset: int, rows: int) -> np.ndarray:
+    """Read a strip of rows as Float32, NoData and NaN pixels become 0."""
+    data = band.ReadAsArray(0, y_offset, band.XSize, rows).astype(np.float32)
+    data[~np.isfinite(data)] = 0
+    if nodata is not None:
+        data[data == nodata] = 0
+    return data
+
+
+def _enforce_rules(
+    sums: typing.Dict[str, np.ndarray], shape: typing.Tuple[int, int]
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Sum all input rasters, preserving magnitude (Float32).
-    If only one layer, just return it.
+    Apply the NCS base rules on a block of the summed pathway rasters.
+
+    Missing sums are treated as zero. Action magnitudes are preserved,
+    a "remove by" mask only zeroes the pixels where that mask is > 0.
+
+    :returns: Protect, Manage and Restore rasters of the block.
     """
-    if not layers:
-        return None
-    if len(layers) == 1:
-        return layers[0]
+    zero = np.zeros(shape, dtype=np.float32)
 
-    # Build "a@1 + b@1 + c@1 + ..."
-    letters = "abcdefghijklmnopqrstuvwxyz"
-    if len(layers) > len(letters):
-        raise QgsProcessingException("Too many layers to sum at once.")
-    expr = " + ".join([f"{letters[i]}@1" for i in range(len(layers))])
+    def s(name):
+        return sums.get(name, zero)
 
-    out_path = _tmp_tif()
-    _calcN(expr, layers, out_path, extent, crs, pixel)
-    lyr = QgsRasterLayer(out_path, "sum")
-    return lyr if lyr.isValid() else None
+    # 1 where the raster is absent (<= 0)
+    not_c = s("C") <= 0
+    not_w = s("W") <= 0
+    not_g = s("G") <= 0
 
+    actions = {}
+    for action in ("P", "M", "R"):
+        a_c, a_w, a_o = s(f"{action}_c"), s(f"{action}_w"), s(f"{action}_o")
 
-def _presence_mask(
-    layer: QgsRasterLayer,
-    extent: QgsRectangle,
+        # 1) Cropland supersedes others
+        after_crop = a_c + (a_w + a_o) * not_c
+
+        # 2) Wetlands supersede remaining others, but NOT croplands
+        actions[action] = a_c + a_w + after_crop * (a_c <= 0) * not_w
+
+    # 3) Biodiversity safeguard (forest restore cannot replace native
+    # grass/savanna/shrub)
+    r_for_after_cropwet = s("R_for") * not_c * not_w
+    r_for_after = r_for_after_cropwet * not_g
+    r_after_bio = actions["R"] * (r_for_after_cropwet <= 0) + r_for_after
+
+    # 4) Action hierarchy: Protect > Manage > Restore
+    p_final = actions["P"]
+    m_final = actions["M"] * (p_final <= 0)
+    r_final = r_after_bio * (p_final <= 0) * (m_final <= 0)
+
+    return p_final, m_final, r_final
+
+
+def run_ncs_decision_tree(
+    pathways: typing.List[NcsPathway],
+    output_paths: typing.Dict[int, str],
     crs: QgsCoordinateReferenceSystem,
-    pixel: float,
-) -> QgsRasterLayer:
+    extent: QgsRectangle,
+    pixel_size: float,
+    nodata: int,
+    feedback: QgsProcessingFeedback = None,
+    block_rows: int = 256,
+) -> typing.Dict[int, str]:
     """
-    1 where layer > 0, else 0
+    Enforce the NCS base rules on the pathways and write the action masks.
+
+    Each pathway is warped once to the target grid, then the warped rasters
+    are read block by block, each window once, and the rules are applied
+    in memory so only the requested action masks are written. The warped
+    temporary rasters are always deleted.
+
+    :param pathways: NCS pathways to apply the rules on.
+    :type pathways: list
+
+    :param output_paths: Output path of each requested action, keyed by
+        its index in ApplyNcsDecisionTreeAlgorithm.CHOICES_ACTION.
+    :type output_paths: dict
+
+    :param crs: Target CRS.
+    :type crs: QgsCoordinateReferenceSystem
+
+    :param extent: Target extent.
+    :type extent: QgsRectangle
+
+    :param pixel_size: Target pixel size in map units.
+    :type pixel_size: float
+
+    :param nodata: NoData value of the outputs.
+    :type nodata: int
+
+    :param feedback: Feedback for progress and cancellation.
+    :type feedback: QgsProcessingFeedback
+
+    :param block_rows: Number of rows read and written at a time.
+    :type block_rows: int
+
+    :returns: Output path of each action that has data, keyed by the
+        action index.
+    :rtype: dict
     """
-    out_path = _tmp_tif()
-    _calcN("(a@1) > 0", [layer], out_path, extent, crs, pixel)
-    return QgsRasterLayer(out_path, "presence")
+    materialized = []
+    # Cache entries of the remote rasters that are in use
+    pinned_keys = []
+    datasets = []
+    output_datasets = {}
+    try:
+        for pathway in pathways:
+            if feedback and feedback.isCanceled():
+                return {}
+            groups = _pathway_groups(pathway)
+            if not groups:
+                continue
+            path, temporary = _materialize(
+                pathway, extent, crs, pixel_size, nodata, feedback, pinned_keys
+            )
+            if not path:
+                log(f"DecisionTree: skip '{pathway.name}' (no raster)")
+                continue
+            if temporary:
+                materialized.append(path)
+            dataset = gdal.Open(path, gdal.GA_ReadOnly)
+            datasets.append((dataset, dataset.GetRasterBand(1), groups))
+
+        # Actions with at least one pathway
+        available = {
+            action_idx
+            for action_idx, prefix in enumerate(("P_", "M_", "R_"))
+            for _, _, groups in datasets
+            if any(group.startswith(prefix) for group in groups)
+        }
+        if not available:
+            raise QgsProcessingException(
+                "No action masks could be built (check inputs and pathways)."
+            )
+
+        reference = datasets[0][0]
+        x_size, y_size = reference.RasterXSize, reference.RasterYSize
+        driver = gdal.GetDriverByName("GTiff")
+        for action_idx, out_path in output_paths.items():
+            if action_idx not in available:
+                continue
+            out_ds = driver.Create(
+                out_path,
+                x_size,
+                y_size,
+                1,
+                gdal.GDT_Float32,
+                ["COMPRESS=DEFLATE", "TILED=YES", "BIGTIFF=IF_SAFER"],
+            )
+            out_ds.SetGeoTransform(reference.GetGeoTransform())
+            out_ds.SetProjection(reference.GetProjection())
+            out_ds.GetRasterBand(1).SetNoDataValue(nodata)
+            output_datasets[action_idx] = out_ds
+
+        for y_offset in range(0, y_size, block_rows):
+            if feedback and feedback.isCanceled():
+                break
+            rows = min(block_rows, y_size - y_offset)
+
+            sums = {}
+            for dataset, band, groups in datasets:
+                data = _read_block(band, band.GetNoDataValue(), y_offset, rows)
+                for group in groups:
+                    sums[group] = data if group not in sums else sums[group] + data
+
+            action_blocks = _enforce_rules(sums, (rows, x_size))
+            for action_idx, out_ds in output_datasets.items():
+                out_ds.GetRasterBand(1).WriteArray(
+                    action_blocks[action_idx], 0, y_offset
+                )
+
+            if feedback:
+                feedback.setProgress(100.0 * (y_offset + rows) / y_size)
+
+        cancelled = feedback is not None and feedback.isCanceled()
+        for out_ds in output_datasets.values():
+            out_ds.FlushCache()
+        # GDAL only closes a dataset once no reference to it or to its
+        # bands is left, including the loop variables
+        reference = dataset = band = out_ds = None
+        output_datasets.clear()
+        datasets.clear()
+        if cancelled:
+            _remove_files(output_paths.values())
+            return {}
+
+        return {
+            action_idx: out_path
+            for action_idx, out_path in output_paths.items()
+            if action_idx in available
+        }
+    finally:
+        # Close the datasets before deleting the temporary rasters
+        reference = dataset = band = out_ds = None
+        output_datasets.clear()
+        datasets.clear()
+        _remove_files(materialized)
+        if pinned_keys:
+            for cache_key in pinned_keys:
+                remote_raster_cache.unpin(cache_key)
+            try:
+                remote_raster_cache.trim()
+            except OSError as ex:
+                log(f"DecisionTree: unable to trim the raster cache: {ex}", info=False)
 
 
 # processing algo
@@ -303,169 +511,24 @@ class ApplyNcsDecisionTreeAlgorithm(QgsProcessingAlgorithm):
                 "No valid pathways provided for decision tree."
             )
 
-        # Materialize + group masks
-        cropland, wetlands, grass_sav_shrub = [], [], []
-
-        P_crops, M_crops, R_crops = [], [], []
-        P_wets, M_wets, R_wets = [], [], []
-        P_other, M_other, R_other = [], [], []
-
-        R_forest, R_nonforest = [], []  # for biodiversity safeguard
-
-        for p in pathways:
-            if feedback.isCanceled():
-                break
-
-            lyr = _materialize(p, extent, tgt_crs, pixel, nodata)
-            if not lyr:
-                log(f"DecisionTree: skip '{p.name}' (no raster)")
-                continue
-
-            # Biome grouping (prefer metadata; fallback on names)
-            biome = (getattr(p, "biome", None) or getattr(p, "name", "")).lower()
-            is_crop = "crop" in biome
-            is_wet = "wetland" in biome
-            is_grass_sav_shrub = any(k in biome for k in ("grass", "savanna", "shrub"))
-            is_forest = "forest" in biome
-
-            # populate biome lists (used to build presence masks C/W/G)
-            if is_crop:
-                cropland.append(lyr)
-            elif is_wet:
-                wetlands.append(lyr)
-            elif is_grass_sav_shrub:
-                grass_sav_shrub.append(lyr)
-
-            ptype = getattr(p, "pathway_type", None)
-
-            # action x biome grouping (keeps magnitudes)
-            if ptype == NcsPathwayType.PROTECT:
-                (P_crops if is_crop else P_wets if is_wet else P_other).append(lyr)
-            elif ptype == NcsPathwayType.MANAGE:
-                (M_crops if is_crop else M_wets if is_wet else M_other).append(lyr)
-            elif ptype == NcsPathwayType.RESTORE:
-                (R_crops if is_crop else R_wets if is_wet else R_other).append(lyr)
-                # track forest restore specifically (for biodiversity rule)
-                (R_forest if is_forest else R_nonforest).append(lyr)
-
-        # Build presence masks C/W/G from populated biome lists
-        C_sum = _mosaic_sum(cropland, tgt_crs, extent, pixel)
-        W_sum = _mosaic_sum(wetlands, tgt_crs, extent, pixel)
-        G_sum = _mosaic_sum(grass_sav_shrub, tgt_crs, extent, pixel)
-
-        C = _presence_mask(C_sum, extent, tgt_crs, pixel) if C_sum else None
-        W = _presence_mask(W_sum, extent, tgt_crs, pixel) if W_sum else None
-        G = _presence_mask(G_sum, extent, tgt_crs, pixel) if G_sum else None
-
-        P_c = _mosaic_sum(P_crops, tgt_crs, extent, pixel)
-        P_w = _mosaic_sum(P_wets, tgt_crs, extent, pixel)
-        P_o = _mosaic_sum(P_other, tgt_crs, extent, pixel)
-
-        M_c = _mosaic_sum(M_crops, tgt_crs, extent, pixel)
-        M_w = _mosaic_sum(M_wets, tgt_crs, extent, pixel)
-        M_o = _mosaic_sum(M_other, tgt_crs, extent, pixel)
-
-        R_c = _mosaic_sum(R_crops, tgt_crs, extent, pixel)
-        R_w = _mosaic_sum(R_wets, tgt_crs, extent, pixel)
-        R_o = _mosaic_sum(R_other, tgt_crs, extent, pixel)
-
-        R_for = _mosaic_sum(R_forest, tgt_crs, extent, pixel)
-        R_non = _mosaic_sum(R_nonforest, tgt_crs, extent, pixel)
-
-        # Short-circuit if nothing
-        if not any([P_c, P_w, P_o, M_c, M_w, M_o, R_c, R_w, R_o]):
-            raise QgsProcessingException(
-                "No action masks could be built (check inputs and pathways)."
-            )
-
-        # ---------- ENFORCEMENT ORDER ----------
-        # Helpers
-        def _minus(
-            mask: QgsRasterLayer, by: typing.Optional[QgsRasterLayer]
-        ) -> typing.Optional[QgsRasterLayer]:
-            """Subtract 'by' mask from 'mask' (1 - (b>0)),
-            preserving magnitude of 'mask'.
-            """
-            if mask is None:
-                return None
-            if by is None:
-                return mask
-            out = _tmp_tif()
-            _calc("(a@1) * (1 - (b@1 > 0))", mask, out, b=by, extent=extent)
-            return QgsRasterLayer(out, "tmp")
-
-        # Helper to sum a few aligned rasters
-        def _sum_layers(*layers):
-            L = [lyr for lyr in layers if lyr is not None]
-            return _mosaic_sum(L, tgt_crs, extent, pixel) if L else None
-
-        # 1) Cropland supersedes others:
-        #    - keep cropland actions (P_c/M_c/R_c)
-        #    - remove NON-cropland actions wherever C == 1
-        P_after_crop = _sum_layers(P_c, _minus(P_w, C), _minus(P_o, C))
-        M_after_crop = _sum_layers(M_c, _minus(M_w, C), _minus(M_o, C))
-        R_after_crop = _sum_layers(R_c, _minus(R_w, C), _minus(R_o, C))
-
-        # 2) Wetlands supersede remaining others, but NOT croplands
-        P_after_wet = _sum_layers(
-            P_c,  # keep cropland
-            P_w,  # keep wetlands
-            _minus(
-                _minus(P_after_crop, P_c), W
-            ),  # from post-crop, remove cropland then wetlands
-        )
-
-        M_after_wet = _sum_layers(M_c, M_w, _minus(_minus(M_after_crop, M_c), W))
-
-        R_after_wet = _sum_layers(R_c, R_w, _minus(_minus(R_after_crop, R_c), W))
+        # Single output path
+        out_path = self.parameterAsOutputLayer(params, self.O_SELECTED, context)
 
-        # 3) Biodiversity safeguard (forest restore cannot replace native grass/savanna/shrub)
-        R_for_after_cropwet = _sum_layers(_minus(R_for, C), None)  # remove cropland
-        R_for_after_cropwet = (
-            _minus(R_for_after_cropwet, W) if R_for_after_cropwet else None
+        results = run_ncs_decision_tree(
+            pathways,
+            {sel_idx: out_path},
+            tgt_crs,
+            extent,
+            pixel,
+            nodata,
+            feedback,
         )
-
-        # Apply the G mask to that slice (removing any forest-restore on native G/S/S)
-        R_for_after = _minus(R_for_after_cropwet, G) if R_for_after_cropwet else None
-
-        # Recombine: takes R_after_wet, removes the pre-G forest slice
-        # and adds the G-filtered slice back
-        R_after_bio = _sum_layers(_minus(R_after_wet, R_for_after_cropwet), R_for_after)
-
-        # 4) Action hierarchy: Protect > Manage > Restore
-        P_final = P_after_wet
-        M_final = _minus(M_after_wet, P_final) if M_after_wet else None
-        R_tmp = _minus(R_after_bio, P_final) if R_after_bio else None
-        R_final = _minus(R_tmp, M_final) if (R_tmp and M_final) else R_tmp
-
-        # Select the one action to output
-        if sel_idx == 0:
-            selected_layer = P_final
-        elif sel_idx == 1:
-            selected_layer = M_final
-        else:
-            selected_layer = R_final
-
-        if selected_layer is None:
+        if feedback.isCanceled():
+            return {}
+        if sel_idx not in results:
             raise QgsProcessingException(
                 f"No data available for selected action: {selected_name}"
             )
 
-        # Single output path
-        out_path = self.parameterAsOutputLayer(params, self.O_SELECTED, context)
-
-        # Save the selected mask (Byte, with NoData)
-        processing.run(
-            "gdal:translate",
-            {
-                "INPUT": selected_layer,
-                "TARGET_CRS": tgt_crs,
-                "NODATA": nodata,
-                "DATA_TYPE": 6,
-                "COPY_SUBDATASETS": False,
-                "OUTPUT": out_path,
-            },
-        )
-
         log(f"DecisionTree: wrote '{selected_name}' mask to {out_path}")
         return {self.O_SELECTED: out_path}
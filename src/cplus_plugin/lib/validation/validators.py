@@ -4,12 +4,14 @@ Aggregated and individual rule validators.
 """
 
 from abc import abstractmethod
+import concurrent.futures
+import os
 from pathlib import Path
 import traceback
 import typing
 
+from qgis.PyQt import QtCore
 from qgis.core import (
-    QgsRasterBandStats,
     QgsRasterLayer,
     QgsTask,
     QgsUnitTypes,
@@ -27,6 +29,7 @@ from .configs import (
     resolution_validation_config,
 )
 from .feedback import ValidationFeedback
+from .metadata import LayerMetadata, LayerMetadataCache, LayerMetadataStore
 from ...models.base import LayerModelComponent, ModelComponentType, NcsPathway
 from ...models.validation import (
     RuleConfiguration,
@@ -48,11 +51,15 @@ class BaseRuleValidator:
     protected function.
     """
 
+    # Whether the rule requires the band statistics of the layers
+    REQUIRES_STATISTICS = False
+
     def __init__(self, configuration: RuleConfiguration, feedback: ValidationFeedback):
         self._config = configuration
         self._feedback = feedback
         self._result: RuleResult = None
         self.model_components: typing.List[LayerModelComponent] = list()
+        self.metadata_cache: LayerMetadataCache = None
 
     @property
     def rule_configuration(self) -> RuleConfiguration:
@@ -93,6 +100,16 @@ class BaseRuleValidator:
         """
         return self._feedback
 
+    @feedback.setter
+    def feedback(self, feedback: ValidationFeedback):
+        """Sets the feedback object used in the validator e.g. a feedback
+        object for this rule only when the rules are run concurrently.
+
+        :param feedback: Feedback object for the rule validation.
+        :type feedback: ValidationFeedback
+        """
+        self._feedback = feedback
+
     @abstractmethod
     def _validate(self) -> bool:
         """Initiates the validation process.
@@ -183,6 +200,24 @@ class BaseRuleValidator:
         layer_metadata = layer.get("metadata", {})
         return layer_metadata
 
+    def layer_metadata(self, model_component: LayerModelComponent) -> LayerMetadata:
+        """Returns the metadata of the model component's layer from the
+        metadata cache shared by the rule validators.
+
+        A cache for this validator is created if none has been shared.
+
+        :param model_component: Model component whose metadata will
+        be returned.
+        :type model_component: LayerModelComponent
+
+        :returns: Metadata of the model component's layer.
+        :rtype: LayerMetadata
+        """
+        if self.metadata_cache is None:
+            self.metadata_cache = LayerMetadataCache()
+
+        return self.metadata_cache.metadata(model_component, self.REQUIRES_STATISTICS)
+
 
 BaseRuleValidatorType = typing.TypeVar("BaseRuleValidatorType", bound=BaseRuleValidator)
 
@@ -211,22 +246,13 @@ class RasterValidator(BaseRuleValidator):
             if self.feedback.isCanceled():
                 return False
 
-            is_valid = model_component.is_valid()
-            if not is_valid:
+            layer_metadata = self.layer_metadata(model_component)
+            if not layer_metadata.is_valid:
                 if status:
                     status = False
                 non_raster_model_components.append(model_component.name)
-            else:
-                if model_component.is_default_layer():
-                    layer_metadata = self.get_default_layer_metadata(
-                        model_component.layer_uuid
-                    )
-                    if not layer_metadata.get("is_raster", False):
-                        non_raster_model_components.append(model_component.name)
-                else:
-                    layer = model_component.to_map_layer().clone()
-                    if not isinstance(layer, QgsRasterLayer):
-                        non_raster_model_components.append(model_component.name)
+            elif not layer_metadata.is_raster:
+                non_raster_model_components.append(model_component.name)
 
             progress += progress_increment
             self._set_progress(progress)
@@ -299,8 +325,8 @@ class CrsValidator(BaseRuleValidator):
             if self.feedback.isCanceled():
                 return False
 
-            is_valid = model_component.is_valid()
-            if not is_valid:
+            layer_metadata = self.layer_metadata(model_component)
+            if not layer_metadata.is_valid:
                 if status:
                     status = False
 
@@ -312,16 +338,8 @@ class CrsValidator(BaseRuleValidator):
                     crs_definitions[invalid_msg] = [model_component.name]
 
             else:
-                if model_component.is_default_layer():
-                    layer_metadata = self.get_default_layer_metadata(
-                        model_component.layer_uuid
-                    )
-                    crs = layer_metadata.get("crs", None)
-                else:
-                    layer = model_component.to_map_layer().clone()
-                    crs = layer.crs()
-
-                if crs is None:
+                crs_id = layer_metadata.crs
+                if crs_id is None:
                     # Flag that there is at least one dataset with an undefined CRS
                     if not has_undefined:
                         has_undefined = True
@@ -335,10 +353,6 @@ class CrsValidator(BaseRuleValidator):
                     else:
                         crs_definitions[undefined_msg] = [model_component.name]
                 else:
-                    if model_component.is_default_layer():
-                        crs_id = crs
-                    else:
-                        crs_id = crs.authid()
                     if crs_id in crs_definitions:
                         layers = crs_definitions.get(crs_id)
                         layers.append(model_component.name)
@@ -449,11 +463,12 @@ class ProjectedCrsValidator(BaseRuleValidator):
             if self.feedback.isCanceled():
                 return False
 
-            if not model_component.is_valid():
+            layer_metadata = self.layer_metadata(model_component)
+            if not layer_metadata.is_valid:
                 status = False
                 crs_definitions.setdefault(invalid_msg, []).append(model_component.name)
             else:
-                crs, is_geographic = self._get_crs_and_type(model_component)
+                crs, is_geographic = layer_metadata.crs, layer_metadata.is_geographic
 
                 if crs is None:
                     status = False
@@ -506,27 +521,6 @@ class ProjectedCrsValidator(BaseRuleValidator):
 
         return status
 
-    def _get_crs_and_type(
-        self, model_component
-    ) -> typing.Tuple[typing.Optional[str], bool]:
-        """Retrieve the CRS and its type (geographic or not) for a model component.
-
-        :param model_component: The model component to analyze.
-        :type model_component: LayerModelComponent
-
-        :returns: A tuple containing the CRS ID (or None) and a boolean indicating if it is geographic.
-        :rtype: tuple
-        """
-        if model_component.is_default_layer():
-            layer_metadata = self.get_default_layer_metadata(model_component.layer_uuid)
-            return layer_metadata.get("crs", None), layer_metadata.get(
-                "is_geographic", False
-            )
-        else:
-            layer = model_component.to_map_layer().clone()
-            crs = layer.crs()
-            return crs.authid() if crs else None, crs.isGeographic() if crs else False
-
     def _generate_summary_and_info(
         self, status: bool, crs: str, crs_definitions: dict
     ) -> typing.Tuple[str, list]:
@@ -602,8 +596,8 @@ class NoDataValueValidator(BaseRuleValidator):
             if self.feedback.isCanceled():
                 return False
 
-            is_valid = model_component.is_valid()
-            if not is_valid:
+            layer_metadata = self.layer_metadata(model_component)
+            if not layer_metadata.is_valid:
                 if status:
                     status = False
 
@@ -616,30 +610,14 @@ class NoDataValueValidator(BaseRuleValidator):
                     no_data_definitions[invalid_msg] = [model_component.name]
 
             else:
-                if model_component.is_default_layer():
-                    layer_metadata = self.get_default_layer_metadata(
-                        model_component.layer_uuid
-                    )
-                    if not layer_metadata.get("is_raster", False):
-                        continue
-                else:
-                    layer = model_component.to_map_layer().clone()
-                    if not isinstance(layer, QgsRasterLayer):
-                        continue
+                if not layer_metadata.is_raster:
+                    continue
 
                 # If band does not have NoData value then exclude from validation
-                if model_component.is_default_layer():
-                    if "nodata_value" not in layer_metadata:
-                        continue
-                else:
-                    raster_provider = layer.dataProvider()
-                    if not raster_provider.sourceHasNoDataValue(1):
-                        continue
+                if not layer_metadata.has_nodata:
+                    continue
 
-                if model_component.is_default_layer():
-                    no_data_value = layer_metadata["nodata_value"]
-                else:
-                    no_data_value = raster_provider.sourceNoDataValue(1)
+                no_data_value = layer_metadata.nodata_value
                 if no_data_value != analysis_nodata_value:
                     if no_data_value in no_data_definitions:
                         layers = no_data_definitions.get(no_data_value)
@@ -738,8 +716,8 @@ class ResolutionValidator(BaseRuleValidator):
             if self.feedback.isCanceled():
                 return False
 
-            is_valid = model_component.is_valid()
-            if not is_valid:
+            layer_metadata = self.layer_metadata(model_component)
+            if not layer_metadata.is_valid:
                 if status:
                     status = False
 
@@ -752,25 +730,12 @@ class ResolutionValidator(BaseRuleValidator):
                     spatial_resolution_definitions[invalid_msg] = [model_component.name]
 
             else:
-                if model_component.is_default_layer():
-                    layer_metadata = self.get_default_layer_metadata(
-                        model_component.layer_uuid
-                    )
-                    if not layer_metadata.get("is_raster", False):
-                        continue
-                else:
-                    layer = model_component.to_map_layer().clone()
-                    if not isinstance(layer, QgsRasterLayer):
-                        continue
+                if not layer_metadata.is_raster:
+                    continue
 
-                if model_component.is_default_layer():
-                    resolution_definition = (
-                        round(layer_metadata["resolution"][0], self.DECIMAL_PLACES),
-                        round(layer_metadata["resolution"][1], self.DECIMAL_PLACES),
-                        layer_metadata["unit"],
-                    )
-                else:
-                    resolution_definition = self.create_resolution_definition(layer)
+                resolution_definition = self.metadata_resolution_definition(
+                    layer_metadata
+                )
                 if resolution_definition in spatial_resolution_definitions:
                     layers = spatial_resolution_definitions.get(resolution_definition)
                     layers.append(model_component.name)
@@ -844,6 +809,25 @@ class ResolutionValidator(BaseRuleValidator):
         )
         return resolution_definition
 
+    @classmethod
+    def metadata_resolution_definition(cls, layer_metadata: LayerMetadata) -> tuple:
+        """Creates a resolution definition tuple from the metadata of
+        a raster layer.
+
+        :param layer_metadata: Metadata of the raster layer.
+        :type layer_metadata: LayerMetadata
+
+        :returns: Tuple containing x and y resolutions as well
+        as the units.
+        :rtype: tuple
+        """
+        x_resolution, y_resolution = layer_metadata.resolution
+        return (
+            round(x_resolution, cls.DECIMAL_PLACES),
+            round(y_resolution, cls.DECIMAL_PLACES),
+            layer_metadata.map_units,
+        )
+
     @classmethod
     def resolution_definition_to_str(cls, resolution_definition: tuple) -> str:
         """Formats the resolution definition to a friendly-display string.
@@ -903,8 +887,8 @@ class CarbonLayerResolutionValidator(ResolutionValidator):
             if self.feedback.isCanceled():
                 return False
 
-            is_valid = model_component.is_valid()
-            if not is_valid:
+            ncs_layer_metadata = self.layer_metadata(model_component)
+            if not ncs_layer_metadata.is_valid:
                 if status:
                     status = False
 
@@ -917,76 +901,40 @@ class CarbonLayerResolutionValidator(ResolutionValidator):
                     carbon_resolution_definitions[invalid_msg] = [model_component.name]
 
             else:
-                if model_component.is_default_layer():
-                    ncs_layer_metadata = self.get_default_layer_metadata(
-                        model_component.layer_uuid
-                    )
-                    if not ncs_layer_metadata.get("is_raster", False):
-                        continue
-                else:
-                    ncs_layer = model_component.to_map_layer().clone()
-                    if not isinstance(ncs_layer, QgsRasterLayer):
-                        continue
+                if not ncs_layer_metadata.is_raster:
+                    continue
 
                 # Check if the model component is an NcsPathway
                 if not isinstance(model_component, NcsPathway):
                     continue
 
-                if model_component.is_default_layer():
-                    ncs_resolution_definition = (
-                        round(ncs_layer_metadata["resolution"][0], self.DECIMAL_PLACES),
-                        round(ncs_layer_metadata["resolution"][1], self.DECIMAL_PLACES),
-                        ncs_layer_metadata["unit"],
-                    )
-                else:
-                    ncs_resolution_definition = self.create_resolution_definition(
-                        ncs_layer
-                    )
+                ncs_resolution_definition = self.metadata_resolution_definition(
+                    ncs_layer_metadata
+                )
 
                 # Loop through the spatial resolution of each carbon path
                 for carbon_path in model_component.carbon_paths:
-                    if carbon_path.startswith("cplus://"):
-                        layer_uuid = carbon_path.replace("cplus://", "")
-                        carbon_layer_metadata = self.get_default_layer_metadata(
-                            layer_uuid, "ncs_carbon"
-                        )
-                    else:
-                        layer = QgsRasterLayer(carbon_path)
-                        if not layer.isValid():
-                            if model_component.name in carbon_resolution_definitions:
-                                carbon_definitions = carbon_resolution_definitions.get(
-                                    model_component.name
-                                )
-                                carbon_definitions.append(invalid_carbon_msg)
-                            else:
-                                carbon_resolution_definitions[model_component.name] = [
-                                    invalid_carbon_msg
-                                ]
-                            continue
-
-                    if carbon_path.startswith("cplus://"):
-                        carbon_resolution_definition = (
-                            round(
-                                carbon_layer_metadata["resolution"][0],
-                                self.DECIMAL_PLACES,
-                            ),
-                            round(
-                                carbon_layer_metadata["resolution"][1],
-                                self.DECIMAL_PLACES,
-                            ),
-                            carbon_layer_metadata["unit"],
-                        )
-                    else:
-                        carbon_layer = layer.clone()
-                        carbon_resolution_definition = (
-                            self.create_resolution_definition(carbon_layer)
-                        )
+                    carbon_layer_metadata = self.metadata_cache.path_metadata(
+                        carbon_path, "ncs_carbon"
+                    )
+                    if not carbon_layer_metadata.is_valid:
+                        if model_component.name in carbon_resolution_definitions:
+                            carbon_definitions = carbon_resolution_definitions.get(
+                                model_component.name
+                            )
+                            carbon_definitions.append(invalid_carbon_msg)
+                        else:
+                            carbon_resolution_definitions[model_component.name] = [
+                                invalid_carbon_msg
+                            ]
+                        continue
 
-                    if carbon_path.startswith("cplus://"):
-                        layer_name = carbon_layer_metadata["name"]
-                    else:
-                        # We will use the file name to represent the layer name
-                        layer_name = Path(carbon_layer.source()).stem
+                    carbon_resolution_definition = self.metadata_resolution_definition(
+                        carbon_layer_metadata
+                    )
+
+                    # For local layers, the file name represents the layer name
+                    layer_name = carbon_layer_metadata.name
 
                     if ncs_resolution_definition != carbon_resolution_definition:
                         if model_component.name in carbon_resolution_definitions:
@@ -1050,6 +998,8 @@ class NormalizedValidator(BaseRuleValidator):
     range 0 - 1.
     """
 
+    REQUIRES_STATISTICS = True
+
     def _validate(self) -> bool:
         """Checks whether the value range is between 0 and 1
         for the input raster datasets.
@@ -1073,41 +1023,32 @@ class NormalizedValidator(BaseRuleValidator):
             if self.feedback.isCanceled():
                 return False
 
-            is_valid = model_component.is_valid()
-            if not is_valid:
+            layer_metadata = self.layer_metadata(model_component)
+            if not layer_metadata.is_valid:
                 if status:
                     status = False
                 invalid_model_components.append(model_component.name)
             else:
                 if model_component.is_default_layer():
-                    layer_metadata = self.get_default_layer_metadata(
-                        model_component.layer_uuid
-                    )
                     # TODO: Proposed attribute in CPLUS API
-                    if "has_range" not in layer_metadata:
+                    if "has_range" not in layer_metadata.source_metadata:
                         continue
 
                     # TODO: CPLUS API to consider additional
                     #  attributes to check / get
                     pass
                 else:
-                    layer = model_component.to_map_layer().clone()
-                    if not isinstance(layer, QgsRasterLayer):
+                    if not layer_metadata.is_raster:
                         invalid_model_components.append(model_component.name)
                         continue
 
-                    raster_provider = layer.dataProvider()
-                    raster_stats = raster_provider.bandStatistics(
-                        1, QgsRasterBandStats.Stats.Min | QgsRasterBandStats.Stats.Max
-                    )
-
-                    if (
-                        raster_stats.minimumValue < 0.0
-                        or raster_stats.maximumValue > 1.0
+                    # No minimum or maximum if the layer only has NoData
+                    if layer_metadata.minimum is not None and (
+                        layer_metadata.minimum < 0.0 or layer_metadata.maximum > 1.0
                     ):
                         outside_range_model_components[model_component.name] = (
-                            raster_stats.minimumValue,
-                            raster_stats.maximumValue,
+                            layer_metadata.minimum,
+                            layer_metadata.maximum,
                         )
 
             progress += progress_increment
@@ -1169,6 +1110,9 @@ class DataValidator(QgsTask):
     NAME = "Default Data Validator"
     MODEL_COMPONENT_TYPE = ModelComponentType.UNKNOWN
 
+    # Whether the layer metadata is persisted across validation runs
+    PERSIST_LAYER_METADATA = False
+
     def __init__(self, model_components=None):
         super().__init__(tr(self.NAME))
 
@@ -1181,12 +1125,12 @@ class DataValidator(QgsTask):
         self._applicable_rule_validators = []
         self._feedback = ValidationFeedback()
         self._feedback.rule_progress_changed.connect(self._on_rule_progress_changed)
-        self._feedback.rule_validation_completed.connect(
-            self._on_rule_validation_completed
-        )
 
-        # Used to calculate the overall progress
-        self._rule_reference_progress = 0
+        # Progress of each rule, used to calculate the overall progress
+        self._rule_progress: typing.Dict[RuleType, float] = {}
+
+        # Layer metadata shared by the rule validators
+        self._metadata_cache = LayerMetadataCache()
 
     @property
     def feedback(self) -> ValidationFeedback:
@@ -1224,47 +1168,107 @@ class DataValidator(QgsTask):
             self.log(msg, False)
             return False
 
-        for i, rule_validator in enumerate(self._applicable_rule_validators):
-            if self.isCanceled():
-                status = False
-                break
+        # Open each layer once, in parallel, and let the rule validators
+        # evaluate against the cached metadata. Unchanged layers from
+        # previous runs are not reopened if the metadata is persisted.
+        self._metadata_cache = LayerMetadataCache(
+            LayerMetadataStore() if self.PERSIST_LAYER_METADATA else None
+        )
+        self._metadata_cache.populate(
+            self.model_components,
+            any(
+                validator.REQUIRES_STATISTICS
+                for validator in self._applicable_rule_validators
+            ),
+            self.feedback,
+        )
 
+        # Run the rules concurrently, each with its own feedback object
+        # and result. The results are merged once all the rules have
+        # finished.
+        self._rule_progress = {}
+        for rule_validator in self._applicable_rule_validators:
             rule_validator.model_components = self.model_components
-            rule_info = RuleInfo(
-                rule_validator.rule_type, rule_validator.rule_configuration.rule_name
-            )
-            self.feedback.current_rule = rule_info
-            rule_validator.run()
+            rule_validator.metadata_cache = self._metadata_cache
+            rule_validator.feedback = self._create_rule_feedback(rule_validator)
+
+        def _run(rule_validator: BaseRuleValidator) -> bool:
+            if self.isCanceled():
+                return False
+            return rule_validator.run()
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(self._applicable_rule_validators), os.cpu_count() or 1)
+        ) as executor:
+            futures = {
+                executor.submit(_run, rule_validator): rule_validator
+                for rule_validator in self._applicable_rule_validators
+            }
+            for future in concurrent.futures.as_completed(futures):
+                exception = future.exception()
+                if exception is not None:
+                    rule_name = futures[future].rule_configuration.rule_name
+                    self.log(f"{rule_name} - {exception}", False)
+                    status = False
+
+        if self.isCanceled():
+            status = False
 
         return status
 
-    def _on_rule_progress_changed(self, rule_type: RuleType, rule_progress: float):
+    def _create_rule_feedback(
+        self, rule_validator: BaseRuleValidator
+    ) -> ValidationFeedback:
+        """Creates the feedback object of a rule validator whose updates are
+        relayed to the feedback object of the data validator.
+
+        :param rule_validator: Rule validator that will use the feedback.
+        :type rule_validator: BaseRuleValidator
+
+        :returns: Feedback object for the rule validation.
+        :rtype: ValidationFeedback
+        """
+        rule_feedback = ValidationFeedback()
+        rule_feedback.current_rule = RuleInfo(
+            rule_validator.rule_type, rule_validator.rule_configuration.rule_name
+        )
+        rule_feedback.rule_validation_started.connect(
+            self._feedback.rule_validation_started
+        )
+        rule_feedback.rule_progress_changed.connect(
+            self._feedback.rule_progress_changed
+        )
+        rule_feedback.rule_validation_completed.connect(
+            self._feedback.rule_validation_completed
+        )
+        self._feedback.canceled.connect(
+            rule_feedback.cancel, QtCore.Qt.ConnectionType.DirectConnection
+        )
+
+        return rule_feedback
+
+    def _on_rule_progress_changed(self, rule_info: RuleInfo, rule_progress: float):
         """Slot raised when the rule validation progress changes.
 
-        This calculates the overall progress of the validation process.
+        This calculates the overall progress of the validation process
+        from the progress of each of the rules, which may be running
+        concurrently.
 
-        :param rule_type: Rule type currently being executed.
-        :type rule_type: RuleType
+        :param rule_info: Rule whose progress has changed.
+        :type rule_info: RuleInfo
 
         :param rule_progress: Progress of the rule validation.
         :type rule_progress: float
         """
-        if len(self._rule_validators) == 0:
+        rule_count = len(self._applicable_rule_validators) or len(self._rule_validators)
+        if rule_count == 0 or rule_info is None:
             return
 
-        progress_increment = rule_progress / len(self._rule_validators)
-        total_progress = self._rule_reference_progress + progress_increment
+        self._rule_progress[rule_info.type] = rule_progress
+        total_progress = sum(self._rule_progress.values()) / rule_count
         self._feedback.setProgress(total_progress)
         self.setProgress(total_progress)
 
-    def _on_rule_validation_completed(self, rule_info: RuleInfo):
-        """Slot raised when rule validation has completed.
-
-        param rule_info: Rule whose execution has ended.
-        :type rule_info: RuleInfo
-        """
-        self._rule_reference_progress += 100 / len(self._rule_validators)
-
     def log(self, message: str, info: bool = True):
         """Convenience function that logs the given messages by appending
         the information for the validator.
@@ -1421,6 +1425,7 @@ class NcsDataValidator(DataValidator):
 
     MODEL_COMPONENT_TYPE = ModelComponentType.NCS_PATHWAY
     NAME = "NCS Data Validator"
+    PERSIST_LAYER_METADATA = True
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
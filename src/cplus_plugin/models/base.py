@@ -682,6 +682,9 @@ class ScenarioResult:
     analysis_output: typing.Dict = None
     output_layer_name: str = ""
     scenario_directory: str = ""
+    # True if the analysis ran at a coarse resolution for a quick
+    # preview, the outputs and areas are then only indicative
+    preview: bool = False
 
 
 class DataSourceType(IntEnum):
@@ -38,6 +38,8 @@ class ReportContext(BaseReportContext):
     scenario_output_dir: str
     output_layer_name: str
     custom_metrics: bool
+    # Whether the report is for a coarse resolution preview analysis
+    preview: bool = False
 
 
 @dataclasses.dataclass
@@ -3,22 +3,28 @@
 Plugin tasks related to the scenario analysis
 
 """
+import contextlib
 import datetime
+import functools
 import json
 import math
 import os
+import threading
 import uuid
 import traceback
 import typing
+import weakref
 from pathlib import Path
 
-from qgis import processing
 from qgis.PyQt import QtCore
 from qgis.core import (
     Qgis,
     QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsProject,
     QgsProcessing,
     QgsProcessingContext,
+    QgsProcessingException,
     QgsProcessingFeedback,
     QgsRasterLayer,
     QgsRectangle,
@@ -34,9 +40,27 @@ from .conf import settings_manager, Settings
 from .definitions.constants import NO_DATA_VALUE
 from .definitions.defaults import (
     SCENARIO_OUTPUT_FILE_NAME,
+    SCENARIO_PROFILE_FILE_NAME,
     DEFAULT_CRS_ID,
+    DEFAULT_MAX_CONCURRENT_STAGES,
+)
+from .lib.constant_raster import (
+    constant_raster_registry,
+    virtual_constant_raster_value,
+)
+from .lib.profiling import AnalysisProfiler, layer_info
+from .lib.progress import ProgressModel
+from .lib.pipeline import (
+    fingerprint,
+    outputs_exist,
+    PipelineStage,
+    StageManifest,
+    StageScheduler,
+)
+from .lib.validation.ncs_decision_tree import (
+    ApplyNcsDecisionTreeAlgorithm,
+    run_ncs_decision_tree,
 )
-from .lib.constant_raster import constant_raster_registry
 from .models.base import ScenarioResult, Activity, NcsPathway, NcsPathwayType
 from .utils import (
     align_rasters,
@@ -57,6 +81,63 @@ class ScenarioAnalysisTask(QgsTask):
     info_message_changed = QtCore.pyqtSignal(str, int)
 
     custom_progress_changed = QtCore.pyqtSignal(float)
+    # Estimated remaining time of the analysis in seconds
+    remaining_time_changed = QtCore.pyqtSignal(float)
+
+    # Stages whose outputs only depend on the pathway and priority layers,
+    # the extent and the settings, and the analysis state they write
+    PREPROCESSING_STAGES = (
+        "preview_downsampling",
+        "snapping",
+        "studyarea_clipping",
+        "reprojection",
+        "priority_layers_nodata",
+        "pathways_nodata",
+        "carbon_summation",
+    )
+    PREPROCESSED_RESOURCES = (
+        "pathway_layers",
+        "pathway_priority_layers",
+        "carbon_layers",
+        "carbon_impact",
+        "replaced_priority_layers",
+        "preview_priority_layers",
+    )
+
+    # Average resampling method of gdal:warpreproject
+    PREVIEW_RESAMPLING = 5
+
+    # Settings read by the analysis stages, changes to the other settings
+    # e.g. the scenario name or the report details do not affect the
+    # stage outputs. The relative impact matrix is excluded since only
+    # the pathways weighting depends on it.
+    STAGE_SETTINGS = (
+        Settings.NCS_NO_DATA_VALUE,
+        Settings.SNAPPING_ENABLED,
+        Settings.SNAP_LAYER,
+        Settings.ALLOW_RESAMPLING,
+        Settings.RESCALE_VALUES,
+        Settings.RESAMPLING_METHOD,
+        Settings.SNAP_PIXEL_VALUE,
+        Settings.PIXEL_CONNECTIVITY_ENABLED,
+        Settings.SIEVE_ENABLED,
+        Settings.SIEVE_THRESHOLD,
+        Settings.SIEVE_MASK_PATH,
+        Settings.MASK_LAYERS_PATHS,
+        Settings.NCS_WITH_CARBON,
+        Settings.NCS_WEIGHTED,
+        Settings.LANDUSE_PROJECT,
+        Settings.LANDUSE_NORMALIZED,
+        Settings.LANDUSE_WEIGHTED,
+        Settings.HIGHEST_POSITION,
+        Settings.IRRECOVERABLE_CARBON_ENABLED,
+        Settings.IRRECOVERABLE_CARBON_SOURCE_TYPE,
+        Settings.IRRECOVERABLE_CARBON_LOCAL_SOURCE,
+        Settings.IRRECOVERABLE_CARBON_ONLINE_SOURCE,
+        Settings.IRRECOVERABLE_CARBON_ONLINE_LOCAL_PATH,
+        Settings.STORED_CARBON_ONLINE_SOURCE,
+        Settings.STORED_CARBON_BIOMASS_PATH,
+    )
 
     def __init__(
         self,
@@ -92,15 +173,252 @@ class ScenarioAnalysisTask(QgsTask):
         self.info_message = None
 
         self.processing_cancelled = False
+        # Feedback and context of the stages running concurrently
+        # in worker threads
+        self._stage_local = threading.local()
+        # Feedback of the running algorithms and block computations,
+        # cancelled together when the analysis is cancelled
+        self._feedbacks = weakref.WeakSet()
+        self._cancellation_lock = threading.Lock()
+        # Files written by the processing algorithms of each stage
+        self._stage_files: typing.Dict[str, typing.Set[str]] = {}
         self.feedback = QgsProcessingFeedback()
         self.processing_context = QgsProcessingContext()
 
+        # Priority layer paths after replacing the nodata value and
+        # connectivity layers of the activities, keyed by their UUID
+        self.replaced_priority_layers_paths = {}
+        self.connectivity_layers = {}
+
+        # Raster masks of the NCS decision tree actions allowed for each
+        # activity, keyed by the activity UUID
+        self.decision_mask_paths = {}
+
+        # Directory of a previous analysis to resume and the manifest
+        # of the completed stages
+        self.resume_directory = None
+        self.stage_manifest = None
+
+        # Reuse the outputs of the previous analyses for the stages and
+        # weighted pathways whose inputs have not changed
+        self.incremental = settings_manager.get_value(
+            Settings.INCREMENTAL_ANALYSIS, default=False, setting_type=bool
+        )
+        self._stage_fingerprints = {}
+        self._previous_stage_outputs = {}
+        self._previous_items = {}
+
+        # Settings and priority layers of the scenario that take precedence
+        # over the plugin settings e.g. for the scenarios of a batch run
+        self.scenario_settings = {}
+        self.scenario_priority_layers = None
+
+        # Preprocessed pathway and priority layers shared by the scenarios
+        # of a batch run, keyed by the resource name
+        self.preprocessed_state = None
+
+        # Downsampling factor of a preview analysis, which runs all the
+        # stages at a coarser resolution, 1 runs the full resolution
+        # analysis. Downsampled priority layer paths keyed by their UUID.
+        self.preview_factor = 1
+        self.preview_priority_layers_paths = {}
+
+        # Resources used by the stages and the processing algorithms
+        self.profiler = AnalysisProfiler()
+
+        # Overall progress weighted by the estimated pixels of the stages
+        # and the number of pixels of the snapped analysis extent
+        self.progress_model = ProgressModel()
+        self.analysis_grid_pixels = 0
+        self.remaining_time = None
+
         self.scenario = scenario
 
         self.no_data_value = settings_manager.get_value(
             Settings.NCS_NO_DATA_VALUE, NO_DATA_VALUE
         )
 
+    @property
+    def preview(self) -> bool:
+        """Returns whether the analysis is a coarse resolution preview.
+
+        :returns: True if the layers are downsampled else False.
+        :rtype: bool
+        """
+        return self.preview_factor > 1
+
+    @property
+    def feedback(self) -> QgsProcessingFeedback:
+        """Returns the processing feedback of the current stage.
+
+        :returns: Feedback of the stage running in the current thread.
+        :rtype: QgsProcessingFeedback
+        """
+        return getattr(self._stage_local, "feedback", self._feedback)
+
+    @feedback.setter
+    def feedback(self, feedback: QgsProcessingFeedback):
+        """Sets the processing feedback of the current stage.
+
+        :param feedback: Processing feedback.
+        :type feedback: QgsProcessingFeedback
+        """
+        self.register_feedback(feedback)
+        if getattr(self._stage_local, "isolated", False):
+            self._stage_local.feedback = feedback
+        else:
+            self._feedback = feedback
+
+    def register_feedback(self, feedback: QgsProcessingFeedback):
+        """Registers a processing feedback so that it is cancelled when
+        the analysis is cancelled. The feedback is cancelled right away
+        if the analysis has already been cancelled.
+
+        :param feedback: Processing feedback.
+        :type feedback: QgsProcessingFeedback
+        """
+        if feedback is None:
+            return
+
+        with self._cancellation_lock:
+            self._feedbacks.add(feedback)
+        if self.processing_cancelled:
+            feedback.cancel()
+
+    def cancel_feedbacks(self):
+        """Cancels the registered processing feedback, which stops the
+        running algorithms and block computations.
+        """
+        with self._cancellation_lock:
+            feedbacks = list(self._feedbacks)
+        for feedback in feedbacks:
+            if not feedback.isCanceled():
+                feedback.cancel()
+
+    def cancel(self):
+        """Cancels the analysis, including the processing algorithms and
+        block computations of the stages that are running.
+        """
+        self.processing_cancelled = True
+        self.cancel_feedbacks()
+        super().cancel()
+
+    @property
+    def processing_context(self) -> QgsProcessingContext:
+        """Returns the processing context of the current stage.
+
+        :returns: Context of the stage running in the current thread.
+        :rtype: QgsProcessingContext
+        """
+        return getattr(self._stage_local, "context", self._processing_context)
+
+    @processing_context.setter
+    def processing_context(self, context: QgsProcessingContext):
+        """Sets the processing context of the current stage.
+
+        :param context: Processing context.
+        :type context: QgsProcessingContext
+        """
+        if getattr(self._stage_local, "isolated", False):
+            self._stage_local.context = context
+        else:
+            self._processing_context = context
+
+    def isolated_stage(self, func: typing.Callable) -> typing.Callable:
+        """Wraps a stage function so that, when it runs concurrently
+        with other stages, it uses its own processing feedback and context
+        instead of sharing those of the task.
+
+        :param func: Stage function.
+        :type func: typing.Callable
+
+        :returns: Wrapped stage function.
+        :rtype: typing.Callable
+        """
+
+        def run_isolated():
+            self._stage_local.isolated = True
+            self._stage_local.feedback = QgsProcessingFeedback()
+            self._stage_local.context = QgsProcessingContext()
+            self.register_feedback(self._stage_local.feedback)
+            try:
+                return func()
+            finally:
+                self._stage_local.__dict__.clear()
+
+        return run_isolated
+
+    def cancellable_stage(self, name: str, func: typing.Callable) -> typing.Callable:
+        """Wraps a stage function so that it does not start once the
+        analysis has been cancelled and the files written by its
+        algorithms are deleted if the analysis is cancelled while it runs.
+
+        :param name: Stage name.
+        :type name: str
+
+        :param func: Stage function.
+        :type func: typing.Callable
+
+        :returns: Wrapped stage function.
+        :rtype: typing.Callable
+        """
+
+        def run_cancellable():
+            if self.processing_cancelled or self.isCanceled():
+                return False
+            try:
+                return func()
+            finally:
+                if self.processing_cancelled or self.isCanceled():
+                    self.remove_stage_files(name)
+
+        return run_cancellable
+
+    def record_stage_files(self, parameters: dict):
+        """Records the output files of an algorithm run by the current
+        stage.
+
+        :param parameters: Algorithm parameters.
+        :type parameters: dict
+        """
+        stage = self.profiler.current_stage
+        if stage is None:
+            return
+
+        paths = {
+            value
+            for key, value in parameters.items()
+            if key.startswith("OUTPUT")
+            and isinstance(value, str)
+            and os.path.splitext(value)[1]
+        }
+        with self._cancellation_lock:
+            self._stage_files.setdefault(stage, set()).update(paths)
+
+    def remove_stage_files(self, name: str):
+        """Deletes the files written by the algorithms of a stage, which
+        may be incomplete when the stage was cancelled.
+
+        :param name: Stage name.
+        :type name: str
+        """
+        with self._cancellation_lock:
+            paths = self._stage_files.pop(name, set())
+
+        for path in paths:
+            for file_path in (path, f"{path}.aux.xml"):
+                try:
+                    if os.path.isfile(file_path):
+                        os.remove(file_path)
+                except OSError as e:
+                    self.log_message(
+                        f"Unable to remove the partial output {file_path}, {e}"
+                    )
+        if paths:
+            self.log_message(
+                f"Removed the partial outputs of the cancelled stage {name}"
+            )
+
     def get_settings_value(self, name: str, default=None, setting_type=None):
         """Gets value of the setting with the passed name.
 
@@ -116,6 +434,19 @@ class ScenarioAnalysisTask(QgsTask):
         :returns: Value of the setting
         :rtype: Any
         """
+        if name in self.scenario_settings:
+            value = self.scenario_settings[name]
+            if value is None:
+                return default
+            if setting_type is bool and isinstance(value, str):
+                return value.lower() in ("true", "1")
+            if setting_type is not None and value is not None:
+                try:
+                    return setting_type(value)
+                except (TypeError, ValueError):
+                    return default
+            return value
+
         return settings_manager.get_value(name, default, setting_type)
 
     def get_scenario_directory(self) -> str:
@@ -139,7 +470,15 @@ class ScenarioAnalysisTask(QgsTask):
         :returns: Priority layer dict
         :rtype: dict
         """
-        return settings_manager.get_priority_layer(identifier)
+        if self.scenario_priority_layers is not None:
+            for priority_layer in self.scenario_priority_layers:
+                if str(priority_layer.get("uuid")) == str(identifier):
+                    return self.preview_priority_layer(priority_layer)
+            return None
+
+        return self.preview_priority_layer(
+            settings_manager.get_priority_layer(identifier)
+        )
 
     def get_activity(self, activity_uuid) -> typing.Union[Activity, None]:
         """Gets an activity object matching the given unique
@@ -161,7 +500,38 @@ class ScenarioAnalysisTask(QgsTask):
         :returns: Priority layers list
         :rtype: list
         """
-        return settings_manager.get_priority_layers()
+        if self.scenario_priority_layers is not None:
+            priority_layers = list(self.scenario_priority_layers)
+        else:
+            priority_layers = settings_manager.get_priority_layers()
+
+        return [
+            self.preview_priority_layer(priority_layer)
+            for priority_layer in priority_layers
+        ]
+
+    def preview_priority_layer(
+        self, priority_layer: typing.Optional[typing.Dict]
+    ) -> typing.Optional[typing.Dict]:
+        """Returns a copy of the priority layer that uses its downsampled
+        layer in a preview analysis.
+
+        :param priority_layer: Priority layer dict
+        :type priority_layer: dict
+
+        :returns: The priority layer or its preview copy
+        :rtype: dict
+        """
+        if priority_layer is None:
+            return None
+
+        preview_path = self.preview_priority_layers_paths.get(
+            str(priority_layer.get("uuid"))
+        )
+        if preview_path is None:
+            return priority_layer
+
+        return dict(priority_layer, path=preview_path)
 
     def get_masking_layers(self) -> typing.List:
         """Gets all the masking layers.
@@ -182,6 +552,10 @@ class ScenarioAnalysisTask(QgsTask):
         Returns:
             str|None: Return the path of the reference layer or None is it doesn't exist
         """
+        if self.preview:
+            # The downsampled pathways define the grid of a preview
+            return None
+
         snapping_enabled = self.get_settings_value(
             Settings.SNAPPING_ENABLED, default=False, setting_type=bool
         )
@@ -248,192 +622,1111 @@ class ScenarioAnalysisTask(QgsTask):
     def run(self):
         """Runs the main scenario analysis task operations"""
         try:
+            self.prepare_scenario_directory()
+            extent_string = self.analysis_extent_string()
+            self.run_stages(self.analysis_stages(extent_string), extent_string)
+
+            return True
+        except Exception as e:
+            self.log_message(f"Analysis failed with error {e}")
+            self.log_message(traceback.format_exc())
+            if self.error is None:
+                self.error = e
+            return False
+
+    def prepare_scenario_directory(self):
+        """Creates the directory of the analysis outputs. A directory set
+        before the analysis runs is used as is, otherwise a new directory
+        is created in the plugin base directory.
+        """
+        if self.resume_directory:
+            self.scenario_directory = self.resume_directory
+        elif not self.scenario_directory:
             self.scenario_directory = self.get_scenario_directory()
 
-            FileUtils.create_new_dir(self.scenario_directory)
+        FileUtils.create_new_dir(self.scenario_directory)
 
-            selected_pathway = None
-            pathway_found = False
+    def analysis_extent_string(self) -> str:
+        """Sets the analysis CRS and snaps the analysis extent to the
+        pixels of the first pathway layer.
 
-            for activity in self.analysis_activities:
-                if pathway_found:
+        :returns: Snapped analysis extent with its CRS.
+        :rtype: str
+        """
+        selected_pathway = None
+        pathway_found = False
+
+        for activity in self.analysis_activities:
+            if pathway_found:
+                break
+            for pathway in activity.pathways:
+                if pathway is not None:
+                    pathway_found = True
+                    selected_pathway = pathway
                     break
-                for pathway in activity.pathways:
-                    if pathway is not None:
-                        pathway_found = True
-                        selected_pathway = pathway
-                        break
 
-            target_layer = QgsRasterLayer(selected_pathway.path, selected_pathway.name)
+        target_layer = QgsRasterLayer(selected_pathway.path, selected_pathway.name)
 
-            self.analysis_crs = self.analysis_extent.crs
+        self.analysis_crs = self.analysis_extent.crs
 
-            if self.analysis_crs is not None:
-                # Use the CRS of the analysis if it is provided
-                dest_crs = QgsCoordinateReferenceSystem(self.analysis_crs)
-            else:
-                # Use the CRS of the target layer if it exists
-                # or use EPSG:4326 as a default CRS
-                dest_crs = (
-                    target_layer.crs()
-                    if selected_pathway and selected_pathway.path
-                    else QgsCoordinateReferenceSystem.fromEpsgId(DEFAULT_CRS_ID)
-                )
+        if self.analysis_crs is not None:
+            # Use the CRS of the analysis if it is provided
+            dest_crs = QgsCoordinateReferenceSystem(self.analysis_crs)
+        else:
+            # Use the CRS of the target layer if it exists
+            # or use EPSG:4326 as a default CRS
+            dest_crs = (
+                target_layer.crs()
+                if selected_pathway and selected_pathway.path
+                else QgsCoordinateReferenceSystem.fromEpsgId(DEFAULT_CRS_ID)
+            )
+
+        processing_extent = QgsRectangle(
+            float(self.analysis_extent.bbox[0]),
+            float(self.analysis_extent.bbox[2]),
+            float(self.analysis_extent.bbox[1]),
+            float(self.analysis_extent.bbox[3]),
+        )
+
+        snapped_extent = self.align_extent(target_layer, processing_extent)
+        # The extent is only on the layer grid in the layer CRS
+        self.analysis_grid_pixels = self.grid_pixels(
+            target_layer,
+            snapped_extent if target_layer.crs() == dest_crs else None,
+        )
+
+        extent_string = (
+            f"{snapped_extent.xMinimum()},{snapped_extent.xMaximum()},"
+            f"{snapped_extent.yMinimum()},{snapped_extent.yMaximum()}"
+            f" [{dest_crs.authid()}]"
+        )
+
+        self.log_message(
+            "Original area of interest extent: "
+            f"{processing_extent.asWktPolygon()} \n"
+        )
+        self.log_message(
+            "Snapped area of interest extent " f"{snapped_extent.asWktPolygon()} \n"
+        )
+
+        return extent_string
+
+    def grid_pixels(self, layer: QgsRasterLayer, extent: QgsRectangle) -> int:
+        """Estimates the number of pixels of the analysis extent on the
+        grid of a layer, for estimating the work of the stages.
+
+        :param layer: Layer whose pixel size is used.
+        :type layer: QgsRasterLayer
+
+        :param extent: Analysis extent in the layer CRS.
+        :type extent: QgsRectangle
+
+        :returns: Number of pixels, those of the whole layer if the
+        extent cannot be used.
+        :rtype: int
+        """
+        if layer is None or not layer.isValid():
+            return 0
 
-            processing_extent = QgsRectangle(
-                float(self.analysis_extent.bbox[0]),
-                float(self.analysis_extent.bbox[2]),
-                float(self.analysis_extent.bbox[1]),
-                float(self.analysis_extent.bbox[3]),
+        pixel_width = layer.rasterUnitsPerPixelX()
+        pixel_height = layer.rasterUnitsPerPixelY()
+        if extent is None or extent.isEmpty() or pixel_width <= 0 or pixel_height <= 0:
+            return layer.width() * layer.height()
+
+        return int(
+            round(extent.width() / pixel_width) * round(extent.height() / pixel_height)
+        )
+
+    def run_stages(self, stages: typing.List[PipelineStage], extent_string: str):
+        """Runs the analysis stages, skipping the stages completed by the
+        analysis being resumed.
+
+        :param stages: Stages to run.
+        :type stages: list
+
+        :param extent_string: Snapped analysis extent with its CRS.
+        :type extent_string: str
+        """
+        if self.incremental:
+            self.load_previous_outputs()
+        self.stage_manifest = self.prepare_stage_manifest(stages, extent_string)
+        scheduler = StageScheduler(
+            stages,
+            budget=self.get_max_concurrent_stages(),
+            completed=self.stage_manifest.completed,
+            on_stage_finished=self.on_stage_finished,
+            reuse_stage=self.reuse_stage,
+        )
+        skipped_stages = scheduler.skipped_stages()
+        if skipped_stages:
+            self.log_message(
+                f"Resuming scenario analysis in {self.scenario_directory}, "
+                f"skipping the completed stages {skipped_stages}"
             )
 
-            snapped_extent = self.align_extent(target_layer, processing_extent)
+        self.progress_model = ProgressModel()
+        for stage in stages:
+            self.progress_model.add_stage(stage.name, stage.work)
+        for name in skipped_stages:
+            self.progress_model.complete_stage(name)
+        self.progress_model.start()
+        self.report_progress()
 
-            extent_string = (
-                f"{snapped_extent.xMinimum()},{snapped_extent.xMaximum()},"
-                f"{snapped_extent.yMinimum()},{snapped_extent.yMaximum()}"
-                f" [{dest_crs.authid()}]"
+        try:
+            scheduler.run()
+        finally:
+            self.save_profile()
+
+    def save_profile(self):
+        """Saves the resources used by the stages and the processing
+        algorithms in the scenario directory and logs their summary.
+        """
+        try:
+            self.profiler.save(
+                os.path.join(self.scenario_directory, SCENARIO_PROFILE_FILE_NAME)
             )
+        except OSError as e:
+            self.log_message(f"Unable to save the analysis profile, {e}")
+        self.profiler.log_summary()
 
-            self.log_message(
-                "Original area of interest extent: "
-                f"{processing_extent.asWktPolygon()} \n"
+    def run_algorithm(
+        self, algorithm_id: str, parameters: dict, **kwargs
+    ) -> typing.Dict[str, typing.Any]:
+        """Runs a processing algorithm, recording the resources it uses
+        in the analysis profile.
+
+        :param algorithm_id: Processing algorithm identifier.
+        :type algorithm_id: str
+
+        :param parameters: Algorithm parameters.
+        :type parameters: dict
+
+        :param kwargs: Other arguments of `processing.run` e.g. the
+        context and feedback.
+        :type kwargs: dict
+
+        :returns: Algorithm results.
+        :rtype: dict
+
+        :raises QgsProcessingException: If the analysis has been cancelled.
+        """
+        if self.processing_cancelled or self.isCanceled():
+            raise QgsProcessingException(tr("Scenario analysis was cancelled"))
+
+        # Algorithms stop when the analysis is cancelled through their
+        # feedback
+        if kwargs.get("feedback") is None:
+            kwargs["feedback"] = self.feedback
+        self.register_feedback(kwargs["feedback"])
+        self.record_stage_files(parameters)
+
+        # The algorithm progress is weighted by the pixels of its inputs
+        inputs = layer_info(list(parameters.values()))
+        pixels = sum(info.get("pixels", 0) for info in inputs)
+        with self.track_progress(
+            kwargs["feedback"], pixels or self.analysis_grid_pixels
+        ):
+            return self.profiler.run_algorithm(
+                algorithm_id, parameters, inputs=inputs, **kwargs
             )
+
+    @contextlib.contextmanager
+    def track_progress(self, feedback: QgsProcessingFeedback, pixels: float):
+        """Context manager that adds the progress reported by a processing
+        feedback to the progress of the current stage, weighted by the
+        pixels processed.
+
+        :param feedback: Feedback of the algorithm or block computation.
+        :type feedback: QgsProcessingFeedback
+
+        :param pixels: Number of pixels processed.
+        :type pixels: float
+        """
+        stage = self.profiler.current_stage
+        item = None
+        if stage is not None and feedback is not None:
+            item = self.progress_model.start_item(stage, pixels)
+        if item is None:
+            yield
+            return
+
+        # Called directly in the thread emitting the progress
+        update_item = functools.partial(self.update_item_progress, item)
+        feedback.progressChanged.connect(update_item)
+        try:
+            yield
+        finally:
+            try:
+                feedback.progressChanged.disconnect(update_item)
+            except TypeError:
+                pass
+            self.progress_model.finish_item(item)
+            self.report_progress()
+
+    def update_item_progress(self, item: int, value: float):
+        """Updates the progress of an algorithm tracked by the progress
+        model and reports the overall progress.
+
+        :param item: Item identifier in the progress model.
+        :type item: int
+
+        :param value: Algorithm progress between 0 and 100.
+        :type value: float
+        """
+        self.progress_model.update_item(item, value / 100.0)
+        self.report_progress()
+
+    def report_progress(self):
+        """Reports the overall progress and the estimated remaining time
+        of the analysis from the progress model.
+        """
+        if self.processing_cancelled or not self.progress_model.active:
+            return
+
+        self.set_custom_progress(self.progress_model.progress * 100.0)
+        self.remaining_time = self.progress_model.remaining_time()
+        if self.remaining_time is not None:
+            self.remaining_time_changed.emit(self.remaining_time)
+
+    def run_preprocessing(self) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Runs only the preprocessing stages i.e. the snapping, clipping,
+        reprojection, nodata replacement and carbon summation of the
+        pathway and priority layers, whose outputs do not depend on the
+        activities or the weights of the scenario.
+
+        :returns: Preprocessed analysis state to share with other analyses
+        using :meth:`use_preprocessed_state` or None if the preprocessing
+        failed.
+        :rtype: dict
+        """
+        try:
+            self.prepare_scenario_directory()
+            extent_string = self.analysis_extent_string()
+            stages = [
+                stage
+                for stage in self.analysis_stages(extent_string)
+                if stage.name in self.PREPROCESSING_STAGES
+            ]
+            self.run_stages(stages, extent_string)
+        except Exception as e:
+            self.log_message(f"Preprocessing failed with error {e}")
+            self.log_message(traceback.format_exc())
+            return None
+
+        if self.processing_cancelled or self.isCanceled():
+            return None
+
+        return {
+            resource: self.stage_state(resource)
+            for resource in self.PREPROCESSED_RESOURCES
+        }
+
+    def use_preprocessed_state(self, state: typing.Dict[str, typing.Any]):
+        """Sets the preprocessed analysis state created by another
+        analysis with the same extent, study area, pathways and settings.
+        The preprocessing stages of this analysis will restore the state
+        instead of running.
+
+        :param state: Preprocessed state from :meth:`run_preprocessing`.
+        :type state: dict
+        """
+        self.preprocessed_state = state
+
+    def resume(self, scenario_directory: str):
+        """Sets the directory of a previous failed or cancelled analysis
+        of the scenario, the analysis will continue from its first
+        incomplete stage if its stage manifest is valid else the analysis
+        starts again in the same directory.
+
+        :param scenario_directory: Directory of the previous analysis.
+        :type scenario_directory: str
+        """
+        self.resume_directory = scenario_directory
+
+    @staticmethod
+    def find_resumable_directory(
+        scenario, base_dir: str = None
+    ) -> typing.Optional[str]:
+        """Gets the directory of the latest analysis of the scenario that
+        has a stage manifest and did not complete.
+
+        :param scenario: Scenario whose analysis is to be resumed.
+        :type scenario: Scenario
+
+        :param base_dir: Directory containing the scenario directories,
+            defaults to the plugin base directory.
+        :type base_dir: str
+
+        :returns: Scenario directory or None if there is no analysis
+            that can be resumed.
+        :rtype: str
+        """
+        base_dir = base_dir or settings_manager.get_value(Settings.BASE_DIR)
+        for manifest in StageManifest.find_manifests(base_dir, limit=None):
+            if manifest.parameters.get("scenario") != str(scenario.uuid):
+                continue
+            if "highest_position" in manifest.completed:
+                continue
+            return manifest.scenario_directory
+
+        return None
+
+    @staticmethod
+    def find_resumable_analysis(
+        scenario_name: str, base_dir: str = None
+    ) -> typing.Optional[StageManifest]:
+        """Gets the stage manifest of the latest analysis of a scenario
+        with the given name if the analysis did not complete. The scenario
+        identifier in the manifest parameters is required to resume it.
+
+        :param scenario_name: Name of the scenario.
+        :type scenario_name: str
+
+        :param base_dir: Directory containing the scenario directories,
+            defaults to the plugin base directory.
+        :type base_dir: str
+
+        :returns: Stage manifest or None if there is no analysis of the
+            scenario that can be resumed.
+        :rtype: StageManifest
+        """
+        base_dir = base_dir or settings_manager.get_value(Settings.BASE_DIR)
+        for manifest in StageManifest.find_manifests(base_dir):
+            if manifest.parameters.get("scenario_name") != scenario_name:
+                continue
+            if not manifest.parameters.get("scenario"):
+                continue
+            if "highest_position" in manifest.completed:
+                return None
+            return manifest
+
+        return None
+
+    def stage_parameters(
+        self, stages: typing.List[PipelineStage], extent_string: str
+    ) -> dict:
+        """Returns the parameters that a resumed analysis must share
+        with the analysis that created the stage manifest.
+
+        :param stages: Stages of the analysis.
+        :type stages: list
+
+        :param extent_string: Snapped analysis extent with its CRS.
+        :type extent_string: str
+
+        :returns: Analysis parameters.
+        :rtype: dict
+        """
+        return {
+            "scenario": str(self.scenario.uuid),
+            "scenario_name": self.scenario.name,
+            "extent": extent_string,
+            "activities": [str(activity.uuid) for activity in self.analysis_activities],
+            "priority_layers_groups": self.analysis_priority_layers_groups,
+            "impact_matrix": self.get_settings_value(
+                Settings.SCENARIO_IMPACT_MATRIX, ""
+            ),
+            "no_data_value": self.no_data_value,
+            "stages": [stage.name for stage in stages],
+            "preview_factor": self.preview_factor,
+        }
+
+    def prepare_stage_manifest(
+        self, stages: typing.List[PipelineStage], extent_string: str
+    ) -> StageManifest:
+        """Creates the stage manifest of the analysis. When resuming an
+        analysis with a valid manifest, the analysis state recorded in
+        the manifest is restored.
+
+        :param stages: Stages of the analysis.
+        :type stages: list
+
+        :param extent_string: Snapped analysis extent with its CRS.
+        :type extent_string: str
+
+        :returns: The stage manifest.
+        :rtype: StageManifest
+        """
+        parameters = self.stage_parameters(stages, extent_string)
+        if self.resume_directory:
+            manifest = StageManifest.load(self.scenario_directory)
+            if manifest is not None and manifest.is_compatible(parameters):
+                self.restore_stage_state(manifest.state)
+                return manifest
+
             self.log_message(
-                "Snapped area of interest extent " f"{snapped_extent.asWktPolygon()} \n"
+                f"Unable to resume the scenario analysis in "
+                f"{self.scenario_directory}, running all the stages."
             )
-            # Run pathways layers snapping using a specified reference layer
-            snapping_enabled = self.get_settings_value(
-                Settings.SNAPPING_ENABLED, default=False, setting_type=bool
+
+        manifest = StageManifest(
+            self.scenario_directory,
+            json.loads(json.dumps(parameters, cls=CustomJsonEncoder)),
+        )
+        manifest.save()
+
+        return manifest
+
+    def on_stage_finished(self, stage: PipelineStage, result: typing.Any):
+        """Records the stage in the stage manifest if it completed.
+
+        :param stage: Finished stage.
+        :type stage: PipelineStage
+
+        :param result: Return value of the stage.
+        :type result: Any
+        """
+        self.progress_model.complete_stage(stage.name)
+        self.report_progress()
+
+        if result is False or self.processing_cancelled or self.isCanceled():
+            return
+
+        if self.stage_manifest is not None:
+            self.stage_manifest.record_stage(
+                stage.name,
+                {output: self.stage_state(output) for output in stage.outputs},
+                self._stage_fingerprints.get(stage.name),
             )
-            reference_layer = self.get_reference_layer()
-            if snapping_enabled and reference_layer:
-                self.snap_analysis_data(
-                    self.analysis_activities,
-                    extent_string,
-                )
 
-            # Clip to StudyArea
-            if self.clip_to_studyarea and os.path.exists(self.studyarea_path):
-                # Reproject the study area to the EPSG:4326
-                # The validate_vector_layer is successful when the layer is in EPSG:4326
-                studyarea_path = self.reproject_layer(
-                    input_path=self.studyarea_path,
-                    target_crs=QgsCoordinateReferenceSystem("EPSG:4326"),
-                    is_raster=False,
-                )
+    def load_previous_outputs(self, limit: int = 10):
+        """Loads the fingerprinted outputs of the latest analyses for
+        reuse in an incremental analysis.
 
-                # Validate layer geometries
-                validated_path = self.validate_vector_layer(studyarea_path)
-                if not validated_path:
-                    self.log_message(f"Invalid studyarea layer: {studyarea_path} ")
-                else:
-                    self.studyarea_path = validated_path
-                self.clip_analysis_data(self.studyarea_path)
+        :param limit: Maximum number of previous analyses to check.
+        :type limit: int
+        """
+        self._previous_stage_outputs = {}
+        self._previous_items = {}
+        base_dir = self.get_settings_value(Settings.BASE_DIR)
+        for manifest in StageManifest.find_manifests(base_dir, limit):
+            if manifest.scenario_directory == self.scenario_directory:
+                continue
+            # The latest analysis takes precedence
+            for stage_fingerprint, outputs in manifest.stage_outputs.items():
+                self._previous_stage_outputs.setdefault(stage_fingerprint, outputs)
+            for item_fingerprint, value in manifest.items.items():
+                self._previous_items.setdefault(item_fingerprint, value)
+
+    def stage_fingerprint(self, stage: PipelineStage) -> str:
+        """Creates the fingerprint of the current inputs and the
+        parameters of the stage.
+
+        :param stage: Analysis stage.
+        :type stage: PipelineStage
+
+        :returns: Stage fingerprint.
+        :rtype: str
+        """
+        return fingerprint(
+            {
+                "stage": stage.name,
+                "parameters": stage.parameters,
+                "inputs": {
+                    resource: self.stage_state(resource) for resource in stage.inputs
+                },
+            }
+        )
 
-            # Reproject the pathways and priority layers to the
-            # scenario CRS if it is not the same as the pathways CRS
+    def reuse_stage(self, stage: PipelineStage) -> bool:
+        """Fingerprints the stage inputs before the stage runs and restores
+        the outputs of a preprocessing stage from the shared preprocessed
+        state or, in an incremental analysis, the outputs of a previous
+        analysis whose stage had the same fingerprint.
 
-            if self.analysis_crs is not None:
-                self.reproject_pathways(
-                    target_extent=extent_string,
-                    target_crs=QgsCoordinateReferenceSystem(self.analysis_crs),
-                )
+        :param stage: Stage that is about to run.
+        :type stage: PipelineStage
+
+        :returns: True if the previous outputs were restored and the stage
+        does not need to run else False.
+        :rtype: bool
+        """
+        stage_fingerprint = self.stage_fingerprint(stage)
+        self._stage_fingerprints[stage.name] = stage_fingerprint
+
+        if (
+            self.preprocessed_state is not None
+            and stage.name in self.PREPROCESSING_STAGES
+        ):
+            self.restore_stage_state(
+                {
+                    output: self.preprocessed_state[output]
+                    for output in stage.outputs
+                    if output in self.preprocessed_state
+                }
+            )
+            return True
+
+        if not self.incremental:
+            return False
+
+        outputs = self._previous_stage_outputs.get(stage_fingerprint)
+        if outputs is None or not outputs_exist(outputs):
+            return False
+
+        self.restore_stage_state(outputs)
+        self.log_message(
+            f"Reusing the outputs of an earlier analysis for the stage {stage.name}"
+        )
+
+        return True
+
+    def reusable_item(self, item_fingerprint: str) -> typing.Optional[str]:
+        """Gets the output file of an item within a stage e.g. a weighted
+        pathway, created by a previous analysis with the same inputs.
+
+        :param item_fingerprint: Fingerprint of the item inputs.
+        :type item_fingerprint: str
+
+        :returns: Path of the output or None if it cannot be reused.
+        :rtype: str
+        """
+        if not self.incremental:
+            return None
+
+        path = self._previous_items.get(item_fingerprint)
+        if not path or not os.path.exists(path):
+            return None
+
+        return path
+
+    def record_item(self, item_fingerprint: str, path: str):
+        """Records the output file of an item within a stage for reuse
+        in later incremental analyses.
+
+        :param item_fingerprint: Fingerprint of the item inputs.
+        :type item_fingerprint: str
+
+        :param path: Output file path.
+        :type path: str
+        """
+        if self.stage_manifest is not None and path and os.path.isabs(path):
+            self.stage_manifest.record_item(item_fingerprint, path)
+
+    def _analysis_pathways_by_uuid(
+        self,
+    ) -> typing.Dict[str, typing.List[NcsPathway]]:
+        """Returns the pathway objects of the analysis activities keyed by
+        the pathway UUID.
+        """
+        pathways = {}
+        for activity in self.analysis_activities:
+            for pathway in activity.pathways or []:
+                if pathway is not None:
+                    pathways.setdefault(str(pathway.uuid), []).append(pathway)
+
+        return pathways
+
+    def stage_state(self, resource: str) -> typing.Any:
+        """Returns the current value of an analysis resource i.e. the
+        analysis state written by the stages.
+
+        :param resource: Resource name.
+        :type resource: str
+
+        :returns: JSON serializable value of the resource.
+        :rtype: Any
+        """
+        pathways = {
+            pathway_uuid: pathways[0]
+            for pathway_uuid, pathways in self._analysis_pathways_by_uuid().items()
+        }
+        activities = {
+            str(activity.uuid): activity for activity in self.analysis_activities
+        }
+
+        if resource == "pathway_layers":
+            return {key: pathway.path for key, pathway in pathways.items()}
+        elif resource == "pathway_priority_layers":
+            return {key: pathway.priority_layers for key, pathway in pathways.items()}
+        elif resource == "carbon_layers":
+            return {
+                key: getattr(pathway, "carbon_paths", None) or []
+                for key, pathway in pathways.items()
+            }
+        elif resource == "carbon_impact":
+            return {
+                key: pathway.carbon_impact_value for key, pathway in pathways.items()
+            }
+        elif resource == "activities":
+            return {key: activity.path for key, activity in activities.items()}
+        elif resource == "activity_masks":
+            return {key: activity.mask_paths for key, activity in activities.items()}
+        elif resource == "decision_masks":
+            return dict(self.decision_mask_paths)
+        elif resource == "replaced_priority_layers":
+            return dict(self.replaced_priority_layers_paths)
+        elif resource == "preview_priority_layers":
+            return dict(self.preview_priority_layers_paths)
+        elif resource.startswith("connectivity:"):
+            return self.connectivity_layers.get(resource.split(":", 1)[1])
+        elif resource == "scenario_result":
+            return self.output
+
+        return None
+
+    def restore_stage_state(self, state: typing.Dict[str, typing.Any]):
+        """Restores the analysis state recorded in a stage manifest.
+
+        :param state: Values of the analysis resources keyed by the
+        resource name.
+        :type state: dict
+        """
+        pathway_attributes = {
+            "pathway_layers": "path",
+            "pathway_priority_layers": "priority_layers",
+            "carbon_layers": "carbon_paths",
+            "carbon_impact": "carbon_impact_value",
+        }
+        activity_attributes = {"activities": "path", "activity_masks": "mask_paths"}
+        pathways = self._analysis_pathways_by_uuid()
+        activities = {
+            str(activity.uuid): activity for activity in self.analysis_activities
+        }
 
-            # Replace no data value for the pathways and priority layers
-            nodata_value = float(
-                self.get_settings_value(
-                    Settings.NCS_NO_DATA_VALUE,
-                    default=NO_DATA_VALUE,
-                    setting_type=float,
+        for resource, value in state.items():
+            if resource in pathway_attributes:
+                for key, item_value in value.items():
+                    for pathway in pathways.get(key, []):
+                        setattr(pathway, pathway_attributes[resource], item_value)
+            elif resource in activity_attributes:
+                for key, item_value in value.items():
+                    if key in activities:
+                        setattr(
+                            activities[key], activity_attributes[resource], item_value
+                        )
+            elif resource == "decision_masks":
+                self.decision_mask_paths = dict(value)
+            elif resource == "replaced_priority_layers":
+                self.replaced_priority_layers_paths = dict(value)
+            elif resource == "preview_priority_layers":
+                self.preview_priority_layers_paths = dict(value)
+            elif resource.startswith("connectivity:") and value:
+                self.connectivity_layers[resource.split(":", 1)[1]] = value
+            elif resource == "scenario_result" and value:
+                self.output = value
+                self.scenario_result = ScenarioResult(
+                    scenario=self.scenario,
+                    scenario_directory=self.scenario_directory,
+                    created_date=datetime.datetime.now(),
+                    preview=self.preview,
                 )
+
+    def get_max_concurrent_stages(self) -> int:
+        """Returns the maximum number of analysis stages that can run at
+        the same time.
+
+        :returns: Stage concurrency budget, at least 1.
+        :rtype: int
+        """
+        budget = self.get_settings_value(
+            Settings.MAX_CONCURRENT_STAGES,
+            default=DEFAULT_MAX_CONCURRENT_STAGES,
+            setting_type=int,
+        )
+        try:
+            budget = int(budget)
+        except (TypeError, ValueError):
+            budget = DEFAULT_MAX_CONCURRENT_STAGES
+
+        return max(1, min(budget, os.cpu_count() or 1))
+
+    def analysis_stages(self, extent_string: str) -> typing.List[PipelineStage]:
+        """Creates the stages of the scenario analysis in their sequential
+        order, each with the analysis state it reads and writes.
+
+        The pathway and priority layer nodata replacement, the carbon
+        summation and the activity connectivity layers do not depend on
+        each other and can therefore run concurrently.
+
+        :param extent_string: Snapped analysis extent with its CRS.
+        :type extent_string: str
+
+        :returns: Analysis stages.
+        :rtype: list
+        """
+        stages = []
+        concurrent = self.get_max_concurrent_stages() > 1
+        common_parameters = self.stage_common_parameters(extent_string)
+
+        # Number of layers processed by the stages, each stage is
+        # estimated to read its layers once over the analysis extent
+        pathways = list(
+            {
+                str(pathway.uuid): pathway
+                for activity in self.analysis_activities
+                for pathway in activity.pathways or []
+                if pathway is not None
+            }.values()
+        )
+        pathway_count = len(pathways)
+        pathway_priority_layer_count = sum(
+            len(pathway.priority_layers or []) for pathway in pathways
+        )
+        carbon_layer_count = sum(
+            len(getattr(pathway, "carbon_paths", None) or []) for pathway in pathways
+        )
+        priority_layer_count = len(
+            [layer for layer in self.get_priority_layers() if layer is not None]
+        )
+        activity_count = len(self.analysis_activities)
+        pathway_layer_count = (
+            pathway_count + pathway_priority_layer_count + carbon_layer_count
+        )
+
+        def add_stage(
+            name, func, inputs=(), outputs=(), cost=1, parameters=None, layers=0
+        ):
+            func = self.profiler.profile_stage(name, func)
+            func = self.cancellable_stage(name, func)
+            if concurrent:
+                func = self.isolated_stage(func)
+            stage_parameters = dict(common_parameters, **(parameters or {}))
+            work = layers * self.analysis_grid_pixels
+            if self.preview and name != "preview_downsampling":
+                work /= self.preview_factor**2
+            stages.append(
+                PipelineStage(name, func, inputs, outputs, cost, stage_parameters, work)
             )
-            self.log_message(
-                f"Replacing nodata value for the pathways and priority layers to {nodata_value}"
+
+        pathway_layers = ("pathway_layers", "pathway_priority_layers", "carbon_layers")
+
+        # Downsample the pathway, priority and carbon layers of a preview,
+        # the following stages then run at the coarser resolution
+        if self.preview:
+            add_stage(
+                "preview_downsampling",
+                self.run_preview_downsampling,
+                inputs=pathway_layers,
+                outputs=pathway_layers + ("preview_priority_layers",),
+                layers=pathway_layer_count + priority_layer_count,
+            )
+
+        # Apply the NCS decision tree once on all the scenario pathways
+        add_stage(
+            "ncs_decision_tree",
+            lambda: self.run_ncs_decision_tree(self.analysis_activities),
+            inputs=("pathway_layers",),
+            outputs=("decision_masks",),
+            layers=pathway_count,
+        )
+
+        # Run pathways layers snapping using a specified reference layer
+        snapping_enabled = self.get_settings_value(
+            Settings.SNAPPING_ENABLED, default=False, setting_type=bool
+        )
+        if snapping_enabled and self.get_reference_layer():
+            add_stage(
+                "snapping",
+                lambda: self.snap_analysis_data(
+                    self.analysis_activities, extent_string
+                ),
+                inputs=pathway_layers,
+                outputs=pathway_layers,
+                layers=pathway_layer_count,
             )
-            self.run_pathways_replace_nodata(nodata_value=nodata_value)
 
-            # Calculate total carbon mitigation values for the Naturebase pathways
-            self.run_pathways_carbon_summation()
+        # Clip to StudyArea
+        if self.clip_to_studyarea and os.path.exists(self.studyarea_path):
+            add_stage(
+                "studyarea_clipping",
+                self.run_studyarea_clipping,
+                inputs=pathway_layers,
+                outputs=pathway_layers,
+                layers=pathway_layer_count,
+            )
 
-            # Weight the pathways using the pathway suitability index
-            # and priority group coefficients for the PWLs
-            save_output = self.get_settings_value(
-                Settings.NCS_WEIGHTED, default=True, setting_type=bool
+        # Reproject the pathways and priority layers to the
+        # scenario CRS if it is not the same as the pathways CRS
+        if self.analysis_crs is not None:
+            add_stage(
+                "reprojection",
+                lambda: self.reproject_pathways(
+                    target_extent=extent_string,
+                    target_crs=QgsCoordinateReferenceSystem(self.analysis_crs),
+                ),
+                inputs=pathway_layers,
+                outputs=pathway_layers,
+                layers=pathway_layer_count,
             )
-            self.run_pathways_weighting(
+
+        # Replace no data value for the pathways and priority layers
+        nodata_value = float(
+            self.get_settings_value(
+                Settings.NCS_NO_DATA_VALUE,
+                default=NO_DATA_VALUE,
+                setting_type=float,
+            )
+        )
+        add_stage(
+            "priority_layers_nodata",
+            lambda: self.run_priority_layers_replace_nodata(nodata_value),
+            inputs=("preview_priority_layers",),
+            outputs=("replaced_priority_layers",),
+            layers=priority_layer_count,
+            parameters={
+                "priority_layers": {
+                    priority_layer.get("uuid"): priority_layer.get("path")
+                    for priority_layer in self.get_priority_layers()
+                    if priority_layer is not None
+                }
+            },
+        )
+        add_stage(
+            "pathways_nodata",
+            lambda: self.run_pathway_layers_replace_nodata(nodata_value),
+            inputs=("pathway_layers",),
+            outputs=("pathway_layers",),
+            layers=pathway_count,
+        )
+        add_stage(
+            "pathways_priority_layers",
+            lambda: self.update_pathways_priority_layers(
+                self.replaced_priority_layers_paths
+            ),
+            inputs=("replaced_priority_layers",),
+            outputs=("pathway_priority_layers",),
+        )
+
+        # Calculate total carbon mitigation values for the Naturebase pathways
+        add_stage(
+            "carbon_summation",
+            self.run_pathways_carbon_summation,
+            inputs=("pathway_layers",),
+            outputs=("carbon_impact",),
+            layers=carbon_layer_count,
+        )
+
+        # Weight the pathways using the pathway suitability index
+        # and priority group coefficients for the PWLs
+        save_output = self.get_settings_value(
+            Settings.NCS_WEIGHTED, default=True, setting_type=bool
+        )
+        add_stage(
+            "pathways_weighting",
+            lambda: self.run_pathways_weighting(
                 self.analysis_activities,
                 self.analysis_priority_layers_groups,
                 extent_string,
                 temporary_output=not save_output,
-            )
+            ),
+            inputs=pathway_layers + ("carbon_impact",),
+            outputs=("pathway_layers", "activities"),
+            parameters=self.weighting_parameters(),
+            layers=pathway_count + pathway_priority_layer_count,
+        )
 
-            # Creating activities from the weighted pathways
-            save_output = self.get_settings_value(
-                Settings.LANDUSE_PROJECT, default=True, setting_type=bool
-            )
-            self.run_activities_analysis(
+        # Creating activities from the weighted pathways
+        save_activities = self.get_settings_value(
+            Settings.LANDUSE_PROJECT, default=True, setting_type=bool
+        )
+        add_stage(
+            "activities_creation",
+            lambda: self.run_activities_analysis(
                 self.analysis_activities,
                 extent_string,
-                temporary_output=not save_output,
-            )
+                temporary_output=not save_activities,
+            ),
+            inputs=("pathway_layers",),
+            outputs=("activities",),
+            layers=pathway_count,
+        )
 
-            # Normalize the activities.
-            # This is useful when weighting pathways with relative impact matrix
-            # Activities created in previous step may have values greater than 1
-            self.run_activity_normalization()
+        # Normalize the activities.
+        # This is useful when weighting pathways with relative impact matrix
+        # Activities created in previous step may have values greater than 1
+        add_stage(
+            "activities_normalization",
+            self.run_activity_normalization,
+            inputs=("activities",),
+            outputs=("activities",),
+            layers=activity_count,
+        )
 
-            # Run masking of the activities layers
-            masking_layers = self.get_masking_layers()
-            if masking_layers:
-                self.run_activities_masking(
+        # Run masking of the activities layers
+        masking_layers = self.get_masking_layers()
+        if masking_layers:
+            add_stage(
+                "activities_masking",
+                lambda: self.run_activities_masking(
                     self.analysis_activities,
                     masking_layers,
                     extent_string,
-                )
+                ),
+                inputs=("activities",),
+                outputs=("activities",),
+                layers=activity_count,
+            )
 
-            # Run internal masking of the activities layers
-            self.run_internal_activities_masking(
+        # Run internal masking of the activities layers
+        add_stage(
+            "activities_internal_masking",
+            lambda: self.run_internal_activities_masking(
                 self.analysis_activities,
                 extent_string,
-            )
-
-            # Run sieve if enabled
-            sieve_enabled = self.get_settings_value(
-                Settings.SIEVE_ENABLED, default=False, setting_type=bool
-            )
-            if sieve_enabled:
-                self.run_activities_sieve(
-                    self.analysis_activities,
-                )
+            ),
+            inputs=("activities", "activity_masks", "decision_masks"),
+            outputs=("activities",),
+            layers=activity_count,
+        )
 
-            # After creating activities, we normalize them using the
-            # suitability index
-            save_output = self.get_settings_value(
-                Settings.LANDUSE_NORMALIZED, default=True, setting_type=bool
+        # Run sieve if enabled
+        sieve_enabled = self.get_settings_value(
+            Settings.SIEVE_ENABLED, default=False, setting_type=bool
+        )
+        if sieve_enabled:
+            add_stage(
+                "activities_sieve",
+                lambda: self.run_activities_sieve(self.analysis_activities),
+                inputs=("activities",),
+                outputs=("activities",),
+                layers=activity_count,
             )
 
-            # Clean up activities
-            self.run_activities_cleaning(
+        # Clean up activities
+        save_cleaned = self.get_settings_value(
+            Settings.LANDUSE_NORMALIZED, default=True, setting_type=bool
+        )
+        add_stage(
+            "activities_cleaning",
+            lambda: self.run_activities_cleaning(
                 self.analysis_activities,
                 extent_string,
-                temporary_output=not save_output,
-            )
+                temporary_output=not save_cleaned,
+            ),
+            inputs=("activities",),
+            outputs=("activities",),
+            layers=activity_count,
+        )
 
-            # Investability analysis
-            self.run_investability_analysis()
+        # Connectivity layers of the activities for the investability analysis
+        connectivity_layers = []
+        if self.get_settings_value(
+            Settings.PIXEL_CONNECTIVITY_ENABLED, default=True, setting_type=bool
+        ):
+            for activity in self.analysis_activities:
+                connectivity_layer = f"connectivity:{activity.uuid}"
+                connectivity_layers.append(connectivity_layer)
+                add_stage(
+                    f"activity_connectivity:{activity.uuid}",
+                    functools.partial(self.run_activity_connectivity, activity),
+                    inputs=("activities",),
+                    outputs=(connectivity_layer,),
+                    layers=1,
+                )
 
-            # The highest position tool analysis
-            save_output = self.get_settings_value(
-                Settings.HIGHEST_POSITION, default=True, setting_type=bool
-            )
-            self.run_highest_position_analysis(temporary_output=not save_output)
+        # Investability analysis
+        add_stage(
+            "investability",
+            self.run_investability_analysis,
+            inputs=("activities",) + tuple(connectivity_layers),
+            outputs=("activities",),
+            parameters={
+                "constant_rasters": {
+                    str(activity.uuid): [
+                        [component.component_id, component.path]
+                        for component in constant_raster_registry.activity_components(
+                            activity_identifier=str(activity.uuid)
+                        )
+                    ]
+                    for activity in self.analysis_activities
+                }
+            },
+            layers=activity_count,
+        )
 
-            return True
-        except Exception as e:
-            self.log_message(f"Analysis failed with error {e}")
-            self.log_message(traceback.format_exc())
-            return False
+        # The highest position tool analysis
+        save_highest_position = self.get_settings_value(
+            Settings.HIGHEST_POSITION, default=True, setting_type=bool
+        )
+        add_stage(
+            "highest_position",
+            lambda: self.run_highest_position_analysis(
+                temporary_output=not save_highest_position
+            ),
+            inputs=("activities",),
+            outputs=("scenario_result",),
+            layers=activity_count,
+        )
+
+        return stages
+
+    def stage_common_parameters(self, extent_string: str) -> dict:
+        """Returns the parameters that the outputs of all the analysis
+        stages depend on, for fingerprinting the stages. Only the
+        settings in STAGE_SETTINGS are included.
+
+        :param extent_string: Snapped analysis extent with its CRS.
+        :type extent_string: str
+
+        :returns: Common stage parameters.
+        :rtype: dict
+        """
+        return {
+            "extent": extent_string,
+            "crs": self.analysis_crs,
+            "no_data_value": self.no_data_value,
+            "activities": {
+                str(activity.uuid): [
+                    str(pathway.uuid)
+                    for pathway in activity.pathways or []
+                    if pathway is not None
+                ]
+                for activity in self.analysis_activities
+            },
+            "studyarea": self.studyarea_path if self.clip_to_studyarea else None,
+            "preview_factor": self.preview_factor,
+            "settings": {
+                setting.name: self.get_settings_value(setting)
+                for setting in self.STAGE_SETTINGS
+            },
+        }
+
+    def weighting_parameters(self) -> dict:
+        """Returns the parameters of the pathways weighting i.e. the
+        priority groups, the relative impact matrix and the pathway
+        suitability indexes.
+
+        :returns: Weighting parameters.
+        :rtype: dict
+        """
+        return {
+            "priority_layers_groups": self.analysis_priority_layers_groups,
+            "priority_layers": self.get_priority_layers(),
+            "impact_matrix": self.get_settings_value(
+                Settings.SCENARIO_IMPACT_MATRIX, default=""
+            ),
+            "suitability_index": {
+                str(pathway.uuid): pathway.suitability_index
+                for activity in self.analysis_activities
+                for pathway in activity.pathways or []
+                if pathway is not None
+            },
+        }
+
+    def run_studyarea_clipping(self) -> bool:
+        """Clips the analysis data to the study area after reprojecting
+        and validating the study area layer.
+
+        :returns: True if the task operation was successfully completed else False.
+        :rtype: bool
+        """
+        # Reproject the study area to the EPSG:4326
+        # The validate_vector_layer is successful when the layer is in EPSG:4326
+        studyarea_path = self.reproject_layer(
+            input_path=self.studyarea_path,
+            target_crs=QgsCoordinateReferenceSystem("EPSG:4326"),
+            is_raster=False,
+        )
+
+        # Validate layer geometries
+        validated_path = self.validate_vector_layer(studyarea_path)
+        if not validated_path:
+            self.log_message(f"Invalid studyarea layer: {studyarea_path} ")
+        else:
+            self.studyarea_path = validated_path
+
+        return self.clip_analysis_data(self.studyarea_path)
 
     def finished(self, result: bool):
         """Calls the handler responsible for doing post analysis workflow.
@@ -481,11 +1774,18 @@ class ScenarioAnalysisTask(QgsTask):
         :param value: Value to be set on the progress bar
         :type value: float
         """
-        if not self.processing_cancelled:
-            self.set_custom_progress(value)
-        else:
-            self.feedback = QgsProcessingFeedback()
-            self.processing_context = QgsProcessingContext()
+        if self.processing_cancelled:
+            # Stop the algorithm reporting the progress instead of
+            # replacing the feedback it holds
+            self.cancel_feedbacks()
+            return
+
+        # The progress model reports the overall progress of the stages
+        # instead of the progress of each algorithm
+        if self.progress_model.active:
+            return
+
+        self.set_custom_progress(value)
 
     def align_extent(self, raster_layer, target_extent):
         """Snaps the passed extent to the activities pathway layer pixel bounds
@@ -567,7 +1867,7 @@ class ScenarioAnalysisTask(QgsTask):
                 "TARGET_CRS": None,
                 "OUTPUT": QgsProcessing.TEMPORARY_OUTPUT,
             }
-            translate_output = processing.run(
+            translate_output = self.run_algorithm(
                 "gdal:translate",
                 alg_params,
                 context=self.processing_context,
@@ -590,7 +1890,7 @@ class ScenarioAnalysisTask(QgsTask):
                 "TARGET_RESOLUTION": None,
                 "OUTPUT": output_path,
             }
-            outputs = processing.run(
+            outputs = self.run_algorithm(
                 "gdal:warpreproject",
                 alg_params,
                 context=self.processing_context,
@@ -608,6 +1908,59 @@ class ScenarioAnalysisTask(QgsTask):
         """Replace the nodata value for activity pathways and priority layers.
         :param nodata_value: The nodata value to replace in the pathways and priority layers
         :type nodata_value: float
+        :returns: True if the task operation was successfully completed else False.
+        :rtype: bool
+        """
+        self.log_message(
+            f"Replacing nodata value for the pathways and priority layers to {nodata_value}"
+        )
+        if not self.run_pathway_layers_replace_nodata(nodata_value):
+            return False
+
+        if not self.run_priority_layers_replace_nodata(nodata_value):
+            return False
+
+        return self.update_pathways_priority_layers(self.replaced_priority_layers_paths)
+
+    def analysis_pathways(self) -> typing.Optional[typing.List[NcsPathway]]:
+        """Gets the unique pathways of the analysis activities.
+
+        :returns: The pathways or None if an activity has neither
+        pathways nor an activity layer.
+        :rtype: list
+        """
+        pathways: typing.List[NcsPathway] = []
+        for activity in self.analysis_activities:
+            if not activity.pathways and (activity.path is None or activity.path == ""):
+                self.set_info_message(
+                    tr(
+                        f"No defined activity pathways or "
+                        f" activity layers for the activity {activity.name}"
+                    ),
+                    level=Qgis.MessageLevel.Critical,
+                )
+                self.log_message(
+                    f"No defined activity pathways or "
+                    f"activity layers for the activity {activity.name}"
+                )
+                return None
+
+            for pathway in activity.pathways:
+                if not (pathway in pathways):
+                    pathways.append(pathway)
+
+        return pathways
+
+    def run_priority_layers_replace_nodata(self, nodata_value: float = -9999.0) -> bool:
+        """Replace the nodata value for the priority layers.
+
+        The paths of the priority layers, including those that were not
+        replaced, are saved in `replaced_priority_layers_paths` keyed by
+        the priority layer UUID.
+
+        :param nodata_value: The nodata value to replace in the priority layers
+        :type nodata_value: float
+
         :returns: True if the task operation was successfully completed else False.
         :rtype: bool
         """
@@ -615,48 +1968,16 @@ class ScenarioAnalysisTask(QgsTask):
             return False
 
         self.set_status_message(
-            tr(
-                "Replacing the nodata value for the activity pathways and priority layers"
-            )
+            tr("Replacing the nodata value for the priority layers")
         )
 
-        pathways: typing.List[NcsPathway] = []
-
         try:
-            # Create directories for replaced nodata pathways and priority layers
-            replaced_nodata_pathways_directory = os.path.join(
-                self.scenario_directory, "pathways", "replaced_nodata"
-            )
-            FileUtils.create_new_dir(replaced_nodata_pathways_directory)
-
             replaced_nodata_priority_directory = os.path.join(
                 self.scenario_directory, "priority_layer", "replaced_nodata"
             )
             FileUtils.create_new_dir(replaced_nodata_priority_directory)
 
-            for activity in self.analysis_activities:
-                if not activity.pathways and (
-                    activity.path is None or activity.path == ""
-                ):
-                    self.set_info_message(
-                        tr(
-                            f"No defined activity pathways or "
-                            f" activity layers for the activity {activity.name}"
-                        ),
-                        level=Qgis.MessageLevel.Critical,
-                    )
-                    self.log_message(
-                        f"No defined activity pathways or "
-                        f"activity layers for the activity {activity.name}"
-                    )
-                    return False
-
-                for pathway in activity.pathways:
-                    if not (pathway in pathways):
-                        pathways.append(pathway)
-            # Replace the no data value for priority layers
             # Dict with PWL uuid as key and path as value
-
             priority_layers_paths = {}
             for priority_layer in self.get_priority_layers():
                 if priority_layer is None:
@@ -697,7 +2018,7 @@ class ScenarioAnalysisTask(QgsTask):
 
                 output_file = os.path.join(
                     replaced_nodata_priority_directory,
-                    f"{Path(pathway.path).stem}_{str(self.scenario.uuid)[:4]}.tif",
+                    f"{Path(priority_layer_path).stem}_{str(self.scenario.uuid)[:4]}.tif",
                 )
 
                 result = self.replace_nodata(
@@ -706,57 +2027,76 @@ class ScenarioAnalysisTask(QgsTask):
                 if result:
                     priority_layers_paths[priority_layer.get("uuid")] = output_file
 
-            if pathways is not None and len(pathways) > 0:
-                for pathway in pathways:
-                    pathway_layer = QgsRasterLayer(pathway.path, pathway.name)
+            self.replaced_priority_layers_paths = priority_layers_paths
 
-                    if self.processing_cancelled:
-                        return False
-                    if not pathway_layer.isValid():
-                        self.log_message(
-                            f"Pathway layer {pathway.name} is not valid, "
-                            f"skipping replacing nodata value for layer."
-                        )
-                        continue
-                    raster_provider = pathway_layer.dataProvider()
-                    raster_no_data_value = raster_provider.sourceNoDataValue(1)
-                    if raster_no_data_value == nodata_value:
-                        self.log_message(
-                            f"Pathway layer {pathway.name} already has the nodata value "
-                            f"{nodata_value}, skipping replacing nodata value for layer."
-                        )
-                    else:
-                        self.log_message(
-                            f"Replacing nodata value for {pathway.name} pathway layer "
-                            f"from {raster_no_data_value} to {nodata_value}\n"
-                        )
+        except Exception as e:
+            self.log_message(
+                f"Problem replacing nodata value for priority layers, {e} \n"
+            )
+            self.cancel_task(e)
+            return False
 
-                        output_file = os.path.join(
-                            replaced_nodata_pathways_directory,
-                            f"{Path(pathway.path).stem}_{str(self.scenario.uuid)[:4]}.tif",
-                        )
+        return True
 
-                        result = self.replace_nodata(
-                            pathway.path, output_file, nodata_value
-                        )
-                        if result:
-                            pathway.path = output_file
+    def run_pathway_layers_replace_nodata(self, nodata_value: float = -9999.0) -> bool:
+        """Replace the nodata value for the activity pathway layers.
 
-                    if (
-                        pathway.priority_layers is not None
-                        and len(pathway.priority_layers) > 0
-                    ):
-                        pathway_priority_layers = []
-                        for priority_layer in pathway.priority_layers:
-                            pwl_uuid = priority_layer.get("uuid")
-                            if pwl_uuid in priority_layers_paths:
-                                priority_layer["path"] = priority_layers_paths.get(
-                                    pwl_uuid, ""
-                                )
+        :param nodata_value: The nodata value to replace in the pathways
+        :type nodata_value: float
+
+        :returns: True if the task operation was successfully completed else False.
+        :rtype: bool
+        """
+        if self.processing_cancelled:
+            return False
+
+        self.set_status_message(
+            tr("Replacing the nodata value for the activity pathways")
+        )
+
+        try:
+            pathways = self.analysis_pathways()
+            if pathways is None:
+                return False
+
+            replaced_nodata_pathways_directory = os.path.join(
+                self.scenario_directory, "pathways", "replaced_nodata"
+            )
+            FileUtils.create_new_dir(replaced_nodata_pathways_directory)
+
+            for pathway in pathways:
+                pathway_layer = QgsRasterLayer(pathway.path, pathway.name)
+
+                if self.processing_cancelled:
+                    return False
+                if not pathway_layer.isValid():
+                    self.log_message(
+                        f"Pathway layer {pathway.name} is not valid, "
+                        f"skipping replacing nodata value for layer."
+                    )
+                    continue
+                raster_provider = pathway_layer.dataProvider()
+                raster_no_data_value = raster_provider.sourceNoDataValue(1)
+                if raster_no_data_value == nodata_value:
+                    self.log_message(
+                        f"Pathway layer {pathway.name} already has the nodata value "
+                        f"{nodata_value}, skipping replacing nodata value for layer."
+                    )
+                    continue
 
-                            pathway_priority_layers.append(priority_layer)
+                self.log_message(
+                    f"Replacing nodata value for {pathway.name} pathway layer "
+                    f"from {raster_no_data_value} to {nodata_value}\n"
+                )
 
-                        pathway.priority_layers = pathway_priority_layers
+                output_file = os.path.join(
+                    replaced_nodata_pathways_directory,
+                    f"{Path(pathway.path).stem}_{str(self.scenario.uuid)[:4]}.tif",
+                )
+
+                result = self.replace_nodata(pathway.path, output_file, nodata_value)
+                if result:
+                    pathway.path = output_file
 
         except Exception as e:
             self.log_message(f"Problem replacing nodata value for layers, {e} \n")
@@ -765,6 +2105,42 @@ class ScenarioAnalysisTask(QgsTask):
 
         return True
 
+    def update_pathways_priority_layers(
+        self, priority_layers_paths: typing.Dict[str, str]
+    ) -> bool:
+        """Sets the paths of the priority layers of the analysis pathways
+        e.g. to the priority layers with the replaced nodata value.
+
+        :param priority_layers_paths: Priority layer paths keyed by
+        the priority layer UUID.
+        :type priority_layers_paths: dict
+
+        :returns: True if the task operation was successfully completed else False.
+        :rtype: bool
+        """
+        if self.processing_cancelled:
+            return False
+
+        pathways = self.analysis_pathways()
+        if pathways is None:
+            return False
+
+        for pathway in pathways:
+            if pathway.priority_layers is None or len(pathway.priority_layers) == 0:
+                continue
+
+            pathway_priority_layers = []
+            for priority_layer in pathway.priority_layers:
+                pwl_uuid = priority_layer.get("uuid")
+                if pwl_uuid in priority_layers_paths:
+                    priority_layer["path"] = priority_layers_paths.get(pwl_uuid, "")
+
+                pathway_priority_layers.append(priority_layer)
+
+            pathway.priority_layers = pathway_priority_layers
+
+        return True
+
     def run_pathways_carbon_summation(self) -> bool:
         """Calculates total carbon mitigation values for the Naturebase pathways.
 
@@ -867,7 +2243,7 @@ class ScenarioAnalysisTask(QgsTask):
                 f" {alg_params} \n"
             )
 
-            result = processing.run(
+            result = self.run_algorithm(
                 "native:fixgeometries",
                 alg_params,
                 context=self.processing_context,
@@ -996,7 +2372,7 @@ class ScenarioAnalysisTask(QgsTask):
             if self.processing_cancelled:
                 return False
 
-            result = processing.run(
+            result = self.run_algorithm(
                 "gdal:cliprasterbymasklayer",
                 alg_params,
                 context=self.processing_context,
@@ -1415,6 +2791,130 @@ class ScenarioAnalysisTask(QgsTask):
 
         return output_path
 
+    def run_preview_downsampling(self) -> bool:
+        """Downsamples the pathway, priority and carbon layers by the
+        preview factor so that the rest of the analysis runs at a coarser
+        resolution.
+
+        The layers are average resampled, reading from the overviews of
+        the layers when they have them.
+
+        :returns: True if the task operation was successfully completed else False.
+        :rtype: bool
+        """
+        if self.processing_cancelled:
+            return False
+
+        self.set_status_message(
+            tr(f"Downsampling the layers by {self.preview_factor} for the preview")
+        )
+
+        preview_directory = os.path.join(self.scenario_directory, "preview")
+        FileUtils.create_new_dir(preview_directory)
+
+        # Layers used by more than one pathway are downsampled once
+        downsampled_paths = {}
+
+        def downsample(path: str) -> str:
+            if not path or not os.path.exists(path):
+                return path
+            if path not in downsampled_paths:
+                downsampled_paths[path] = (
+                    self.downsample_layer(path, preview_directory) or path
+                )
+            return downsampled_paths[path]
+
+        try:
+            for priority_layer in self.get_priority_layers():
+                if priority_layer is None:
+                    continue
+                if self.processing_cancelled:
+                    return False
+                self.preview_priority_layers_paths[str(priority_layer.get("uuid"))] = (
+                    downsample(priority_layer.get("path"))
+                )
+
+            for pathways in self._analysis_pathways_by_uuid().values():
+                if self.processing_cancelled:
+                    return False
+                pathway = pathways[0]
+                path = downsample(pathway.path)
+                carbon_paths = [
+                    downsample(carbon_path)
+                    for carbon_path in getattr(pathway, "carbon_paths", None) or []
+                ]
+                priority_layers = [
+                    dict(
+                        priority_layer,
+                        path=self.preview_priority_layers_paths.get(
+                            str(priority_layer.get("uuid")),
+                            priority_layer.get("path"),
+                        ),
+                    )
+                    for priority_layer in pathway.priority_layers or []
+                ]
+                for pathway in pathways:
+                    pathway.path = path
+                    pathway.carbon_paths = list(carbon_paths)
+                    pathway.priority_layers = list(priority_layers)
+        except Exception as e:
+            self.log_message(f"Problem downsampling the preview layers, {e} \n")
+            self.cancel_task(e)
+            return False
+
+        return True
+
+    def downsample_layer(self, input_path: str, output_directory: str) -> str:
+        """Average resamples a raster layer to its pixel size multiplied by
+        the preview factor.
+
+        :param input_path: Input layer path
+        :type input_path: str
+
+        :param output_directory: Directory to save the downsampled layer
+        :type output_directory: str
+
+        :returns: Path to the downsampled layer or None if the layer could
+        not be downsampled.
+        :rtype: str
+        """
+        if self.processing_cancelled:
+            return None
+
+        layer = QgsRasterLayer(input_path, f"{str(uuid.uuid4())[:4]}")
+        if not layer.isValid():
+            self.log_message(
+                f"Layer {input_path} is not valid, skipping the preview downsampling."
+            )
+            return None
+
+        output_file = os.path.join(
+            output_directory,
+            f"{Path(input_path).stem}_{str(uuid.uuid4())[:4]}.tif",
+        )
+        alg_params = {
+            "INPUT": input_path,
+            "RESAMPLING": self.PREVIEW_RESAMPLING,
+            "TARGET_RESOLUTION": layer.rasterUnitsPerPixelX() * self.preview_factor,
+            "MULTITHREADING": True,
+            "OUTPUT": output_file,
+        }
+
+        try:
+            self.feedback = QgsProcessingFeedback()
+            self.feedback.progressChanged.connect(self.update_progress)
+
+            results = self.run_algorithm(
+                "gdal:warpreproject",
+                alg_params,
+                context=self.processing_context,
+                feedback=self.feedback,
+            )
+            return results["OUTPUT"]
+        except Exception as e:
+            self.log_message(f"Problem downsampling layer {input_path}, {e} \n")
+            return None
+
     def reproject_layer(
         self,
         input_path: str,
@@ -1476,7 +2976,7 @@ class ScenarioAnalysisTask(QgsTask):
             if self.processing_cancelled:
                 return None
 
-            results = processing.run(
+            results = self.run_algorithm(
                 "gdal:warpreproject" if is_raster else "native:reprojectlayer",
                 alg_params,
                 context=self.processing_context,
@@ -1751,7 +3251,7 @@ class ScenarioAnalysisTask(QgsTask):
                 if self.processing_cancelled:
                     return False
 
-                results = processing.run(
+                results = self.run_algorithm(
                     "native:cellstatistics",
                     alg_params,
                     context=self.processing_context,
@@ -1766,6 +3266,138 @@ class ScenarioAnalysisTask(QgsTask):
 
         return True
 
+    def run_ncs_decision_tree(self, activities: typing.List[Activity]) -> bool:
+        """Applies the NCS decision tree on the union of the pathways of
+        the passed activities.
+
+        The Protect, Manage and Restore masks are computed together in a
+        single pass, on the grid of the reference layer (or of the first
+        pathway layer if there is no reference layer). Each activity then
+        gets the masks of the actions of its pathways, which are kept apart
+        from its vector mask layers and applied as raster masks when the
+        activities are masked.
+
+        :param activities: List of the selected activities
+        :type activities: typing.List[Activity]
+
+        :returns: True if the task operation was successfully completed else False.
+        :rtype: bool
+        """
+        if self.processing_cancelled:
+            return False
+
+        pathways = {}
+        for activity in activities:
+            for pathway in activity.pathways or []:
+                if pathway is not None:
+                    pathways[str(pathway.uuid)] = pathway
+        if not pathways:
+            return False
+
+        self.set_status_message(tr("Applying the NCS decision tree"))
+
+        reference_layer_path = self.get_reference_layer()
+        if reference_layer_path:
+            reference_layer = QgsRasterLayer(reference_layer_path, "reference")
+        else:
+            first_pathway = next(
+                (pathway for pathway in pathways.values() if pathway.path),
+                None,
+            )
+            reference_layer = (
+                QgsRasterLayer(first_pathway.path, first_pathway.name)
+                if first_pathway
+                else None
+            )
+        if reference_layer is None or not reference_layer.isValid():
+            self.log_message(
+                "Skipping the NCS decision tree, no valid reference layer."
+            )
+            return False
+
+        if self.analysis_extent.crs is not None:
+            crs = QgsCoordinateReferenceSystem(self.analysis_extent.crs)
+        else:
+            crs = reference_layer.crs()
+
+        extent = QgsRectangle(
+            float(self.analysis_extent.bbox[0]),
+            float(self.analysis_extent.bbox[2]),
+            float(self.analysis_extent.bbox[1]),
+            float(self.analysis_extent.bbox[3]),
+        )
+        pixel_size = reference_layer.rasterUnitsPerPixelX()
+        if reference_layer.crs() == crs:
+            extent = self.align_extent(reference_layer, extent)
+        else:
+            # Pixel size of the reference grid in the scenario CRS
+            transform = QgsCoordinateTransform(
+                reference_layer.crs(), crs, QgsProject.instance()
+            )
+            reference_extent = transform.transformBoundingBox(reference_layer.extent())
+            pixel_size = reference_extent.width() / reference_layer.width()
+
+        nodata_value = self.get_settings_value(
+            Settings.NCS_NO_DATA_VALUE, default=NO_DATA_VALUE, setting_type=float
+        )
+
+        decision_tree_directory = os.path.join(self.scenario_directory, "decision_tree")
+        FileUtils.create_new_dir(decision_tree_directory)
+        output_paths = {
+            action_idx: os.path.join(
+                decision_tree_directory, f"decision_{action_name.lower()}.tif"
+            )
+            for action_idx, action_name in enumerate(
+                ApplyNcsDecisionTreeAlgorithm.CHOICES_ACTION
+            )
+        }
+
+        self.feedback = QgsProcessingFeedback()
+        self.feedback.progressChanged.connect(self.update_progress)
+
+        # The decision tree reads each pathway once over the extent
+        pixels = 0
+        if pixel_size > 0:
+            pixels = len(pathways) * int(
+                round(extent.width() / pixel_size) * round(extent.height() / pixel_size)
+            )
+        self.profiler.record_pixels(pixels)
+
+        try:
+            with self.track_progress(self.feedback, pixels):
+                results = run_ncs_decision_tree(
+                    list(pathways.values()),
+                    output_paths,
+                    crs,
+                    extent,
+                    pixel_size,
+                    int(nodata_value),
+                    self.feedback,
+                )
+        except Exception as e:
+            self.log_message(f"Problem applying the NCS decision tree, {e}")
+            return False
+
+        action_types = [
+            NcsPathwayType.PROTECT,
+            NcsPathwayType.MANAGE,
+            NcsPathwayType.RESTORE,
+        ]
+        self.decision_mask_paths = {}
+        for activity in activities:
+            activity_types = {
+                pathway.pathway_type
+                for pathway in activity.pathways or []
+                if pathway is not None
+            }
+            self.decision_mask_paths[str(activity.uuid)] = [
+                results[action_idx]
+                for action_idx, action_type in enumerate(action_types)
+                if action_type in activity_types and action_idx in results
+            ]
+
+        return not self.processing_cancelled
+
     def run_activity_normalization(
         self,
     ) -> bool:
@@ -1853,7 +3485,7 @@ class ScenarioAnalysisTask(QgsTask):
                 if self.processing_cancelled:
                     return False
 
-                result = processing.run(
+                result = self.run_algorithm(
                     "gdal:rastercalculator",
                     alg_params,
                     context=self.processing_context,
@@ -2027,7 +3659,7 @@ class ScenarioAnalysisTask(QgsTask):
                 if self.processing_cancelled:
                     return False
 
-                results = processing.run(
+                results = self.run_algorithm(
                     "gdal:cliprasterbymasklayer",
                     alg_params,
                     context=self.processing_context,
@@ -2042,6 +3674,182 @@ class ScenarioAnalysisTask(QgsTask):
 
         return True
 
+    def apply_decision_masks(
+        self, activity: Activity, temporary_output: bool = False
+    ) -> bool:
+        """Applies the NCS decision tree masks of the activity on its layer.
+
+        The decision tree masks are rasters, the pixels of the activity
+        layer where none of its masks allows an action are set to NoData.
+
+        :param activity: Activity to be masked
+        :type activity: Activity
+
+        :param temporary_output: Whether to save the processing outputs as temporary
+        files
+        :type temporary_output: bool
+
+        :returns: False if the processing has been cancelled else True.
+        :rtype: bool
+        """
+        mask_paths = [
+            mask_path
+            for mask_path in self.decision_mask_paths.get(str(activity.uuid), [])
+            if mask_path and os.path.exists(mask_path)
+        ]
+        if not mask_paths or not activity.path:
+            return not self.processing_cancelled
+
+        activity_layer = QgsRasterLayer(activity.path, "activity_layer")
+        if not activity_layer.isValid():
+            self.log_message(
+                f"Skipping the decision tree masking of the activity "
+                f"{activity.name}, its layer {activity.path} is not valid."
+            )
+            return not self.processing_cancelled
+
+        masked_activities_directory = os.path.join(
+            self.scenario_directory, "final_masked_activities"
+        )
+        FileUtils.create_new_dir(masked_activities_directory)
+        file_name = clean_filename(activity.name.replace(" ", "_"))
+        output_file = os.path.join(
+            masked_activities_directory,
+            f"{file_name}_decision_{str(uuid.uuid4())[:4]}.tif",
+        )
+        output = QgsProcessing.TEMPORARY_OUTPUT if temporary_output else output_file
+
+        self.feedback = QgsProcessingFeedback()
+        self.feedback.progressChanged.connect(self.update_progress)
+
+        if self.processing_cancelled:
+            return False
+
+        # Step 1: Pixels where at least one action is allowed, on the
+        # grid of the activity layer
+        allowed_expression = " OR ".join(
+            f'("{Path(mask_path).stem}@1" > 0)' for mask_path in mask_paths
+        )
+        allowed_mask = self.run_algorithm(
+            "qgis:rastercalculator",
+            {
+                "CELLSIZE": activity_layer.rasterUnitsPerPixelX(),
+                "LAYERS": mask_paths,
+                "CRS": activity_layer.crs(),
+                "EXTENT": activity_layer.extent(),
+                "EXPRESSION": allowed_expression,
+                "OUTPUT": "TEMPORARY_OUTPUT",
+            },
+            context=self.processing_context,
+            feedback=self.feedback,
+        )["OUTPUT"]
+
+        # Step 2: Set the activity pixels outside the allowed areas to NoData
+        nodata_value = float(
+            self.get_settings_value(
+                Settings.NCS_NO_DATA_VALUE, default=NO_DATA_VALUE, setting_type=float
+            )
+        )
+        alg_params = {
+            "INPUT_A": activity.path,
+            "BAND_A": 1,
+            "INPUT_B": allowed_mask,
+            "BAND_B": 1,
+            "FORMULA": f"A * (B > 0) + (B <= 0) * {nodata_value}",
+            "NO_DATA": nodata_value,
+            "RTYPE": 5,
+            "OPTIONS": "COMPRESS=DEFLATE|ZLEVEL=6|TILED=YES",
+            "OUTPUT": output,
+        }
+
+        self.log_message(
+            f"Used parameters for masking the activity {activity.name}"
+            f" using its decision tree masks: {alg_params} \n"
+        )
+
+        results = self.run_algorithm(
+            "gdal:rastercalculator",
+            alg_params,
+            context=self.processing_context,
+            feedback=self.feedback,
+        )
+        activity.path = results["OUTPUT"]
+
+        return not self.processing_cancelled
+
+    def polygonize_decision_masks(self, activity: Activity) -> typing.Optional[str]:
+        """Creates a polygon mask layer of the areas where none of the NCS
+        decision tree masks of the activity allows an action.
+
+        Used where only vector mask layers are supported e.g. by the
+        online analysis.
+
+        :param activity: Activity whose decision tree masks are converted
+        :type activity: Activity
+
+        :returns: Path of the polygon mask layer or None if the activity
+        has no decision tree masks or they could not be converted.
+        :rtype: str
+        """
+        mask_paths = [
+            mask_path
+            for mask_path in self.decision_mask_paths.get(str(activity.uuid), [])
+            if mask_path and os.path.exists(mask_path)
+        ]
+        if not mask_paths or self.processing_cancelled:
+            return None
+
+        # The decision tree masks share the same grid
+        letters = ["A", "B", "C"]
+        alg_params = {"FORMULA": "1"}
+        for letter, mask_path in zip(letters, mask_paths):
+            alg_params[f"INPUT_{letter}"] = mask_path
+            alg_params[f"BAND_{letter}"] = 1
+            alg_params["FORMULA"] += f" * ({letter} <= 0)"
+        alg_params.update({"NO_DATA": 0, "RTYPE": 0, "OUTPUT": "TEMPORARY_OUTPUT"})
+
+        output_directory = os.path.join(self.scenario_directory, "decision_tree")
+        FileUtils.create_new_dir(output_directory)
+        file_name = clean_filename(activity.name.replace(" ", "_"))
+        output_file = os.path.join(
+            output_directory,
+            f"{file_name}_excluded_{str(uuid.uuid4())[:4]}.shp",
+        )
+
+        self.feedback = QgsProcessingFeedback()
+        self.feedback.progressChanged.connect(self.update_progress)
+
+        try:
+            # Excluded pixels are 1, the allowed ones are NoData
+            excluded = self.run_algorithm(
+                "gdal:rastercalculator",
+                alg_params,
+                context=self.processing_context,
+                feedback=self.feedback,
+            )["OUTPUT"]
+
+            results = self.run_algorithm(
+                "gdal:polygonize",
+                {
+                    "INPUT": excluded,
+                    "BAND": 1,
+                    "FIELD": "DN",
+                    "EIGHT_CONNECTEDNESS": False,
+                    "EXTRA": "",
+                    "OUTPUT": output_file,
+                },
+                context=self.processing_context,
+                feedback=self.feedback,
+            )
+        except Exception as e:
+            self.log_message(
+                f"Problem converting the decision tree masks of the activity "
+                f"{activity.name} to polygons, {e}"
+            )
+            return None
+
+        return results["OUTPUT"]
+
     def run_internal_activities_masking(
         self, activities, extent, temporary_output=False
     ):
@@ -2069,6 +3877,10 @@ class ScenarioAnalysisTask(QgsTask):
         )
 
         try:
+            for activity in activities:
+                if not self.apply_decision_masks(activity, temporary_output):
+                    return False
+
             for activity in activities:
                 masking_layers = activity.mask_paths
 
@@ -2217,7 +4029,7 @@ class ScenarioAnalysisTask(QgsTask):
                 if self.processing_cancelled:
                     return False
 
-                results = processing.run(
+                results = self.run_algorithm(
                     "gdal:cliprasterbymasklayer",
                     alg_params,
                     context=self.processing_context,
@@ -2269,7 +4081,7 @@ class ScenarioAnalysisTask(QgsTask):
 
         self.log_message(f"Used parameters for merging mask layers: {alg_params} \n")
 
-        results = processing.run(
+        results = self.run_algorithm(
             "native:mergevectorlayers",
             alg_params,
             context=self.processing_context,
@@ -2295,7 +4107,7 @@ class ScenarioAnalysisTask(QgsTask):
             "OUTPUT": QgsProcessing.TEMPORARY_OUTPUT,
         }
 
-        results = processing.run(
+        results = self.run_algorithm(
             "native:extenttolayer",
             alg_params,
             context=self.processing_context,
@@ -2326,7 +4138,7 @@ class ScenarioAnalysisTask(QgsTask):
             "OUTPUT": QgsProcessing.TEMPORARY_OUTPUT,
         }
 
-        results = processing.run(
+        results = self.run_algorithm(
             "native:symmetricaldifference",
             alg_params,
             context=self.processing_context,
@@ -2414,7 +4226,7 @@ class ScenarioAnalysisTask(QgsTask):
                 input_name = os.path.splitext(os.path.basename(activity.path))[0]
 
                 # Step 1: Create a binary mask from the original raster
-                binary_mask = processing.run(
+                binary_mask = self.run_algorithm(
                     "qgis:rastercalculator",
                     {
                         "CELLSIZE": 0,
@@ -2437,7 +4249,7 @@ class ScenarioAnalysisTask(QgsTask):
                 self.log_message(f"Used parameters for sieving: {sieve_alg_params} \n")
 
                 # Step 2: Run sieve analysis from the output of the binary mask
-                sieved_mask = processing.run(
+                sieved_mask = self.run_algorithm(
                     "gdal:sieve",
                     sieve_alg_params,
                     context=self.processing_context,
@@ -2447,7 +4259,7 @@ class ScenarioAnalysisTask(QgsTask):
                 expr = f"({os.path.splitext(os.path.basename(sieved_mask))[0]}@1 > 0) * {os.path.splitext(os.path.basename(sieved_mask))[0]}@1"
 
                 # Step 3: Remove and convert any no data value to 0
-                sieved_mask_clean = processing.run(
+                sieved_mask_clean = self.run_algorithm(
                     "qgis:rastercalculator",
                     {
                         "CELLSIZE": 0,
@@ -2463,7 +4275,7 @@ class ScenarioAnalysisTask(QgsTask):
                 expr_2 = f"{input_name}@1 * {os.path.splitext(os.path.basename(sieved_mask_clean))[0]}@1"
 
                 # Step 4: Join the sieved mask with the original input layer to filter out the small areas
-                sieve_output = processing.run(
+                sieve_output = self.run_algorithm(
                     "qgis:rastercalculator",
                     {
                         "CELLSIZE": 0,
@@ -2481,7 +4293,7 @@ class ScenarioAnalysisTask(QgsTask):
                 no_data_replace_exp = (
                     f"(A > 0)*A + (A <= 0)*{float(self.no_data_value)}"
                 )
-                sieve_output_updated = processing.run(
+                sieve_output_updated = self.run_algorithm(
                     "gdal:rastercalculator",
                     {
                         "INPUT_A": f"{sieve_output}",
@@ -2513,7 +4325,7 @@ class ScenarioAnalysisTask(QgsTask):
 
                 # Step 6. Run sum statistics with ignore no data values set to false
                 # and no data value
-                results = processing.run(
+                results = self.run_algorithm(
                     "native:cellstatistics",
                     {
                         "INPUT": [sieve_output_updated],
@@ -2667,9 +4479,7 @@ class ScenarioAnalysisTask(QgsTask):
 
         # Get the relative impact matrix
         relative_impact_matrix = dict()
-        impact_matrix = settings_manager.get_value(
-            Settings.SCENARIO_IMPACT_MATRIX, dict()
-        )
+        impact_matrix = self.get_settings_value(Settings.SCENARIO_IMPACT_MATRIX, dict())
         if len(impact_matrix) > 0:
             relative_impact_matrix = json.loads(impact_matrix)
 
@@ -2767,13 +4577,18 @@ class ScenarioAnalysisTask(QgsTask):
                         self.log_message(missing_pwl_message)
                         continue
 
-                    pwl_path = Path(pwl)
+                    # Virtual constant rasters are inlined as scalars
+                    pwl_constant_value = virtual_constant_raster_value(pwl)
+                    if pwl_constant_value is not None:
+                        pwl_reference = f"{pwl_constant_value!r}"
+                    else:
+                        pwl_path = Path(pwl)
 
-                    if not pwl_path.exists():
-                        self.log_message(missing_pwl_message)
-                        continue
+                        if not pwl_path.exists():
+                            self.log_message(missing_pwl_message)
+                            continue
 
-                    pwl_path_basename = pwl_path.stem
+                        pwl_reference = f'"{pwl_path.stem}@1"'
 
                     for priority_layer in settings_priority_layers:
                         if priority_layer.get("name") == layer.get("name"):
@@ -2801,19 +4616,19 @@ class ScenarioAnalysisTask(QgsTask):
                                 value = group.get("value")
                                 priority_group_coefficient = float(value)
                                 if priority_group_coefficient > 0:
-                                    if pwl not in layers:
+                                    if pwl_constant_value is None and pwl not in layers:
                                         layers.append(pwl)
 
                                     pwl_expression = (
                                         f"({priority_group_coefficient}*"
-                                        f'"{pwl_path_basename}@1")'
+                                        f"{pwl_reference})"
                                     )
 
                                     if impact_value is not None and impact_value < 0:
                                         # Inverse the PWL
                                         pwl_expression = (
                                             f"({priority_group_coefficient}*"
-                                            f'("{pwl_path_basename}@1" - 1) * -1)'
+                                            f"({pwl_reference} - 1) * -1)"
                                         )
                                     norm_carbon_impact = pathway.type_options.get(
                                         "norm_carbon_impact"
@@ -2858,6 +4673,25 @@ class ScenarioAnalysisTask(QgsTask):
                     "OUTPUT": output_file,
                 }
 
+                # Reuse the weighted pathway of a previous analysis with
+                # the same expression and input layers
+                pathway_fingerprint = fingerprint(
+                    {
+                        "expression": expression,
+                        "extent": extent,
+                        "layers": layers,
+                    }
+                )
+                weighted_path = self.reusable_item(pathway_fingerprint)
+                if weighted_path:
+                    self.log_message(
+                        f"Reusing the weighted pathway {weighted_path} "
+                        f"for the pathway {pathway.name}"
+                    )
+                    pathway.path = weighted_path
+                    self.record_item(pathway_fingerprint, weighted_path)
+                    continue
+
                 self.log_message(
                     f" Used parameters for calculating weighting pathways {alg_params} \n"
                 )
@@ -2868,13 +4702,14 @@ class ScenarioAnalysisTask(QgsTask):
                 if self.processing_cancelled:
                     return False
 
-                results = processing.run(
+                results = self.run_algorithm(
                     "qgis:rastercalculator",
                     alg_params,
                     context=self.processing_context,
                     feedback=self.feedback,
                 )
                 pathway.path = results["OUTPUT"]
+                self.record_item(pathway_fingerprint, pathway.path)
 
         except Exception as e:
             self.log_message(f"Problem weighting pathways, {e}\n")
@@ -2966,7 +4801,7 @@ class ScenarioAnalysisTask(QgsTask):
                 if self.processing_cancelled:
                     return False
 
-                results = processing.run(
+                results = self.run_algorithm(
                     "native:cellstatistics",
                     alg_params,
                     context=self.processing_context,
@@ -3026,7 +4861,7 @@ class ScenarioAnalysisTask(QgsTask):
             self.feedback.progressChanged.connect(self.update_progress)
 
             # 1. Creating a binary raster
-            binary = processing.run(
+            binary = self.run_algorithm(
                 "qgis:rastercalculator",
                 {
                     "CELLSIZE": 0,
@@ -3040,7 +4875,7 @@ class ScenarioAnalysisTask(QgsTask):
             )["OUTPUT"]
 
             # 2. Polygonize the binary to get polygon clusters
-            binary_polygonize = processing.run(
+            binary_polygonize = self.run_algorithm(
                 "gdal:polygonize",
                 {
                     "INPUT": binary,
@@ -3058,7 +4893,7 @@ class ScenarioAnalysisTask(QgsTask):
                 return None
 
             # 3. Create a zonal statistics to find the number of pixels in each cluster
-            zonal_statistics = processing.run(
+            zonal_statistics = self.run_algorithm(
                 "native:zonalstatisticsfb",
                 {
                     "INPUT": QgsProcessingFeatureSourceDefinition(
@@ -3080,7 +4915,7 @@ class ScenarioAnalysisTask(QgsTask):
             )["OUTPUT"]
 
             # 4. Caculate connectivity score = count of pixels in cluster * compactness
-            score = processing.run(
+            score = self.run_algorithm(
                 "native:fieldcalculator",
                 {
                     "INPUT": zonal_statistics,
@@ -3099,7 +4934,7 @@ class ScenarioAnalysisTask(QgsTask):
                 return None
 
             # 5. Rasterize the score vector
-            processing.run(
+            self.run_algorithm(
                 "gdal:rasterize_over",
                 {
                     "INPUT": score,
@@ -3135,6 +4970,27 @@ class ScenarioAnalysisTask(QgsTask):
             self.cancel_task(e)
         return None
 
+    def run_activity_connectivity(self, activity: Activity) -> bool:
+        """Creates the connectivity layer of the activity and saves its
+        path in `connectivity_layers` for the investability analysis.
+
+        :param activity: Activity
+        :type activity: Activity
+
+        :returns: True if the connectivity layer was created else False.
+        :rtype: bool
+        """
+        if self.processing_cancelled:
+            return False
+
+        connectivity_path = self.create_activity_connectivity_layer(activity)
+        if not connectivity_path:
+            return False
+
+        self.connectivity_layers[str(activity.uuid)] = connectivity_path
+
+        return True
+
     def run_investability_analysis(self) -> bool:
         """Run activity investability analysis
 
@@ -3182,22 +5038,27 @@ class ScenarioAnalysisTask(QgsTask):
                     )
                 )
 
-                # Serialize the constant rasters
-                constant_rasters = [
-                    {
-                        "name": component.base_name,
-                        "uuid": component.component_id,
-                        "absolute": component.value_info.absolute,
-                        "normalized": component.value_info.normalized,
-                        "path": component.path,
-                        "skip_raster": (
-                            component.skip_raster
-                            if os.path.exists(component.path)
-                            else True
-                        ),
-                    }
-                    for component in constant_raster_components
-                ]
+                # Serialize the constant rasters, the value of a virtual
+                # constant raster is used as its normalized value
+                constant_rasters = []
+                for component in constant_raster_components:
+                    normalized_value = virtual_constant_raster_value(component.path)
+                    if normalized_value is None:
+                        normalized_value = component.value_info.normalized
+                    constant_rasters.append(
+                        {
+                            "name": component.base_name,
+                            "uuid": component.component_id,
+                            "absolute": component.value_info.absolute,
+                            "normalized": normalized_value,
+                            "path": component.path,
+                            "skip_raster": (
+                                component.skip_raster
+                                if component.path and os.path.exists(component.path)
+                                else True
+                            ),
+                        }
+                    )
 
                 if constant_rasters is None:
                     constant_rasters = []
@@ -3208,10 +5069,13 @@ class ScenarioAnalysisTask(QgsTask):
                 if self.get_settings_value(
                     Settings.PIXEL_CONNECTIVITY_ENABLED, default=True, setting_type=bool
                 ):
-                    # Add connectivity layer
-                    connectivity_path = self.create_activity_connectivity_layer(
-                        activity=activity
-                    )
+                    # Add connectivity layer, reusing the layer created in
+                    # the connectivity stage of the activity if available
+                    connectivity_path = self.connectivity_layers.get(str(activity.uuid))
+                    if not connectivity_path:
+                        connectivity_path = self.create_activity_connectivity_layer(
+                            activity=activity
+                        )
                     if connectivity_path and os.path.exists(connectivity_path):
                         constant_rasters.append(
                             {
@@ -3298,7 +5162,7 @@ class ScenarioAnalysisTask(QgsTask):
                 if self.processing_cancelled:
                     return False
 
-                result = processing.run(
+                result = self.run_algorithm(
                     "qgis:rastercalculator",
                     alg_params,
                     context=self.processing_context,
@@ -3351,6 +5215,7 @@ class ScenarioAnalysisTask(QgsTask):
             scenario=self.scenario,
             scenario_directory=self.scenario_directory,
             created_date=datetime.datetime.now(),
+            preview=self.preview,
         )
 
         try:
@@ -3427,7 +5292,7 @@ class ScenarioAnalysisTask(QgsTask):
             if self.processing_cancelled:
                 return False
 
-            self.output = processing.run(
+            self.output = self.run_algorithm(
                 "native:highestpositioninrasterstack",
                 alg_params,
                 context=self.processing_context,
@@ -94,14 +94,108 @@ class tr_download:
         return QtCore.QCoreApplication.translate("tr_download", message)
 
 
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_SIDECAR_SUFFIX = ".md5.json"
+MAX_PARALLEL_DOWNLOADS = 4
+
+
+class StreamingHasher:
+    """Computes the MD5 hash of a file in chunks while it is being written,
+    so that the downloaded data is hashed as it arrives instead of being
+    read again once the download has completed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._md5 = hashlib.md5()
+        self._offset = 0
+
+    def update(self):
+        """Hashes the data that has been written since the last update.
+
+        The file is not kept open between updates so that the downloader
+        can still remove it if the download fails.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                for chunk in iter(partial(f.read, HASH_CHUNK_SIZE), b""):
+                    self._md5.update(chunk)
+                    self._offset += len(chunk)
+        except FileNotFoundError:
+            return
+
+    def finish(self) -> str:
+        """Hashes the remaining data and returns the hex digest."""
+        self.update()
+        return self._md5.hexdigest()
+
+
+def file_md5(path) -> str:
+    """Computes the MD5 hash of a file by reading it in chunks."""
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(partial(f.read, HASH_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def read_hash_sidecar(path) -> typing.Optional[str]:
+    """Returns the hash recorded in the sidecar of a file, if the file
+    has not changed since the hash was recorded.
+    """
+    try:
+        stat = os.stat(path)
+        with open(f"{path}{HASH_SIDECAR_SUFFIX}", "r") as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if sidecar.get("size") != stat.st_size or sidecar.get("mtime") != stat.st_mtime_ns:
+        return None
+
+    return sidecar.get("md5")
+
+
+def write_hash_sidecar(path, md5hash: str):
+    """Records the hash of a file together with its size and modification
+    time so that it is not hashed again while it is unchanged.
+    """
+    sidecar_path = f"{path}{HASH_SIDECAR_SUFFIX}"
+    try:
+        stat = os.stat(path)
+        temp_path = f"{sidecar_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(
+                {"md5": md5hash, "size": stat.st_size, "mtime": stat.st_mtime_ns}, f
+            )
+        os.replace(temp_path, sidecar_path)
+    except OSError as e:
+        log(f"Unable to write hash sidecar for {path}, {e}")
+
+
+def file_hash(path) -> str:
+    """Returns the MD5 hash of a file, reusing the hash in its sidecar
+    if the file is unchanged.
+
+    The sidecar is only written once the hash has been verified, see
+    check_hash_against_etag.
+    """
+    md5hash = read_hash_sidecar(path)
+    if md5hash is None:
+        md5hash = file_md5(path)
+    return md5hash
+
+
 def local_check_hash_against_etag(path: Path, expected: str) -> bool:
     try:
-        path_hash = hashlib.md5(path.read_bytes()).hexdigest()
+        path_hash = file_hash(path)
     except FileNotFoundError:
         result = False
     else:
         result = path_hash == expected
         if result:
+            write_hash_sidecar(path, path_hash)
             log(f"File hash verified for {path}")
         else:
             log(
@@ -111,7 +205,7 @@ def local_check_hash_against_etag(path: Path, expected: str) -> bool:
     return result
 
 
-def check_hash_against_etag(url, filename, expected=None):
+def check_hash_against_etag(url, filename, expected=None, md5hash=None):
     if not expected:
         h = APIClient(API_URL, TIMEOUT).get_header(url)
         if not h:
@@ -125,10 +219,11 @@ def check_hash_against_etag(url, filename, expected=None):
             else:
                 raise NotImplementedError
 
-    with open(filename, "rb") as f:
-        md5hash = hashlib.md5(f.read()).hexdigest()
+    if md5hash is None:
+        md5hash = file_hash(filename)
 
     if md5hash == expected:
+        write_hash_sidecar(filename, md5hash)
         log("File hash verified for {}".format(filename))
         return True
     else:
@@ -163,7 +258,7 @@ def extract_zipfile(f, verify=True):
         resp = worker.get_resp()
         if not resp:
             return False
-        if not check_hash_against_etag(url, filename):
+        if not check_hash_against_etag(url, filename, md5hash=worker.get_hash()):
             return False
 
     try:
@@ -203,7 +298,7 @@ def read_json(f, verify=True):
         resp = worker.get_resp()
         if not resp:
             return None
-        if not check_hash_against_etag(url, filename):
+        if not check_hash_against_etag(url, filename, md5hash=worker.get_hash()):
             return None
 
     with gzip.GzipFile(filename, "r") as fin:
@@ -230,43 +325,52 @@ def download_files(urls, out_folder):
         )
         return None
 
+    out_paths = [(url, os.path.join(out_folder, os.path.basename(url))) for url in urls]
+    pending = [
+        (url, out_path)
+        for url, out_path in out_paths
+        if not os.path.exists(out_path) or not check_hash_against_etag(url, out_path)
+    ]
+    if len(pending) == 0:
+        return []
+
+    for url, out_path in pending:
+        log("Downloading {} to {}".format(url, out_path))
+
+    batch = DownloadBatch(pending)
+    try:
+        results = batch.start()
+    except PermissionError:
+        log("Unable to write to {}.".format(out_folder))
+        QtWidgets.QMessageBox.critical(
+            None,
+            tr_download.tr("Error"),
+            tr_download.tr("Unable to write to {}.".format(out_folder)),
+        )
+        return None
+
     downloads = []
-    for url in urls:
-        out_path = os.path.join(out_folder, os.path.basename(url))
-        if not os.path.exists(out_path) or not check_hash_against_etag(url, out_path):
-            log("Downloading {} to {}".format(url, out_path))
-
-            worker = Download(url, out_path)
-            try:
-                worker.start()
-            except PermissionError:
-                log("Unable to write to {}.".format(out_folder))
-                QtWidgets.QMessageBox.critical(
-                    None,
-                    tr_download.tr("Error"),
-                    tr_download.tr("Unable to write to {}.".format(out_folder)),
-                )
-                return None
-
-            resp = worker.get_resp()
-            if not resp:
-                log("Error accessing {}.".format(url))
-                QtWidgets.QMessageBox.critical(
-                    None,
-                    tr_download.tr("Error"),
-                    tr_download.tr("Error accessing {}.".format(url)),
-                )
-                return None
-            if not check_hash_against_etag(url, out_path):
-                log("File verification failed for {}.".format(out_path))
-                QtWidgets.QMessageBox.critical(
-                    None,
-                    tr_download.tr("Error"),
-                    tr_download.tr("File verification failed for {}.".format(out_path)),
-                )
-                return None
-
-            downloads.extend(out_path)
+    for url, out_path in pending:
+        if not results.get(out_path):
+            log("Error accessing {}.".format(url))
+            QtWidgets.QMessageBox.critical(
+                None,
+                tr_download.tr("Error"),
+                tr_download.tr("Error accessing {}.".format(url)),
+            )
+            return None
+        if not check_hash_against_etag(
+            url, out_path, md5hash=batch.hashes.get(out_path)
+        ):
+            log("File verification failed for {}.".format(out_path))
+            QtWidgets.QMessageBox.critical(
+                None,
+                tr_download.tr("Error"),
+                tr_download.tr("File verification failed for {}.".format(out_path)),
+            )
+            return None
+
+        downloads.append(out_path)
 
     return downloads
 
@@ -343,6 +447,8 @@ class DownloadWorker(AbstractWorker):
         AbstractWorker.__init__(self)
         self.url = url
         self.outfile = outfile
+        self.md5 = None
+        self.hasher = StreamingHasher(outfile)
 
     def work(self):
         self.toggle_show_progress.emit(True)
@@ -376,6 +482,7 @@ class DownloadWorker(AbstractWorker):
             log(tr_download.tr("Error in downloading file, {}").format(str(e)))
 
     def update_progress(self, value, total):
+        self.hasher.update()
         if total > 0:
             self.progress.emit(value * 100 / total)
 
@@ -390,6 +497,7 @@ class DownloadWorker(AbstractWorker):
         )
 
     def download_finished(self):
+        self.md5 = self.hasher.finish()
         log(tr_download.tr(f"Finished downloading file to {self.outfile}"))
 
     def download_exit(self, loop):
@@ -401,6 +509,7 @@ class Download:
     def __init__(self, url, outfile):
         self.resp = None
         self.exception = None
+        self.md5 = None
         self.url = url
         self.outfile = outfile
 
@@ -415,6 +524,7 @@ class Download:
                 worker, iface, tr_download.tr("Downloading {}").format(self.outfile)
             )
             pause.exec()
+            self.md5 = worker.md5
             if self.get_exception():
                 raise self.get_exception()
 
@@ -446,3 +556,66 @@ class Download:
 
     def get_exception(self):
         return self.exception
+
+    def get_hash(self):
+        return self.md5
+
+
+class DownloadBatch:
+    """Downloads files concurrently, with at most max_workers downloads
+    running at the same time.
+    """
+
+    def __init__(self, downloads, max_workers=MAX_PARALLEL_DOWNLOADS):
+        self.downloads = list(downloads)
+        self.max_workers = max(1, max_workers)
+        self.results = {}
+        self.hashes = {}
+        self.exceptions = {}
+        self._pending = []
+        self._workers = []
+        self._running = 0
+        self._loop = None
+
+    def start(self) -> typing.Dict[str, bool]:
+        """Runs the downloads and returns whether each output file was
+        downloaded successfully.
+
+        The hashes computed while downloading are kept in hashes, keyed
+        by the output file, so that they can be verified without reading
+        the files again.
+        """
+        self._pending = list(self.downloads)
+        self._loop = QtCore.QEventLoop()
+        self._start_next()
+        if self._running > 0:
+            self._loop.exec()
+        self._workers = []
+
+        return self.results
+
+    def _start_next(self):
+        while self._pending and self._running < self.max_workers:
+            url, outfile = self._pending.pop(0)
+            worker = DownloadWorker(url, outfile)
+            worker.finished.connect(partial(self._download_finished, worker))
+            worker.error.connect(partial(self._save_exception, outfile))
+            self._workers.append(worker)
+            self._running += 1
+            start_worker(
+                worker, iface, tr_download.tr("Downloading {}").format(outfile)
+            )
+
+    def _save_exception(self, outfile, exception):
+        log(f"Download of {outfile} failed, {exception}")
+        self.exceptions[outfile] = exception
+
+    def _download_finished(self, worker, result):
+        outfile = worker.outfile
+        self.results[outfile] = bool(result) and outfile not in self.exceptions
+        if self.results[outfile]:
+            self.hashes[outfile] = worker.md5
+        self._running -= 1
+        self._start_next()
+        if self._running == 0:
+            self._loop.quit()
@@ -6,6 +6,7 @@ Plugin utilities
 import hashlib
 import json
 import math
+import mmap
 import os
 import typing
 import uuid
@@ -900,6 +901,109 @@ def md5(fname):
     return hash_md5.hexdigest()
 
 
+def sampled_file_fingerprint(file_path: str, sample_size: int = 1024 * 1024) -> str:
+    """Computes a fast fingerprint of a file from its size and a hash of
+    samples taken from the start, middle and end of the file.
+
+    Files smaller than three samples are hashed entirely. Two files with
+    the same fingerprint are very likely, but not guaranteed, to have the
+    same content so the fingerprint should be confirmed with `md5`.
+
+    :param file_path: Path of the file
+    :type file_path: str
+
+    :param sample_size: Number of bytes in each sample, defaults to 1 MiB
+    :type sample_size: int
+
+    :returns: Fingerprint of the file in the form `<size>-<hash>`
+    :rtype: str
+    """
+    file_size = os.stat(file_path).st_size
+    hash_md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        if file_size <= sample_size * 3:
+            hash_md5.update(f.read())
+        else:
+            for offset in (0, (file_size - sample_size) // 2, file_size - sample_size):
+                f.seek(offset)
+                hash_md5.update(f.read(sample_size))
+
+    return f"{file_size}-{hash_md5.hexdigest()}"
+
+
+class FilePartReader:
+    """Reads byte ranges of a file without sharing a file position,
+    so that several threads can read different parts of the same file
+    concurrently.
+
+    Uses `os.pread` where the platform supports it, otherwise the file
+    is memory-mapped and the requested range is sliced from the map.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = None
+        self._mmap = None
+
+    def __enter__(self) -> "FilePartReader":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def open(self):
+        """Opens the underlying file for reading."""
+        self._file = open(self.file_path, "rb")
+        if not hasattr(os, "pread") and os.fstat(self._file.fileno()).st_size > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Closes the memory map, if any, and the underlying file."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Reads up to `size` bytes starting at `offset`.
+
+        :param offset: Position in the file to start reading from.
+        :type offset: int
+
+        :param size: Maximum number of bytes to read.
+        :type size: int
+
+        :returns: The bytes read, shorter than `size` only at the end
+        of the file.
+        :rtype: bytes
+        """
+        if self._file is None:
+            raise ValueError(f"File {self.file_path} is not open for reading")
+
+        if self._mmap is not None:
+            return self._mmap[offset : offset + size]
+
+        if not hasattr(os, "pread"):
+            # Empty file on a platform without pread
+            return b""
+
+        fd = self._file.fileno()
+        parts = []
+        remaining = size
+        while remaining > 0:
+            data = os.pread(fd, remaining, offset)
+            if not data:
+                break
+            parts.append(data)
+            offset += len(data)
+            remaining -= len(data)
+
+        return b"".join(parts)
+
+
 def get_layer_type(file_path: str):
     """
     Get layer type code from file path
@@ -1069,10 +1173,16 @@ def compress_raster(
     output_format: str = "GTiff",
     create_options: list = None,
     additional_options: list = None,
+    predictor: int = None,
+    block_size: int = 512,
 ):
     """
     Compresses a raster file using GDAL and optionally replace old NoData pixel values with a new one.
 
+    The raster is written as a tiled GeoTIFF and copied window by window,
+    a strip of `block_size` rows at a time, so that the whole band is
+    never held in memory.
+
     :param input_path: Path to the input raster file
     :type input_path: str
 
@@ -1097,6 +1207,13 @@ def compress_raster(
     :param additional_options: dditional GDAL options as a list
     :type additional_options: list
 
+    :param predictor: Compression predictor, 2 for horizontal differencing
+        or 3 for floating point. If None, it is chosen from the data type
+    :type predictor: int
+
+    :param block_size: Size of the output tiles in pixels, defaults to 512
+    :type block_size: int
+
     :return: Path to the temporary file if successful, None if failed
     :rtype: str or None
     """
@@ -1131,10 +1248,13 @@ def compress_raster(
         dtype = src_ds.GetRasterBand(1).DataType
 
         compression = src_ds.GetMetadataItem("COMPRESSION", "IMAGE_STRUCTURE")
-        if compression.lower() == "deflate":
-            log(f"Raster {input_path} is already compressed with DEFLATE.")
+        if compression and compression.lower() in ("deflate", "zstd"):
+            log(f"Raster {input_path} is already compressed with {compression}.")
             return input_path
 
+        if predictor is None:
+            predictor = 3 if dtype in (gdal.GDT_Float32, gdal.GDT_Float64) else 2
+
         # Add any additional create options
         if not create_options:
             create_options = []
@@ -1145,9 +1265,13 @@ def compress_raster(
                 f"COMPRESS={compression_type}",
                 f"ZLEVEL={compress_level}",
                 f"JPEG_QUALITY={compress_level}",
+                f"ZSTD_LEVEL={compress_level}",
+                f"PREDICTOR={predictor}",
                 f"NUM_THREADS=ALL_CPUS",
                 "BIGTIFF=IF_SAFER",
                 "TILED=YES",
+                f"BLOCKXSIZE={block_size}",
+                f"BLOCKYSIZE={block_size}",
             ]
         )
 
@@ -1165,19 +1289,27 @@ def compress_raster(
 
         for i in range(1, band_count + 1):
             band = src_ds.GetRasterBand(i)
-            data = band.ReadAsArray()
             old_nodata = band.GetNoDataValue()
+            out_band = out_ds.GetRasterBand(i)
 
-            # Replace pixel values if old NoData exists
-            if nodata_value is not None and old_nodata is not None:
-                data = np.where(data == old_nodata, nodata_value, data)
+            # Copy a strip of tiles at a time
+            for y_offset in range(0, ysize, block_size):
+                rows = min(block_size, ysize - y_offset)
+                data = band.ReadAsArray(0, y_offset, xsize, rows)
 
-            out_band = out_ds.GetRasterBand(i)
-            out_band.WriteArray(data)
-            out_band.SetNoDataValue(nodata_value)
+                # Replace pixel values if old NoData exists
+                if nodata_value is not None and old_nodata is not None:
+                    data = np.where(data == old_nodata, nodata_value, data)
+
+                out_band.WriteArray(data, 0, y_offset)
+
+            new_nodata = nodata_value if nodata_value is not None else old_nodata
+            if new_nodata is not None:
+                out_band.SetNoDataValue(new_nodata)
             out_band.FlushCache()
 
         # Close datasets
+        out_ds = None
         src_ds = None
         # if os.path.exists(output_path):
         log(f"Successfully compressed raster saved to temporary file: {output_path}")
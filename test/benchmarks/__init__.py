@@ -0,0 +1,6 @@
+# coding=utf-8
+"""Performance benchmarks of the scenario analysis using synthetic rasters.
+
+The benchmarks are not part of the unit test suite, run them in the QGIS
+test environment with ``qgis_testrunner.sh test_suite.benchmark_package``.
+"""
@@ -0,0 +1,330 @@
+# coding=utf-8
+"""Synthetic raster and vector fixtures for the benchmarks."""
+
+import dataclasses
+import json
+import os
+import typing
+import uuid
+
+import numpy as np
+from osgeo import gdal, osr
+
+
+NODATA_VALUE = -9999.0
+
+# Origin and pixel size of the projected (UTM zone 35S) fixtures
+PROJECTED_EPSG = 32735
+PROJECTED_ORIGIN = (300000.0, 7400000.0)
+PROJECTED_PIXEL_SIZE = 30.0
+
+# Origin and pixel size of the geographic fixtures for the carbon
+# calculations, which expect WGS84 layers
+GEOGRAPHIC_EPSG = 4326
+GEOGRAPHIC_ORIGIN = (30.0, -23.0)
+GEOGRAPHIC_PIXEL_SIZE = 0.0003
+
+BLOCK_ROWS = 512
+
+# Name and NcsPathwayType value of the synthetic pathways, cycled through
+# so the NCS decision tree gets protect, manage and restore pathways
+PATHWAY_TYPES = [
+    ("Protect forest", 0),
+    ("Manage grassland", 2),
+    ("Restore forest", 1),
+    ("Restore wetland", 1),
+]
+
+
+def write_raster(
+    path: str,
+    size: int,
+    values: typing.Callable[[np.random.Generator, int, int], np.ndarray],
+    epsg: int = PROJECTED_EPSG,
+    origin: typing.Tuple[float, float] = PROJECTED_ORIGIN,
+    pixel_size: float = PROJECTED_PIXEL_SIZE,
+    seed: int = 0,
+) -> str:
+    """Writes a square single band Float32 GeoTIFF block by block so that
+    large rasters do not have to fit in memory.
+
+    :param path: Output path.
+    :type path: str
+
+    :param size: Number of rows and columns.
+    :type size: int
+
+    :param values: Callable returning the values of a block given a random
+    generator, the number of rows and the number of columns.
+    :type values: Callable
+
+    :param epsg: EPSG code of the raster CRS.
+    :type epsg: int
+
+    :param origin: Top left corner of the raster.
+    :type origin: tuple
+
+    :param pixel_size: Pixel width and height in CRS units.
+    :type pixel_size: float
+
+    :param seed: Seed of the random values, the same seed gives the
+    same raster.
+    :type seed: int
+
+    :returns: The output path.
+    :rtype: str
+    """
+    driver = gdal.GetDriverByName("GTiff")
+    dataset = driver.Create(
+        path,
+        size,
+        size,
+        1,
+        gdal.GDT_Float32,
+        options=["TILED=YES", "COMPRESS=DEFLATE", "BIGTIFF=IF_SAFER"],
+    )
+    dataset.SetGeoTransform([origin[0], pixel_size, 0, origin[1], 0, -pixel_size])
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    dataset.SetProjection(srs.ExportToWkt())
+
+    band = dataset.GetRasterBand(1)
+    band.SetNoDataValue(NODATA_VALUE)
+    for row in range(0, size, BLOCK_ROWS):
+        rows = min(BLOCK_ROWS, size - row)
+        # Seeding each block makes the values independent of the block size
+        generator = np.random.default_rng([seed, row])
+        band.WriteArray(values(generator, rows, size).astype(np.float32), 0, row)
+
+    band.FlushCache()
+    dataset = None
+
+    return path
+
+
+def pathway_values(generator: np.random.Generator, rows: int, columns: int):
+    """Suitability values between 0 and 1 with a third of nodata pixels."""
+    values = generator.random((rows, columns))
+    values[generator.random((rows, columns)) < 0.3] = NODATA_VALUE
+    return values
+
+
+def priority_values(generator: np.random.Generator, rows: int, columns: int):
+    """Priority weighting values between 0 and 1."""
+    return generator.random((rows, columns))
+
+
+def carbon_values(generator: np.random.Generator, rows: int, columns: int):
+    """Carbon values in tonnes per hectare."""
+    return generator.uniform(0, 300, (rows, columns))
+
+
+def binary_values(generator: np.random.Generator, rows: int, columns: int):
+    """Binary values of a protect pathways union."""
+    return (generator.random((rows, columns)) < 0.5).astype(np.float32)
+
+
+def write_aoi(
+    path: str,
+    size: int,
+    epsg: int = PROJECTED_EPSG,
+    origin: typing.Tuple[float, float] = PROJECTED_ORIGIN,
+    pixel_size: float = PROJECTED_PIXEL_SIZE,
+) -> str:
+    """Writes a GeoJSON study area covering the central 80% of the extent
+    of the rasters with the given size.
+
+    :returns: The output path.
+    :rtype: str
+    """
+    length = size * pixel_size
+    x_min = origin[0] + 0.1 * length
+    x_max = origin[0] + 0.9 * length
+    y_max = origin[1] - 0.1 * length
+    y_min = origin[1] - 0.9 * length
+    feature_collection = {
+        "type": "FeatureCollection",
+        "crs": {
+            "type": "name",
+            "properties": {"name": f"urn:ogc:def:crs:EPSG::{epsg}"},
+        },
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"id": 1},
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [
+                        [
+                            [x_min, y_min],
+                            [x_max, y_min],
+                            [x_max, y_max],
+                            [x_min, y_max],
+                            [x_min, y_min],
+                        ]
+                    ],
+                },
+            }
+        ],
+    }
+    with open(path, "w") as f:
+        json.dump(feature_collection, f)
+
+    return path
+
+
+@dataclasses.dataclass
+class SyntheticDataset:
+    """Paths of the synthetic layers of a benchmark dataset."""
+
+    directory: str
+    size: int
+    pathways: typing.List[str]
+    priority_layers: typing.List[str]
+    carbon_layers: typing.List[str]
+    aoi: str
+    protect_pathways: str
+    reference_carbon: str
+
+    @property
+    def extent(self) -> typing.List[float]:
+        """Returns the extent of the projected layers in the order
+        xmin, xmax, ymin, ymax.
+        """
+        length = self.size * PROJECTED_PIXEL_SIZE
+        x_min, y_max = PROJECTED_ORIGIN
+        return [x_min, x_min + length, y_max - length, y_max]
+
+    @property
+    def geographic_extent(self) -> typing.List[float]:
+        """Returns the extent of the geographic layers in the order
+        xmin, xmax, ymin, ymax.
+        """
+        length = self.size * GEOGRAPHIC_PIXEL_SIZE
+        x_min, y_max = GEOGRAPHIC_ORIGIN
+        return [x_min, x_min + length, y_max - length, y_max]
+
+    def scenario_definition(self, name: str = "Benchmark scenario") -> dict:
+        """Returns a headless runner scenario definition with an activity
+        per pathway, using the priority layers in a single group.
+
+        :param name: Scenario name.
+        :type name: str
+
+        :returns: Scenario definition attribute values.
+        :rtype: dict
+        """
+        group = {"uuid": str(uuid.uuid4()), "name": "Benchmark group", "value": 5}
+        priority_layers = [
+            {
+                "uuid": str(uuid.uuid4()),
+                "name": f"Priority layer {index}",
+                "description": "Synthetic priority layer",
+                "path": path,
+                "selected": True,
+                "groups": [{"name": group["name"], "value": group["value"]}],
+            }
+            for index, path in enumerate(self.priority_layers, 1)
+        ]
+        pathways = []
+        for index, path in enumerate(self.pathways):
+            pathway_name, pathway_type = PATHWAY_TYPES[index % len(PATHWAY_TYPES)]
+            pathways.append(
+                {
+                    "uuid": str(uuid.uuid4()),
+                    "name": f"{pathway_name} {index + 1}",
+                    "description": "Synthetic pathway",
+                    "path": path,
+                    "layer_type": 0,
+                    "pathway_type": pathway_type,
+                    "suitability_index": 0,
+                    "priority_layers": priority_layers,
+                }
+            )
+        activities = [
+            {
+                "uuid": str(uuid.uuid4()),
+                "name": f"Activity {index}",
+                "description": "Synthetic activity",
+                "pathways": [pathway["uuid"]],
+            }
+            for index, pathway in enumerate(pathways, 1)
+        ]
+
+        return {
+            "name": name,
+            "description": "Synthetic benchmark scenario",
+            "extent": {"bbox": self.extent, "crs": f"EPSG:{PROJECTED_EPSG}"},
+            "studyarea_path": self.aoi,
+            "base_dir": self.directory,
+            "settings": {
+                "INCREMENTAL_ANALYSIS": False,
+                "SNAPPING_ENABLED": False,
+                "SIEVE_ENABLED": False,
+                "PIXEL_CONNECTIVITY_ENABLED": False,
+            },
+            "priority_groups": [group],
+            "priority_layers": priority_layers,
+            "pathways": pathways,
+            "activities": activities,
+        }
+
+
+def create_dataset(
+    directory: str,
+    size: int,
+    pathway_count: int = 3,
+    priority_layer_count: int = 2,
+    carbon_layer_count: int = 1,
+    seed: int = 0,
+) -> SyntheticDataset:
+    """Creates a dataset of synthetic layers, reusing the layers of an
+    earlier run in the same directory.
+
+    :param directory: Directory of the dataset.
+    :type directory: str
+
+    :param size: Number of rows and columns of the rasters.
+    :type size: int
+
+    :returns: The synthetic dataset.
+    :rtype: SyntheticDataset
+    """
+    directory = os.path.join(directory, f"synthetic_{size}")
+    os.makedirs(directory, exist_ok=True)
+
+    def raster(name, values, index, **kwargs):
+        path = os.path.join(directory, f"{name}_{index}.tif")
+        if not os.path.exists(path):
+            write_raster(path, size, values, seed=seed + index, **kwargs)
+        return path
+
+    geographic = {
+        "epsg": GEOGRAPHIC_EPSG,
+        "origin": GEOGRAPHIC_ORIGIN,
+        "pixel_size": GEOGRAPHIC_PIXEL_SIZE,
+    }
+
+    aoi = os.path.join(directory, "aoi.geojson")
+    if not os.path.exists(aoi):
+        write_aoi(aoi, size)
+
+    return SyntheticDataset(
+        directory=directory,
+        size=size,
+        pathways=[
+            raster("pathway", pathway_values, index)
+            for index in range(1, pathway_count + 1)
+        ],
+        priority_layers=[
+            raster("priority", priority_values, 100 + index)
+            for index in range(1, priority_layer_count + 1)
+        ],
+        carbon_layers=[
+            raster("carbon", carbon_values, 200 + index)
+            for index in range(1, carbon_layer_count + 1)
+        ],
+        aoi=aoi,
+        protect_pathways=raster("protect", binary_values, 300, **geographic),
+        reference_carbon=raster("reference_carbon", carbon_values, 301, **geographic),
+    )
@@ -0,0 +1,262 @@
+# coding=utf-8
+"""Timing, reporting and baseline comparison of the benchmarks."""
+
+import dataclasses
+import datetime
+import json
+import os
+import platform
+import statistics
+import time
+import typing
+
+
+@dataclasses.dataclass
+class BenchmarkResult:
+    """Timings of the rounds of a benchmark, in seconds."""
+
+    name: str
+    group: str
+    timings: typing.List[float] = dataclasses.field(default_factory=list)
+
+    @property
+    def min(self) -> float:
+        return min(self.timings)
+
+    @property
+    def max(self) -> float:
+        return max(self.timings)
+
+    @property
+    def mean(self) -> float:
+        return statistics.mean(self.timings)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.timings)
+
+    @property
+    def stddev(self) -> float:
+        if len(self.timings) < 2:
+            return 0.0
+        return statistics.stdev(self.timings)
+
+    @property
+    def key(self) -> str:
+        """Returns the identifier of the benchmark in the baselines."""
+        return f"{self.group}::{self.name}"
+
+    def to_dict(self) -> dict:
+        """Returns the benchmark statistics.
+
+        :returns: Benchmark statistics.
+        :rtype: dict
+        """
+        return {
+            "name": self.name,
+            "group": self.group,
+            "rounds": len(self.timings),
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+            "median": self.median,
+            "stddev": self.stddev,
+        }
+
+
+@dataclasses.dataclass
+class Regression:
+    """A benchmark slower than its baseline beyond the tolerance."""
+
+    key: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float("inf")
+
+
+class BenchmarkSession:
+    """Runs the benchmarks and compares their timings with the saved
+    baselines.
+
+    Baselines are specific to the machine they were recorded on, they are
+    only meaningful for comparing changes benchmarked in the same
+    environment.
+    """
+
+    def __init__(self, rounds: int = 3, warmup: bool = False):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.results: typing.List[BenchmarkResult] = []
+
+    def benchmark(
+        self,
+        name: str,
+        func: typing.Callable,
+        group: str = "default",
+        rounds: int = None,
+    ) -> typing.Any:
+        """Times the rounds of a function.
+
+        :param name: Benchmark name.
+        :type name: str
+
+        :param func: Function to time, called without arguments.
+        :type func: Callable
+
+        :param group: Benchmark group e.g. the dataset size.
+        :type group: str
+
+        :param rounds: Number of rounds, the session rounds if not set.
+        :type rounds: int
+
+        :returns: Return value of the last round.
+        :rtype: Any
+        """
+        if self.warmup:
+            func()
+
+        value = None
+        timings = []
+        for _ in range(rounds or self.rounds):
+            start = time.perf_counter()
+            value = func()
+            timings.append(time.perf_counter() - start)
+
+        self.add_timings(name, timings, group)
+
+        return value
+
+    def add_timings(
+        self, name: str, timings: typing.List[float], group: str = "default"
+    ) -> BenchmarkResult:
+        """Adds timings measured outside the session e.g. the stage
+        durations from an analysis profile.
+
+        :param name: Benchmark name.
+        :type name: str
+
+        :param timings: Timings in seconds.
+        :type timings: list
+
+        :param group: Benchmark group.
+        :type group: str
+
+        :returns: The benchmark result.
+        :rtype: BenchmarkResult
+        """
+        for result in self.results:
+            if result.name == name and result.group == group:
+                result.timings.extend(timings)
+                return result
+
+        result = BenchmarkResult(name, group, list(timings))
+        self.results.append(result)
+
+        return result
+
+    def table(self) -> str:
+        """Returns the benchmark statistics as a text table.
+
+        :returns: Table text.
+        :rtype: str
+        """
+        headers = ["Name", "Min", "Max", "Mean", "StdDev", "Median", "Rounds"]
+        rows = []
+        for result in sorted(self.results, key=lambda item: (item.group, item.mean)):
+            rows.append(
+                [
+                    result.key,
+                    f"{result.min:.4f}",
+                    f"{result.max:.4f}",
+                    f"{result.mean:.4f}",
+                    f"{result.stddev:.4f}",
+                    f"{result.median:.4f}",
+                    str(len(result.timings)),
+                ]
+            )
+
+        widths = [
+            max(len(row[index]) for row in [headers] + rows)
+            for index in range(len(headers))
+        ]
+
+        def line(values):
+            return "  ".join(
+                value.ljust(width) for value, width in zip(values, widths)
+            ).rstrip()
+
+        lines = [line(headers), "-" * sum(widths + [2 * (len(widths) - 1)])]
+        lines.extend(line(row) for row in rows)
+
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        """Returns the benchmark results with the machine details.
+
+        :returns: Benchmark results.
+        :rtype: dict
+        """
+        return {
+            "datetime": datetime.datetime.now().isoformat(),
+            "machine": {
+                "node": platform.node(),
+                "processor": platform.processor(),
+                "system": platform.platform(),
+                "python": platform.python_version(),
+                "cpu_count": os.cpu_count(),
+            },
+            "benchmarks": [result.to_dict() for result in self.results],
+        }
+
+    def save(self, path: str):
+        """Writes the benchmark results as a JSON file, the file can be
+        used as a baseline of later runs.
+
+        :param path: Path of the results file.
+        :type path: str
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+        os.replace(temp_path, path)
+
+    def compare(
+        self, baseline_path: str, tolerance: float = 0.2
+    ) -> typing.List[Regression]:
+        """Compares the median timings with the baseline timings.
+
+        :param baseline_path: Path of a saved results file.
+        :type baseline_path: str
+
+        :param tolerance: Allowed slowdown as a fraction of the baseline
+        e.g. 0.2 for 20% slower.
+        :type tolerance: float
+
+        :returns: Benchmarks slower than the baseline beyond the
+        tolerance, empty if there is no baseline.
+        :rtype: list
+        """
+        if not os.path.exists(baseline_path):
+            return []
+
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        baseline_medians = {
+            f"{item['group']}::{item['name']}": item["median"]
+            for item in baseline.get("benchmarks", [])
+        }
+        regressions = []
+        for result in self.results:
+            baseline_median = baseline_medians.get(result.key)
+            if baseline_median is None:
+                continue
+            if result.median > baseline_median * (1 + tolerance):
+                regressions.append(
+                    Regression(result.key, baseline_median, result.median)
+                )
+
+        return regressions
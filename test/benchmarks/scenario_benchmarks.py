@@ -0,0 +1,239 @@
+# coding=utf-8
+"""Benchmarks of the scenario analysis pipeline and of its hot paths.
+
+The benchmarks run on synthetic rasters generated with fixed seeds, so
+runs on the same machine process identical inputs. They are configured
+with the following environment variables:
+
+``CPLUS_BENCHMARK_SIZES``
+    Comma separated raster sizes in pixels per side, default 1000. Sizes
+    of 10000 and 40000 approach national scale analyses.
+``CPLUS_BENCHMARK_ROUNDS``
+    Number of rounds of each benchmark, default 3.
+``CPLUS_BENCHMARK_DATA_DIR``
+    Directory of the synthetic rasters, which are reused across runs.
+``CPLUS_BENCHMARK_SAVE_BASELINE``
+    Saves the results as the baseline of later runs when set to 1.
+``CPLUS_BENCHMARK_TOLERANCE``
+    Allowed slowdown against the baseline, default 0.2 i.e. 20%.
+"""
+
+import json
+import os
+import tempfile
+import typing
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsRasterLayer,
+    QgsRectangle,
+)
+
+from cplus_plugin.conf import settings_manager, Settings
+from cplus_plugin.definitions.defaults import SCENARIO_PROFILE_FILE_NAME
+from cplus_plugin.lib.carbon import _get_intersecting_pixel_values
+from cplus_plugin.lib.reports.comparison_table import ScenarioComparisonTableInfo
+from cplus_plugin.lib.runner import ExitCode, run_scenario, ScenarioDefinition
+from cplus_plugin.lib.validation.ncs_decision_tree import (
+    ApplyNcsDecisionTreeAlgorithm,
+    run_ncs_decision_tree,
+)
+from cplus_plugin.models.helpers import create_ncs_pathway
+from cplus_plugin.utils import calculate_raster_area_by_pixel_value
+
+from .fixtures import (
+    create_dataset,
+    NODATA_VALUE,
+    PROJECTED_EPSG,
+    PROJECTED_PIXEL_SIZE,
+    SyntheticDataset,
+)
+from .harness import BenchmarkSession
+
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baselines.json"
+)
+
+
+def benchmark_sizes() -> typing.List[int]:
+    """Returns the raster sizes to benchmark from the environment."""
+    sizes = os.environ.get("CPLUS_BENCHMARK_SIZES", "1000")
+    return [int(size) for size in sizes.split(",") if size.strip()]
+
+
+def benchmark_scenario_analysis(
+    session: BenchmarkSession, dataset: SyntheticDataset, group: str
+):
+    """Benchmarks the full scenario analysis using the headless runner and
+    records the duration of each stage from the analysis profile.
+
+    :returns: Summary of the last run.
+    :rtype: ScenarioRunSummary
+    """
+    summary = None
+    for _ in range(session.rounds):
+        definition = ScenarioDefinition.from_dict(dataset.scenario_definition())
+        summary = run_scenario(definition, save_result=False)
+        if summary.exit_code != ExitCode.SUCCESS:
+            print(f"Scenario analysis failed for {group}, {summary.error}")
+            return summary
+
+        session.add_timings("scenario_analysis", [summary.duration], group)
+
+        profile_path = os.path.join(
+            summary.scenario_directory, SCENARIO_PROFILE_FILE_NAME
+        )
+        if not os.path.exists(profile_path):
+            continue
+        with open(profile_path) as f:
+            profile = json.load(f)
+        for stage in profile.get("stages", []):
+            session.add_timings(
+                f"stage:{stage['name']}", [stage["usage"]["wall_time"]], group
+            )
+
+    return summary
+
+
+def benchmark_decision_tree(
+    session: BenchmarkSession, dataset: SyntheticDataset, group: str
+):
+    """Benchmarks the NCS decision tree on the synthetic pathways."""
+    definition = dataset.scenario_definition()
+    pathways = [
+        create_ncs_pathway(pathway_dict) for pathway_dict in definition["pathways"]
+    ]
+    x_min, x_max, y_min, y_max = dataset.extent
+    extent = QgsRectangle(x_min, y_min, x_max, y_max)
+    crs = QgsCoordinateReferenceSystem(f"EPSG:{PROJECTED_EPSG}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        output_paths = {
+            action_idx: os.path.join(directory, f"decision_{action.lower()}.tif")
+            for action_idx, action in enumerate(
+                ApplyNcsDecisionTreeAlgorithm.CHOICES_ACTION
+            )
+        }
+        session.benchmark(
+            "ncs_decision_tree",
+            lambda: run_ncs_decision_tree(
+                pathways,
+                output_paths,
+                crs,
+                extent,
+                PROJECTED_PIXEL_SIZE,
+                int(NODATA_VALUE),
+            ),
+            group,
+        )
+
+
+def benchmark_carbon(session: BenchmarkSession, dataset: SyntheticDataset, group: str):
+    """Benchmarks the extraction of the carbon values under the protect
+    pathways.
+    """
+    settings_manager.set_value(Settings.CLIP_TO_STUDYAREA, False)
+    settings_manager.set_value(Settings.SCENARIO_EXTENT, dataset.geographic_extent)
+    protect_layer = QgsRasterLayer(dataset.protect_pathways, "protect")
+
+    session.benchmark(
+        "carbon_intersecting_pixel_values",
+        lambda: _get_intersecting_pixel_values(
+            protect_layer,
+            dataset.reference_carbon,
+            "Reference carbon",
+            "Stored Carbon",
+        ),
+        group,
+    )
+
+
+def benchmark_reports(session: BenchmarkSession, summary, group: str):
+    """Benchmarks the area calculations of the reports on the output of
+    the scenario analysis.
+    """
+    if summary is None or summary.scenario_result is None:
+        return
+
+    output_layer = QgsRasterLayer(summary.output_path, "scenario")
+    if not output_layer.isValid():
+        return
+
+    session.benchmark(
+        "raster_area_by_pixel_value",
+        lambda: calculate_raster_area_by_pixel_value(output_layer),
+        group,
+    )
+    session.benchmark(
+        "comparison_table_contents",
+        lambda: ScenarioComparisonTableInfo([summary.scenario_result]).contents(),
+        group,
+    )
+
+
+def run_benchmarks(
+    sizes: typing.List[int] = None,
+    rounds: int = None,
+    data_directory: str = None,
+    save_baseline: bool = None,
+    tolerance: float = None,
+) -> BenchmarkSession:
+    """Runs the benchmarks for each raster size, prints the results and
+    compares them with the baseline.
+
+    Arguments that are not set are read from the environment.
+
+    :param sizes: Raster sizes in pixels per side.
+    :type sizes: list
+
+    :param rounds: Number of rounds of each benchmark.
+    :type rounds: int
+
+    :param data_directory: Directory of the synthetic rasters.
+    :type data_directory: str
+
+    :param save_baseline: Whether to save the results as the baseline.
+    :type save_baseline: bool
+
+    :param tolerance: Allowed slowdown against the baseline.
+    :type tolerance: float
+
+    :returns: The benchmark session with the results.
+    :rtype: BenchmarkSession
+    """
+    sizes = sizes or benchmark_sizes()
+    rounds = rounds or int(os.environ.get("CPLUS_BENCHMARK_ROUNDS", 3))
+    data_directory = data_directory or os.environ.get(
+        "CPLUS_BENCHMARK_DATA_DIR",
+        os.path.join(tempfile.gettempdir(), "cplus_benchmarks"),
+    )
+    if save_baseline is None:
+        save_baseline = os.environ.get("CPLUS_BENCHMARK_SAVE_BASELINE") == "1"
+    if tolerance is None:
+        tolerance = float(os.environ.get("CPLUS_BENCHMARK_TOLERANCE", 0.2))
+
+    session = BenchmarkSession(rounds)
+    for size in sizes:
+        group = f"{size}x{size}"
+        print(f"Benchmarking {group} rasters in {data_directory}")
+        dataset = create_dataset(data_directory, size)
+
+        summary = benchmark_scenario_analysis(session, dataset, group)
+        benchmark_decision_tree(session, dataset, group)
+        benchmark_carbon(session, dataset, group)
+        benchmark_reports(session, summary, group)
+
+    print(session.table())
+
+    for regression in session.compare(BASELINE_PATH, tolerance):
+        print(
+            f"Regression in {regression.key}: {regression.current:.4f}s "
+            f"against {regression.baseline:.4f}s ({regression.ratio:.2f}x)"
+        )
+
+    if save_baseline:
+        session.save(BASELINE_PATH)
+        print(f"Baseline saved in {BASELINE_PATH}")
+
+    return session
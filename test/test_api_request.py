@@ -1,3 +1,4 @@
+import hashlib
 import os
 import tempfile
 import typing
@@ -16,6 +17,7 @@ from cplus_plugin.api.request import (
     JOB_COMPLETED_STATUS,
     CplusApiUrl,
     CplusApiRequest,
+    PARTIAL_DOWNLOAD_SUFFIX,
 )
 from cplus_plugin.api.carbon import IrrecoverableCarbonDownloadTask
 from cplus_plugin.conf import settings_manager, Settings
@@ -55,6 +57,36 @@ class MockQNetworkReply(QNetworkReply):
         return True  # Simulating that the request is complete
 
 
+class MockDownloadReply:
+    """Stub of a download reply returning its content in one read."""
+
+    def __init__(self, data: bytes, status: int = 200, etag: str = ""):
+        self.data = data
+        self.status = status
+        self.etag = etag
+        self.readyRead = MagicMock()
+        self.downloadProgress = MagicMock()
+
+    def readAll(self):
+        data, self.data = self.data, b""
+        return QByteArray(data)
+
+    def attribute(self, attr_name):
+        return self.status
+
+    def rawHeader(self, name):
+        return QByteArray(f'"{self.etag}"'.encode("utf-8"))
+
+    def error(self):
+        return QNetworkReply.NetworkError.NoError
+
+    def errorString(self):
+        return ""
+
+    def deleteLater(self):
+        pass
+
+
 class TestCplusApiPooling(unittest.TestCase):
     @patch("cplus_plugin.api.request.CplusApiRequest")
     def setUp(self, mock_base_api_client):
@@ -384,6 +416,82 @@ class TestCplusApiRequest(unittest.TestCase):
         )
 
 
+class TestCplusApiDownload(unittest.TestCase):
+    """Tests for the resumable and verified download of output files."""
+
+    CONTENT = b"scenario output " * 64
+
+    def setUp(self):
+        self.api_request = CplusApiRequest()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "output.tif")
+        self.partial_path = f"{self.file_path}{PARTIAL_DOWNLOAD_SUFFIX}"
+        self.etag = hashlib.md5(self.CONTENT).hexdigest()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def download(self, reply: MockDownloadReply):
+        """Downloads the test file using the stubbed reply and returns the
+        request that was sent.
+        """
+        with patch(
+            "cplus_plugin.api.request.QgsNetworkAccessManager.instance"
+        ) as mock_nam_instance, patch.object(self.api_request, "_make_request"):
+            mock_nam_instance.return_value.get.return_value = reply
+            try:
+                self.api_request.download_file(
+                    "http://example.com/output.tif", self.file_path, MagicMock()
+                )
+            finally:
+                request = mock_nam_instance.return_value.get.call_args[0][0]
+
+        return request
+
+    def read_output(self) -> bytes:
+        with open(self.file_path, "rb") as f:
+            return f.read()
+
+    def test_download_file(self):
+        """Test the file is moved into place once its checksum matches."""
+        request = self.download(MockDownloadReply(self.CONTENT, etag=self.etag))
+
+        self.assertFalse(request.hasRawHeader(b"Range"))
+        self.assertEqual(self.read_output(), self.CONTENT)
+        self.assertFalse(os.path.exists(self.partial_path))
+
+    def test_resume_partial_download(self):
+        """Test only the remaining bytes of a partial file are requested."""
+        with open(self.partial_path, "wb") as f:
+            f.write(self.CONTENT[:100])
+
+        request = self.download(
+            MockDownloadReply(self.CONTENT[100:], status=206, etag=self.etag)
+        )
+
+        self.assertEqual(bytes(request.rawHeader(b"Range")), b"bytes=100-")
+        self.assertEqual(self.read_output(), self.CONTENT)
+
+    def test_restart_when_range_is_ignored(self):
+        """Test the partial file is replaced when the server sends the
+        whole file instead of the requested range.
+        """
+        with open(self.partial_path, "wb") as f:
+            f.write(b"stale content")
+
+        self.download(MockDownloadReply(self.CONTENT, status=200, etag=self.etag))
+
+        self.assertEqual(self.read_output(), self.CONTENT)
+
+    def test_checksum_mismatch(self):
+        """Test a file that does not match its ETag is discarded."""
+        with self.assertRaises(CplusApiRequestError):
+            self.download(MockDownloadReply(self.CONTENT, etag="0" * 32))
+
+        self.assertFalse(os.path.exists(self.file_path))
+        self.assertFalse(os.path.exists(self.partial_path))
+
+
 class TestIrrecoverableCarbonDownloader(unittest.TestCase):
     """Tests for the IrrecoverableCarbonDownloadTask."""
 
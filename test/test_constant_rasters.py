@@ -3,8 +3,12 @@
 Unit tests for constant raster models and functionality.
 """
 
+from datetime import datetime
+import os
 import sys
+import tempfile
 from unittest import TestCase
+from unittest.mock import patch
 from uuid import UUID
 
 from cplus_plugin.definitions.constants import (
@@ -22,11 +26,20 @@ from cplus_plugin.definitions.constants import (
     ALLOWABLE_MAX_ATTRIBUTE,
     COMPONENTS_ATTRIBUTE,
 )
+from qgis.core import QgsCoordinateReferenceSystem, QgsRectangle
+
+from cplus_plugin.lib.constant_raster import (
+    ConstantRasterGrid,
+    ConstantRasterProcessingUtils,
+    virtual_constant_raster_path,
+    virtual_constant_raster_value,
+)
 from cplus_plugin.models.base import ModelComponentType, Activity, LayerType
 from cplus_plugin.models.constant_raster import (
     ConstantRasterInfo,
     ConstantRasterComponent,
     ConstantRasterCollection,
+    ConstantRasterContext,
     ConstantRasterMetadata,
     InputRange,
 )
@@ -37,6 +50,7 @@ from cplus_plugin.models.helpers import (
 from cplus_plugin.gui.constant_rasters.constant_raster_widgets import (
     YearsExperienceWidget,
 )
+from cplus_plugin.utils import get_constant_raster_dir
 
 from model_data_for_testing import (
     ACTIVITY_2_UUID_STR,
@@ -324,6 +338,101 @@ class TestConstantRasterHelpers(TestCase):
         result = constant_raster_collection_from_dict({}, [])
         self.assertIsNone(result)
 
+    def test_virtual_constant_raster_value(self):
+        """Test the value of a virtual constant raster is read from its path."""
+        path = virtual_constant_raster_path(0.35)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(virtual_constant_raster_value(path), 0.35)
+        self.assertIsNone(virtual_constant_raster_value(TEST_RASTER_PATH))
+
+
+class TestConstantRasterBatch(TestCase):
+    """Tests for the batch creation of constant rasters."""
+
+    def test_reuse_up_to_date_constant_rasters(self):
+        """Test constant rasters are only reused for the same grid."""
+        crs = QgsCoordinateReferenceSystem("EPSG:32735")
+        grid = ConstantRasterGrid.from_extent(QgsRectangle(0, 0, 300, 200), crs, 30.0)
+        self.assertEqual((grid.width, grid.height), (10, 7))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rasters = [
+                (0.25, os.path.join(temp_dir, "first.tif")),
+                (0.75, os.path.join(temp_dir, "second.tif")),
+            ]
+            created = ConstantRasterProcessingUtils.write_constant_rasters(
+                rasters, grid
+            )
+            self.assertEqual(len(created), 2)
+
+            existing = ConstantRasterProcessingUtils.existing_constant_rasters(
+                temp_dir, grid
+            )
+            self.assertEqual(existing.get(0.75), rasters[1][1])
+
+            other_grid = ConstantRasterGrid.from_extent(
+                QgsRectangle(0, 0, 300, 200), crs, 10.0
+            )
+            self.assertEqual(
+                ConstantRasterProcessingUtils.existing_constant_rasters(
+                    temp_dir, other_grid
+                ),
+                {},
+            )
+
+    def test_create_constant_rasters_virtual_paths(self):
+        """Test the components get virtual constant raster paths while the
+        rasters of the collection are still written.
+        """
+        collection = get_constant_raster_collection()
+        crs = QgsCoordinateReferenceSystem("EPSG:32735")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            context = ConstantRasterContext(
+                extent=QgsRectangle(0, 0, 300, 200),
+                pixel_size=30.0,
+                crs=crs,
+                output_dir=temp_dir,
+            )
+            created = ConstantRasterProcessingUtils.create_constant_rasters(
+                collection, context
+            )
+            self.assertEqual(created, [virtual_constant_raster_path(0.5)])
+            self.assertEqual(collection.components[0].path, created[0])
+
+            grid = ConstantRasterGrid.from_context(context)
+            existing = ConstantRasterProcessingUtils.existing_constant_rasters(
+                temp_dir, grid
+            )
+            self.assertEqual(list(existing), [0.5])
+
+    def test_reused_constant_rasters_session(self):
+        """Test a session directory is only created when rasters are
+        written and the metadata of a reused raster is saved beside it.
+        """
+        crs = QgsCoordinateReferenceSystem("EPSG:32735")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            context = ConstantRasterContext(
+                extent=QgsRectangle(0, 0, 300, 200),
+                pixel_size=30.0,
+                crs=crs,
+                output_dir=temp_dir,
+            )
+            with patch("cplus_plugin.lib.constant_raster.datetime") as mock_datetime:
+                for second in range(2):
+                    mock_datetime.now.return_value = datetime(2024, 1, 1, 0, 0, second)
+                    ConstantRasterProcessingUtils.create_constant_rasters(
+                        get_constant_raster_collection(),
+                        context,
+                        metadata_id="test_metadata",
+                    )
+
+            raster_dir = get_constant_raster_dir(
+                temp_dir, ModelComponentType.ACTIVITY, "test_metadata"
+            )
+            self.assertEqual(os.listdir(raster_dir), ["20240101_000000"])
+            session_dir = os.path.join(raster_dir, "20240101_000000")
+            self.assertEqual(len(os.listdir(os.path.join(session_dir, "metadata"))), 1)
+
 
 class TestYearsExperienceWidget(TestCase):
     """Tests for YearsExperienceWidget."""
@@ -0,0 +1,187 @@
+# coding=utf-8
+"""Tests for the hashing and batching of the Trends.Earth downloads."""
+
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from qgis.PyQt import QtCore
+
+from cplus_plugin.trends_earth import download
+from cplus_plugin.trends_earth.download import (
+    DownloadBatch,
+    HASH_SIDECAR_SUFFIX,
+    StreamingHasher,
+    check_hash_against_etag,
+    file_md5,
+    read_hash_sidecar,
+    write_hash_sidecar,
+)
+
+from utilities_for_testing import get_qgis_app
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+class FakeDownloadWorker(QtCore.QObject):
+    """Download worker that writes its file when the event loop runs."""
+
+    finished = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(Exception)
+
+    running = 0
+    max_running = 0
+    failing_urls = ()
+
+    def __init__(self, url, outfile):
+        super().__init__()
+        self.url = url
+        self.outfile = outfile
+        self.md5 = None
+
+    def start(self):
+        FakeDownloadWorker.running += 1
+        FakeDownloadWorker.max_running = max(
+            FakeDownloadWorker.max_running, FakeDownloadWorker.running
+        )
+        QtCore.QTimer.singleShot(10, self.complete)
+
+    def complete(self):
+        FakeDownloadWorker.running -= 1
+        if self.url in FakeDownloadWorker.failing_urls:
+            self.error.emit(Exception(f"Unable to download {self.url}"))
+            self.finished.emit(None)
+            return
+
+        data = self.url.encode()
+        with open(self.outfile, "wb") as f:
+            f.write(data)
+        self.md5 = hashlib.md5(data).hexdigest()
+        self.finished.emit(True)
+
+
+def fake_start_worker(worker, iface, message):
+    worker.start()
+
+
+class DownloadTest(unittest.TestCase):
+    """Tests for the download hashing and batching."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        FakeDownloadWorker.running = 0
+        FakeDownloadWorker.max_running = 0
+        FakeDownloadWorker.failing_urls = ()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_file(self, name: str, data: bytes) -> str:
+        """Writes the data to a file in the temporary directory."""
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_streaming_hasher(self):
+        """Test the hash of a file written in several parts matches
+        the hash of the complete file.
+        """
+        path = os.path.join(self.temp_dir.name, "streamed.bin")
+        hasher = StreamingHasher(path)
+
+        # Nothing has been written yet
+        hasher.update()
+
+        with open(path, "wb") as f:
+            for part in (b"first part", b"", b"second part" * 1000):
+                f.write(part)
+                f.flush()
+                hasher.update()
+            f.write(b"last part")
+
+        md5hash = hasher.finish()
+        self.assertEqual(md5hash, file_md5(path))
+        self.assertEqual(
+            md5hash,
+            hashlib.md5(
+                b"first part" + b"second part" * 1000 + b"last part"
+            ).hexdigest(),
+        )
+
+    def test_hash_sidecar(self):
+        """Test the recorded hash is only returned while the file is
+        unchanged.
+        """
+        path = self.write_file("data.bin", b"data")
+        self.assertIsNone(read_hash_sidecar(path))
+
+        md5hash = file_md5(path)
+        write_hash_sidecar(path, md5hash)
+        self.assertTrue(os.path.exists(f"{path}{HASH_SIDECAR_SUFFIX}"))
+        self.assertEqual(read_hash_sidecar(path), md5hash)
+
+        with open(path, "ab") as f:
+            f.write(b" changed")
+        self.assertIsNone(read_hash_sidecar(path))
+
+    def test_sidecar_written_after_verification(self):
+        """Test the sidecar is only written when the hash matches the
+        expected hash.
+        """
+        path = self.write_file("data.bin", b"data")
+        md5hash = file_md5(path)
+
+        self.assertFalse(
+            check_hash_against_etag("https://example.com/data.bin", path, "invalid")
+        )
+        self.assertFalse(os.path.exists(f"{path}{HASH_SIDECAR_SUFFIX}"))
+
+        # A hash computed while downloading is not recorded if it fails
+        self.assertFalse(
+            check_hash_against_etag(
+                "https://example.com/data.bin", path, md5hash, md5hash="invalid"
+            )
+        )
+        self.assertIsNone(read_hash_sidecar(path))
+
+        self.assertTrue(
+            check_hash_against_etag("https://example.com/data.bin", path, md5hash)
+        )
+        self.assertEqual(read_hash_sidecar(path), md5hash)
+
+    @patch.object(download, "start_worker", fake_start_worker)
+    @patch.object(download, "DownloadWorker", FakeDownloadWorker)
+    def test_download_batch(self):
+        """Test the batch runs at most max_workers downloads at once and
+        keeps the hashes of the downloaded files.
+        """
+        downloads = [
+            (
+                f"https://example.com/file_{i}.bin",
+                os.path.join(self.temp_dir.name, f"file_{i}.bin"),
+            )
+            for i in range(5)
+        ]
+        FakeDownloadWorker.failing_urls = (downloads[3][0],)
+
+        batch = DownloadBatch(downloads, max_workers=2)
+        results = batch.start()
+
+        self.assertEqual(FakeDownloadWorker.max_running, 2)
+        self.assertEqual(len(results), 5)
+        for i, (url, outfile) in enumerate(downloads):
+            if i == 3:
+                self.assertFalse(results[outfile])
+                self.assertIn(outfile, batch.exceptions)
+                self.assertNotIn(outfile, batch.hashes)
+                continue
+
+            self.assertTrue(results[outfile])
+            self.assertEqual(batch.hashes[outfile], file_md5(outfile))
+
+
+if __name__ == "__main__":
+    unittest.main()
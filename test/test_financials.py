@@ -6,6 +6,7 @@ Unit tests for financial NPV computations.
 import os
 import typing
 import unittest
+import uuid
 from unittest import TestCase
 
 from processing.core.Processing import Processing
@@ -14,16 +15,24 @@ from qgis.core import (
     QgsProcessingContext,
     QgsProcessingFeedback,
     QgsProcessingMultiStepFeedback,
-    QgsRasterLayer,
 )
 
 from cplus_plugin.conf import settings_manager, Settings
+from cplus_plugin.lib.constant_raster import virtual_constant_raster_value
 from cplus_plugin.gui.qgis_cplus_main import QgisCplusMain
 from cplus_plugin.lib.financials import (
     calculate_activity_npv,
     compute_discount_value,
+    compute_discount_values,
+    compute_npv_cube,
     create_npv_pwls,
 )
+from cplus_plugin.models.base import Activity
+from cplus_plugin.models.financial import (
+    ActivityNpv,
+    ActivityNpvCollection,
+    NpvParameters,
+)
 from cplus_plugin.utils import FileUtils
 
 from model_data_for_testing import (
@@ -156,22 +165,23 @@ class TestFinancialNpv(TestCase):
         )
 
     def test_create_npv_pwl(self):
-        """Test the creation of an NPV PWL raster layer."""
+        """Test the creation of an NPV PWL as a virtual constant raster."""
 
-        pwl_layer_path = None
+        pwl_layers = {}
 
         def on_pwl_layer_created(pathway_npv, pwl_path, algorithm, context, feedback):
-            nonlocal pwl_layer_path
             assert pwl_path
-            pwl_layer_path = pwl_path
+            pwl_layers[pwl_path] = pathway_npv
 
         self._run_npv_pwl_creation(on_pwl_layer_created)
 
-        pwl_exists = os.path.exists(pwl_layer_path)
-        pwl_npv_layer = QgsRasterLayer(pwl_layer_path, "Test NPV PWL")
-
-        self.assertTrue(pwl_exists, msg="NPV PWL layer does not exist.")
-        self.assertTrue(pwl_npv_layer.isValid(), msg="NPV PWL raster is not valid.")
+        self.assertTrue(pwl_layers, msg="No NPV PWL was created.")
+        for pwl_path, pathway_npv in pwl_layers.items():
+            self.assertFalse(os.path.exists(pwl_path))
+            self.assertAlmostEqual(
+                virtual_constant_raster_value(pwl_path),
+                pathway_npv.params.normalized,
+            )
 
     def test_npv_pwl_model_creation(self):
         """Test the creation and saving of an NPV PWL data model."""
@@ -233,3 +243,98 @@ class TestFinancialNpv(TestCase):
         reference_npv = NCS_PATHWAY_1_NPV * area
 
         self.assertEqual(computed_npv, reference_npv)
+
+
+class TestNpvSensitivityCube(TestCase):
+    """Tests for the vectorized NPV computations."""
+
+    def test_compute_discount_values(self):
+        """Test the array discounted values match the per-year values."""
+        revenues = [25000.0, None, 35000.0]
+        costs = [18000.0, 15000.0, None]
+        discounted_values = compute_discount_values(revenues, costs, 2.0)
+
+        for year, (revenue, cost) in enumerate(zip(revenues, costs), start=1):
+            self.assertAlmostEqual(
+                discounted_values[year - 1],
+                compute_discount_value(revenue or 0.0, cost or 0.0, year, 2.0),
+            )
+
+    def npv_collection(self) -> ActivityNpvCollection:
+        """Returns a collection with the NPV parameters of three activities."""
+        yearly_rates = [
+            [
+                (25000.0, 18000.0, None),
+                (28000.0, 15000.0, None),
+                (35000.0, 13500.0, None),
+            ],
+            [(100000.0, 65000.0, None), (120000.0, 50000.0, None)],
+            [
+                (64000.0, 58000.0, None),
+                (67500.0, 53000.0, None),
+                (70000.0, 48000.0, None),
+            ],
+        ]
+        npv_collection = ActivityNpvCollection(0.0, 0.0)
+        npv_collection.mappings = [
+            ActivityNpv(
+                value_info=NpvParameters(
+                    years=len(rates), discount=2.0, yearly_rates=list(rates)
+                ),
+                component=Activity(
+                    uuid.uuid4(), f"Activity {i + 1}", "Activity description"
+                ),
+            )
+            for i, rates in enumerate(yearly_rates)
+        ]
+
+        return npv_collection
+
+    def test_compute_npv_cube(self):
+        """Test the NPVs and normalized NPVs in the sensitivity cube."""
+        npv_collection = self.npv_collection()
+        discount_rates = [0.0, 2.0, 7.0]
+        horizons = [1, 2, 3, 10]
+        cube = compute_npv_cube(npv_collection, discount_rates, horizons)
+
+        self.assertEqual(cube.absolute.shape, (3, 3, 4))
+        self.assertEqual(cube.normalized.shape, (3, 3, 4))
+        self.assertEqual(
+            cube.component_ids,
+            [activity_npv.component_id for activity_npv in npv_collection.mappings],
+        )
+
+        for discount in discount_rates:
+            for horizon in horizons:
+                npvs = cube.npvs(discount, horizon, False)
+                for activity_npv in npv_collection.mappings:
+                    # Years beyond those of the activity have no values
+                    expected_npv = sum(
+                        compute_discount_value(revenue, cost, year, discount)
+                        for year, (revenue, cost, _) in enumerate(
+                            activity_npv.params.yearly_rates[:horizon], start=1
+                        )
+                    )
+                    self.assertAlmostEqual(
+                        npvs[activity_npv.component_id], expected_npv
+                    )
+
+                normalized_npvs = cube.npvs(discount, horizon).values()
+                self.assertAlmostEqual(min(normalized_npvs), 0.0)
+                self.assertAlmostEqual(max(normalized_npvs), 1.0)
+
+        # The applied values are the ones used to create the NPV PWLs
+        self.assertTrue(cube.apply(npv_collection, 2.0, 3))
+        absolute_npvs = cube.npvs(2.0, 3, False)
+        normalized_npvs = cube.npvs(2.0, 3)
+        for activity_npv in npv_collection.mappings:
+            self.assertAlmostEqual(
+                activity_npv.params.absolute,
+                absolute_npvs[activity_npv.component_id],
+            )
+            self.assertAlmostEqual(
+                activity_npv.params.normalized,
+                normalized_npvs[activity_npv.component_id],
+            )
+        self.assertAlmostEqual(npv_collection.min_value, min(absolute_npvs.values()))
+        self.assertAlmostEqual(npv_collection.max_value, max(absolute_npvs.values()))
@@ -0,0 +1,194 @@
+# coding=utf-8
+"""Tests for the scenario analysis pipeline scheduler."""
+
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from cplus_plugin.lib.pipeline import (
+    fingerprint,
+    PipelineStage,
+    StageManifest,
+    StageScheduler,
+)
+
+
+class TestStageScheduler(TestCase):
+    """Tests for the stage scheduler."""
+
+    def test_stage_dependencies(self):
+        """Test the dependencies are derived from the stage resources."""
+        scheduler = StageScheduler(
+            [
+                PipelineStage("prepare", lambda: True, ("pathways",), ("pathways",)),
+                PipelineStage("pwl", lambda: True, ("pathways",), ("pwl",)),
+                PipelineStage("carbon", lambda: True, ("pathways",), ("carbon",)),
+                PipelineStage(
+                    "weighting", lambda: True, ("pwl", "carbon"), ("pathways",)
+                ),
+            ]
+        )
+
+        self.assertEqual(scheduler.dependencies("prepare"), set())
+        self.assertEqual(scheduler.dependencies("pwl"), {"prepare"})
+        self.assertEqual(scheduler.dependencies("carbon"), {"prepare"})
+        self.assertEqual(
+            scheduler.dependencies("weighting"), {"prepare", "pwl", "carbon"}
+        )
+
+    def test_concurrent_stages(self):
+        """Test independent stages run concurrently and in order otherwise."""
+        order = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(2, timeout=5)
+
+        def stage_func(name, wait=False):
+            def func():
+                if wait:
+                    # Only returns if both independent stages run at once
+                    barrier.wait()
+                with lock:
+                    order.append(name)
+                return name
+
+            return func
+
+        scheduler = StageScheduler(
+            [
+                PipelineStage("first", stage_func("first"), (), ("a",)),
+                PipelineStage("left", stage_func("left", True), ("a",), ("b",)),
+                PipelineStage("right", stage_func("right", True), ("a",), ("c",)),
+                PipelineStage("last", stage_func("last"), ("b", "c"), ("d",)),
+            ],
+            budget=2,
+        )
+        results = scheduler.run()
+
+        self.assertEqual(order[0], "first")
+        self.assertEqual(set(order[1:3]), {"left", "right"})
+        self.assertEqual(order[3], "last")
+        self.assertEqual(results["last"], "last")
+
+    def test_failed_stage(self):
+        """Test no stages are started after a stage fails."""
+        started = []
+
+        def failing_stage():
+            time.sleep(0.01)
+            raise RuntimeError("Stage failed")
+
+        scheduler = StageScheduler(
+            [
+                PipelineStage("failing", failing_stage, (), ("a",)),
+                PipelineStage("next", lambda: started.append("next"), ("a",), ()),
+            ],
+            budget=2,
+        )
+
+        with self.assertRaises(RuntimeError):
+            scheduler.run()
+        self.assertEqual(started, [])
+
+    def test_resume_completed_stages(self):
+        """Test only completed stages with completed dependencies are skipped."""
+        run_stages = []
+        finished_stages = []
+
+        def stage_func(name):
+            return lambda: run_stages.append(name) or True
+
+        scheduler = StageScheduler(
+            [
+                PipelineStage("first", stage_func("first"), (), ("a",)),
+                PipelineStage("second", stage_func("second"), ("a",), ("b",)),
+                PipelineStage("third", stage_func("third"), ("b",), ("c",)),
+                PipelineStage("other", stage_func("other"), (), ("d",)),
+            ],
+            completed=["first", "third", "other"],
+            on_stage_finished=lambda stage, result: finished_stages.append(stage.name),
+        )
+
+        self.assertEqual(scheduler.skipped_stages(), ["first", "other"])
+        scheduler.run()
+        self.assertEqual(run_stages, ["second", "third"])
+        self.assertEqual(finished_stages, ["second", "third"])
+
+    def test_reuse_stages(self):
+        """Test reused stages are finished without running."""
+        run_stages = []
+        finished_stages = []
+
+        def stage_func(name):
+            return lambda: run_stages.append(name) or True
+
+        for budget in (1, 2):
+            run_stages.clear()
+            finished_stages.clear()
+            scheduler = StageScheduler(
+                [
+                    PipelineStage("first", stage_func("first"), (), ("a",)),
+                    PipelineStage("second", stage_func("second"), ("a",), ("b",)),
+                    PipelineStage("third", stage_func("third"), ("b",), ("c",)),
+                ],
+                budget=budget,
+                on_stage_finished=lambda stage, result: finished_stages.append(
+                    stage.name
+                ),
+                reuse_stage=lambda stage: stage.name != "third",
+            )
+            results = scheduler.run()
+
+            self.assertEqual(run_stages, ["third"])
+            self.assertEqual(finished_stages, ["first", "second", "third"])
+            self.assertTrue(results["first"])
+
+
+class TestStageManifest(TestCase):
+    """Tests for the stage manifest."""
+
+    def test_manifest_resume(self):
+        """Test the recorded stages and state are loaded and validated."""
+        with tempfile.TemporaryDirectory() as scenario_directory:
+            layer_path = os.path.join(scenario_directory, "pathway.tif")
+            with open(layer_path, "w") as f:
+                f.write("layer")
+
+            parameters = {"scenario": "test", "stages": ["first", "second"]}
+            manifest = StageManifest(scenario_directory, parameters)
+            manifest.record_stage("first", {"pathway_layers": {"p1": layer_path}})
+
+            loaded_manifest = StageManifest.load(scenario_directory)
+            self.assertIsNotNone(loaded_manifest)
+            self.assertEqual(loaded_manifest.completed, ["first"])
+            self.assertEqual(
+                loaded_manifest.state["pathway_layers"], {"p1": layer_path}
+            )
+            self.assertTrue(loaded_manifest.is_compatible(parameters))
+            self.assertFalse(
+                loaded_manifest.is_compatible({"scenario": "test", "stages": []})
+            )
+
+            os.remove(layer_path)
+            self.assertFalse(loaded_manifest.is_compatible(parameters))
+
+    def test_fingerprint(self):
+        """Test fingerprints change with the inputs and the input files."""
+        with tempfile.TemporaryDirectory() as scenario_directory:
+            layer_path = os.path.join(scenario_directory, "pathway.tif")
+            with open(layer_path, "w") as f:
+                f.write("layer")
+
+            inputs = {"expression": "a + b", "layers": [layer_path]}
+            layer_fingerprint = fingerprint(inputs)
+
+            self.assertEqual(fingerprint(dict(inputs)), layer_fingerprint)
+            self.assertNotEqual(
+                fingerprint({"expression": "a - b", "layers": [layer_path]}),
+                layer_fingerprint,
+            )
+
+            with open(layer_path, "w") as f:
+                f.write("changed layer")
+            self.assertNotEqual(fingerprint(inputs), layer_fingerprint)
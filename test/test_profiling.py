@@ -0,0 +1,123 @@
+# coding=utf-8
+"""Tests for the scenario analysis instrumentation."""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from cplus_plugin.lib.profiling import (
+    AnalysisProfiler,
+    current_rss,
+    layer_info,
+    ResourceUsage,
+    RssMonitor,
+)
+
+
+TEST_RASTER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "tenbytenraster.tif"
+)
+
+
+class AnalysisProfilerTest(unittest.TestCase):
+    """Tests for the analysis profiler."""
+
+    def test_resource_usage(self):
+        """Test the resource usage between two snapshots."""
+        start = ResourceUsage(1.0, 2.0, 100, 200)
+        end = ResourceUsage(4.0, 3.5, 150, None)
+        usage = end.since(start)
+
+        self.assertEqual(usage.wall_time, 3.0)
+        self.assertEqual(usage.cpu_time, 1.5)
+        self.assertEqual(usage.read_bytes, 50)
+        self.assertIsNone(usage.write_bytes)
+
+    def test_stage_profiles(self):
+        """Test the stages are recorded with their outcome."""
+        profiler = AnalysisProfiler()
+        profiler.profile_stage("first", lambda: True)()
+        profiler.profile_stage("second", lambda: False)()
+
+        def failing_stage():
+            raise RuntimeError("Stage failed")
+
+        with self.assertRaises(RuntimeError):
+            profiler.profile_stage("third", failing_stage)()
+
+        self.assertEqual(
+            [(stage.name, stage.failed) for stage in profiler.stages],
+            [("first", False), ("second", True), ("third", True)],
+        )
+        self.assertIsNone(profiler.current_stage)
+        self.assertIn("second", profiler.summary())
+
+        with tempfile.TemporaryDirectory() as directory:
+            profile_path = os.path.join(directory, "profile.json")
+            profiler.save(profile_path)
+            with open(profile_path) as f:
+                profile = json.load(f)
+
+        self.assertEqual(len(profile["stages"]), 3)
+        self.assertEqual(profile["algorithms"], [])
+
+    def test_stage_throughput(self):
+        """Test the pixels processed by a stage and its throughput."""
+        profiler = AnalysisProfiler()
+
+        def stage():
+            profiler.record_pixels(2000000)
+            profiler.record_pixels(1000000)
+
+        profiler.record_pixels(500)
+        profiler.profile_stage("stage", stage)()
+        stage_profile = profiler.stage_profile("stage")
+
+        self.assertEqual(stage_profile.pixels, 3000000)
+        stage_profile.usage.wall_time = 2.0
+        self.assertAlmostEqual(stage_profile.throughput, 1.5)
+        self.assertIn("1.5 Mpixel/s", profiler.summary())
+        self.assertEqual(profiler.to_dict()["stages"][0]["throughput"], 1.5)
+
+    def test_stage_peak_memory(self):
+        """Test the peak memory of a stage is measured while the stage
+        runs instead of over the lifetime of the process.
+        """
+        if current_rss() is None:
+            self.skipTest("The process memory cannot be read on this platform")
+
+        profiler = AnalysisProfiler()
+        baseline = current_rss()
+
+        def allocating_stage():
+            data = bytearray(64 * 1024 * 1024)
+            time.sleep(RssMonitor.SAMPLE_INTERVAL * 4)
+            del data
+
+        profiler.profile_stage("allocating", allocating_stage)()
+        profiler.profile_stage(
+            "idle", lambda: time.sleep(RssMonitor.SAMPLE_INTERVAL * 2)
+        )()
+
+        allocating_peak = profiler.stage_profile("allocating").usage.peak_rss
+        idle_peak = profiler.stage_profile("idle").usage.peak_rss
+        self.assertGreaterEqual(allocating_peak - baseline, 48 * 1024 * 1024)
+        self.assertLess(idle_peak, allocating_peak - 32 * 1024 * 1024)
+
+        profile = profiler.to_dict()
+        self.assertIn("usage.peak_rss", profile["fields"])
+        self.assertIn("MB peak memory", profiler.summary())
+
+    def test_layer_info(self):
+        """Test the layer sizes are read from the layer paths."""
+        info = layer_info([TEST_RASTER_PATH, "TEMPORARY_OUTPUT", 1])
+
+        self.assertEqual(len(info), 1)
+        self.assertEqual(info[0]["pixels"], 100)
+        self.assertGreater(info[0]["bytes"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
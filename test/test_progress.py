@@ -0,0 +1,83 @@
+# coding=utf-8
+"""Tests for the progress model of the scenario analysis."""
+
+import unittest
+
+from cplus_plugin.lib.progress import format_duration, ProgressModel
+
+
+class FakeClock:
+    """Clock returning a time set by the tests."""
+
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+class ProgressModelTest(unittest.TestCase):
+    """Tests for the progress model."""
+
+    def test_weighted_progress(self):
+        """Test the progress is weighted by the pixels of the stages."""
+        model = ProgressModel()
+        model.add_stage("small", 100)
+        model.add_stage("large", 300)
+        self.assertTrue(model.active)
+
+        item = model.start_item("large", 300)
+        model.update_item(item, 0.5)
+        self.assertAlmostEqual(model.progress, 150 / 400)
+
+        model.finish_item(item)
+        model.complete_stage("large")
+        self.assertAlmostEqual(model.progress, 0.75)
+
+        model.complete_stage("small")
+        self.assertEqual(model.progress, 1.0)
+
+    def test_stage_progress_limit(self):
+        """Test a stage processing more pixels than estimated does not
+        report its whole work before it completes.
+        """
+        model = ProgressModel()
+        model.add_stage("stage", 100)
+        for _ in range(3):
+            model.finish_item(model.start_item("stage", 100))
+
+        self.assertLess(model.progress, 1.0)
+        self.assertIsNone(model.start_item("unknown", 100))
+
+        model.complete_stage("stage")
+        self.assertEqual(model.progress, 1.0)
+
+    def test_remaining_time(self):
+        """Test the remaining time from the rate of the processed pixels,
+        excluding the stages completed without processing any pixels.
+        """
+        clock = FakeClock()
+        model = ProgressModel(clock)
+        model.add_stage("skipped", 1000)
+        model.add_stage("first", 100)
+        model.add_stage("second", 100)
+        model.start()
+        model.complete_stage("skipped")
+        self.assertIsNone(model.remaining_time())
+
+        item = model.start_item("first", 100)
+        clock.time = 10.0
+        model.finish_item(item)
+        model.complete_stage("first")
+
+        self.assertAlmostEqual(model.remaining_time(), 10.0)
+
+    def test_format_duration(self):
+        """Test the formatting of the remaining time."""
+        self.assertEqual(format_duration(45.2), "45s")
+        self.assertEqual(format_duration(200), "3m 20s")
+        self.assertEqual(format_duration(3900), "1h 05m")
+
+
+if __name__ == "__main__":
+    unittest.main()
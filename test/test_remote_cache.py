@@ -0,0 +1,168 @@
+# coding=utf-8
+"""Tests for the cache of the remote and uploaded rasters."""
+
+import os
+import tempfile
+import time
+import unittest
+
+from cplus_plugin.lib.remote_cache import RemoteRasterCache
+
+
+class RemoteRasterCacheTest(unittest.TestCase):
+    """Tests for the remote raster cache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_file(self, name: str, size: int) -> str:
+        """Writes a file of the given size in the temporary directory."""
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "wb") as f:
+            f.write(b"0" * size)
+        return path
+
+    def test_key(self):
+        """Test the cache key depends on the window and NoData value."""
+        key = RemoteRasterCache.key(
+            "https://example.com/layer.tif",
+            version="1",
+            crs="EPSG:4326",
+            pixel_size=0.1,
+            extent=[0, 0, 1, 1],
+            nodata=-9999,
+        )
+
+        self.assertEqual(
+            key,
+            RemoteRasterCache.key(
+                "https://example.com/layer.tif",
+                version="1",
+                crs="EPSG:4326",
+                pixel_size=0.1,
+                extent=[0, 0, 1, 1],
+                nodata=-9999.0,
+            ),
+        )
+        self.assertNotEqual(
+            key,
+            RemoteRasterCache.key(
+                "https://example.com/layer.tif",
+                version="1",
+                crs="EPSG:4326",
+                pixel_size=0.1,
+                extent=[0, 0, 1, 1],
+                nodata=0,
+            ),
+        )
+        self.assertNotEqual(
+            key,
+            RemoteRasterCache.key(
+                "https://example.com/layer.tif",
+                version="1",
+                crs="EPSG:4326",
+                pixel_size=0.1,
+                extent=[0, 0, 2, 2],
+                nodata=-9999,
+            ),
+        )
+
+    def test_size_limit(self):
+        """Test the cache is kept within its size limit when rasters
+        are added.
+        """
+        cache = RemoteRasterCache(self.cache_dir, max_size=250)
+        for name in ("first", "second", "third"):
+            cache.put(name, self.write_file(f"{name}.tif", 100))
+            time.sleep(0.01)
+
+        cached_size = sum(
+            os.path.getsize(os.path.join(self.cache_dir, file_name))
+            for file_name in os.listdir(self.cache_dir)
+            if file_name.endswith(".tif")
+        )
+        self.assertLessEqual(cached_size, 250)
+        self.assertIsNone(cache.get("first"))
+        self.assertIsNotNone(cache.get("second"))
+        self.assertIsNotNone(cache.get("third"))
+
+        # A raster larger than the limit is kept until the next one
+        cache.put("large", self.write_file("large.tif", 300))
+        self.assertIsNotNone(cache.get("large"))
+        self.assertIsNone(cache.get("second"))
+        self.assertIsNone(cache.get("third"))
+
+    def test_lru_eviction(self):
+        """Test the least recently used raster is evicted first."""
+        cache = RemoteRasterCache(self.cache_dir, max_size=250)
+        first_path = cache.put("first", self.write_file("first.tif", 100))
+        time.sleep(0.01)
+        second_path = cache.put("second", self.write_file("second.tif", 100))
+        time.sleep(0.01)
+
+        # Reading the first raster makes the second one the least used
+        self.assertEqual(cache.get("first"), first_path)
+        time.sleep(0.01)
+        cache.put("third", self.write_file("third.tif", 100))
+
+        self.assertEqual(cache.get("first"), first_path)
+        self.assertIsNone(cache.get("second"))
+        self.assertFalse(os.path.exists(second_path))
+        self.assertIsNotNone(cache.get("third"))
+
+    def test_deferred_eviction(self):
+        """Test the rasters added without eviction are kept until the
+        cache is trimmed, which evicts the least recently used first.
+        """
+        cache = RemoteRasterCache(self.cache_dir, max_size=150)
+        first_path = cache.put(
+            "first",
+            self.write_file("first.tif", 100),
+            move=True,
+            file_name="first_copy.tif",
+            evict=False,
+        )
+        second_path = cache.put(
+            "second", self.write_file("second.tif", 100), move=True, evict=False
+        )
+
+        self.assertEqual(os.path.basename(first_path), "first_copy.tif")
+        self.assertTrue(os.path.exists(first_path))
+        self.assertTrue(os.path.exists(second_path))
+
+        cache.trim()
+
+        self.assertIsNone(cache.get("first"))
+        self.assertFalse(os.path.exists(first_path))
+        self.assertEqual(cache.get("second"), second_path)
+
+    def test_pinned_entries(self):
+        """Test the pinned rasters are not evicted until they are unpinned."""
+        cache = RemoteRasterCache(self.cache_dir, max_size=150)
+        cache.pin("first")
+        first_path = cache.put("first", self.write_file("first.tif", 100))
+        time.sleep(0.01)
+        second_path = cache.put("second", self.write_file("second.tif", 100))
+
+        # The least recently used raster is pinned
+        self.assertTrue(os.path.exists(first_path))
+        self.assertTrue(os.path.exists(second_path))
+
+        cache.trim()
+        self.assertEqual(cache.get("first"), first_path)
+        self.assertIsNone(cache.get("second"))
+
+        cache.unpin("first")
+        time.sleep(0.01)
+        cache.put("third", self.write_file("third.tif", 100))
+        self.assertIsNone(cache.get("first"))
+        self.assertFalse(os.path.exists(first_path))
+        self.assertIsNotNone(cache.get("third"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,427 @@
+# coding=utf-8
+"""Tests for the headless scenario runner."""
+
+import csv
+import dataclasses
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import uuid
+
+from qgis.core import QgsProcessingException, QgsRasterLayer
+
+from cplus_plugin.conf import settings_manager, Settings
+from cplus_plugin.lib.constant_raster import virtual_constant_raster_value
+from cplus_plugin.models.base import Activity, NcsPathway, ScenarioResult
+from cplus_plugin.lib.runner import (
+    apply_definition,
+    BatchRunSummary,
+    create_analysis_task,
+    ExitCode,
+    main,
+    preprocessing_groups,
+    preserved_settings,
+    run_analysis_task,
+    ScenarioDefinition,
+    ScenarioDefinitionError,
+    ScenarioRunSummary,
+    setting_from_key,
+    union_definition,
+    write_comparison_table,
+)
+
+from model_data_for_testing import get_test_scenario, TEST_RASTER_PATH
+
+
+PATHWAY_ID = "b187f92f-b002-40e4-a8dc-9d2f7f4c4f3d"
+
+
+def scenario_definition_dict() -> dict:
+    """Returns the attribute values of a test scenario definition."""
+    return {
+        "name": "Test scenario",
+        "description": "Test scenario description",
+        "extent": {
+            "bbox": [30.743, 32.069, -25.201, -23.960],
+            "crs": "EPSG:32735",
+        },
+        "settings": {"snapping_enabled": False, "SIEVE_ENABLED": False},
+        "priority_groups": [
+            {
+                "uuid": "a4f76e6c-9f83-4a9c-b700-fb1ae04860a4",
+                "name": "Group",
+                "value": 3,
+            }
+        ],
+        "priority_layers": [
+            {
+                "uuid": "c931282f-db2d-4644-9786-6720b3ab206a",
+                "name": "Priority layer",
+                "description": "Priority layer description",
+                "path": "priority.tif",
+                "groups": [{"name": "Group", "value": 3}],
+            }
+        ],
+        "pathways": [
+            {
+                "uuid": PATHWAY_ID,
+                "name": "Pathway",
+                "description": "Pathway description",
+                "path": "pathway.tif",
+            }
+        ],
+        "activities": [
+            {
+                "uuid": "a0b8fd2d-1259-4141-9ad6-d4369cf0dfd4",
+                "name": "Activity",
+                "description": "Activity description",
+                "pathways": [PATHWAY_ID],
+            }
+        ],
+    }
+
+
+class ScenarioRunnerTest(unittest.TestCase):
+    """Tests for the headless scenario runner."""
+
+    def test_definition_from_dict(self):
+        """Test the scenario definition is created from its values."""
+        definition = ScenarioDefinition.from_dict(scenario_definition_dict())
+
+        self.assertEqual(definition.name, "Test scenario")
+        self.assertEqual(definition.extent.crs, "EPSG:32735")
+        self.assertEqual(len(definition.extent.bbox), 4)
+        self.assertEqual(
+            definition.priority_layer_groups(),
+            [{"name": "Group", "value": 3, "layers": ["Priority layer"]}],
+        )
+
+    def test_invalid_definition(self):
+        """Test invalid scenario definitions are rejected."""
+        missing_extent = scenario_definition_dict()
+        del missing_extent["extent"]
+
+        missing_pathway = scenario_definition_dict()
+        missing_pathway["pathways"] = []
+
+        unknown_setting = scenario_definition_dict()
+        unknown_setting["settings"] = {"unknown_setting": True}
+
+        for source_dict in (missing_extent, missing_pathway, unknown_setting):
+            with self.assertRaises(ScenarioDefinitionError):
+                ScenarioDefinition.from_dict(source_dict)
+
+    def test_constant_priority_layer(self):
+        """Test a priority layer with a constant value is used as a
+        virtual constant raster.
+        """
+        source_dict = scenario_definition_dict()
+        del source_dict["priority_layers"][0]["path"]
+        source_dict["priority_layers"][0]["constant_value"] = 0.4
+
+        definition = ScenarioDefinition.from_dict(source_dict)
+        priority_layer = definition.priority_layers[0]
+        self.assertNotIn("constant_value", priority_layer)
+        self.assertEqual(virtual_constant_raster_value(priority_layer["path"]), 0.4)
+
+        source_dict["priority_layers"][0]["constant_value"] = "high"
+        with self.assertRaises(ScenarioDefinitionError):
+            ScenarioDefinition.from_dict(source_dict)
+
+    def test_preserved_settings(self):
+        """Test the settings written for a definition are restored and
+        the settings it does not set are resolved from the plugin settings.
+        """
+        definition = ScenarioDefinition.from_dict(scenario_definition_dict())
+        settings_manager.set_value(Settings.SNAPPING_ENABLED, True)
+        settings_manager.remove(Settings.SIEVE_ENABLED)
+        settings_manager.remove(Settings.NCS_WEIGHTED)
+
+        other_dict = scenario_definition_dict()
+        other_dict["settings"] = {"ncs_weighted": False}
+        other_definition = ScenarioDefinition.from_dict(other_dict)
+
+        with preserved_settings([definition, other_definition]) as plugin_settings:
+            self.assertTrue(plugin_settings[Settings.SNAPPING_ENABLED])
+            self.assertIsNone(plugin_settings[Settings.SIEVE_ENABLED])
+            self.assertIsNone(plugin_settings[Settings.NCS_WEIGHTED])
+
+            for setting, value in definition.analysis_settings().items():
+                settings_manager.set_value(setting, value)
+
+            task = create_analysis_task(definition, [], plugin_settings)
+            self.assertFalse(
+                task.get_settings_value(
+                    Settings.SNAPPING_ENABLED, default=True, setting_type=bool
+                )
+            )
+            self.assertNotIn(Settings.BASE_DIR, task.scenario_settings)
+
+            # The setting of the other definition is not read from the
+            # plugin settings written by the first definition
+            settings_manager.set_value(Settings.NCS_WEIGHTED, False)
+            self.assertTrue(
+                task.get_settings_value(
+                    Settings.NCS_WEIGHTED, default=True, setting_type=bool
+                )
+            )
+
+        self.assertTrue(
+            settings_manager.get_value(Settings.SNAPPING_ENABLED, setting_type=bool)
+        )
+        self.assertIsNone(settings_manager.get_value(Settings.SIEVE_ENABLED))
+        self.assertIsNone(settings_manager.get_value(Settings.NCS_WEIGHTED))
+
+    def test_definition_components_not_saved(self):
+        """Test the priority layers, groups, pathways and activities of a
+        definition are not saved in the plugin settings.
+        """
+        source_dict = scenario_definition_dict()
+        source_dict["base_dir"] = tempfile.gettempdir()
+        source_dict["pathways"][0]["uuid"] = str(uuid.uuid4())
+        source_dict["pathways"][0]["path"] = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "pathways",
+            "layers",
+            "test_pathway_1.tif",
+        )
+        source_dict["activities"][0]["uuid"] = str(uuid.uuid4())
+        source_dict["activities"][0]["pathways"] = [source_dict["pathways"][0]["uuid"]]
+        source_dict["priority_groups"][0]["uuid"] = str(uuid.uuid4())
+        source_dict["priority_layers"][0]["uuid"] = str(uuid.uuid4())
+        definition = ScenarioDefinition.from_dict(source_dict)
+
+        with preserved_settings([definition]):
+            activities = apply_definition(definition)
+
+        self.assertEqual(len(activities), 1)
+        self.assertEqual(len(activities[0].pathways), 1)
+        self.assertIsNone(
+            settings_manager.get_ncs_pathway(source_dict["pathways"][0]["uuid"])
+        )
+        self.assertIsNone(
+            settings_manager.get_activity(source_dict["activities"][0]["uuid"])
+        )
+        self.assertIsNone(
+            settings_manager.get_priority_layer(
+                source_dict["priority_layers"][0]["uuid"]
+            )
+        )
+        self.assertIsNone(
+            settings_manager.get_priority_group(
+                source_dict["priority_groups"][0]["uuid"]
+            )["name"]
+        )
+
+    def test_setting_from_key(self):
+        """Test settings are matched by their name or value."""
+        for key in ("SNAPPING_ENABLED", "snapping_enabled"):
+            self.assertEqual(setting_from_key(key), Settings.SNAPPING_ENABLED)
+
+    def test_invalid_definition_exit_code(self):
+        """Test the runner exits with the invalid definition code."""
+        with tempfile.TemporaryDirectory() as directory:
+            definition_path = os.path.join(directory, "scenario.json")
+            source_dict = scenario_definition_dict()
+            del source_dict["activities"]
+            with open(definition_path, "w") as f:
+                json.dump(source_dict, f)
+
+            self.assertEqual(main([definition_path]), ExitCode.INVALID_DEFINITION)
+            self.assertEqual(
+                main([os.path.join(directory, "missing.json")]),
+                ExitCode.INVALID_DEFINITION,
+            )
+
+    def test_preprocessing_groups(self):
+        """Test scenarios share the preprocessing only if their extent,
+        settings and layers are compatible.
+        """
+        weighted_dict = scenario_definition_dict()
+        weighted_dict["priority_layers"][0]["groups"][0]["value"] = 5
+        weighted_dict["settings"]["scenario_impact_matrix"] = {"values": []}
+
+        other_extent_dict = scenario_definition_dict()
+        other_extent_dict["extent"]["bbox"] = [0, 1, 0, 1]
+
+        other_layer_dict = scenario_definition_dict()
+        other_layer_dict["pathways"][0]["path"] = "other_pathway.tif"
+
+        definitions = [
+            ScenarioDefinition.from_dict(source_dict)
+            for source_dict in (
+                scenario_definition_dict(),
+                weighted_dict,
+                other_extent_dict,
+                other_layer_dict,
+            )
+        ]
+
+        self.assertEqual(preprocessing_groups(definitions), [[0, 1], [2], [3]])
+
+    def test_union_definition(self):
+        """Test the union definition has the components of all the scenarios."""
+        other_dict = scenario_definition_dict()
+        other_dict["activities"][0]["uuid"] = "4bb4b6b6-a8e5-4f4b-9e53-1c2b8f4a6d8e"
+
+        definition = union_definition(
+            [
+                ScenarioDefinition.from_dict(scenario_definition_dict()),
+                ScenarioDefinition.from_dict(other_dict),
+            ],
+            "preprocessing",
+        )
+
+        self.assertEqual(definition.name, "preprocessing")
+        self.assertEqual(len(definition.activities), 2)
+        self.assertEqual(len(definition.pathways), 1)
+        self.assertEqual(len(definition.priority_layers), 1)
+
+    def test_preview_factor(self):
+        """Test the preview factor is validated and preview scenarios do
+        not share the preprocessing of full resolution scenarios.
+        """
+        preview_dict = scenario_definition_dict()
+        preview_dict["preview_factor"] = 4
+        preview_definition = ScenarioDefinition.from_dict(preview_dict)
+        self.assertEqual(preview_definition.preview_factor, 4)
+
+        definitions = [
+            ScenarioDefinition.from_dict(scenario_definition_dict()),
+            preview_definition,
+        ]
+        self.assertEqual(preprocessing_groups(definitions), [[0], [1]])
+
+        for preview_factor in (0, 2.5):
+            preview_dict["preview_factor"] = preview_factor
+            with self.assertRaises(ScenarioDefinitionError):
+                ScenarioDefinition.from_dict(preview_dict)
+
+    def test_failed_stage_exit_code(self):
+        """Test a failed stage is reported as a failure and a cancelled
+        analysis without an error as cancelled.
+        """
+        pathway_layer_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "pathways",
+            "layers",
+            "test_pathway_1.tif",
+        )
+        test_layer = QgsRasterLayer(pathway_layer_path, "test_pathway")
+        test_extent = test_layer.extent()
+        source_dict = scenario_definition_dict()
+        source_dict["extent"] = {
+            "bbox": [
+                test_extent.xMinimum(),
+                test_extent.xMaximum(),
+                test_extent.yMinimum(),
+                test_extent.yMaximum(),
+            ],
+            "crs": test_layer.crs().authid(),
+        }
+        source_dict["pathways"][0]["path"] = pathway_layer_path
+        definition = ScenarioDefinition.from_dict(source_dict)
+
+        def activities():
+            pathway = NcsPathway(
+                uuid=uuid.UUID(PATHWAY_ID),
+                name="Pathway",
+                description="Pathway description",
+                path=pathway_layer_path,
+            )
+            return [
+                Activity(
+                    uuid=uuid.uuid4(),
+                    name="Activity",
+                    description="Activity description",
+                    pathways=[pathway],
+                )
+            ]
+
+        def failing_algorithm(*args, **kwargs):
+            raise QgsProcessingException("Stage failed")
+
+        with tempfile.TemporaryDirectory() as directory:
+            task = create_analysis_task(definition, activities())
+            task.scenario_directory = os.path.join(directory, "failed")
+            task.run_algorithm = failing_algorithm
+
+            summary = run_analysis_task(
+                task, ScenarioRunSummary(definition.name, ExitCode.FAILED)
+            )
+            self.assertIsNotNone(task.error)
+            self.assertEqual(summary.exit_code, ExitCode.FAILED)
+            self.assertEqual(summary.error, str(task.error))
+
+            task = create_analysis_task(definition, activities())
+            task.scenario_directory = os.path.join(directory, "cancelled")
+            task.cancel()
+
+            summary = run_analysis_task(
+                task, ScenarioRunSummary(definition.name, ExitCode.FAILED)
+            )
+            self.assertEqual(summary.exit_code, ExitCode.CANCELLED)
+
+    def test_batch_exit_code(self):
+        """Test the batch exit code reflects the failed scenarios."""
+        batch_summary = BatchRunSummary(
+            "batch",
+            [
+                ScenarioRunSummary("first", ExitCode.SUCCESS),
+                ScenarioRunSummary("second", ExitCode.INVALID_DEFINITION),
+            ],
+        )
+        self.assertEqual(batch_summary.exit_code, ExitCode.INVALID_DEFINITION)
+
+        batch_summary.summaries.append(ScenarioRunSummary("third", ExitCode.FAILED))
+        self.assertEqual(batch_summary.exit_code, ExitCode.FAILED)
+
+    @patch(
+        "cplus_plugin.lib.reports.comparison_table.calculate_raster_area_by_pixel_value",
+        return_value={1: 25.0},
+    )
+    def test_comparison_table_missing_output(self, area_mock):
+        """Test the areas in the comparison table are written against
+        their scenario when a result has no output layer.
+        """
+        missing_scenario = dataclasses.replace(
+            get_test_scenario(), uuid=uuid.uuid4(), name="Missing output"
+        )
+        summaries = [
+            ScenarioRunSummary(
+                "Missing output",
+                ExitCode.SUCCESS,
+                scenario_result=ScenarioResult(
+                    missing_scenario,
+                    analysis_output={"OUTPUT": "missing_output.tif"},
+                ),
+            ),
+            ScenarioRunSummary(
+                "Test Scenario",
+                ExitCode.SUCCESS,
+                scenario_result=ScenarioResult(
+                    get_test_scenario(), analysis_output={"OUTPUT": TEST_RASTER_PATH}
+                ),
+            ),
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "comparison.csv")
+            write_comparison_table(summaries, path)
+            with open(path, newline="") as f:
+                rows = list(csv.reader(f))
+
+        self.assertEqual(
+            rows[0], ["Scenario", "Status", "Duration (s)", "Test Activity"]
+        )
+        self.assertEqual(rows[1], ["Missing output", "success", "0.0"])
+        self.assertEqual(rows[2][:3], ["Test Scenario", "success", "0.0"])
+        self.assertEqual(float(rows[2][3]), 25.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
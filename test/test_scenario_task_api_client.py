@@ -0,0 +1,181 @@
+# coding=utf-8
+"""Tests for the online scenario analysis client."""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cplus_plugin.api.request import UPLOAD_RESUME_MAX_AGE
+from cplus_plugin.api.scenario_task_api_client import (
+    ScenarioAnalysisTaskApiClient,
+    set_priority_layer_payload_path,
+)
+from cplus_plugin.conf import settings_manager
+from cplus_plugin.lib.constant_raster import virtual_constant_raster_path
+
+from model_data_for_testing import get_test_scenario
+from utilities_for_testing import get_qgis_app
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+class ScenarioPayloadTest(unittest.TestCase):
+    """Tests for the scenario payload sent to the API."""
+
+    def test_priority_layer_payload_path(self):
+        """Test the local path of a priority layer is not sent while the
+        value of a virtual constant raster is.
+        """
+        priority_layer = {"name": "Priority layer", "path": "/data/priority.tif"}
+        set_priority_layer_payload_path(priority_layer)
+        self.assertEqual(priority_layer["path"], "")
+        self.assertNotIn("constant_value", priority_layer)
+
+        virtual_path = virtual_constant_raster_path(0.4)
+        priority_layer = {"name": "NPV", "path": virtual_path}
+        set_priority_layer_payload_path(priority_layer)
+        self.assertEqual(priority_layer["path"], virtual_path)
+        self.assertEqual(priority_layer["constant_value"], 0.4)
+
+
+class UploadResumeTest(unittest.TestCase):
+    """Tests for resuming and aborting the multipart uploads."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "pathway.tif")
+        with open(self.file_path, "wb") as f:
+            f.write(b"layer content")
+        self.identifier = self.file_path.replace(os.sep, "--")
+
+        scenario = get_test_scenario()
+        self.client = ScenarioAnalysisTaskApiClient(
+            "Scenario", "Description", [], [], scenario.extent, scenario, None
+        )
+        self.client.request = MagicMock()
+        self.client.total_file_upload_chunks = 1
+        self.client.request.start_upload_layer.return_value = {
+            "uuid": "new-layer",
+            "multipart_upload_id": "new-upload",
+            "upload_urls": [{"url": "https://example.com/new", "part_number": 1}],
+        }
+        self.client.request.finish_upload_layer.side_effect = (
+            lambda layer_uuid, upload_id, items: {"uuid": layer_uuid}
+        )
+
+    def tearDown(self):
+        settings_manager.remove_layer_mapping(self.identifier)
+        self.temp_dir.cleanup()
+
+    def save_unfinished_upload(self, parts: dict, started: float) -> dict:
+        """Saves the layer mapping of an unfinished upload of the file."""
+        file_stat = os.stat(self.file_path)
+        temp_layer = {
+            "uuid": "old-layer",
+            "size": file_stat.st_size,
+            "mtime": file_stat.st_mtime,
+            "name": os.path.basename(self.file_path),
+            "upload_id": "old-upload",
+            "upload_urls": [{"url": "https://example.com/old", "part_number": 1}],
+            "parts": parts,
+            "path": self.file_path,
+            "started": started,
+        }
+        settings_manager.save_layer_mapping(temp_layer)
+        return temp_layer
+
+    @patch.object(ScenarioAnalysisTaskApiClient, "_update_scenario_status")
+    def test_resume_upload(self, mock_update_status):
+        """Test the recorded parts of an unfinished upload are not
+        uploaded again.
+        """
+        self.save_unfinished_upload({"1": "old-etag"}, time.time())
+
+        result = self.client.run_upload(self.file_path, "ncs_pathway")
+
+        self.assertEqual(result, {"uuid": "old-layer"})
+        self.client.request.upload_file_part.assert_not_called()
+        self.client.request.start_upload_layer.assert_not_called()
+        self.client.request.abort_upload_layer.assert_not_called()
+        self.client.request.finish_upload_layer.assert_called_once_with(
+            "old-layer", "old-upload", [{"part_number": 1, "etag": "old-etag"}]
+        )
+
+    @patch.object(ScenarioAnalysisTaskApiClient, "_update_scenario_status")
+    def test_failed_resume_aborts_upload(self, mock_update_status):
+        """Test an unfinished upload that cannot be resumed is aborted
+        before the file is uploaded again.
+        """
+        self.save_unfinished_upload({}, time.time())
+        self.client.request.upload_file_part.side_effect = [
+            None,
+            {"part_number": 1, "etag": "new-etag"},
+        ]
+
+        result = self.client.run_upload(self.file_path, "ncs_pathway")
+
+        self.assertEqual(result, {"uuid": "new-layer"})
+        self.client.request.abort_upload_layer.assert_called_once_with(
+            "old-layer", "old-upload"
+        )
+        self.client.request.start_upload_layer.assert_called_once_with(
+            self.file_path, "ncs_pathway"
+        )
+        self.client.request.finish_upload_layer.assert_called_once_with(
+            "new-layer", "new-upload", [{"part_number": 1, "etag": "new-etag"}]
+        )
+        self.assertEqual(self.client.uploaded_chunks, 1)
+
+    @patch.object(ScenarioAnalysisTaskApiClient, "_update_scenario_status")
+    def test_expired_upload_aborted(self, mock_update_status):
+        """Test an expired unfinished upload is aborted and replaced by
+        a new upload.
+        """
+        self.save_unfinished_upload(
+            {"1": "old-etag"}, time.time() - UPLOAD_RESUME_MAX_AGE - 1
+        )
+        self.assertIsNone(self.client.get_resumable_upload(self.file_path))
+        self.client.request.upload_file_part.return_value = {
+            "part_number": 1,
+            "etag": "new-etag",
+        }
+
+        result = self.client.run_upload(self.file_path, "ncs_pathway")
+
+        self.assertEqual(result, {"uuid": "new-layer"})
+        self.client.request.abort_upload_layer.assert_called_once_with(
+            "old-layer", "old-upload"
+        )
+        self.client.request.upload_file_part.assert_called_once_with(
+            "https://example.com/new", b"layer content", 1
+        )
+        temp_layer = settings_manager.get_layer_mapping(self.identifier)
+        self.assertEqual(temp_layer["upload_id"], "new-upload")
+        self.assertEqual(temp_layer["parts"], {"1": "new-etag"})
+
+    @patch.object(ScenarioAnalysisTaskApiClient, "_update_scenario_status")
+    def test_changed_file_upload_aborted(self, mock_update_status):
+        """Test the unfinished upload of a file that has changed since
+        is aborted.
+        """
+        self.save_unfinished_upload({"1": "old-etag"}, time.time())
+        with open(self.file_path, "ab") as f:
+            f.write(b" changed")
+        self.client.request.upload_file_part.return_value = {
+            "part_number": 1,
+            "etag": "new-etag",
+        }
+
+        result = self.client.run_upload(self.file_path, "ncs_pathway")
+
+        self.assertEqual(result, {"uuid": "new-layer"})
+        self.client.request.abort_upload_layer.assert_called_once_with(
+            "old-layer", "old-upload"
+        )
+        self.client.request.start_upload_layer.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
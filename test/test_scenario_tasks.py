@@ -7,16 +7,25 @@ import os
 import uuid
 import processing
 import datetime
+import tempfile
 
 from processing.core.Processing import Processing
 
-from qgis.core import QgsRasterLayer
+from qgis.core import QgsProcessingFeedback, QgsRasterLayer
 
 from cplus_plugin.conf import settings_manager, Settings
+from cplus_plugin.lib.constant_raster import virtual_constant_raster_path
+from cplus_plugin.lib.pipeline import StageManifest, StageScheduler
 
 from cplus_plugin.tasks import ScenarioAnalysisTask
 from cplus_plugin.utils import FileUtils
-from cplus_plugin.models.base import Scenario, NcsPathway, Activity, SpatialExtent
+from cplus_plugin.models.base import (
+    Scenario,
+    NcsPathway,
+    NcsPathwayType,
+    Activity,
+    SpatialExtent,
+)
 
 
 class ScenarioAnalysisTaskTest(unittest.TestCase):
@@ -149,6 +158,113 @@ class ScenarioAnalysisTaskTest(unittest.TestCase):
         self.assertEqual(stat.minimumValue, 0.5)
         self.assertEqual(stat.maximumValue, 5.0)
 
+    def test_scenario_pathways_weighting_virtual_priority_layer(self):
+        """Test the weighting of NCS pathways with a virtual constant PWL"""
+        pathway_layer_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "pathways",
+            "layers",
+            "test_pathway_1.tif",
+        )
+
+        test_priority_group = {
+            "uuid": "c1f0ad2e-48d4-4b1a-9a5b-3f3b5a2f7e11",
+            "name": "test_virtual_priority_group",
+            "description": "test_priority_group_description",
+            "value": 2,
+        }
+
+        virtual_priority_layer = {
+            "uuid": "5d0c8a3e-6f1b-4c47-8d0e-2b7f9c4e1a22",
+            "name": "test_virtual_priority_layer",
+            "description": "test_priority_layer_description",
+            "selected": False,
+            "path": virtual_constant_raster_path(0.25),
+            "groups": [test_priority_group],
+        }
+
+        test_pathway = NcsPathway(
+            uuid=uuid.uuid4(),
+            name="test_pathway",
+            description="test_description",
+            path=pathway_layer_path,
+            priority_layers=[
+                {
+                    "uuid": virtual_priority_layer["uuid"],
+                    "name": virtual_priority_layer["name"],
+                }
+            ],
+            suitability_index=0.5,
+        )
+
+        test_layer = QgsRasterLayer(test_pathway.path, test_pathway.name)
+        test_extent = test_layer.extent()
+
+        spatial_extent = SpatialExtent(
+            bbox=[
+                test_extent.xMinimum(),
+                test_extent.xMaximum(),
+                test_extent.yMinimum(),
+                test_extent.yMaximum(),
+            ],
+            crs=test_layer.crs().authid(),
+        )
+
+        test_activity = Activity(
+            uuid=uuid.uuid4(),
+            name="test_activity",
+            description="test_description",
+            pathways=[test_pathway],
+        )
+
+        scenario = Scenario(
+            uuid=uuid.uuid4(),
+            name="Scenario",
+            description="Scenario description",
+            activities=[test_activity],
+            extent=spatial_extent,
+            priority_layer_groups=[],
+        )
+
+        analysis_task = ScenarioAnalysisTask(
+            "test_scenario_pathways_weighting_virtual_priority_layer",
+            "test_scenario_pathways_weighting_virtual_priority_layer_description",
+            [test_activity],
+            [],
+            test_layer.extent(),
+            scenario,
+        )
+        analysis_task.scenario_priority_layers = [virtual_priority_layer]
+        analysis_task.scenario_settings = {Settings.SCENARIO_IMPACT_MATRIX: ""}
+        analysis_task.scenario_directory = tempfile.mkdtemp()
+
+        extent_string = (
+            f"{test_extent.xMinimum()},{test_extent.xMaximum()},"
+            f"{test_extent.yMinimum()},{test_extent.yMaximum()}"
+            f" [{test_layer.crs().authid()}]"
+        )
+
+        results = analysis_task.run_pathways_weighting(
+            [test_activity],
+            [test_priority_group],
+            extent_string,
+            temporary_output=True,
+        )
+
+        self.assertTrue(results)
+
+        # The virtual PWL value is inlined, no raster is read or written
+        self.assertFalse(os.path.exists(virtual_priority_layer["path"]))
+        result_layer = QgsRasterLayer(test_pathway.path, test_pathway.name)
+        self.assertTrue(result_layer.isValid())
+
+        stat = result_layer.dataProvider().bandStatistics(1)
+
+        # (0.5 * pathway) * (2 * 0.25)
+        self.assertAlmostEqual(stat.minimumValue, 0.25)
+        self.assertAlmostEqual(stat.maximumValue, 2.5)
+
     def test_scenario_pathways_weighting_impact_matrix(self):
         """Test the weighting of NCS pathways with relative impact matrix"""
         pathway_layer_directory = os.path.join(
@@ -646,6 +762,115 @@ class ScenarioAnalysisTaskTest(unittest.TestCase):
 
         self.assertTrue(result_layer.isValid())
 
+    def test_scenario_decision_tree_masking(self):
+        pathway_layer_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "pathways",
+            "layers",
+            "test_pathway_1.tif",
+        )
+        activity_layer_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "activities",
+            "layers",
+            "test_activity_1.tif",
+        )
+        mask_layer_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "mask",
+            "layers",
+            "test_mask_1.shp",
+        )
+
+        test_pathway = NcsPathway(
+            uuid=uuid.uuid4(),
+            name="test_forest_pathway",
+            description="test_description",
+            path=pathway_layer_path,
+            pathway_type=NcsPathwayType.PROTECT,
+        )
+
+        test_activity = Activity(
+            uuid=uuid.uuid4(),
+            name="test_activity",
+            description="test_description",
+            pathways=[test_pathway],
+            mask_paths=[mask_layer_path],
+        )
+        test_activity.path = activity_layer_path
+
+        activity_layer = QgsRasterLayer(activity_layer_path, test_activity.name)
+        test_extent = activity_layer.extent()
+
+        spatial_extent = SpatialExtent(
+            bbox=[
+                test_extent.xMinimum(),
+                test_extent.xMaximum(),
+                test_extent.yMinimum(),
+                test_extent.yMaximum(),
+            ],
+            crs=activity_layer.crs().authid(),
+        )
+
+        scenario = Scenario(
+            uuid=uuid.uuid4(),
+            name="Scenario",
+            description="Scenario description",
+            activities=[test_activity],
+            extent=spatial_extent,
+            priority_layer_groups=[],
+        )
+
+        analysis_task = ScenarioAnalysisTask(
+            "test_scenario_decision_tree_masking",
+            "test_scenario_decision_tree_masking_description",
+            [test_activity],
+            [],
+            spatial_extent,
+            scenario,
+        )
+
+        extent_string = (
+            f"{test_extent.xMinimum()},{test_extent.xMaximum()},"
+            f"{test_extent.yMinimum()},{test_extent.yMaximum()}"
+            f" [{activity_layer.crs().authid()}]"
+        )
+
+        scenario_directory = tempfile.mkdtemp()
+        analysis_task.scenario_directory = scenario_directory
+
+        self.assertTrue(analysis_task.run_ncs_decision_tree([test_activity]))
+
+        # The decision tree rasters are kept apart from the vector masks
+        self.assertEqual(test_activity.mask_paths, [mask_layer_path])
+        decision_masks = analysis_task.decision_mask_paths[str(test_activity.uuid)]
+        self.assertEqual(
+            decision_masks,
+            [os.path.join(scenario_directory, "decision_tree", "decision_protect.tif")],
+        )
+
+        results = analysis_task.run_internal_activities_masking(
+            [test_activity], extent_string
+        )
+
+        self.assertTrue(results)
+        self.assertNotEqual(test_activity.path, activity_layer_path)
+
+        result_layer = QgsRasterLayer(test_activity.path, test_activity.name)
+        self.assertTrue(result_layer.isValid())
+
+        # Both the decision tree and the vector masks have been applied
+        result_stat = result_layer.dataProvider().bandStatistics(1)
+        self.assertGreaterEqual(result_stat.minimumValue, 1.0)
+        self.assertLessEqual(result_stat.maximumValue, 18.0)
+        self.assertEqual(
+            os.path.basename(os.path.dirname(test_activity.path)),
+            "final_masked_activities",
+        )
+
     def test_scenario_activity_normalization(self):
         "Test the normalization of activities"
         activities_layer_directory = os.path.join(
@@ -1112,5 +1337,304 @@ class ScenarioAnalysisTaskTest(unittest.TestCase):
         self.assertEqual(result_stat.minimumValue, 0.0)
         self.assertEqual(result_stat.maximumValue, 1.0)
 
+    def test_scenario_cancellation(self):
+        activity_layer_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "activities",
+            "layers",
+            "test_activity_2.tif",
+        )
+        test_activity = Activity(
+            uuid=uuid.uuid4(),
+            name="test_activity",
+            description="test_description",
+            pathways=[],
+            path=activity_layer_path,
+            mask_paths=[],
+        )
+        test_extent = QgsRasterLayer(activity_layer_path, "activity").extent()
+
+        scenario = Scenario(
+            uuid=uuid.uuid4(),
+            name="Scenario",
+            description="Scenario description",
+            activities=[test_activity],
+            extent=SpatialExtent(bbox=[0, 1, 0, 1]),
+            priority_layer_groups=[],
+        )
+
+        analysis_task = ScenarioAnalysisTask(
+            "test_scenario_cancellation",
+            "test_scenario_cancellation_description",
+            [test_activity],
+            [],
+            test_extent,
+            scenario,
+        )
+
+        running_feedback = analysis_task.feedback
+        scenario_directory = tempfile.mkdtemp()
+        partial_output = os.path.join(scenario_directory, "partial_output.tif")
+
+        def running_stage():
+            analysis_task.record_stage_files({"OUTPUT": partial_output})
+            FileUtils.create_new_file(partial_output)
+            analysis_task.cancel()
+            return True
+
+        stage = analysis_task.profiler.profile_stage("running_stage", running_stage)
+        analysis_task.cancellable_stage("running_stage", stage)()
+
+        self.assertTrue(analysis_task.processing_cancelled)
+        self.assertTrue(running_feedback.isCanceled())
+        self.assertFalse(os.path.exists(partial_output))
+
+        # Feedback created after the cancellation is cancelled right away
+        analysis_task.feedback = QgsProcessingFeedback()
+        self.assertTrue(analysis_task.feedback.isCanceled())
+
+        # Pending stages do not start
+        stage_calls = []
+        next_stage = analysis_task.cancellable_stage(
+            "next_stage", lambda: stage_calls.append(True)
+        )
+        self.assertFalse(next_stage())
+        self.assertEqual(stage_calls, [])
+
+    def test_stage_fingerprints_group_weight(self):
+        """Test a changed priority group weight only changes the fingerprint
+        of the pathways weighting and the following stages, so that the
+        stages before the weighting are reused.
+        """
+        pathway_layer_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "pathways",
+            "layers",
+            "test_pathway_1.tif",
+        )
+        priority_layer_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "priority",
+            "layers",
+            "test_priority_1.tif",
+        )
+        test_priority_group = {
+            "uuid": "a4f76e6c-9f83-4a9c-b700-fb1ae04860a4",
+            "name": "test_priority_group",
+            "description": "test_priority_group_description",
+            "value": 1,
+        }
+        priority_layer = {
+            "uuid": "c931282f-db2d-4644-9786-6720b3ab206a",
+            "name": "test_priority_layer",
+            "description": "test_priority_layer_description",
+            "selected": False,
+            "path": priority_layer_path,
+            "groups": [test_priority_group],
+        }
+        test_pathway = NcsPathway(
+            uuid=uuid.uuid4(),
+            name="test_pathway",
+            description="test_description",
+            path=pathway_layer_path,
+            priority_layers=[priority_layer],
+            suitability_index=0.5,
+        )
+        test_activity = Activity(
+            uuid=uuid.uuid4(),
+            name="test_activity",
+            description="test_description",
+            pathways=[test_pathway],
+        )
+
+        test_layer = QgsRasterLayer(pathway_layer_path, test_pathway.name)
+        test_extent = test_layer.extent()
+        spatial_extent = SpatialExtent(
+            bbox=[
+                test_extent.xMinimum(),
+                test_extent.xMaximum(),
+                test_extent.yMinimum(),
+                test_extent.yMaximum(),
+            ],
+            crs=test_layer.crs().authid(),
+        )
+        extent_string = (
+            f"{test_extent.xMinimum()},{test_extent.xMaximum()},"
+            f"{test_extent.yMinimum()},{test_extent.yMaximum()}"
+            f" [{test_layer.crs().authid()}]"
+        )
+
+        def stage_fingerprints(group_value, scenario_settings):
+            groups = [
+                {
+                    "name": test_priority_group["name"],
+                    "value": group_value,
+                    "layers": [priority_layer["name"]],
+                }
+            ]
+            scenario = Scenario(
+                uuid=uuid.uuid4(),
+                name="Scenario",
+                description="Scenario description",
+                activities=[test_activity],
+                extent=spatial_extent,
+                priority_layer_groups=groups,
+            )
+            analysis_task = ScenarioAnalysisTask(
+                "test_stage_fingerprints",
+                "test_stage_fingerprints_description",
+                [test_activity],
+                groups,
+                spatial_extent,
+                scenario,
+            )
+            analysis_task.scenario_settings = scenario_settings
+            analysis_task.scenario_priority_layers = [priority_layer]
+
+            return [
+                (stage.name, analysis_task.stage_fingerprint(stage))
+                for stage in analysis_task.analysis_stages(extent_string)
+            ]
+
+        fingerprints = stage_fingerprints(1, {Settings.SCENARIO_NAME: "Scenario"})
+        # Settings that the stages do not read are not fingerprinted
+        weighted_fingerprints = stage_fingerprints(
+            5,
+            {
+                Settings.SCENARIO_NAME: "Renamed scenario",
+                Settings.LAST_DATA_DIR: tempfile.gettempdir(),
+            },
+        )
+
+        stage_names = [name for name, _ in fingerprints]
+        self.assertEqual(stage_names, [name for name, _ in weighted_fingerprints])
+        weighting_index = stage_names.index("pathways_weighting")
+        self.assertGreater(weighting_index, 0)
+        self.assertEqual(
+            fingerprints[:weighting_index], weighted_fingerprints[:weighting_index]
+        )
+        self.assertNotEqual(
+            fingerprints[weighting_index], weighted_fingerprints[weighting_index]
+        )
+
+    def test_analysis_stage_dependencies(self):
+        """Test the priority layers nodata replacement does not depend on
+        the pathway stages, so that it can run concurrently with the
+        pathways nodata replacement.
+        """
+        pathway_layer_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "pathways",
+            "layers",
+            "test_pathway_1.tif",
+        )
+        test_pathway = NcsPathway(
+            uuid=uuid.uuid4(),
+            name="test_pathway",
+            description="test_description",
+            path=pathway_layer_path,
+        )
+        test_activity = Activity(
+            uuid=uuid.uuid4(),
+            name="test_activity",
+            description="test_description",
+            pathways=[test_pathway],
+        )
+
+        test_layer = QgsRasterLayer(pathway_layer_path, test_pathway.name)
+        test_extent = test_layer.extent()
+        spatial_extent = SpatialExtent(
+            bbox=[
+                test_extent.xMinimum(),
+                test_extent.xMaximum(),
+                test_extent.yMinimum(),
+                test_extent.yMaximum(),
+            ],
+            crs=test_layer.crs().authid(),
+        )
+        extent_string = (
+            f"{test_extent.xMinimum()},{test_extent.xMaximum()},"
+            f"{test_extent.yMinimum()},{test_extent.yMaximum()}"
+            f" [{test_layer.crs().authid()}]"
+        )
+        scenario = Scenario(
+            uuid=uuid.uuid4(),
+            name="Scenario",
+            description="Scenario description",
+            activities=[test_activity],
+            extent=spatial_extent,
+            priority_layer_groups=[],
+        )
+        analysis_task = ScenarioAnalysisTask(
+            "test_analysis_stage_dependencies",
+            "test_analysis_stage_dependencies_description",
+            [test_activity],
+            [],
+            spatial_extent,
+            scenario,
+        )
+        analysis_task.scenario_settings = {Settings.SNAPPING_ENABLED: False}
+        analysis_task.scenario_priority_layers = []
+
+        scheduler = StageScheduler(analysis_task.analysis_stages(extent_string))
+        self.assertEqual(scheduler.dependencies("priority_layers_nodata"), set())
+        self.assertNotIn(
+            "priority_layers_nodata", scheduler.dependencies("pathways_nodata")
+        )
+
+        # The downsampled priority layers of a preview are replaced
+        analysis_task.preview_factor = 4
+        scheduler = StageScheduler(analysis_task.analysis_stages(extent_string))
+        self.assertEqual(
+            scheduler.dependencies("priority_layers_nodata"),
+            {"preview_downsampling"},
+        )
+        self.assertNotIn(
+            "priority_layers_nodata", scheduler.dependencies("pathways_nodata")
+        )
+
+    def test_find_resumable_analysis(self):
+        """Test the incomplete analysis of a scenario is found by the
+        scenario name only if it is the latest analysis of the scenario.
+        """
+        scenario_id = str(uuid.uuid4())
+        with tempfile.TemporaryDirectory() as base_dir:
+
+            def record_analysis(directory_name, scenario_name, stages):
+                manifest = StageManifest(
+                    os.path.join(base_dir, directory_name),
+                    {"scenario": scenario_id, "scenario_name": scenario_name},
+                )
+                os.makedirs(manifest.scenario_directory)
+                for stage in stages:
+                    manifest.record_stage(stage, {})
+                return manifest
+
+            record_analysis("scenario_2024_01_01_00_00_00", "test", ["prepare"])
+            self.assertIsNone(
+                ScenarioAnalysisTask.find_resumable_analysis("other", base_dir)
+            )
+
+            manifest = ScenarioAnalysisTask.find_resumable_analysis("test", base_dir)
+            self.assertIsNotNone(manifest)
+            self.assertEqual(
+                manifest.scenario_directory,
+                os.path.join(base_dir, "scenario_2024_01_01_00_00_00"),
+            )
+            self.assertEqual(manifest.parameters["scenario"], scenario_id)
+
+            record_analysis(
+                "scenario_2024_01_02_00_00_00",
+                "test",
+                ["prepare", "highest_position"],
+            )
+            self.assertIsNone(
+                ScenarioAnalysisTask.find_resumable_analysis("test", base_dir)
+            )
+
     def tearDown(self):
         pass
@@ -1,9 +1,11 @@
+import datetime
 import unittest
+import uuid
 
 from utilities_for_testing import get_qgis_app
 
 from cplus_plugin.definitions.defaults import IRRECOVERABLE_CARBON_API_URL
-from cplus_plugin.models.base import DataSourceType
+from cplus_plugin.models.base import DataSourceType, ScenarioResult
 from cplus_plugin.gui.settings.cplus_options import CplusSettings
 from cplus_plugin.gui.settings.report_options import ReportSettingsWidget
 from cplus_plugin.conf import (
@@ -239,5 +241,33 @@ class ReportSettingsTest(unittest.TestCase):
         self.assertEqual(False, file_exist)
 
 
+class ScenarioResultSettingsTest(unittest.TestCase):
+    def test_preview_result(self):
+        """A test which checks if the preview flag of a scenario result
+        is kept when the result is saved and retrieved.
+        """
+        for preview in (True, False):
+            scenario_id = str(uuid.uuid4())
+            scenario_result = ScenarioResult(
+                scenario=None,
+                created_date=datetime.datetime(2024, 1, 2, 3, 4, 5),
+                analysis_output={"OUTPUT": "highest_position.tif"},
+                output_layer_name="highest_position",
+                scenario_directory="scenario_directory",
+                preview=preview,
+            )
+            settings_manager.save_scenario_result(scenario_result, scenario_id)
+
+            saved_result = settings_manager.get_scenario_result(scenario_id)
+            settings_manager.delete_scenario_result(scenario_id)
+
+            self.assertIsNotNone(saved_result)
+            self.assertEqual(saved_result.preview, preview)
+            self.assertEqual(saved_result.created_date, scenario_result.created_date)
+            self.assertEqual(
+                saved_result.analysis_output, scenario_result.analysis_output
+            )
+
+
 if __name__ == "__main__":
     unittest.main()
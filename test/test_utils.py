@@ -1,10 +1,15 @@
 # coding=utf-8
 """Tests for the CPLUS plugin utilities."""
 import os
+import tempfile
 import unittest
 import uuid
 
-from cplus_plugin.utils import open_documentation
+from cplus_plugin.utils import (
+    FilePartReader,
+    open_documentation,
+    sampled_file_fingerprint,
+)
 
 
 class CplusPluginUtilTest(unittest.TestCase):
@@ -19,3 +24,47 @@ class CplusPluginUtilTest(unittest.TestCase):
         # at the moment only these checks will pass
         self.assertIsNotNone(result)
         self.assertFalse(result)
+
+    def test_file_part_reader(self):
+        # Checks reading arbitrary byte ranges of a file
+        content = bytes(range(256)) * 4
+        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+            temp_file.write(content)
+            file_path = temp_file.name
+
+        try:
+            with FilePartReader(file_path) as reader:
+                self.assertEqual(reader.read(0, 100), content[:100])
+                self.assertEqual(reader.read(500, 100), content[500:600])
+                # Reading past the end returns the remaining bytes
+                self.assertEqual(reader.read(1000, 100), content[1000:])
+                self.assertEqual(reader.read(2000, 100), b"")
+        finally:
+            os.remove(file_path)
+
+    def test_sampled_file_fingerprint(self):
+        # Checks the fingerprint only depends on the file content
+        content = bytes(range(256)) * 64
+        file_paths = []
+        for _ in range(2):
+            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+                temp_file.write(content)
+                file_paths.append(temp_file.name)
+
+        try:
+            fingerprint = sampled_file_fingerprint(file_paths[0], sample_size=1024)
+            self.assertTrue(fingerprint.startswith(f"{len(content)}-"))
+            self.assertEqual(
+                fingerprint, sampled_file_fingerprint(file_paths[1], sample_size=1024)
+            )
+
+            # Change the last sampled byte of the second file
+            with open(file_paths[1], "r+b") as f:
+                f.seek(len(content) - 1)
+                f.write(b"\x00")
+            self.assertNotEqual(
+                fingerprint, sampled_file_fingerprint(file_paths[1], sample_size=1024)
+            )
+        finally:
+            for file_path in file_paths:
+                os.remove(file_path)
@@ -2,9 +2,14 @@
 """
 Unit tests for data validation module.
 """
+import os
+import tempfile
 import unittest
 from unittest import TestCase
 
+import numpy as np
+from osgeo import gdal
+
 from qgis.PyQt.QtCore import QCoreApplication
 
 from cplus_plugin.lib.validation.configs import (
@@ -17,7 +22,18 @@ from cplus_plugin.lib.validation.configs import (
 )
 from cplus_plugin.lib.validation.feedback import ValidationFeedback
 from cplus_plugin.lib.validation.manager import ValidationManager
-from cplus_plugin.lib.validation.validators import DataValidator, RasterValidator
+from cplus_plugin.lib.validation.metadata import (
+    LayerMetadata,
+    LayerMetadataCache,
+    LayerMetadataStore,
+    read_value_range,
+)
+from cplus_plugin.lib.validation.ncs_decision_tree import _enforce_rules
+from cplus_plugin.lib.validation.validators import (
+    DataValidator,
+    NcsDataValidator,
+    RasterValidator,
+)
 from cplus_plugin.models.validation import RuleInfo, RuleType
 
 from model_data_for_testing import get_ncs_pathways, get_protected_ncs_pathways
@@ -153,6 +169,138 @@ class TestDataValidation(TestCase):
         _ = normalized_validator.run()
         self.assertTrue(normalized_validator.result.success)
 
+    def test_ncs_decision_tree_rules(self):
+        """Test the NCS base rules applied on a block of pathway sums."""
+        # Pixels: cropland, wetland, grassland, none
+        sums = {
+            "C": np.array([[1, 0, 0, 0]], dtype=np.float32),
+            "W": np.array([[0, 1, 0, 0]], dtype=np.float32),
+            "G": np.array([[0, 0, 1, 0]], dtype=np.float32),
+            "P_o": np.array([[2, 2, 0, 0]], dtype=np.float32),
+            "M_w": np.array([[3, 3, 3, 0]], dtype=np.float32),
+            "R_o": np.array([[4, 4, 4, 4]], dtype=np.float32),
+            "R_for": np.array([[4, 4, 4, 4]], dtype=np.float32),
+        }
+        protect, manage, restore = _enforce_rules(sums, (1, 4))
+
+        # Non-cropland protect is removed on cropland and wetlands
+        np.testing.assert_array_equal(protect, [[0, 0, 0, 0]])
+        # Wetland manage is kept everywhere
+        np.testing.assert_array_equal(manage > 0, [[True, True, True, False]])
+        # Forest restore is only kept outside cropland, wetland,
+        # grassland and higher priority actions
+        np.testing.assert_array_equal(restore, [[0, 0, 0, 4]])
+
+    def test_concurrent_rule_validation(self):
+        """Test the rules run concurrently, each with its own feedback, and
+        their results are merged once all the rules have finished.
+        """
+        ncs_validator = NcsDataValidator()
+        ncs_validator.model_components = get_ncs_pathways()
+
+        self.assertTrue(ncs_validator.run())
+        ncs_validator.finished(True)
+
+        rule_types = []
+        for rule_validator in ncs_validator._applicable_rule_validators:
+            self.assertIsNot(rule_validator.feedback, ncs_validator.feedback)
+            self.assertEqual(
+                rule_validator.feedback.current_rule.type, rule_validator.rule_type
+            )
+            self.assertEqual(rule_validator.feedback.rule_progress, 100.0)
+            rule_types.append(rule_validator.rule_type)
+
+        rule_results = ncs_validator.result.rule_results
+        self.assertEqual(len(rule_results), len(rule_types))
+        self.assertNotIn(None, rule_results)
+
+    def test_shared_layer_metadata_cache(self):
+        """Test rule validators sharing the layer metadata read once
+        per dataset.
+        """
+        ncs_pathways = get_ncs_pathways()
+        metadata_cache = LayerMetadataCache()
+        metadata_cache.populate(ncs_pathways, include_statistics=True)
+
+        for pathway in ncs_pathways:
+            layer_metadata = metadata_cache.metadata(pathway)
+            self.assertTrue(layer_metadata.is_valid)
+            self.assertTrue(layer_metadata.is_raster)
+            self.assertTrue(layer_metadata.has_statistics)
+            # Subsequent lookups are served from the cache
+            self.assertIs(metadata_cache.metadata(pathway), layer_metadata)
+
+        feedback = ValidationFeedback()
+        feedback.current_rule = RuleInfo(RuleType.CRS, crs_validation_config.rule_name)
+        crs_validator = DataValidator.create_rule_validator(
+            RuleType.CRS, crs_validation_config, feedback
+        )
+        crs_validator.model_components = ncs_pathways
+        crs_validator.metadata_cache = metadata_cache
+
+        _ = crs_validator.run()
+        self.assertTrue(crs_validator.result.success)
+
+    def test_layer_metadata_store(self):
+        """Test the persisted layer metadata is only returned for
+        unchanged files.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            layer_path = os.path.join(temp_dir, "pathway.tif")
+            with open(layer_path, "wb") as f:
+                f.write(b"0" * 16)
+
+            store = LayerMetadataStore(temp_dir)
+            store.put(
+                layer_path,
+                LayerMetadata(is_valid=True, is_raster=True, resolution=(30.0, 30.0)),
+            )
+            store.save()
+
+            layer_metadata = LayerMetadataStore(temp_dir).get(layer_path)
+            self.assertIsNotNone(layer_metadata)
+            self.assertEqual(layer_metadata.resolution, (30.0, 30.0))
+
+            with open(layer_path, "ab") as f:
+                f.write(b"1")
+            self.assertIsNone(LayerMetadataStore(temp_dir).get(layer_path))
+
+    def test_read_value_range(self):
+        """Test the tiered range check of raster values."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            driver = gdal.GetDriverByName("GTiff")
+
+            def create_raster(file_name, values):
+                raster_path = os.path.join(temp_dir, file_name)
+                ds = driver.Create(
+                    raster_path,
+                    values.shape[1],
+                    values.shape[0],
+                    1,
+                    gdal.GDT_Float32,
+                    ["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"],
+                )
+                band = ds.GetRasterBand(1)
+                band.SetNoDataValue(-9999)
+                band.WriteArray(values)
+                ds = None
+                return raster_path
+
+            values = np.full((64, 16), 0.5, dtype=np.float32)
+            values[0, 0] = -9999
+            normalized_path = create_raster("normalized.tif", values)
+            self.assertEqual(read_value_range(normalized_path), (0.5, 0.5, True))
+
+            # Scanning stops at the first block with values out of range
+            values[0, 1] = 5.0
+            values[-1, 0] = 10.0
+            out_of_range_path = create_raster("out_of_range.tif", values)
+            minimum, maximum, exact = read_value_range(
+                out_of_range_path, scan_pixels=256
+            )
+            self.assertEqual(maximum, 5.0)
+            self.assertFalse(exact)
+
     def _setup_normalized_validator(self, pathways):
         rule_info = RuleInfo(
             RuleType.NORMALIZED, normalized_validation_config.rule_name
@@ -68,3 +68,16 @@ def test_package(package="test"):
     except ImportError:
         test_suite = unittest.TestSuite()
     _run_tests(test_suite, package)
+
+
+def benchmark_package():
+    """Runs the performance benchmarks of the scenario analysis, see
+    test/benchmarks/scenario_benchmarks.py for their configuration.
+    """
+    from processing.core.Processing import Processing
+
+    Processing.initialize()
+
+    from test.benchmarks.scenario_benchmarks import run_benchmarks
+
+    run_benchmarks()